@@ -30,6 +30,8 @@ urlpatterns = [
 
     url(r'^model/(?P<pk>\d+)/$', api_views.ForecastModelDetail.as_view(), name='api-model-detail'),
     url(r'^model/(?P<pk>\d+)/forecasts/$', api_views.ForecastModelForecastList.as_view(), name='api-forecast-list'),
+    url(r'^model/(?P<pk>\d+)/forecasts/bulk/$', api_views.upload_forecasts_bulk, name='api-forecast-bulk-upload'),
+    url(r'^model/(?P<pk>\d+)/forecasts/validate/$', api_views.validate_forecast, name='api-forecast-validate'),
 
     url(r'^forecast/(?P<pk>\d+)/$', api_views.ForecastDetail.as_view(), name='api-forecast-detail'),
     url(r'^forecast/(?P<pk>\d+)/data/$', api_views.forecast_data, name='api-forecast-data'),
@@ -1,7 +1,11 @@
 import csv
 import datetime
+import io
+import itertools
+import json
 import logging
 import tempfile
+from pathlib import Path
 from wsgiref.util import FileWrapper
 
 import django
@@ -10,9 +14,9 @@ from boto3.exceptions import Boto3Error
 from botocore.exceptions import BotoCoreError, ClientError, ConnectionClosedError
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.db import IntegrityError, OperationalError, connection, transaction
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse, HttpResponseBadRequest, \
-    HttpResponseNotFound
+    HttpResponseNotFound, StreamingHttpResponse
 from django.utils.text import get_valid_filename
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, renderer_classes
@@ -24,7 +28,7 @@ from rest_framework_csv.renderers import CSVRenderer
 
 from forecast_app.models import Project, ForecastModel, Forecast, Target
 from forecast_app.models.job import Job, JOB_TYPE_QUERY_FORECAST, JOB_TYPE_UPLOAD_TRUTH, \
-    JOB_TYPE_UPLOAD_FORECAST, JOB_TYPE_QUERY_TRUTH
+    JOB_TYPE_UPLOAD_FORECAST, JOB_TYPE_QUERY_TRUTH, JOB_TYPE_UPLOAD_FORECASTS_BULK
 from forecast_app.models.project import TimeZero, Unit
 from forecast_app.serializers import ProjectSerializer, UserSerializer, ForecastModelSerializer, ForecastSerializer, \
     TruthSerializer, JobSerializer, TimeZeroSerializer, UnitSerializer, TargetSerializer
@@ -35,7 +39,9 @@ from forecast_repo.settings.base import QUERY_FORECAST_QUEUE_NAME
 from utils.forecast import json_io_dict_from_forecast
 from utils.project import create_project_from_json, config_dict_from_project, latest_forecast_cols_for_project
 from utils.project_diff import execute_project_config_diff, project_config_diff
-from utils.project_queries import _forecasts_query_worker, _truth_query_worker
+from utils.project_queries import _forecasts_query_worker, _truth_query_worker, QUERY_FORMAT_CSV, QUERY_FORMATS, \
+    QUERY_FORMAT_PARQUET, QUERY_ESTIMATE_MAX_ROWS_FACTOR, is_parquet_available, _set_local_query_timeouts
+from utils.query_cache import query_cache_key, cached_query_entry
 from utils.utilities import YYYY_MM_DD_DATE_FORMAT
 
 
@@ -423,7 +429,8 @@ class ForecastModelForecastList(UserPassesTestMixin, generics.ListCreateAPIView)
         """
         Handles uploading a new Forecast to this ForecastModel. POST form fields:
         - 'data_file' (required): The data file to upload. NB: 'data_file' is our naming convention. it could be
-            renamed. If multiple files, just uses the first one.
+            renamed. If multiple files, just uses the first one. Files named '*.csv' are loaded as forecast csv files
+            (see `prediction_dicts_from_forecast_csv()`), and all others as JSON.
         - 'timezero_date' (required): The TimeZero.timezero_date to use to look up the TimeZero to associate with the
             upload. The date format is utils.utilities.YYYY_MM_DD_DATE_FORMAT. The TimeZero must exist, and will not be
             created if one corresponding to 'timezero_date' isn't found.
@@ -432,7 +439,7 @@ class ForecastModelForecastList(UserPassesTestMixin, generics.ListCreateAPIView)
 
         # imported here so that tests can patch via mock:
         from forecast_app.views import _upload_file, _upload_forecast_worker, is_user_ok_upload_forecast
-        from forecast_repo.settings.base import MAX_UPLOAD_FILE_SIZE
+        from forecast_repo.settings.base import MAX_FORECAST_UPLOAD_FILE_SIZE
 
 
         # check authorization
@@ -446,8 +453,9 @@ class ForecastModelForecastList(UserPassesTestMixin, generics.ListCreateAPIView)
 
         # NB: if multiple files, just uses the first one:
         data_file = request.data['data_file']  # UploadedFile (e.g., InMemoryUploadedFile or TemporaryUploadedFile)
-        if data_file.size > MAX_UPLOAD_FILE_SIZE:
-            message = "File was too large to upload. size={}, max={}.".format(data_file.size, MAX_UPLOAD_FILE_SIZE)
+        if data_file.size > MAX_FORECAST_UPLOAD_FILE_SIZE:
+            message = "File was too large to upload. size={}, max={}.".format(data_file.size,
+                                                                             MAX_FORECAST_UPLOAD_FILE_SIZE)
             return JsonResponse({'error': message}, status=status.HTTP_400_BAD_REQUEST)
 
         # validate 'timezero_date'
@@ -497,6 +505,165 @@ class ForecastModelForecastList(UserPassesTestMixin, generics.ListCreateAPIView)
         return JsonResponse(job_serializer.data)
 
 
+@api_view(['POST'])
+def upload_forecasts_bulk(request, pk):
+    """
+    Handles uploading many new Forecasts to a ForecastModel at once via a single archive file, e.g., when backfilling
+    a season. The archive is uploaded to the cloud once and then processed by a single Job - see
+    `_upload_forecasts_bulk_worker()`. POST form fields:
+    - 'data_file' (required): a zip or tar archive of forecast data files, each in the same format as
+        `ForecastModelForecastList.post()`'s 'data_file'
+    - 'manifest' (required): a JSON list of dicts, one per archive file to load, with these keys: 'filename' (the
+        file's name within the archive), 'timezero_date' (as in `ForecastModelForecastList.post()`'s
+        'timezero_date'), and optional 'notes'. Files with the same 'timezero_date' are loaded as successive versions
+        in manifest order
+
+    :param request: a request
+    :param pk: a ForecastModel's pk
+    :return: the serialized Job. its output_json will contain per-file statuses when it's done
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_app.views import _upload_file, _upload_forecasts_bulk_worker, is_user_ok_upload_forecast
+    from forecast_repo.settings.base import MAX_BULK_UPLOAD_FILE_SIZE, MAX_UPLOAD_FILE_SIZE
+    from utils.forecast_archive import archive_member_sizes
+
+
+    # check authorization
+    forecast_model = get_object_or_404(ForecastModel, pk=pk)
+    if (not request.user.is_authenticated) or not is_user_ok_upload_forecast(request, forecast_model):
+        return HttpResponseForbidden()
+
+    # validate 'data_file'
+    if 'data_file' not in request.data:
+        return JsonResponse({'error': "No 'data_file' form field."}, status=status.HTTP_400_BAD_REQUEST)
+
+    data_file = request.data['data_file']  # UploadedFile (e.g., InMemoryUploadedFile or TemporaryUploadedFile)
+    if data_file.size > MAX_BULK_UPLOAD_FILE_SIZE:
+        message = f"File was too large to upload. size={data_file.size}, max={MAX_BULK_UPLOAD_FILE_SIZE}."
+        return JsonResponse({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        filename_to_size = archive_member_sizes(data_file)
+        data_file.seek(0)  # for `_upload_file()`
+    except RuntimeError as rte:
+        return JsonResponse({'error': f"Invalid 'data_file' form field: {rte}. forecast_model={forecast_model}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    # validate 'manifest', replacing each entry's 'timezero_date' with 'timezero_pk'
+    if 'manifest' not in request.data:
+        return JsonResponse({'error': "No 'manifest' form field."}, status=status.HTTP_400_BAD_REQUEST)
+
+    manifest = request.data['manifest']
+    try:
+        manifest = json.loads(manifest) if isinstance(manifest, str) else manifest  # multipart forms send JSON strings
+    except json.JSONDecodeError as jde:
+        return JsonResponse({'error': f"Badly formatted 'manifest' form field: '{jde!r}'. "
+                                      f"forecast_model={forecast_model}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    if (not isinstance(manifest, list)) or (not manifest) \
+            or (not all(isinstance(manifest_entry, dict) and ({'filename', 'timezero_date'} <= manifest_entry.keys())
+                        for manifest_entry in manifest)):
+        return JsonResponse({'error': f"'manifest' form field was not a non-empty list of dicts with 'filename' and "
+                                      f"'timezero_date' keys. manifest={manifest}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    filenames = [manifest_entry['filename'] for manifest_entry in manifest]
+    if len(filenames) != len(set(filenames)):
+        return JsonResponse({'error': f"'manifest' form field had duplicate filenames. filenames={filenames}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    job_manifest = []  # passed to `_upload_forecasts_bulk_worker()`. filled next
+    for manifest_entry in manifest:
+        filename, timezero_date_str = manifest_entry['filename'], manifest_entry['timezero_date']
+        if filename not in filename_to_size:
+            return JsonResponse({'error': f"'manifest' file not found in archive: {filename!r}. "
+                                          f"forecast_model={forecast_model}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        elif filename_to_size[filename] > MAX_UPLOAD_FILE_SIZE:
+            return JsonResponse({'error': f"Archive file was too large to upload. filename={filename!r}, "
+                                          f"size={filename_to_size[filename]}, max={MAX_UPLOAD_FILE_SIZE}."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            timezero_date_obj = datetime.datetime.strptime(timezero_date_str, YYYY_MM_DD_DATE_FORMAT)
+        except (TypeError, ValueError) as ve:
+            return JsonResponse({'error': f"Badly formatted 'manifest' 'timezero_date': '{ve!r}'. "
+                                          f"filename={filename!r}, forecast_model={forecast_model}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        time_zero = forecast_model.project.time_zero_for_timezero_date(timezero_date_obj)
+        if not time_zero:
+            return JsonResponse({'error': f"TimeZero not found for 'manifest' 'timezero_date': '{timezero_date_obj}'. "
+                                          f"filename={filename!r}, forecast_model={forecast_model}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        job_manifest.append({'filename': filename, 'timezero_pk': time_zero.pk,
+                             'notes': manifest_entry.get('notes', '')})
+
+    # upload to cloud and enqueue a job to process a new Job
+    is_error, job = _upload_file(request.user, data_file, _upload_forecasts_bulk_worker,
+                                 type=JOB_TYPE_UPLOAD_FORECASTS_BULK, forecast_model_pk=forecast_model.pk,
+                                 manifest=job_manifest)
+    if is_error:
+        return JsonResponse({'error': f"There was an error uploading the file. The error was: '{is_error}'. "
+                                      f"forecast_model={forecast_model}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    job_serializer = JobSerializer(job, context={'request': request})
+    return JsonResponse(job_serializer.data)
+
+
+@api_view(['POST'])
+def validate_forecast(request, pk):
+    """
+    Validates a forecast data file against a ForecastModel's project without loading it, i.e., no Forecast is created,
+    nothing is uploaded to the cloud, and no Job is enqueued. Unlike uploading, all errors are reported rather than
+    just the first one - see `validation_errors_for_json_io_dict()`. POST form fields:
+    - 'data_file' (required): The data file to validate, in the same format as `ForecastModelForecastList.post()`'s
+        'data_file', i.e., files named '*.csv' are parsed as forecast csv files, and all others as JSON. it is validated
+        as uploading does, e.g., bin cats are not checked against their targets' cats
+
+    :param request: a request
+    :param pk: a ForecastModel's pk
+    :return: a JSON dict with these keys: 'is_valid' (bool) and 'errors' (a list of error dicts as returned by
+        `validation_errors_for_json_io_dict()`)
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_app.views import is_user_ok_upload_forecast
+    from forecast_repo.settings.base import MAX_UPLOAD_FILE_SIZE
+    from utils.forecast import validation_errors_for_json_io_dict
+    from utils.forecast_csv import prediction_dicts_from_forecast_csv
+
+
+    # check authorization. NB: we use the same check as uploading so that validation is not a way to probe projects
+    forecast_model = get_object_or_404(ForecastModel, pk=pk)
+    if (not request.user.is_authenticated) or not is_user_ok_upload_forecast(request, forecast_model):
+        return HttpResponseForbidden()
+
+    # validate 'data_file'
+    if 'data_file' not in request.data:
+        return JsonResponse({'error': "No 'data_file' form field."}, status=status.HTTP_400_BAD_REQUEST)
+
+    data_file = request.data['data_file']  # UploadedFile (e.g., InMemoryUploadedFile or TemporaryUploadedFile)
+    if data_file.size > MAX_UPLOAD_FILE_SIZE:
+        message = f"File was too large to validate. size={data_file.size}, max={MAX_UPLOAD_FILE_SIZE}."
+        return JsonResponse({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
+    is_csv = Path(data_file.name).suffix.lower() == '.csv'
+    try:
+        if is_csv:
+            json_io_dict = {'meta': {}, 'predictions': list(prediction_dicts_from_forecast_csv(
+                forecast_model.project, io.TextIOWrapper(data_file.file, 'utf-8')))}
+        else:
+            json_io_dict = json.load(data_file)
+    except (UnicodeDecodeError, json.JSONDecodeError, RuntimeError) as ex:  # RuntimeError: csv header or row
+        errors = [{'index': None, 'message': f"data_file was not valid {'csv' if is_csv else 'JSON'}: {ex!r}"}]
+    else:
+        errors = validation_errors_for_json_io_dict(forecast_model.project, json_io_dict, is_validate_cats=False)
+    return JsonResponse({'is_valid': not errors, 'errors': errors})
+
+
 class JobDetailView(UserPassesTestMixin, generics.RetrieveAPIView):
     queryset = Job.objects.all()
     serializer_class = JobSerializer
@@ -773,16 +940,30 @@ def query_forecasts_endpoint(request, pk):
 
     POST form fields:
     - 'query' (required): a dict specifying the query parameters. see https://docs.zoltardata.com/ for documentation
+    - 'format' (optional): the job data's file format. either 'csv' (the default) or 'parquet'. the latter requires
+        the server to have the optional pyarrow package installed. its 'value' and 'sample' columns are floats that
+        have numeric targets' values, and each is followed by a string column ('value_text' and 'sample_text') that
+        has other targets' values - see `_write_parquet_rows()`
+    - 'dry_run' (optional): a boolean. if true then no Job is created. instead the query's estimated size is returned
+        as a dict: {'estimate': {'num_elements': ..., 'num_rows': ..., 'num_bytes': ...}} - see
+        `estimate_forecasts_query()`
+    - 'sync' (optional): a boolean. if true, and the query's estimated number of rows is at most QUERY_SYNC_MAX_ROWS,
+        then no Job is created. instead the query's CSV is streamed as the response (content type 'text/csv'), which
+        saves the Job round trip for small queries. larger queries fall back to creating a Job as usual. requires the
+        'csv' format
+
+    Queries whose estimated number of prediction elements is obviously larger than MAX_NUM_QUERY_ROWS are rejected.
 
     :param request: a request
     :param pk: a Project's pk
-    :return: the serialized Job
+    :return: the serialized Job, the estimate if 'dry_run', or the query's CSV if 'sync' and the query is small
     """
     # imported here so that tests can patch via mock:
-    from utils.project_queries import validate_forecasts_query
+    from utils.project_queries import validate_forecasts_query, estimate_forecasts_query, query_forecasts_for_project
 
 
-    return _query_endpoint(request, pk, validate_forecasts_query, JOB_TYPE_QUERY_FORECAST, _forecasts_query_worker)
+    return _query_endpoint(request, pk, validate_forecasts_query, JOB_TYPE_QUERY_FORECAST, _forecasts_query_worker,
+                           query_forecasts_for_project, estimate_forecasts_query)
 
 
 @api_view(['POST'])
@@ -792,19 +973,26 @@ def query_truth_endpoint(request, pk):
 
     POST form fields:
     - 'query' (required): a dict specifying the query parameters. see https://docs.zoltardata.com/ for documentation
+    - 'format' (optional): as documented in query_forecasts_endpoint()
+    - 'sync' (optional): as documented in query_forecasts_endpoint(), except that truth queries are not estimated.
+        instead, up to QUERY_SYNC_MAX_ROWS rows are fetched, and the query falls back to a Job if there are more
+
+    Unlike query_forecasts_endpoint(), 'dry_run' is not supported b/c truth queries are small.
 
     :param request: a request
     :param pk: a Project's pk
-    :return: the serialized Job
+    :return: the serialized Job, or the query's CSV if 'sync' and the query is small
     """
     # imported here so that tests can patch via mock:
-    from utils.project_queries import validate_truth_query
+    from utils.project_queries import validate_truth_query, query_truth_for_project
 
 
-    return _query_endpoint(request, pk, validate_truth_query, JOB_TYPE_QUERY_TRUTH, _truth_query_worker)
+    return _query_endpoint(request, pk, validate_truth_query, JOB_TYPE_QUERY_TRUTH, _truth_query_worker,
+                           query_truth_for_project)
 
 
-def _query_endpoint(request, project_pk, query_validation_fcn, query_job_type, query_worker_fcn):
+def _query_endpoint(request, project_pk, query_validation_fcn, query_job_type, query_worker_fcn, query_rows_fcn,
+                    query_estimate_fcn=None):
     """
     `query_forecasts_endpoint()` and `_truth_query_worker()` helper
 
@@ -819,8 +1007,18 @@ def _query_endpoint(request, project_pk, query_validation_fcn, query_job_type, q
     :param query_job_type: is either JOB_TYPE_QUERY_FORECAST or JOB_TYPE_QUERY_TRUTH. used for the new Job's `type`
     :param query_worker_fcn: an enqueue() helper function of one arg (job_pk). the function is either
         `_forecasts_query_worker` or `_truth_query_worker`
-    :return: the serialized Job
+    :param query_rows_fcn: a function of 2 args (Project and query) that returns the query's rows, including the
+        header, for 'sync'. the function is either `query_forecasts_for_project` or `query_truth_for_project`
+    :param query_estimate_fcn: optional function of 2 args (Project and the second element of query_validation_fcn's
+        result) that returns the query's size estimate. currently only `estimate_forecasts_query`. 'dry_run' requires
+        it
+    :return: the serialized Job, the query's size estimate if 'dry_run', or a StreamingHttpResponse of the query's CSV
+        if 'sync' and the query is small
     """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import MAX_NUM_QUERY_ROWS
+
+
     if request.method != 'POST':
         return Response(f"Only POST is allowed at this endpoint", status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -835,20 +1033,150 @@ def _query_endpoint(request, project_pk, query_validation_fcn, query_job_type, q
 
     query = request.data['query']
     logger.debug(f"query_forecasts_endpoint(): query={query}")
-    error_messages, _ = query_validation_fcn(project, query)
+    error_messages, validated_query = query_validation_fcn(project, query)
     if error_messages:
         return JsonResponse({'error': f"Invalid query. error_messages='{error_messages}', query={query}"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-    job = _create_query_job(project_pk, query, query_job_type, query_worker_fcn, request)
+    # validate 'format'
+    query_format = request.data.get('format', QUERY_FORMAT_CSV)
+    if query_format not in QUERY_FORMATS:
+        return JsonResponse({'error': f"Invalid 'format'. format={query_format!r}, valid formats={QUERY_FORMATS}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    elif (query_format == QUERY_FORMAT_PARQUET) and not is_parquet_available():
+        return JsonResponse({'error': f"The {QUERY_FORMAT_PARQUET!r} format is not available on this server."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    # validate 'dry_run' and 'sync', and estimate the query's size
+    is_dry_run = request.data.get('dry_run', False)
+    if not isinstance(is_dry_run, bool):
+        return JsonResponse({'error': f"'dry_run' was not a boolean. dry_run={is_dry_run!r}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    elif is_dry_run and not query_estimate_fcn:
+        return JsonResponse({'error': "'dry_run' is not supported for this type of query."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    is_sync = request.data.get('sync', False)
+    if not isinstance(is_sync, bool):
+        return JsonResponse({'error': f"'sync' was not a boolean. sync={is_sync!r}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    elif is_sync and (query_format != QUERY_FORMAT_CSV):
+        return JsonResponse({'error': f"'sync' requires the {QUERY_FORMAT_CSV!r} format. format={query_format!r}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    estimate = query_estimate_fcn(project, validated_query) if query_estimate_fcn and validated_query else None
+    if is_dry_run:
+        return JsonResponse({'estimate': estimate})
+    elif estimate and (estimate['num_elements'] > MAX_NUM_QUERY_ROWS * QUERY_ESTIMATE_MAX_ROWS_FACTOR):
+        # NB: MAX_NUM_QUERY_ROWS limits prediction elements, not CSV rows - see `query_forecasts_for_project()`
+        return JsonResponse({'error': f"Query is too large. estimated num_elements={estimate['num_elements']}, "
+                                      f"max_num_rows={MAX_NUM_QUERY_ROWS}. Please narrow the query."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    if is_sync:
+        rows = _sync_query_rows(project, query, query_rows_fcn, estimate)
+        if rows is not None:
+            logger.debug(f"query_forecasts_endpoint(): streaming query. query={query}")
+            query_type_str = 'forecasts' if query_job_type == JOB_TYPE_QUERY_FORECAST else 'truth'
+            csv_filename = get_valid_filename(f"project-{project.name}-{query_type_str}-query.csv")
+            return _streaming_csv_response(rows, csv_filename)
+
+    job = _create_query_job(project_pk, query, query_job_type, query_worker_fcn, request, query_format,
+                            validated_query)
     job_serializer = JobSerializer(job, context={'request': request})
     logger.debug(f"query_forecasts_endpoint(): query enqueued. job={job}")
     return JsonResponse(job_serializer.data)
 
 
-def _create_query_job(project_pk, query, query_job_type, query_worker_fcn, request):
+def _sync_query_rows(project, query, query_rows_fcn, estimate):
+    """
+    A `_query_endpoint()` helper for 'sync' requests that decides whether the query is small enough to return directly.
+
+    :param project: a Project
+    :param query: a valid query
+    :param query_rows_fcn: as passed to `_query_endpoint()`
+    :param estimate: the query's `query_estimate_fcn` result, or None if it has no estimator
+    :return: a list of the query's rows (including the header) if it has at most QUERY_SYNC_MAX_ROWS, or None if it is
+        larger. the rows are fetched up front, stopping after QUERY_SYNC_MAX_ROWS + 1 rows, so that the query does not
+        run unbounded in the web process, and so that an error is not streamed as a truncated response. queries whose
+        estimate (if passed) is larger are not run at all. NB: we do not rely on the estimate alone b/c it does not
+        count forecasts whose metadata has not been cached, and truth queries have no estimate. for the same reason,
+        the rows are fetched with the same postgres timeouts as `_query_worker()`, and a query that times out also
+        returns None so that its Job reports the error
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import QUERY_SYNC_MAX_ROWS
+
+
+    if estimate and (estimate['num_rows'] > QUERY_SYNC_MAX_ROWS):
+        return None
+
+    try:
+        # use a transaction to set the scope of the postgres `statement_timeout` parameter, as `_query_worker()` does
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    _set_local_query_timeouts(cursor)
+            rows = list(itertools.islice(query_rows_fcn(project, query), QUERY_SYNC_MAX_ROWS + 2))  # + 2: header, extra
+    except OperationalError as oe:
+        logger.warning(f"_sync_query_rows(): query timed out. falling back to a Job. error={oe!r}, query={query}")
+        return None
+
+    return rows if len(rows) <= QUERY_SYNC_MAX_ROWS + 1 else None
+
+
+class _EchoWriter:
+    """
+    A file-like object for `csv.writer()` whose `write()` returns the formatted row rather than storing it. Used by
+    `_streaming_csv_response()`, as recommended by https://docs.djangoproject.com/en/3.1/howto/outputting-csv/ .
+    """
+
+
+    def write(self, value):
+        return value
+
+
+def _streaming_csv_response(rows, csv_filename):
+    """
+    :param rows: an iterable of CSV rows, e.g., a generator
+    :param csv_filename: the response's attachment file name
+    :return: a StreamingHttpResponse that formats rows as CSV as it iterates over them
+    """
+    csv_writer = csv.writer(_EchoWriter())
+    response = StreamingHttpResponse((csv_writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(str(csv_filename))
+    return response
+
+
+def _create_query_job(project_pk, query, query_job_type, query_worker_fcn, request, query_format=QUERY_FORMAT_CSV,
+                      validated_query=None):
+    """
+    Creates a query Job and enqueues query_worker_fcn to run it. If the query cache is enabled and has an entry for
+    the query at the project's current data version then the Job instead succeeds immediately, pointing at the entry's
+    Job's file via output_json['cached_job_pk'] - see `_download_job_data_request()`.
+
+    :param validated_query: optional second element of query's validation function result, which is used to compute
+        its `query_cache_key()`. the cache is not used if not passed
+    :return: the new Job
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import IS_QUERY_CACHE
+
+
+    input_json = {'type': query_job_type, 'project_pk': project_pk, 'query': query}
+    if query_format != QUERY_FORMAT_CSV:  # o/w leave input_json as it was before formats were added
+        input_json['format'] = query_format
+    cache_key = query_cache_key(query_job_type, query_format, validated_query) if IS_QUERY_CACHE else None
+    cache_entry = cached_query_entry(get_object_or_404(Project, pk=project_pk), cache_key) if cache_key else None
+    if cache_entry:
+        logger.debug(f"_create_query_job(): cache hit. cache_entry={cache_entry}")
+        return Job.objects.create(user=request.user, status=Job.SUCCESS, input_json=input_json,
+                                  output_json={'num_rows': cache_entry.num_rows, 'cached_job_pk': cache_entry.job.pk})
+
     job = Job.objects.create(user=request.user)  # status = PENDING
-    job.input_json = {'type': query_job_type, 'project_pk': project_pk, 'query': query}
+    job.input_json = input_json
+    if cache_key:
+        job.input_json['cache_key'] = cache_key
     job.save()
     queue = django_rq.get_queue(QUERY_FORECAST_QUEUE_NAME)
     queue.enqueue(query_worker_fcn, job.pk)
@@ -905,7 +1233,7 @@ def download_job_data(request, pk):
     A note regarding Job "type": Currently there is no Job.type IV, so we have to infer it from Job.input_json, which
     will have a 'query' key if it was created by `query_forecasts_endpoint()`.
 
-    :return: a Job's data as CSV
+    :return: a Job's data as CSV, or as Parquet if the job's query was run with that format
     """
     job = get_object_or_404(Job, pk=pk)
     if (not request.user.is_authenticated) or ((not request.user.is_superuser) and (not request.user == job.user)):
@@ -920,21 +1248,29 @@ def download_job_data(request, pk):
 def _download_job_data_request(job):
     """
     :param job: a Job
-    :return: the data file corresponding to `job` as a CSV file
+    :return: the data file corresponding to `job` as a CSV file, or as a Parquet one if its input_json 'format' is
+        QUERY_FORMAT_PARQUET
     """
     # imported here so that tests can patch via mock:
     from utils.cloud_file import download_file, _file_name_for_object
 
 
+    # jobs that were answered from the query cache share the file of the job that ran the query. NB: that job might
+    # have since been deleted, but its file was not
+    is_cached = isinstance(job.output_json, dict) and ('cached_job_pk' in job.output_json)
+    file_job = Job(pk=job.output_json['cached_job_pk']) if is_cached else job
     with tempfile.TemporaryFile() as cloud_file_fp:  # <class '_io.BufferedRandom'>
         try:
-            download_file(job, cloud_file_fp)
+            download_file(file_job, cloud_file_fp)
             cloud_file_fp.seek(0)  # yes you have to do this!
 
             # https://stackoverflow.com/questions/16538210/downloading-files-from-amazon-s3-using-django
-            csv_filename = get_valid_filename(f'job-{_file_name_for_object(job)}-data.csv')
+            is_parquet = isinstance(job.input_json, dict) and (job.input_json.get('format') == QUERY_FORMAT_PARQUET)
+            extension, content_type = ('parquet', 'application/vnd.apache.parquet') if is_parquet \
+                else ('csv', 'text/csv')
+            csv_filename = get_valid_filename(f'job-{_file_name_for_object(job)}-data.{extension}')
             wrapper = FileWrapper(cloud_file_fp)
-            response = HttpResponse(wrapper, content_type='text/csv')
+            response = HttpResponse(wrapper, content_type=content_type)
             # response['Content-Length'] = os.path.getsize('/tmp/'+fname)
             response['Content-Disposition'] = 'attachment; filename="{}"'.format(str(csv_filename))
             return response
@@ -0,0 +1,58 @@
+# Generated by Django 3.1.12 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+#
+# This file does both schema and data migrations for changing PredictionData from one row per PredictionElement to
+# one row per distinct data (keyed by PredictionElement.data_hash). I edited the Django-generated file to get this. We
+# rename the old table out of the way, create the new one, backfill it from the old one via SQL (the ORM is much too
+# slow for the number of rows involved), and then drop the old one.
+#
+
+def forwards_func(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    PredictionElement = apps.get_model("forecast_app", "PredictionElement")
+    PredictionDataOld = apps.get_model("forecast_app", "PredictionDataOld")
+    PredictionData = apps.get_model("forecast_app", "PredictionData")
+
+    # NB: Postgres does not allow the "bare" `data` column in the GROUP BY (SQLite does, taking it from an arbitrary row
+    # in the group), so we pick the first one. the data is the same for all rows in the group b/c they have the same
+    # hash
+    data_column = '(ARRAY_AGG(pred_data.data))[1]' if schema_editor.connection.vendor == 'postgresql' \
+        else 'pred_data.data'
+    sql = f"""
+        INSERT INTO {PredictionData._meta.db_table} (data_hash, data, ref_count)
+        SELECT pred_ele.data_hash, {data_column}, COUNT(*)
+        FROM {PredictionElement._meta.db_table} AS pred_ele
+                 JOIN {PredictionDataOld._meta.db_table} AS pred_data ON pred_ele.id = pred_data.pred_ele_id
+        GROUP BY pred_ele.data_hash;
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('forecast_app', '0017_forecast_issued_at'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='PredictionData',
+            new_name='PredictionDataOld',
+        ),
+        migrations.CreateModel(
+            name='PredictionData',
+            fields=[
+                ('data_hash', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('ref_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(forwards_func, reverse_code=migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PredictionDataOld',
+        ),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 3.1.12 on 2026-10-18 13:40
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+#
+# This file does both schema and data migrations for changing PredictionElement.data_hash and PredictionData.data_hash
+# from 32 character MD5 hex strings to 16-byte blake2b hashes stored as UUIDs (see
+# `PredictionElement.DATA_HASH_SCHEMES`). I edited the Django-generated file to get this. We first convert
+# retractions' '' hashes to RETRACT_DATA_HASH so that all PredictionElement.data_hash values are valid UUIDs (MD5 hex
+# strings already are), and then change that field's type. Then, similar to 0018_predictiondata_content_addressed.py,
+# we rename the old PredictionData table out of the way, create the new one, and rehash the old one's data into it,
+# saving an old -> new hash mapping in a temp table that we use to update PredictionElement.data_hash in one
+# statement. NB: the hashing code is copied here rather than imported so that this migration does not change if the
+# app's scheme does.
+#
+
+RETRACT_DATA_HASH = '0' * 32  # uuid.UUID(int=0).hex
+
+_CANONICAL_JSON_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'), check_circular=False)
+
+REHASH_BATCH_SIZE = 10_000
+
+
+def _blake2b_json_and_hash(prediction_data):
+    json_str = _CANONICAL_JSON_ENCODER.encode(prediction_data)
+    return json_str, hashlib.blake2b(json_str.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def set_retract_data_hash(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    PredictionElement = apps.get_model("forecast_app", "PredictionElement")
+    PredictionElement.objects.filter(is_retract=True).update(data_hash=RETRACT_DATA_HASH)
+
+
+def rehash_prediction_data(apps, schema_editor):
+    PredictionElement = apps.get_model("forecast_app", "PredictionElement")
+    PredictionDataOld = apps.get_model("forecast_app", "PredictionDataOld")
+    PredictionData = apps.get_model("forecast_app", "PredictionData")
+    connection = schema_editor.connection
+    pred_data_table_name = PredictionData._meta.db_table
+    hash_type = 'uuid' if connection.vendor == 'postgresql' else 'char(32)'  # matches UUIDField's column type
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE data_hash_map (old_hash {hash_type} PRIMARY KEY, new_hash {hash_type});")
+
+    # fill the new PredictionData table and the hash mapping in batches. NB: it's possible (though very unlikely) that
+    # two old rows' data have the same new hash, e.g., if the database normalized their numbers the same way, so we
+    # merge ref_counts rather than failing
+    map_rows, data_rows = [], []
+
+
+    def insert_batch():
+        with connection.cursor() as cursor:
+            cursor.executemany("INSERT INTO data_hash_map (old_hash, new_hash) VALUES (%s, %s);", map_rows)
+            cursor.executemany(f"""
+                INSERT INTO {pred_data_table_name} (data_hash, data, ref_count)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (data_hash) DO UPDATE SET ref_count = {pred_data_table_name}.ref_count + excluded.ref_count;
+            """, data_rows)
+        map_rows.clear()
+        data_rows.clear()
+
+
+    for old_hash, data, ref_count in PredictionDataOld.objects.values_list('data_hash', 'data', 'ref_count') \
+            .iterator(chunk_size=REHASH_BATCH_SIZE):
+        json_str, new_hash = _blake2b_json_and_hash(data)
+        map_rows.append((old_hash, new_hash))
+        data_rows.append((new_hash, json_str, ref_count))
+        if len(map_rows) >= REHASH_BATCH_SIZE:
+            insert_batch()
+    insert_batch()
+
+    # update PredictionElement.data_hash. retractions are not in data_hash_map and so are not changed
+    pred_ele_table_name = PredictionElement._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {pred_ele_table_name}
+            SET data_hash = data_hash_map.new_hash
+            FROM data_hash_map
+            WHERE {pred_ele_table_name}.data_hash = data_hash_map.old_hash;
+        """)
+        cursor.execute("DROP TABLE data_hash_map;")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('forecast_app', '0018_predictiondata_content_addressed'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_retract_data_hash, reverse_code=migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='predictionelement',
+            name='data_hash',
+            field=models.UUIDField(),
+        ),
+        migrations.RenameModel(
+            old_name='PredictionData',
+            new_name='PredictionDataOld',
+        ),
+        migrations.CreateModel(
+            name='PredictionData',
+            fields=[
+                ('data_hash', models.UUIDField(primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('ref_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(rehash_prediction_data, reverse_code=migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PredictionDataOld',
+        ),
+    ]
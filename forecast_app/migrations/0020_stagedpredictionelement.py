@@ -0,0 +1,27 @@
+# Generated by Django 3.1.12 on 2026-10-18 05:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0019_data_hash_blake2b'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StagedPredictionElement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pred_class', models.IntegerField(choices=[(0, 'bin'), (1, 'named'), (2, 'point'), (3, 'sample'), (4, 'quantile')])),
+                ('is_retract', models.BooleanField(default=False)),
+                ('data_hash', models.UUIDField()),
+                ('data', models.JSONField(null=True)),
+                ('forecast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='staged_pred_eles', to='forecast_app.forecast')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.target')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.unit')),
+            ],
+        ),
+    ]
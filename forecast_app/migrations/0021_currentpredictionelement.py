@@ -0,0 +1,70 @@
+# Generated by Django 3.1.12 on 2026-10-18 05:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+#
+# This file creates the CurrentPredictionElement table and fills it from the existing PredictionElements by ranking
+# all of their versions once, as `rebuild_current_pred_eles()` does for one (forecast_model, time_zero). I edited the
+# Django-generated file to add the data migration. NB: the SQL is copied here rather than imported so that this
+# migration does not change if the app's does.
+#
+
+def fill_current_pred_eles(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    PredictionElement = apps.get_model("forecast_app", "PredictionElement")
+    Forecast = apps.get_model("forecast_app", "Forecast")
+    CurrentPredictionElement = apps.get_model("forecast_app", "CurrentPredictionElement")
+    sql = f"""
+        INSERT INTO {CurrentPredictionElement._meta.db_table} (forecast_model_id, time_zero_id, unit_id, target_id,
+                                                              pred_class, forecast_id, is_retract, data_hash)
+        SELECT fm_id, tz_id, unit_id, target_id, pred_class, forecast_id, is_retract, data_hash
+        FROM (SELECT f.forecast_model_id    AS fm_id,
+                     f.time_zero_id         AS tz_id,
+                     pred_ele.unit_id       AS unit_id,
+                     pred_ele.target_id     AS target_id,
+                     pred_ele.pred_class    AS pred_class,
+                     pred_ele.forecast_id   AS forecast_id,
+                     pred_ele.is_retract    AS is_retract,
+                     pred_ele.data_hash     AS data_hash,
+                     RANK() OVER (
+                         PARTITION BY f.forecast_model_id, f.time_zero_id, pred_ele.unit_id, pred_ele.target_id,
+                             pred_ele.pred_class
+                         ORDER BY f.issued_at DESC) AS rownum
+              FROM {PredictionElement._meta.db_table} AS pred_ele
+                       JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id) AS ranked_rows
+        WHERE rownum = 1;
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0020_stagedpredictionelement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentPredictionElement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pred_class', models.IntegerField(choices=[(0, 'bin'), (1, 'named'), (2, 'point'), (3, 'sample'), (4, 'quantile')])),
+                ('is_retract', models.BooleanField(default=False)),
+                ('data_hash', models.UUIDField()),
+                ('forecast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.forecast')),
+                ('forecast_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='current_pred_eles', to='forecast_app.forecastmodel')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.target')),
+                ('time_zero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.timezero')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.unit')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='currentpredictionelement',
+            constraint=models.UniqueConstraint(fields=('forecast_model', 'time_zero', 'unit', 'target', 'pred_class'), name='unique_current_pred_ele'),
+        ),
+        migrations.RunPython(fill_current_pred_eles, reverse_code=migrations.RunPython.noop),
+    ]
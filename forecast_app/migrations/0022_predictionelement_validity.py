@@ -0,0 +1,65 @@
+# Generated by Django 3.1.12 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+#
+# This file adds PredictionElement.valid_from and valid_to and fills them from the existing PredictionElements by
+# computing each element's next version via `LEAD()`, as `rebuild_pred_ele_validity()` does for one (forecast_model,
+# time_zero). I edited the Django-generated file to add valid_from as nullable, run the data migration, and then make
+# it non-nullable. NB: the SQL is copied here rather than imported so that this migration does not change if the app's
+# does.
+#
+
+def fill_pred_ele_validity(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    PredictionElement = apps.get_model("forecast_app", "PredictionElement")
+    Forecast = apps.get_model("forecast_app", "Forecast")
+    pred_ele_table_name = PredictionElement._meta.db_table
+    sql = f"""
+        UPDATE {pred_ele_table_name}
+        SET valid_from = intervals.valid_from,
+            valid_to   = intervals.valid_to
+        FROM (SELECT pred_ele.id AS pred_ele_id,
+                     f.issued_at AS valid_from,
+                     LEAD(f.issued_at) OVER (
+                         PARTITION BY f.forecast_model_id, f.time_zero_id, pred_ele.unit_id, pred_ele.target_id,
+                             pred_ele.pred_class
+                         ORDER BY f.issued_at) AS valid_to
+              FROM {pred_ele_table_name} AS pred_ele
+                       JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id) AS intervals
+        WHERE {pred_ele_table_name}.id = intervals.pred_ele_id;
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0021_currentpredictionelement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionelement',
+            name='valid_from',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='predictionelement',
+            name='valid_to',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_pred_ele_validity, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='predictionelement',
+            name='valid_from',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='predictionelement',
+            index=models.Index(fields=['valid_from', 'valid_to'], name='pred_ele_validity_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.12 on 2026-10-18 08:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0022_predictionelement_validity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectDataVersion',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='data_version', serialize=False, to='forecast_app.project')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QueryCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64)),
+                ('data_version', models.PositiveIntegerField()),
+                ('num_rows', models.IntegerField()),
+                ('num_bytes', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='forecast_app.job')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='query_cache_entries', to='forecast_app.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='querycacheentry',
+            constraint=models.UniqueConstraint(fields=('project', 'cache_key', 'data_version'), name='unique_query_cache_entry'),
+        ),
+    ]
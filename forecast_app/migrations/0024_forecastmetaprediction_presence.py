@@ -0,0 +1,91 @@
+# Generated by Django 3.1.12 on 2026-10-18 06:56
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+#
+# This file adds ForecastMetaPrediction's unit and target presence fields and fills them from the existing
+# ForecastMetaUnit and ForecastMetaTarget rows. I edited the Django-generated file to add the data migration. NB: the
+# bitset encoding is copied here from `ids_to_bitset()` rather than imported so that this migration does not change if
+# the app's does.
+#
+
+def _ids_to_bitset(ids):
+    if not ids:
+        return b'', 0
+
+    offset = min(ids)
+    bitset = bytearray((max(ids) - offset) // 8 + 1)
+    for obj_id in ids:
+        bitset[(obj_id - offset) // 8] |= 1 << ((obj_id - offset) % 8)
+    return bytes(bitset), offset
+
+
+def fill_forecast_meta_presence(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    ForecastMetaPrediction = apps.get_model("forecast_app", "ForecastMetaPrediction")
+    ForecastMetaUnit = apps.get_model("forecast_app", "ForecastMetaUnit")
+    ForecastMetaTarget = apps.get_model("forecast_app", "ForecastMetaTarget")
+    forecast_meta_predictions = list(ForecastMetaPrediction.objects.order_by('id'))
+    for batch_idx in range(0, len(forecast_meta_predictions), 1000):  # bounds the number of ID rows in memory
+        batch = forecast_meta_predictions[batch_idx:batch_idx + 1000]
+        batch_forecast_ids = [forecast_meta_prediction.forecast_id for forecast_meta_prediction in batch]
+        forecast_id_to_ids = defaultdict(lambda: (set(), set()))
+        for ids_idx, (meta_class, column_name) in enumerate([(ForecastMetaUnit, 'unit_id'),
+                                                             (ForecastMetaTarget, 'target_id')]):
+            for forecast_id, obj_id in meta_class.objects.filter(forecast_id__in=batch_forecast_ids) \
+                    .values_list('forecast_id', column_name):
+                forecast_id_to_ids[forecast_id][ids_idx].add(obj_id)
+        for forecast_meta_prediction in batch:
+            unit_ids, target_ids = forecast_id_to_ids[forecast_meta_prediction.forecast_id]
+            forecast_meta_prediction.unit_count = len(unit_ids)
+            forecast_meta_prediction.unit_bits, forecast_meta_prediction.unit_bits_offset = _ids_to_bitset(unit_ids)
+            forecast_meta_prediction.target_count = len(target_ids)
+            forecast_meta_prediction.target_bits, forecast_meta_prediction.target_bits_offset = \
+                _ids_to_bitset(target_ids)
+        ForecastMetaPrediction.objects.bulk_update(batch, ['unit_count', 'unit_bits', 'unit_bits_offset',
+                                                           'target_count', 'target_bits', 'target_bits_offset'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0023_query_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecastmetaprediction',
+            name='target_bits',
+            field=models.BinaryField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='forecastmetaprediction',
+            name='target_bits_offset',
+            field=models.IntegerField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='forecastmetaprediction',
+            name='target_count',
+            field=models.IntegerField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='forecastmetaprediction',
+            name='unit_bits',
+            field=models.BinaryField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='forecastmetaprediction',
+            name='unit_bits_offset',
+            field=models.IntegerField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='forecastmetaprediction',
+            name='unit_count',
+            field=models.IntegerField(default=None, null=True),
+        ),
+        migrations.RunPython(fill_forecast_meta_presence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.1.12 on 2026-10-18 07:02
+
+from django.db import migrations, models
+from django.db.models import F, Max, Sum
+import django.db.models.deletion
+
+
+#
+# This file adds ProjectSummary and creates one for each existing project so that the signals that maintain them
+# always have a row to update. I edited the Django-generated file to add the data migration. NB: the fields are
+# computed here as `refresh_project_summary()` computes them rather than by calling it so that this migration does not
+# change if the app's does.
+#
+
+def create_project_summaries(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    Project = apps.get_model("forecast_app", "Project")
+    Forecast = apps.get_model("forecast_app", "Forecast")
+    ForecastMetaPrediction = apps.get_model("forecast_app", "ForecastMetaPrediction")
+    ProjectSummary = apps.get_model("forecast_app", "ProjectSummary")
+    for project in Project.objects.all():
+        forecasts_qs = Forecast.objects.filter(forecast_model__project=project)
+        model_forecasts_qs = forecasts_qs.filter(forecast_model__is_oracle=False)
+        num_rows = ForecastMetaPrediction.objects.filter(forecast__in=model_forecasts_qs) \
+            .aggregate(num_rows=Sum(F('point_count') + F('named_count') + F('bin_count') + F('sample_count')
+                                    + F('quantile_count')))['num_rows']
+        batches = list(forecasts_qs.filter(forecast_model__is_oracle=True)
+                       .values('source', 'issued_at')
+                       .distinct()
+                       .order_by('issued_at')
+                       .values_list('source', 'issued_at'))
+        ProjectSummary.objects.create(project=project,
+                                      num_models=project.models.filter(is_oracle=False).count(),
+                                      num_forecasts=model_forecasts_qs.count(),
+                                      num_rows=num_rows or 0,
+                                      last_update=forecasts_qs.aggregate(Max('created_at'))['created_at__max'],
+                                      num_truth_batches=len(batches),
+                                      truth_latest_source=batches[-1][0] if batches else None,
+                                      truth_latest_issued_at=batches[-1][1] if batches else None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0024_forecastmetaprediction_presence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSummary',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='forecast_app.project')),
+                ('num_models', models.IntegerField(default=0)),
+                ('num_forecasts', models.IntegerField(default=0)),
+                ('num_rows', models.BigIntegerField(default=0)),
+                ('last_update', models.DateTimeField(null=True)),
+                ('num_truth_batches', models.IntegerField(default=0)),
+                ('truth_latest_source', models.TextField(null=True)),
+                ('truth_latest_issued_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(create_project_summaries, migrations.RunPython.noop),
+    ]
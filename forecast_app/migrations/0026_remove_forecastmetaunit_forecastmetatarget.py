@@ -0,0 +1,82 @@
+# Generated by Django 3.1.12 on 2026-10-18 07:32
+
+from django.db import migrations
+
+
+#
+# This file removes ForecastMetaUnit and ForecastMetaTarget, and ForecastMetaPrediction's unit and target counts, all of
+# which are replaced by ForecastMetaPrediction's presence bitsets (filled by 0024_forecastmetaprediction_presence). I
+# edited the Django-generated file to add the reverse data migration, which refills the rows and counts from the
+# bitsets. NB: the bitset decoding is copied here from `bitset_to_ids()` rather than imported so that this migration
+# does not change if the app's does.
+#
+
+def _bitset_to_ids(bitset, offset):
+    if bitset is None:
+        return set()
+
+    return {offset + byte_idx * 8 + bit_idx for byte_idx, byte in enumerate(bytes(bitset)) if byte
+            for bit_idx in range(8) if byte & (1 << bit_idx)}
+
+
+def fill_forecast_meta_units_targets(apps, schema_editor):
+    # via https://docs.djangoproject.com/en/2.2/ref/migration-operations/#runpython : We get the model from the
+    # versioned app registry; if we directly import it, it'll be the wrong version:
+    ForecastMetaPrediction = apps.get_model("forecast_app", "ForecastMetaPrediction")
+    ForecastMetaUnit = apps.get_model("forecast_app", "ForecastMetaUnit")
+    ForecastMetaTarget = apps.get_model("forecast_app", "ForecastMetaTarget")
+    Unit = apps.get_model("forecast_app", "Unit")
+    Target = apps.get_model("forecast_app", "Target")
+    unit_ids = set(Unit.objects.values_list('id', flat=True))  # skip deleted ones, which would violate foreign keys
+    target_ids = set(Target.objects.values_list('id', flat=True))
+    forecast_meta_predictions = list(ForecastMetaPrediction.objects.order_by('id'))
+    for batch_idx in range(0, len(forecast_meta_predictions), 1000):  # bounds the number of ID rows in memory
+        batch = forecast_meta_predictions[batch_idx:batch_idx + 1000]
+        forecast_meta_units, forecast_meta_targets = [], []
+        for forecast_meta_prediction in batch:
+            present_unit_ids = _bitset_to_ids(forecast_meta_prediction.unit_bits,
+                                              forecast_meta_prediction.unit_bits_offset) & unit_ids
+            present_target_ids = _bitset_to_ids(forecast_meta_prediction.target_bits,
+                                                forecast_meta_prediction.target_bits_offset) & target_ids
+            forecast_meta_prediction.unit_count = len(present_unit_ids)
+            forecast_meta_prediction.target_count = len(present_target_ids)
+            forecast_meta_units.extend(ForecastMetaUnit(forecast_id=forecast_meta_prediction.forecast_id,
+                                                        unit_id=unit_id) for unit_id in present_unit_ids)
+            forecast_meta_targets.extend(ForecastMetaTarget(forecast_id=forecast_meta_prediction.forecast_id,
+                                                            target_id=target_id) for target_id in present_target_ids)
+        ForecastMetaPrediction.objects.bulk_update(batch, ['unit_count', 'target_count'])
+        ForecastMetaUnit.objects.bulk_create(forecast_meta_units)
+        ForecastMetaTarget.objects.bulk_create(forecast_meta_targets)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0025_project_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, fill_forecast_meta_units_targets),
+        migrations.RemoveField(
+            model_name='forecastmetaunit',
+            name='forecast',
+        ),
+        migrations.RemoveField(
+            model_name='forecastmetaunit',
+            name='unit',
+        ),
+        migrations.RemoveField(
+            model_name='forecastmetaprediction',
+            name='target_count',
+        ),
+        migrations.RemoveField(
+            model_name='forecastmetaprediction',
+            name='unit_count',
+        ),
+        migrations.DeleteModel(
+            name='ForecastMetaTarget',
+        ),
+        migrations.DeleteModel(
+            name='ForecastMetaUnit',
+        ),
+    ]
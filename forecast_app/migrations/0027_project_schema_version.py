@@ -0,0 +1,21 @@
+# Generated by Django 3.1.12 on 2026-10-18 07:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forecast_app', '0026_remove_forecastmetaunit_forecastmetatarget'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSchemaVersion',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schema_version', serialize=False, to='forecast_app.project')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
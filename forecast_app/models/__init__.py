@@ -1,13 +1,17 @@
 # per https://docs.djangoproject.com/en/1.11/topics/db/models/#organizing-models-in-a-package
 
 
+from .current_prediction_element import CurrentPredictionElement
 from .forecast import Forecast
-from .forecast_metadata import ForecastMetadataCache, ForecastMetaPrediction, ForecastMetaUnit, ForecastMetaTarget
+from .forecast_metadata import ForecastMetadataCache, ForecastMetaPrediction
 from .forecast_model import ForecastModel
 from .job import Job
 from .prediction_data import PredictionData
 from .prediction_element import PredictionElement
-from .project import Project, Unit, TimeZero
+from .project import Project, ProjectSchemaVersion, Unit, TimeZero
+from .project_summary import ProjectSummary
+from .query_cache import ProjectDataVersion, QueryCacheEntry
+from .staged_prediction_element import StagedPredictionElement
 from .target import Target, TargetCat, TargetLwr, TargetRange
 
 # __all__ = ['Article', 'Publication']
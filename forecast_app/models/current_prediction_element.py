@@ -0,0 +1,47 @@
+from django.db import models
+
+from forecast_app.models.prediction_element import PredictionElement
+from utils.utilities import basic_str
+
+
+#
+# ---- CurrentPredictionElement ----
+#
+
+class CurrentPredictionElement(models.Model):
+    """
+    A materialized copy of the latest version of each (forecast_model, time_zero, unit, target, pred_class) prediction
+    element, i.e., the result of the `RANK() OVER (PARTITION BY ... ORDER BY issued_at DESC)` "rownum = 1" query that
+    `_query_forecasts_sql_for_pred_class()` otherwise runs over all versions. Queries without an `as_of` use this table
+    instead. Retractions are included (with is_retract=True) b/c they mask older versions just as they do in that query.
+
+    Rows are upserted by `_publish_pred_ele_temp_table()` in the same transaction as the PredictionElements they copy,
+    and a (forecast_model, time_zero)'s rows are rebuilt when one of its Forecasts is deleted - see
+    `rebuild_current_pred_eles()`.
+    """
+
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['forecast_model', 'time_zero', 'unit', 'target', 'pred_class'],
+                                    name='unique_current_pred_ele'),
+        ]
+
+
+    forecast_model = models.ForeignKey('ForecastModel', related_name='current_pred_eles', on_delete=models.CASCADE)
+    time_zero = models.ForeignKey('TimeZero', on_delete=models.CASCADE)
+    unit = models.ForeignKey('Unit', on_delete=models.CASCADE)
+    target = models.ForeignKey('Target', on_delete=models.CASCADE)
+    pred_class = models.IntegerField(choices=PredictionElement.PRED_CLASS_CHOICES)
+    forecast = models.ForeignKey('Forecast', on_delete=models.CASCADE)  # the version the element is from
+    is_retract = models.BooleanField(default=False)  # PredictionElement.is_retract
+    data_hash = models.UUIDField()  # PredictionElement.data_hash
+
+
+    def __repr__(self):
+        return str((self.pk, self.forecast_model.pk, self.time_zero.pk, self.unit.pk, self.target.pk, self.pred_class,
+                    self.forecast.pk, self.is_retract, self.data_hash))
+
+
+    def __str__(self):  # todo
+        return basic_str(self)
@@ -1,6 +1,6 @@
 import django
 from django.db import models, connection
-from django.db.models.signals import pre_save, pre_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
 
@@ -131,6 +131,50 @@ def pre_validate_deleted_forecast(instance, **kwargs):
         raise RuntimeError(f"you cannot delete a forecast that has any newer versions. forecast={instance}")
 
 
+@receiver(pre_delete, sender=Forecast)
+def decrement_deleted_forecast_ref_counts(instance, **kwargs):
+    # NB: must be registered after pre_validate_deleted_forecast() so that it's not run if that raises, and must be
+    # pre_delete b/c it needs the forecast's PredictionElements, which are gone by post_delete
+    from utils.forecast import decrement_prediction_data_ref_counts  # avoid circular imports
+
+
+    decrement_prediction_data_ref_counts(instance)
+
+
+@receiver(post_delete, sender=Forecast)
+def rebuild_deleted_forecast_current_pred_eles(instance, **kwargs):
+    # NB: must be post_delete so that the rebuild does not include the forecast's PredictionElements. the forecast's
+    # CurrentPredictionElements were deleted via CASCADE
+    from utils.forecast import rebuild_current_pred_eles  # avoid circular imports
+
+
+    rebuild_current_pred_eles(instance.forecast_model_id, instance.time_zero_id)
+
+
+@receiver(post_delete, sender=Forecast)
+def rebuild_deleted_forecast_pred_ele_validity(instance, **kwargs):
+    # NB: like rebuild_deleted_forecast_current_pred_eles(), must be post_delete so that the forecast's
+    # PredictionElements are not included. this re-opens the intervals that its elements ended
+    from utils.forecast import rebuild_pred_ele_validity  # avoid circular imports
+
+
+    rebuild_pred_ele_validity(instance.forecast_model_id, instance.time_zero_id)
+
+
+@receiver(post_save, sender=Forecast)
+def rebuild_edited_forecast_pred_ele_validity(instance, created, **kwargs):
+    # editing a version's issued_at cannot reposition it (see pre_validate_new_or_edited_forecast()), so only the
+    # interval endpoints that copy it are out of date. we check for them rather than comparing to the pre-saved state
+    from forecast_app.models import PredictionElement  # avoid circular imports
+    from utils.forecast import rebuild_pred_ele_validity  # ""
+
+
+    if not created and PredictionElement.objects.filter(forecast=instance) \
+            .exclude(valid_from=instance.issued_at) \
+            .exists():
+        rebuild_pred_ele_validity(instance.forecast_model_id, instance.time_zero_id)
+
+
 #
 # _newest_forecast_version()
 #
@@ -1,12 +1,12 @@
 from django.db import models
-from django.db.models import IntegerField
+from django.db.models import IntegerField, BinaryField
 
 from forecast_app.models import Forecast
 from utils.utilities import basic_str
 
 
 #
-# This file defines three models that, together, implement the caching of Forecast meatadata.
+# This file defines the model that implements the caching of Forecast meatadata.
 #
 
 class ForecastMetadataCache(models.Model):
@@ -24,7 +24,9 @@ class ForecastMetadataCache(models.Model):
 
 class ForecastMetaPrediction(ForecastMetadataCache):
     """
-    Caches this metadata for Forecasts: prediction type counts from my forecast's PredictionElements.
+    Caches this metadata for Forecasts: prediction type counts from my forecast's PredictionElements, and the units and
+    targets that are present as bitsets (see `ids_to_bitset()`). Thus project-wide pages can get all forecasts' units
+    and targets from one row per forecast.
     """
 
     point_count = IntegerField(default=None, null=True)  # number of PointPredictions in this forecast
@@ -32,6 +34,10 @@ class ForecastMetaPrediction(ForecastMetadataCache):
     bin_count = IntegerField(default=None, null=True)  # "" BinDistribution ""
     sample_count = IntegerField(default=None, null=True)  # "" SampleDistribution ""
     quantile_count = IntegerField(default=None, null=True)  # "" QuantileDistribution ""
+    unit_bits = BinaryField(default=None, null=True)  # IDs of units that are present, as a bitset
+    unit_bits_offset = IntegerField(default=None, null=True)  # "" bitset offset
+    target_bits = BinaryField(default=None, null=True)  # "" targets ""
+    target_bits_offset = IntegerField(default=None, null=True)  # ""
 
 
     def __repr__(self):
@@ -43,33 +49,97 @@ class ForecastMetaPrediction(ForecastMetadataCache):
         return basic_str(self)
 
 
-class ForecastMetaUnit(ForecastMetadataCache):
+    @classmethod
+    def presence_fields(cls, unit_ids, target_ids):
+        """
+        :param unit_ids: an iterable of the Unit IDs that are present
+        :param target_ids: "" Target IDs ""
+        :return: a dict of my unit and target fields for the passed IDs, suitable for passing to `create()`
+        """
+        unit_bits, unit_bits_offset = ids_to_bitset(unit_ids)
+        target_bits, target_bits_offset = ids_to_bitset(target_ids)
+        return {'unit_bits': unit_bits, 'unit_bits_offset': unit_bits_offset,
+                'target_bits': target_bits, 'target_bits_offset': target_bits_offset}
+
+
+    def unit_ids(self):
+        """
+        :return: the set of Unit IDs that are present. NB: may include deleted units - see `ids_to_bitset()`
+        """
+        return bitset_to_ids(self.unit_bits, self.unit_bits_offset)
+
+
+    def target_ids(self):
+        """
+        :return: the set of Target IDs that are present. NB: may include deleted targets - see `ids_to_bitset()`
+        """
+        return bitset_to_ids(self.target_bits, self.target_bits_offset)
+
+
+#
+# ---- presence bitsets ----
+#
+
+def ids_to_bitset(ids):
     """
-    Caches this metadata for Forecasts: units that are present.
+    Encodes a set of object IDs (e.g., a forecast's present Unit IDs) as a compact bitset. Bits are relative to the
+    smallest ID (the offset) rather than to positions in a project's list of objects so that bitsets stay valid when
+    objects are added or deleted. A project's objects are normally created together and so have nearby IDs, which
+    keeps bitsets small. NB: a deleted object's bit stays set, so callers should intersect decoded IDs with the
+    project's current ones.
+
+    :param ids: an iterable of int IDs
+    :return: a 2-tuple: (bitset, offset) where bitset is bytes whose bit `i % 8` of byte `i // 8` is set if ID
+        `offset + i` is in ids. returns (b'', 0) if ids is empty
     """
+    ids = set(ids)
+    if not ids:
+        return b'', 0
 
-    unit = models.ForeignKey('Unit', on_delete=models.CASCADE)
+    offset = min(ids)
+    bitset = bytearray((max(ids) - offset) // 8 + 1)
+    for obj_id in ids:
+        bitset[(obj_id - offset) // 8] |= 1 << ((obj_id - offset) % 8)
+    return bytes(bitset), offset
 
 
-    def __repr__(self):
-        return str((self.pk, self.forecast.pk, self.unit.pk))
-
+def bitset_to_ids(bitset, offset):
+    """
+    :param bitset: as returned by `ids_to_bitset()`. may be a memoryview, which is what Postgres BinaryFields return
+    :param offset: ""
+    :return: the set of IDs in bitset. returns an empty set if bitset is None, i.e., has not been cached
+    """
+    if bitset is None:
+        return set()
 
-    def __str__(self):  # todo
-        return basic_str(self)
+    return {offset + byte_idx * 8 + bit_idx for byte_idx, byte in enumerate(bytes(bitset)) if byte
+            for bit_idx in range(8) if byte & (1 << bit_idx)}
 
 
-class ForecastMetaTarget(ForecastMetadataCache):
+def bitset_to_mask(bitset, offset):
     """
-    Caches this metadata for Forecasts: targets that are present.
+    :param bitset: as passed to `bitset_to_ids()`
+    :param offset: ""
+    :return: the IDs in bitset as an int whose bit `i` is set if ID `i` is in bitset. this is much faster than
+        `bitset_to_ids()` when the caller only needs to intersect or count IDs - see `count_mask_ids()`
     """
+    if bitset is None:
+        return 0
 
-    target = models.ForeignKey('Target', on_delete=models.CASCADE)
+    return int.from_bytes(bytes(bitset), 'little') << offset
 
 
-    def __repr__(self):
-        return str((self.pk, self.forecast.pk, self.target.pk))
+def ids_to_mask(ids):
+    """
+    :param ids: an iterable of int IDs, e.g., a project's current Unit IDs
+    :return: the IDs as an int in the format returned by `bitset_to_mask()`
+    """
+    return bitset_to_mask(*ids_to_bitset(ids))
 
 
-    def __str__(self):  # todo
-        return basic_str(self)
+def count_mask_ids(mask):
+    """
+    :param mask: an int as returned by `bitset_to_mask()`, usually intersected (`&`) with an `ids_to_mask()` one
+    :return: the number of IDs in mask
+    """
+    return bin(mask).count('1')
@@ -36,6 +36,7 @@ JOB_TYPE_QUERY_TRUTH = 'JOB_TYPE_QUERY_TRUTH'
 JOB_TYPE_DELETE_FORECAST = 'DELETE_FORECAST'
 JOB_TYPE_UPLOAD_TRUTH = 'UPLOAD_TRUTH'
 JOB_TYPE_UPLOAD_FORECAST = 'UPLOAD_FORECAST'
+JOB_TYPE_UPLOAD_FORECASTS_BULK = 'UPLOAD_FORECASTS_BULK'
 
 
 #
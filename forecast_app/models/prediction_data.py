@@ -9,9 +9,9 @@ from utils.utilities import basic_str
 
 class PredictionData(models.Model):
     """
-    Represents the actual prediction data corresponding to a PredictionElement. Note that we store the data as JSON,
-    rather than a "sparse" table where every row's has all NULL columns but one (as we used to). We did this because
-    the data's shape varies depending on the target type.
+    Represents the actual prediction data corresponding to one or more PredictionElements. Note that we store the data
+    as JSON, rather than a "sparse" table where every row's has all NULL columns but one (as we used to). We did this
+    because the data's shape varies depending on the target type.
 
     The `data` field is the "prediction" portion of a prediction element (AKA its "prediction_data"). For example,
     this prediction element:
@@ -39,14 +39,21 @@ class PredictionData(models.Model):
     Notes:
     - None of the values are transformed in any way. For example, 'family' is not changed to an int.
     - This field is the data that each PredictionElement.data_hash is calculated on.
+
+    Storage is content-addressed: there is exactly one row per distinct `data`, keyed by its hash, and
+    PredictionElements reference it via their own `data_hash` (retractions' RETRACT_DATA_HASH matches no row). This is
+    a big space saver because many elements share byte-identical data across versions, models, and timezeros (e.g.,
+    zero-probability bins, constant point forecasts, baseline models). `ref_count` is the number of PredictionElements
+    that reference the row. It is maintained by `_insert_pred_ele_rows()` and `decrement_prediction_data_ref_counts()`,
+    the latter of which deletes rows that are no longer referenced.
     """
-    pred_ele = models.ForeignKey('PredictionElement', related_name='pred_data', on_delete=models.CASCADE,
-                                 primary_key=True)
+    data_hash = models.UUIDField(primary_key=True)  # PredictionElement.data_hash
     data = models.JSONField()
+    ref_count = models.IntegerField(default=0)
 
 
     def __repr__(self):
-        return str((self.pk, list(self.data.keys())))
+        return str((self.pk, self.ref_count, list(self.data.keys())))
 
 
     def __str__(self):  # todo
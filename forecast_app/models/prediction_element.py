@@ -1,5 +1,7 @@
 import hashlib
 import json
+import uuid
+from collections import namedtuple
 
 from django.db import models
 
@@ -29,13 +31,20 @@ class PredictionElement(models.Model):
         (QUANTILE_CLASS, 'quantile'),
     )
 
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['valid_from', 'valid_to'], name='pred_ele_validity_idx'),
+        ]
+
+
     forecast = models.ForeignKey('Forecast', related_name='pred_eles', on_delete=models.CASCADE)
     pred_class = models.IntegerField(choices=PRED_CLASS_CHOICES)
     unit = models.ForeignKey('Unit', on_delete=models.CASCADE)
     target = models.ForeignKey('Target', on_delete=models.CASCADE)
     is_retract = models.BooleanField(default=False)
 
-    # A binary MD5 hex hash of input "prediction" dict (converted to a json string), e.g., input dicts like:
+    # A 128-bit hash of the input "prediction" dict (converted to a canonical json string), e.g., input dicts like:
     #
     #   {"family": "pois", "param1": 1.1}
     #   {"value": 5}
@@ -44,14 +53,25 @@ class PredictionElement(models.Model):
     #   {"quantile": [0.25, 0.75], "value": [0, 50]}
     #
     # This hash is used by `load_predictions_from_json_io_dict()` to compare prediction elements for equality so that
-    # duplicate data can be skipped. The algorithm we use to calculate this hash is as implemented in
-    # `hash_for_prediction_data_dict()`. we store '' if is_retract b/c there is no PredictionData and therefore no hash
-    data_hash = models.CharField(max_length=32)  # length based on output from hashlib.md5(s).hexdigest()
+    # duplicate data can be skipped, and to look up the element's PredictionData. The algorithm we use to calculate this
+    # hash is as implemented in `hash_for_prediction_data_dict()`. we store RETRACT_DATA_HASH if is_retract b/c there is
+    # no PredictionData and therefore no hash. NB: we use a UUIDField b/c it's a compact 16-byte `uuid` in Postgres,
+    # which is faster to compare than text. the hash is not actually a UUID
+    data_hash = models.UUIDField()
+
+    # The [valid_from, valid_to) issued_at interval during which this element is the latest version of its (unit,
+    # target, pred_class) within its forecast's (forecast_model, time_zero). valid_from is a copy of the forecast's
+    # issued_at, and valid_to is the issued_at of the next version that masks or retracts this element, or NULL if there
+    # is none. Intervals are maintained by `_publish_pred_ele_temp_table()` and `rebuild_pred_ele_validity()`, and let
+    # `as_of` queries use a range predicate rather than ranking all versions. NB: newer versions' duplicates of this
+    # element do not end its interval b/c duplicates are not stored
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True)
 
 
     def __repr__(self):
         return str((self.pk, self.forecast.pk, self.prediction_class_as_str(), self.unit.pk, self.target.pk,
-                    self.is_retract, self.data_hash))
+                    self.is_retract, self.data_hash, self.valid_from, self.valid_to))
 
 
     def __str__(self):  # todo
@@ -68,20 +88,62 @@ class PredictionElement(models.Model):
 
 
     @classmethod
-    def hash_for_prediction_data_dict(cls, prediction_data):
+    def hash_for_prediction_data_dict(cls, prediction_data, scheme_name=None):
         """
         Top-level method for computing the hash of a json_io_dict's "prediction" value. This function is not meant to be
-        general to any dict, just json_io_dict ones. Recall MD5 is 128 bits (16 bytes).
+        general to any dict, just json_io_dict ones.
 
         :param prediction_data: the json_io_dict's "prediction" value, e.g.,
-            {"family": "pois", "param1": 1.1}  -> '845e3d041b6be23a381b6afd263fb113'
+            {"family": "pois", "param1": 1.1}  -> 'e145610073ce7699d984a0381ad636c5'
             {"value": 5}
             {"sample": [0, 2, 5]}
             {"cat": [0, 2, 50], "prob": [0.0, 0.1, 0.9]}
             {"quantile": [0.25, 0.75], "value": [0, 50]}
-        :return: MD5 hex hash of `prediction_data` as `str`
+        :param scheme_name: a DATA_HASH_SCHEMES key. defaults to DATA_HASH_SCHEME_NAME
+        :return: 32 character hex hash of `prediction_data` as `str`, which is suitable for `data_hash`
+        """
+        return cls.json_and_hash_for_prediction_data_dict(prediction_data, scheme_name)[1]
+
+
+    @classmethod
+    def json_and_hash_for_prediction_data_dict(cls, prediction_data, scheme_name=None):
+        """
+        Like `hash_for_prediction_data_dict()`, but also returns the json string that was hashed. Callers that store
+        the data can store that string rather than encoding `prediction_data` a second time.
+
+        :return: a 2-tuple: (json_str, data_hash)
         """
-        return hashlib.md5(json.dumps(prediction_data, sort_keys=True).encode('utf-8')).hexdigest()
+        data_hash_scheme = DATA_HASH_SCHEMES[scheme_name or DATA_HASH_SCHEME_NAME]
+        json_str = data_hash_scheme.encode(prediction_data)
+        return json_str, data_hash_scheme.digest(json_str.encode('utf-8'))
+
+
+#
+# data_hash "schemes"
+#
+
+# a scheme has two functions: `encode` converts a json_io_dict's "prediction" value to a canonical json `str` (i.e.,
+# equal values always encode to the same string), and `digest` hashes that string's utf-8 bytes to a 32 character hex
+# `str` (i.e., 128 bits - the size of a UUID). NB: duplicate prediction elements are found by comparing hashes, so all
+# stored hashes must have been computed with the same scheme. changing DATA_HASH_SCHEME_NAME therefore requires a
+# migration that rehashes existing PredictionElements and PredictionData (see 0019_data_hash_blake2b.py)
+DataHashScheme = namedtuple('DataHashScheme', ['encode', 'digest'])
+
+# sort_keys=True makes the encoding canonical, and compact separators and check_circular=False make it faster
+_CANONICAL_JSON_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'), check_circular=False)
+
+DATA_HASH_SCHEMES = {
+    # the original scheme. kept for comparison. see `utils/benchmark_data_hash.py`
+    'md5': DataHashScheme(encode=lambda prediction_data: json.dumps(prediction_data, sort_keys=True),
+                          digest=lambda data_bytes: hashlib.md5(data_bytes).hexdigest()),
+    'blake2b': DataHashScheme(encode=_CANONICAL_JSON_ENCODER.encode,
+                              digest=lambda data_bytes: hashlib.blake2b(data_bytes, digest_size=16).hexdigest()),
+}
+
+DATA_HASH_SCHEME_NAME = 'blake2b'
+
+# the data_hash stored for retractions. no scheme's digest will produce it in practice, so it matches no PredictionData
+RETRACT_DATA_HASH = uuid.UUID(int=0).hex
 
 
 #
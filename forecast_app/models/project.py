@@ -4,6 +4,8 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import ManyToManyField
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.urls import reverse
 
 from utils.utilities import basic_str
@@ -314,6 +316,43 @@ class Unit(models.Model):
         return basic_str(self)
 
 
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def _clear_unit_validation_schema_cache(instance, **kwargs):
+    # keeps `validation_schema_for_project()`'s cache up-to-date
+    from utils.forecast import clear_validation_schema_cache  # avoid circular imports
+
+
+    clear_validation_schema_cache(instance.project_id)
+
+
+#
+# ---- ProjectSchemaVersion class ----
+#
+
+class ProjectSchemaVersion(models.Model):
+    """
+    A counter that is incremented whenever a Project's Units or Targets (including their cats, ranges, and lwrs)
+    change, i.e., whenever its `validation_schema_for_project()` would change. Processes use it to tell whether their
+    cached schema is stale - see `clear_validation_schema_cache()`. Unlike ProjectDataVersion it is not bumped by
+    forecast or truth loads.
+
+    The counter is kept in its own table rather than as a Project field so that saving a stale Project instance cannot
+    roll it back. Rows are created lazily by `validation_schema_for_project()`.
+    """
+    project = models.OneToOneField(Project, primary_key=True, related_name='schema_version',
+                                   on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=0)
+
+
+    def __repr__(self):
+        return str((self.project_id, self.version))
+
+
+    def __str__(self):  # todo
+        return basic_str(self)
+
+
 #
 # ---- TimeZero class ----
 #
@@ -0,0 +1,123 @@
+from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from forecast_app.models.forecast import Forecast
+from forecast_app.models.forecast_metadata import ForecastMetaPrediction
+from forecast_app.models.forecast_model import ForecastModel
+from forecast_app.models.project import Project
+from utils.utilities import basic_str
+
+
+#
+# ---- ProjectSummary ----
+#
+
+class ProjectSummary(models.Model):
+    """
+    Materialized counters that the projects list and project detail pages show, so that they do not have to aggregate
+    a project's forecasts and metadata on every view. All but the truth fields are kept up to date incrementally by the
+    signals below, whose updates are applied after the writer's transaction commits. The truth fields are refreshed by
+    truth loads and deletes.
+    Rows are created along with their Project so that the signals always have one to update. See
+    `refresh_project_summary()` for how each field is computed.
+    """
+    project = models.OneToOneField(Project, primary_key=True, related_name='summary', on_delete=models.CASCADE)
+    num_models = models.IntegerField(default=0)  # non-oracle ForecastModels
+    num_forecasts = models.IntegerField(default=0)  # "" Forecasts
+    num_rows = models.BigIntegerField(default=0)  # sum of non-oracle ForecastMetaPrediction counts
+    last_update = models.DateTimeField(null=True)  # latest Forecast.created_at, including oracle ones
+    num_truth_batches = models.IntegerField(default=0)  # as returned by `truth_batches()`
+    truth_latest_source = models.TextField(null=True)  # "" latest batch's source
+    truth_latest_issued_at = models.DateTimeField(null=True)  # "" issued_at
+
+
+    def __repr__(self):
+        return str((self.project_id, self.num_models, self.num_forecasts, self.num_rows, str(self.last_update),
+                    self.num_truth_batches))
+
+
+    def __str__(self):  # todo
+        return basic_str(self)
+
+
+#
+# set up signals to update ProjectSummary. NB: like `bump_project_data_version()`, these use UPDATEs so that they are
+# safe to call while the project is being deleted
+#
+
+@receiver(post_save, sender=Project)
+def _create_summary_for_project(instance, created=False, raw=False, **kwargs):
+    # a new project has no models or forecasts, so its summary starts out empty. NB: `loaddata` (raw) is skipped so
+    # that fixtures can include summaries
+    if created and not raw:
+        ProjectSummary.objects.create(project=instance)
+
+
+@receiver(post_save, sender=ForecastModel)
+def _update_summary_for_saved_model(instance, created=False, **kwargs):
+    # an edited model might have changed is_oracle, which changes which forecasts are counted
+    from utils.project_summary import add_to_project_summary, refresh_project_summary  # avoid circular imports
+
+
+    if not created:
+        refresh_project_summary(instance.project_id, is_create=False)
+    elif not instance.is_oracle:
+        add_to_project_summary(instance.project_id, num_models=1)
+
+
+@receiver(post_delete, sender=ForecastModel)
+def _update_summary_for_deleted_model(instance, **kwargs):
+    # NB: the model's forecasts were already deleted, and their signals updated the summary
+    from utils.project_summary import add_to_project_summary  # avoid circular imports
+
+
+    if not instance.is_oracle:
+        add_to_project_summary(instance.project_id, num_models=-1)
+
+
+@receiver(post_save, sender=Forecast)
+@receiver(post_delete, sender=Forecast)
+def _update_summary_for_forecast(instance, signal, created=False, **kwargs):
+    # only creates and deletes change the counts and last_update. NB: edits that change truth batches' issued_at are
+    # handled by `load_truth_data()`
+    # avoid circular imports:
+    from utils.project_summary import add_to_project_summary, update_project_summary_last_update
+
+
+    is_deleted = signal is post_delete
+    if not (created or is_deleted):
+        return
+
+    project_id_is_oracle = ForecastModel.objects.filter(pk=instance.forecast_model_id) \
+        .values_list('project_id', 'is_oracle') \
+        .first()
+    if project_id_is_oracle is None:  # the model no longer exists
+        return
+
+    project_id, is_oracle = project_id_is_oracle
+    if not is_oracle:
+        add_to_project_summary(project_id, num_forecasts=-1 if is_deleted else 1)
+    update_project_summary_last_update(project_id, instance.created_at, is_deleted)
+
+
+@receiver(post_save, sender=ForecastMetaPrediction)
+@receiver(post_delete, sender=ForecastMetaPrediction)
+def _update_summary_for_forecast_meta_prediction(instance, signal, created=False, **kwargs):
+    # NB: metadata counts are never edited in place, only cleared and re-created
+    from utils.project_summary import add_to_project_summary  # avoid circular imports
+
+
+    is_deleted = signal is post_delete
+    if not (created or is_deleted):
+        return
+
+    project_id_is_oracle = Forecast.objects.filter(pk=instance.forecast_id) \
+        .values_list('forecast_model__project_id', 'forecast_model__is_oracle') \
+        .first()
+    if (project_id_is_oracle is None) or project_id_is_oracle[1]:  # the forecast no longer exists, or is an oracle
+        return
+
+    num_rows = sum(count or 0 for count in [instance.point_count, instance.named_count, instance.bin_count,
+                                            instance.sample_count, instance.quantile_count])
+    add_to_project_summary(project_id_is_oracle[0], num_rows=-num_rows if is_deleted else num_rows)
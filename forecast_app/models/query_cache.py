@@ -0,0 +1,111 @@
+from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from forecast_app.models.forecast import Forecast
+from forecast_app.models.forecast_model import ForecastModel
+from forecast_app.models.job import Job
+from forecast_app.models.project import Project, Unit, TimeZero
+from forecast_app.models.target import Target
+from utils.utilities import basic_str
+
+
+#
+# ---- ProjectDataVersion ----
+#
+
+class ProjectDataVersion(models.Model):
+    """
+    A counter that is incremented whenever anything that can appear in a Project's query results changes: forecast and
+    truth data (including loads, deletes, and issued_at edits), and the names of its models, units, targets, and
+    timezeros. `QueryCacheEntry`s are only valid for the version they were created at. See
+    `bump_project_data_version()`.
+
+    Not to be confused with TimeZero.data_version_date. The counter is kept in its own table rather than as a Project
+    field so that saving a stale Project instance cannot roll it back. Rows are created lazily by
+    `project_data_version()`, which means a project without one has no cache entries to invalidate.
+    """
+    project = models.OneToOneField(Project, primary_key=True, related_name='data_version', on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=0)
+
+
+    def __repr__(self):
+        return str((self.project_id, self.version))
+
+
+    def __str__(self):  # todo
+        return basic_str(self)
+
+
+#
+# ---- QueryCacheEntry ----
+#
+
+class QueryCacheEntry(models.Model):
+    """
+    Records that a successful query Job's output file holds the result of a normalized query (see `query_cache_key()`)
+    at a particular ProjectDataVersion.version. New query Jobs with the same key and version point at that file instead
+    of re-running the query - see `_create_query_job()`. Entries are evicted by `evict_query_cache()`. NB: evicting an
+    entry does not delete its Job's file, which the Job's user can still download.
+    """
+
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'cache_key', 'data_version'], name='unique_query_cache_entry'),
+        ]
+
+
+    project = models.ForeignKey(Project, related_name='query_cache_entries', on_delete=models.CASCADE)
+    cache_key = models.CharField(max_length=64)  # sha256 hex digest
+    data_version = models.PositiveIntegerField()  # ProjectDataVersion.version when the query was run
+    job = models.ForeignKey(Job, on_delete=models.CASCADE)  # the Job whose file has the result
+    num_rows = models.IntegerField()  # the Job's output_json['num_rows']
+    num_bytes = models.BigIntegerField()  # the size of the Job's file
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=now)
+
+
+    def __repr__(self):
+        return str((self.pk, self.project_id, self.cache_key[:8], self.data_version, self.job_id, self.num_rows,
+                    self.num_bytes, str(self.created_at), str(self.last_used_at)))
+
+
+    def __str__(self):  # todo
+        return basic_str(self)
+
+
+#
+# set up signals to bump ProjectDataVersion when objects whose names appear in query results change. forecast and truth
+# data loads are handled by `_publish_pred_ele_temp_table()`
+#
+
+@receiver(post_save, sender=ForecastModel)
+@receiver(post_delete, sender=ForecastModel)
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+@receiver(post_save, sender=Target)
+@receiver(post_delete, sender=Target)
+@receiver(post_save, sender=TimeZero)
+@receiver(post_delete, sender=TimeZero)
+def _bump_config_data_version(instance, **kwargs):
+    from utils.query_cache import bump_project_data_version  # avoid circular imports
+
+
+    bump_project_data_version(instance.project_id)
+
+
+@receiver(post_save, sender=Forecast)
+@receiver(post_delete, sender=Forecast)
+def _bump_forecast_data_version(instance, created=False, **kwargs):
+    # a new Forecast has no data yet. editing one can change issued_at, which determines which version is the latest
+    from utils.query_cache import bump_project_data_version  # avoid circular imports
+
+
+    if not created:
+        project_id = ForecastModel.objects.filter(pk=instance.forecast_model_id) \
+            .values_list('project_id', flat=True) \
+            .first()
+        if project_id is not None:
+            bump_project_data_version(project_id)
@@ -0,0 +1,34 @@
+from django.db import models
+
+from forecast_app.models.prediction_element import PredictionElement
+from utils.utilities import basic_str
+
+
+#
+# ---- StagedPredictionElement ----
+#
+
+class StagedPredictionElement(models.Model):
+    """
+    A validated PredictionElement plus its PredictionData's `data` that `stage_predictions_chunked()` has staged but
+    `publish_staged_predictions()` has not yet published to those two tables. Unlike the temp table that
+    `load_predictions_from_json_io_dict()` uses, staged rows are committed one chunk at a time, which lets a load that
+    was killed partway through resume where it left off. Rows are deleted when their Forecast is published or deleted.
+    Staged rows are not visible to queries, i.e., a Forecast's data only appears once all of it is published.
+    """
+    forecast = models.ForeignKey('Forecast', related_name='staged_pred_eles', on_delete=models.CASCADE)
+    pred_class = models.IntegerField(choices=PredictionElement.PRED_CLASS_CHOICES)
+    unit = models.ForeignKey('Unit', on_delete=models.CASCADE)
+    target = models.ForeignKey('Target', on_delete=models.CASCADE)
+    is_retract = models.BooleanField(default=False)
+    data_hash = models.UUIDField()  # PredictionElement.data_hash
+    data = models.JSONField(null=True)  # PredictionData.data. NULL if is_retract
+
+
+    def __repr__(self):
+        return str((self.pk, self.forecast.pk, self.pred_class, self.unit.pk, self.target.pk, self.is_retract,
+                    self.data_hash))
+
+
+    def __str__(self):  # todo
+        return basic_str(self)
@@ -4,6 +4,8 @@ import itertools
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import BooleanField, IntegerField
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from rest_framework.test import APIRequestFactory
 
 from forecast_app.models import Project
@@ -237,6 +239,8 @@ class Target(models.Model):
             for lwr, upper in itertools.zip_longest(cats, cats[1:], fillvalue=float('inf')):
                 TargetLwr.objects.create(target=self, lwr=lwr, upper=upper)
 
+        _clear_validation_schema_cache(self)
+
 
     def set_range(self, lower, upper):
         """
@@ -267,6 +271,7 @@ class Target(models.Model):
         TargetRange.objects.create(target=self,
                                    value_i=upper if (data_types[0] == Target.INTEGER_DATA_TYPE) else None,
                                    value_f=upper if (data_types[0] == Target.FLOAT_DATA_TYPE) else None)
+        _clear_validation_schema_cache(self)
 
 
     @staticmethod
@@ -338,6 +343,20 @@ class Target(models.Model):
                                    NamedData.NBINOM2_DIST)))
 
 
+#
+# set up signals to keep `validation_schema_for_project()`'s cache up-to-date. note that changes to TargetCats and
+# TargetRanges (and TargetLwrs) are handled by Target.set_cats() and Target.set_range()
+#
+
+@receiver(post_save, sender=Target)
+@receiver(post_delete, sender=Target)
+def _clear_validation_schema_cache(instance, **kwargs):
+    from utils.forecast import clear_validation_schema_cache  # avoid circular imports
+
+
+    clear_validation_schema_cache(instance.project_id)
+
+
 #
 # ---- TargetCat ----
 #
@@ -1,24 +1,32 @@
+import csv
 import datetime
+import io
 import json
 import shutil
 import tempfile
 import unittest
+import zipfile
 from pathlib import Path
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APIRequestFactory
 from rq.timeouts import JobTimeoutException
 
-from forecast_app.models import Project, TimeZero, Job, PredictionElement
+from forecast_app.models import Project, TimeZero, Job, PredictionElement, ProjectSchemaVersion, ProjectSummary
 from forecast_app.models.forecast import Forecast
 from forecast_app.models.forecast_model import ForecastModel
-from forecast_app.views import _upload_forecast_worker
+from forecast_app.views import _upload_forecast_worker, _upload_forecasts_bulk_worker
 from utils.cdc_io import load_cdc_csv_forecast_file, make_cdc_units_and_targets
-from utils.forecast import json_io_dict_from_forecast, load_predictions_from_json_io_dict
+from utils.forecast import json_io_dict_from_forecast, load_predictions_from_json_io_dict, publish_staged_predictions, \
+    clear_forecast_metadata
+from utils.forecast_archive import load_forecast_archive
 from utils.make_minimal_projects import _make_docs_project
 from utils.make_thai_moph_project import load_cdc_csv_forecasts_from_dir
 from utils.project import create_project_from_json
+from utils.project_queries import query_forecasts_for_project
+from utils.query_cache import project_data_version
 from utils.utilities import get_or_create_super_po_mo_users
 
 
@@ -378,6 +386,7 @@ class ForecastTestCase(TestCase):
         project, time_zero, forecast_model, forecast = _make_docs_project(po_user)
         forecast.issued_at -= datetime.timedelta(days=1)  # older version avoids unique constraint errors
         forecast.save()
+        clear_forecast_metadata(forecast)  # cached by the load. o/w _upload_forecast_worker() does not cache it
 
         with patch('forecast_app.models.job.job_cloud_file') as job_cloud_file_mock, \
                 patch('utils.forecast.load_predictions_from_json_io_dict') as load_preds_mock, \
@@ -393,3 +402,185 @@ class ForecastTestCase(TestCase):
             cache_metatdata_mock.assert_called_once()
             self.assertEqual(Job.SUCCESS, job.status)
             self.assertEqual(job.input_json['forecast_pk'], job.output_json['forecast_pk'])
+
+
+    def test__upload_forecast_worker_chunked(self):
+        # verifies that large files are staged in chunks that are checkpointed to the job, and that the job resumes from
+        # its checkpoint. this test is complicated by that function's use of the `job_cloud_file` context manager.
+        # solution is per https://stackoverflow.com/questions/60198229/python-patch-context-manager-to-return-object
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project, time_zero, forecast_model, forecast = _make_docs_project(po_user)
+        forecast.issued_at -= datetime.timedelta(days=1)  # older version avoids unique constraint errors
+        forecast.save()
+        forecast_model2 = ForecastModel.objects.create(project=project, name='name2', abbreviation='abbrev2')
+
+        with patch('forecast_app.models.job.job_cloud_file') as job_cloud_file_mock, \
+                patch('forecast_repo.settings.base.CHUNKED_LOAD_MIN_FILE_SIZE', 0), \
+                patch('forecast_repo.settings.base.CHUNKED_LOAD_CHUNK_SIZE', 10), \
+                patch('utils.forecast.load_predictions_from_json_io_dict') as load_preds_mock, \
+                patch('utils.forecast.publish_staged_predictions') as publish_mock, \
+                open('forecast_app/tests/predictions/docs-predictions.json') as cloud_file_fp:
+            # case: killed while publishing: staged chunks are kept, and no data is visible
+            forecast2 = Forecast.objects.create(forecast_model=forecast_model2, time_zero=time_zero)
+            job = Job.objects.create()
+            job.input_json = {'forecast_pk': forecast2.pk, 'filename': 'a name!'}
+            job.save()
+            job_cloud_file_mock.return_value.__enter__.return_value = (job, cloud_file_fp)
+            publish_mock.side_effect = SystemExit('killed')  # not caught by `_upload_forecast_worker()`
+            with self.assertRaises(SystemExit):
+                _upload_forecast_worker(job.pk)
+            job.refresh_from_db()
+            load_preds_mock.assert_not_called()
+            self.assertEqual({'num_staged_pred_dicts': 29}, job.output_json)
+            self.assertEqual(29, forecast2.staged_pred_eles.count())
+            self.assertEqual(0, forecast2.pred_eles.count())
+
+            # case: resumed: nothing is re-staged
+            cloud_file_fp.seek(0)
+            publish_mock.side_effect = publish_staged_predictions
+            with patch('utils.forecast._bulk_insert_pred_ele_rows') as bulk_insert_mock:
+                _upload_forecast_worker(job.pk)
+                bulk_insert_mock.assert_not_called()
+            job.refresh_from_db()
+            self.assertEqual(Job.SUCCESS, job.status)
+            self.assertEqual({'num_staged_pred_dicts': 29, 'forecast_pk': forecast2.pk}, job.output_json)
+            self.assertEqual(29, forecast2.pred_eles.count())
+            self.assertEqual(0, forecast2.staged_pred_eles.count())
+
+
+    def test__upload_forecast_worker_csv(self):
+        # verifies that '.csv' files are streamed into staging regardless of size. we use the query csv of the docs
+        # forecast as the file
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project, time_zero, forecast_model, forecast = _make_docs_project(po_user)
+        forecast.issued_at -= datetime.timedelta(days=1)  # older version avoids unique constraint errors
+        forecast.save()
+        forecast_model2 = ForecastModel.objects.create(project=project, name='name2', abbreviation='abbrev2')
+        csv_fp = io.StringIO()
+        csv.writer(csv_fp).writerows(query_forecasts_for_project(project, {'models': [forecast_model.abbreviation]}))
+        csv_fp.seek(0)
+
+        with patch('forecast_app.models.job.job_cloud_file') as job_cloud_file_mock, \
+                patch('forecast_repo.settings.base.CHUNKED_LOAD_CHUNK_SIZE', 10), \
+                patch('utils.forecast.load_predictions_from_json_io_dict') as load_preds_mock:
+            forecast2 = Forecast.objects.create(forecast_model=forecast_model2, time_zero=time_zero)
+            job = Job.objects.create()
+            job.input_json = {'forecast_pk': forecast2.pk, 'filename': 'a name!.CSV'}
+            job.save()
+            job_cloud_file_mock.return_value.__enter__.return_value = (job, csv_fp)
+            _upload_forecast_worker(job.pk)
+            job.refresh_from_db()
+            load_preds_mock.assert_not_called()
+            self.assertEqual(Job.SUCCESS, job.status)
+            self.assertEqual({'num_staged_pred_dicts': 29, 'forecast_pk': forecast2.pk}, job.output_json)
+            self.assertEqual(json_io_dict_from_forecast(forecast, None)['predictions'],
+                             json_io_dict_from_forecast(forecast2, None)['predictions'])
+
+
+    def test__upload_forecasts_bulk_worker(self):
+        # tests loading an archive with two timezeros' files where one of them is invalid. the valid ones should be
+        # loaded, and the job's output_json should report per-file statuses. this test is complicated by that
+        # function's use of the `job_cloud_file` context manager. solution is per https://stackoverflow.com/questions/60198229/python-patch-context-manager-to-return-object
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        tz1 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 2)).first()
+        tz2 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 9)).first()
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+        json_io_dict_2 = {'predictions': [pred_dict for pred_dict in json_io_dict['predictions']
+                                          if pred_dict['class'] == 'point']}
+        zip_bytes_io = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes_io, 'w') as zip_file:
+            zip_file.writestr('tz1.json', json.dumps(json_io_dict))
+            zip_file.writestr('tz1-v2.json', json.dumps(json_io_dict_2))  # a subset of tz1.json -> invalid
+            zip_file.writestr('tz2.json', json.dumps(json_io_dict_2))
+
+        with patch('forecast_app.models.job.job_cloud_file') as job_cloud_file_mock:
+            job = Job.objects.create()
+            job.input_json = {'forecast_model_pk': forecast_model.pk, 'filename': 'a name!',
+                              'manifest': [{'filename': 'tz2.json', 'timezero_pk': tz2.pk, 'notes': 'n2'},
+                                           {'filename': 'tz1.json', 'timezero_pk': tz1.pk},
+                                           {'filename': 'tz1-v2.json', 'timezero_pk': tz1.pk}]}
+            job.save()
+            job_cloud_file_mock.return_value.__enter__.return_value = (job, io.TextIOWrapper(zip_bytes_io))
+            _upload_forecasts_bulk_worker(job.pk)
+            job.refresh_from_db()
+            self.assertEqual(Job.FAILED, job.status)
+            self.assertIn("1 of 3 files failed to load", job.failure_message)
+
+        forecast_tz1 = forecast_model.forecasts.get(time_zero=tz1)
+        forecast_tz2 = forecast_model.forecasts.get(time_zero=tz2)
+        self.assertEqual(['tz2.json', 'tz1.json', 'tz1-v2.json'],
+                         [file_status['filename'] for file_status in job.output_json['forecasts']])
+        self.assertEqual([('2011-10-09', forecast_tz2.pk, 'SUCCESS'), ('2011-10-02', forecast_tz1.pk, 'SUCCESS'),
+                          ('2011-10-02', None, 'FAILED')],
+                         [(file_status['timezero_date'], file_status['forecast_pk'], file_status['status'])
+                          for file_status in job.output_json['forecasts']])
+        self.assertIn('new data is a subset of previous', job.output_json['forecasts'][2]['failure_message'])
+        self.assertEqual(('tz1.json', '', 29), (forecast_tz1.source, forecast_tz1.notes,
+                                                forecast_tz1.pred_eles.count()))
+        self.assertEqual(('tz2.json', 'n2', 11), (forecast_tz2.source, forecast_tz2.notes,
+                                                  forecast_tz2.pred_eles.count()))
+
+
+    def test_load_forecast_archive_max_file_size(self):
+        # tests that files larger than MAX_UPLOAD_FILE_SIZE fail without being loaded, regardless of their headers
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        tz1 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 2)).first()
+        tz2 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 9)).first()
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+        json_1 = json.dumps(json_io_dict)
+        json_2 = json.dumps({'predictions': [pred_dict for pred_dict in json_io_dict['predictions']
+                                             if pred_dict['class'] == 'point']})
+        zip_bytes_io = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes_io, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('tz1.json', json_1)
+            zip_file.writestr('tz2.json', json_2)
+
+        manifest = [{'filename': 'tz1.json', 'timezero_pk': tz1.pk}, {'filename': 'tz2.json', 'timezero_pk': tz2.pk}]
+        with patch('forecast_repo.settings.base.MAX_UPLOAD_FILE_SIZE', len(json_2)):
+            file_statuses = load_forecast_archive(forecast_model, zip_bytes_io, manifest, 1)
+        self.assertEqual([('tz1.json', 'FAILED'), ('tz2.json', 'SUCCESS')],
+                         [(file_status['filename'], file_status['status']) for file_status in file_statuses])
+        self.assertIn('archive file was too large', file_statuses[0]['failure_message'])
+        self.assertEqual([tz2], [forecast.time_zero for forecast in forecast_model.forecasts.all()])
+
+
+@unittest.skipIf(connection.vendor != 'postgresql', "forked pool workers cannot share sqlite's in-memory test database")
+class LoadForecastArchivePoolTestCase(TransactionTestCase):
+    """
+    Tests `load_forecast_archive()` with a process pool. This is a TransactionTestCase because the pool's forked workers
+    open their own database connections, which means they can only see committed data.
+    """
+
+
+    def test_load_forecast_archive_pool(self):
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        tz1 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 2)).first()
+        tz2 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 9)).first()
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+        zip_bytes_io = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes_io, 'w') as zip_file:
+            zip_file.writestr('tz1.json', json.dumps(json_io_dict))
+            zip_file.writestr('tz2.json', json.dumps(json_io_dict))
+
+        # the loads' data version bumps and summary increments are applied once each file's transaction commits, and
+        # they do not change the schema version
+        data_version = project_data_version(project.pk)
+        manifest = [{'filename': 'tz1.json', 'timezero_pk': tz1.pk}, {'filename': 'tz2.json', 'timezero_pk': tz2.pk}]
+        file_statuses = load_forecast_archive(forecast_model, zip_bytes_io, manifest, 2)
+        self.assertEqual([('tz1.json', 'SUCCESS'), ('tz2.json', 'SUCCESS')],
+                         [(file_status['filename'], file_status['status']) for file_status in file_statuses])
+        self.assertEqual({tz1, tz2}, {forecast.time_zero for forecast in forecast_model.forecasts.all()})
+        self.assertEqual(data_version + 2, project_data_version(project.pk))
+        self.assertEqual(0, ProjectSchemaVersion.objects.get(project=project).version)
+        self.assertEqual((1, 2, 58), ProjectSummary.objects.filter(project=project)
+                         .values_list('num_models', 'num_forecasts', 'num_rows')
+                         .first())
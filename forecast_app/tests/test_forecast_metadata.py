@@ -4,9 +4,12 @@ import json
 from django.db.models import QuerySet
 from django.test import TestCase
 
-from forecast_app.models import ForecastMetaPrediction, ForecastMetaUnit, ForecastMetaTarget, Forecast
+from forecast_app.models import ForecastMetaPrediction, Forecast, ForecastModel, Target, Unit
+from forecast_app.models.forecast_metadata import ids_to_bitset, bitset_to_ids, bitset_to_mask, count_mask_ids, \
+    ids_to_mask
 from utils.forecast import cache_forecast_metadata, clear_forecast_metadata, load_predictions_from_json_io_dict, \
-    forecast_metadata, is_forecast_metadata_available, forecast_metadata_counts_for_project
+    forecast_metadata, is_forecast_metadata_available, forecast_metadata_counts_for_project, \
+    rebuild_forecast_metadata_for_project
 from utils.make_minimal_projects import _make_docs_project
 from utils.utilities import get_or_create_super_po_mo_users
 
@@ -48,47 +51,47 @@ class ForecastMetadataTestCase(TestCase):
 
 
     def test_cache_forecast_metadata_units(self):
-        self.assertEqual(0, ForecastMetaUnit.objects.filter(forecast=self.forecast).count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[1].count())
 
         cache_forecast_metadata(self.forecast)
-        forecast_meta_unit_qs = ForecastMetaUnit.objects.filter(forecast=self.forecast)
-        self.assertEqual(3, forecast_meta_unit_qs.count())
-        self.assertEqual(set(self.project.units.all()), set([fmu.unit for fmu in forecast_meta_unit_qs]))
+        unit_qs = forecast_metadata(self.forecast)[1]
+        self.assertEqual(3, unit_qs.count())
+        self.assertEqual(set(self.project.units.all()), set(unit_qs))
 
         # second run first deletes existing rows, resulting in the same number as before
         cache_forecast_metadata(self.forecast)
-        self.assertEqual(3, forecast_meta_unit_qs.count())
+        self.assertEqual(3, forecast_metadata(self.forecast)[1].count())
 
 
     def test_cache_forecast_metadata_targets(self):
-        self.assertEqual(0, ForecastMetaTarget.objects.filter(forecast=self.forecast).count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[2].count())
 
         cache_forecast_metadata(self.forecast)
-        forecast_meta_target_qs = ForecastMetaTarget.objects.filter(forecast=self.forecast)
-        self.assertEqual(5, forecast_meta_target_qs.count())
-        self.assertEqual(set(self.project.targets.all()), set([fmt.target for fmt in forecast_meta_target_qs]))
+        target_qs = forecast_metadata(self.forecast)[2]
+        self.assertEqual(5, target_qs.count())
+        self.assertEqual(set(self.project.targets.all()), set(target_qs))
 
         # second run first deletes existing rows, resulting in the same number as before
         cache_forecast_metadata(self.forecast)
-        self.assertEqual(5, forecast_meta_target_qs.count())
+        self.assertEqual(5, forecast_metadata(self.forecast)[2].count())
 
 
     def test_cache_forecast_metadata_clears_first(self):
         self.assertEqual(0, ForecastMetaPrediction.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(0, ForecastMetaUnit.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(0, ForecastMetaTarget.objects.filter(forecast=self.forecast).count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[1].count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[2].count())
 
         # first run creates rows, second run first deletes existing rows, resulting in the same number as before
         for _ in range(2):
             cache_forecast_metadata(self.forecast)
             self.assertEqual(1, ForecastMetaPrediction.objects.filter(forecast=self.forecast).count())
-            self.assertEqual(3, ForecastMetaUnit.objects.filter(forecast=self.forecast).count())
-            self.assertEqual(5, ForecastMetaTarget.objects.filter(forecast=self.forecast).count())
+            self.assertEqual(3, forecast_metadata(self.forecast)[1].count())
+            self.assertEqual(5, forecast_metadata(self.forecast)[2].count())
 
         clear_forecast_metadata(self.forecast)
         self.assertEqual(0, ForecastMetaPrediction.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(0, ForecastMetaUnit.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(0, ForecastMetaTarget.objects.filter(forecast=self.forecast).count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[1].count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[2].count())
 
 
     def test_cache_forecast_metadata_second_forecast(self):
@@ -100,26 +103,26 @@ class ForecastMetadataTestCase(TestCase):
             load_predictions_from_json_io_dict(forecast2, json_io_dict_in, is_validate_cats=False)
 
         self.assertEqual(0, ForecastMetaPrediction.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(0, ForecastMetaUnit.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(0, ForecastMetaTarget.objects.filter(forecast=self.forecast).count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[1].count())
+        self.assertEqual(0, forecast_metadata(self.forecast)[2].count())
 
         self.assertEqual(0, ForecastMetaPrediction.objects.filter(forecast=forecast2).count())
-        self.assertEqual(0, ForecastMetaUnit.objects.filter(forecast=forecast2).count())
-        self.assertEqual(0, ForecastMetaTarget.objects.filter(forecast=forecast2).count())
+        self.assertEqual(0, forecast_metadata(forecast2)[1].count())
+        self.assertEqual(0, forecast_metadata(forecast2)[2].count())
 
         cache_forecast_metadata(self.forecast)
         self.assertEqual(1, ForecastMetaPrediction.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(3, ForecastMetaUnit.objects.filter(forecast=self.forecast).count())
-        self.assertEqual(5, ForecastMetaTarget.objects.filter(forecast=self.forecast).count())
+        self.assertEqual(3, forecast_metadata(self.forecast)[1].count())
+        self.assertEqual(5, forecast_metadata(self.forecast)[2].count())
 
         self.assertEqual(0, ForecastMetaPrediction.objects.filter(forecast=forecast2).count())
-        self.assertEqual(0, ForecastMetaUnit.objects.filter(forecast=forecast2).count())
-        self.assertEqual(0, ForecastMetaTarget.objects.filter(forecast=forecast2).count())
+        self.assertEqual(0, forecast_metadata(forecast2)[1].count())
+        self.assertEqual(0, forecast_metadata(forecast2)[2].count())
 
 
     def test_metadata_for_forecast(self):
         cache_forecast_metadata(self.forecast)
-        forecast_meta_prediction, forecast_meta_unit_qs, forecast_meta_target_qs = forecast_metadata(self.forecast)
+        forecast_meta_prediction, unit_qs, target_qs = forecast_metadata(self.forecast)
 
         self.assertIsInstance(forecast_meta_prediction, ForecastMetaPrediction)
         self.assertEqual(11, forecast_meta_prediction.point_count)
@@ -128,13 +131,13 @@ class ForecastMetadataTestCase(TestCase):
         self.assertEqual(7, forecast_meta_prediction.sample_count)
         self.assertEqual(3, forecast_meta_prediction.quantile_count)
 
-        self.assertIsInstance(forecast_meta_unit_qs, QuerySet)
-        self.assertEqual(3, len(forecast_meta_unit_qs))
-        self.assertEqual({ForecastMetaUnit}, set(map(type, forecast_meta_unit_qs)))
+        self.assertIsInstance(unit_qs, QuerySet)
+        self.assertEqual(3, len(unit_qs))
+        self.assertEqual({Unit}, set(map(type, unit_qs)))
 
-        self.assertIsInstance(forecast_meta_target_qs, QuerySet)
-        self.assertEqual(5, len(forecast_meta_target_qs))
-        self.assertEqual({ForecastMetaTarget}, set(map(type, forecast_meta_target_qs)))
+        self.assertIsInstance(target_qs, QuerySet)
+        self.assertEqual(5, len(target_qs))
+        self.assertEqual({Target}, set(map(type, target_qs)))
 
 
     def test_is_forecast_metadata_available(self):
@@ -159,3 +162,135 @@ class ForecastMetadataTestCase(TestCase):
         self.assertEqual(sorted([self.forecast.id, forecast2.id]), sorted(forecast_id_to_counts.keys()))
         self.assertEqual([(11, 2, 6, 7, 3), 3, 5], forecast_id_to_counts[self.forecast.id])
         self.assertEqual([(11, 2, 6, 7, 3), 3, 5], forecast_id_to_counts[forecast2.id])
+
+        # deleted units and targets are not counted, although their bits are still set
+        self.project.units.get(name='location3').delete()
+        self.project.targets.get(name='season severity').delete()
+        self.assertEqual([(11, 2, 6, 7, 3), 2, 4], forecast_metadata_counts_for_project(self.project)[forecast2.id])
+
+
+    def test_cache_forecast_metadata_incremental(self):
+        def metadata_tuple(forecast):
+            forecast_meta_prediction, unit_qs, target_qs = forecast_metadata(forecast)
+            return ((forecast_meta_prediction.point_count, forecast_meta_prediction.named_count,
+                     forecast_meta_prediction.bin_count, forecast_meta_prediction.sample_count,
+                     forecast_meta_prediction.quantile_count),
+                    {unit.name for unit in unit_qs},
+                    {target.name for target in target_qs})
+
+
+        # loading a new version caches its metadata from the previous version's plus the new elements. each version's
+        # must match what a full cache_forecast_metadata() computes
+        forecast_model = ForecastModel.objects.create(project=self.project, name='incremental', abbreviation='incr')
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+        retract_pred_dicts = [{'unit': pred_dict['unit'], 'target': pred_dict['target'], 'class': pred_dict['class'],
+                               'prediction': None} for pred_dict in json_io_dict['predictions']
+                              if pred_dict['unit'] == 'location3' or pred_dict['target'] == 'season severity']
+        version_pred_dicts = [
+            json_io_dict['predictions'],  # first version: no previous metadata
+            # retract all of location3's and 'season severity's elements, change one, and add one
+            retract_pred_dicts + [
+                {'unit': 'location1', 'target': 'pct next week', 'class': 'point', 'prediction': {'value': 2.2}},
+                {'unit': 'location1', 'target': 'cases next week', 'class': 'point', 'prediction': {'value': 5}}],
+            # un-retract one of location3's elements
+            [{'unit': 'location3', 'target': 'pct next week', 'class': 'point', 'prediction': {'value': 3.3}}]]
+        exp_metadatas = [((11, 2, 6, 7, 3), {'location1', 'location2', 'location3'},
+                          {'pct next week', 'cases next week', 'season severity', 'above baseline',
+                           'Season peak week'}),
+                         ((7, 2, 4, 3, 2), {'location1', 'location2'},
+                          {'pct next week', 'cases next week', 'above baseline', 'Season peak week'}),
+                         ((8, 2, 4, 3, 2), {'location1', 'location2', 'location3'},
+                          {'pct next week', 'cases next week', 'above baseline', 'Season peak week'})]
+        issued_at = self.forecast.issued_at
+        for pred_dicts, exp_metadata in zip(version_pred_dicts, exp_metadatas):
+            issued_at += datetime.timedelta(days=1)
+            forecast = Forecast.objects.create(forecast_model=forecast_model, source='f', time_zero=self.time_zero,
+                                               issued_at=issued_at)
+            load_predictions_from_json_io_dict(forecast, {'meta': {}, 'predictions': pred_dicts},
+                                               is_validate_cats=False, is_subset_allowed=True)
+            self.assertTrue(is_forecast_metadata_available(forecast))
+            self.assertEqual(exp_metadata, metadata_tuple(forecast))
+
+            cache_forecast_metadata(forecast)
+            self.assertEqual(exp_metadata, metadata_tuple(forecast))
+
+        # case: the previous version has no metadata -> none is cached
+        clear_forecast_metadata(forecast)
+        forecast = Forecast.objects.create(forecast_model=forecast_model, source='f', time_zero=self.time_zero,
+                                           issued_at=issued_at + datetime.timedelta(days=1))
+        load_predictions_from_json_io_dict(forecast, {'meta': {}, 'predictions': [
+            {'unit': 'location2', 'target': 'pct next week', 'class': 'point', 'prediction': {'value': 4.4}}]},
+                                           is_validate_cats=False, is_subset_allowed=True)
+        self.assertFalse(is_forecast_metadata_available(forecast))
+
+
+    def test_rebuild_forecast_metadata_for_project(self):
+        # versions: the docs forecast, a later one that retracts location3, and an empty one. the project's oracle
+        # forecasts (from its truth) must not get metadata
+        forecast2 = Forecast.objects.create(forecast_model=self.forecast_model, source='f2', time_zero=self.time_zero)
+        load_predictions_from_json_io_dict(forecast2, {'meta': {}, 'predictions': [
+            {'unit': 'location3', 'target': target_name, 'class': 'point', 'prediction': None}
+            for target_name in ['pct next week', 'cases next week', 'Season peak week']]},
+                                           is_validate_cats=False, is_subset_allowed=True)
+        forecast3 = Forecast.objects.create(forecast_model=self.forecast_model, source='f3', time_zero=self.time_zero,
+                                            issued_at=forecast2.issued_at + datetime.timedelta(days=1))
+
+        # the rebuild must match one cache_forecast_metadata() per forecast
+        forecast_id_to_exp_metadata = {}
+        for forecast in [self.forecast, forecast2, forecast3]:
+            cache_forecast_metadata(forecast)
+            forecast_meta_prediction = forecast_metadata(forecast)[0]
+            forecast_id_to_exp_metadata[forecast.id] = (
+                (forecast_meta_prediction.point_count, forecast_meta_prediction.named_count,
+                 forecast_meta_prediction.bin_count, forecast_meta_prediction.sample_count,
+                 forecast_meta_prediction.quantile_count),
+                forecast_meta_prediction.unit_ids(), forecast_meta_prediction.target_ids())
+        self.assertEqual((8, 2, 6, 7, 3), forecast_id_to_exp_metadata[forecast2.id][0])
+        self.assertEqual(forecast_id_to_exp_metadata[forecast2.id], forecast_id_to_exp_metadata[forecast3.id])
+
+        clear_forecast_metadata(forecast2)  # some forecasts have metadata, others don't
+        self.assertEqual(3, rebuild_forecast_metadata_for_project(self.project))
+        for forecast_id, exp_metadata in forecast_id_to_exp_metadata.items():
+            forecast_meta_prediction = forecast_metadata(Forecast.objects.get(pk=forecast_id))[0]
+            self.assertEqual(exp_metadata, ((forecast_meta_prediction.point_count,
+                                             forecast_meta_prediction.named_count, forecast_meta_prediction.bin_count,
+                                             forecast_meta_prediction.sample_count,
+                                             forecast_meta_prediction.quantile_count),
+                                            forecast_meta_prediction.unit_ids(), forecast_meta_prediction.target_ids()))
+            self.assertEqual(1, ForecastMetaPrediction.objects.filter(forecast_id=forecast_id).count())
+        self.assertFalse(ForecastMetaPrediction.objects.filter(forecast__forecast_model__is_oracle=True).exists())
+
+
+    def test_presence_bitsets(self):
+        for ids, exp_bitset_offset in [([], (b'', 0)),
+                                       ([5], (b'\x01', 5)),
+                                       ([12, 3, 4, 3], (b'\x03\x02', 3))]:
+            bitset, offset = ids_to_bitset(ids)
+            self.assertEqual(exp_bitset_offset, (bitset, offset))
+            self.assertEqual(set(ids), bitset_to_ids(bitset, offset))
+            self.assertEqual(set(ids), bitset_to_ids(memoryview(bitset), offset))  # what Postgres returns
+        self.assertEqual(set(), bitset_to_ids(None, None))
+
+        # masks
+        for ids, other_ids, exp_count in [([], [3], 0), ([12, 3, 4], [3, 5, 12], 2), ([100], [100, 101], 1)]:
+            mask = bitset_to_mask(*ids_to_bitset(ids))
+            self.assertEqual(mask, ids_to_mask(ids))
+            self.assertEqual(len(ids), count_mask_ids(mask))
+            self.assertEqual(exp_count, count_mask_ids(mask & ids_to_mask(other_ids)))
+        self.assertEqual(0, bitset_to_mask(None, None))
+
+        # cached bitsets match the forecast's units and targets, less deleted ones
+        cache_forecast_metadata(self.forecast)
+        forecast_meta_prediction = forecast_metadata(self.forecast)[0]
+        forecast_meta_prediction.refresh_from_db()
+        self.assertEqual(set(self.project.units.values_list('id', flat=True)), forecast_meta_prediction.unit_ids())
+        self.assertEqual(set(self.project.targets.values_list('id', flat=True)), forecast_meta_prediction.target_ids())
+
+        location3 = self.project.units.get(name='location3')
+        location3_id = location3.id
+        location3.delete()
+        forecast_meta_prediction, unit_qs, target_qs = forecast_metadata(self.forecast)
+        self.assertIn(location3_id, forecast_meta_prediction.unit_ids())
+        self.assertEqual({'location1', 'location2'}, {unit.name for unit in unit_qs})
+        self.assertEqual(5, target_qs.count())
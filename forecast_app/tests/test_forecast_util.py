@@ -1,8 +1,10 @@
+import io
+import json
 import logging
 
 from django.test import TestCase
 
-from utils.forecast import data_rows_from_forecast
+from utils.forecast import data_rows_from_forecast, prediction_dicts_from_json_io_file
 from utils.make_minimal_projects import _make_docs_project
 from utils.utilities import get_or_create_super_po_mo_users
 
@@ -131,3 +133,35 @@ class ForecastUtilTestCase(TestCase):
         for (unit, target), exp_rows in loc_targ_to_exp_rows.items():
             act_rows = data_rows_from_forecast(forecast, unit, target)
             self.assertEqual(exp_rows, act_rows)
+
+
+    def test_prediction_dicts_from_json_io_file(self):
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_str = fp.read()
+        exp_pred_dicts = json.loads(json_str)['predictions']
+
+        # case: blue sky. small read sizes exercise values and numbers that span reads
+        for read_size in [1, 7, 1_000_000]:
+            act_pred_dicts = list(prediction_dicts_from_json_io_file(io.StringIO(json_str), read_size))
+            self.assertEqual(exp_pred_dicts, act_pred_dicts)
+
+        # case: key order, other keys, whitespace, and empty containers
+        for json_str, exp_pred_dicts in [
+            ('{"predictions": [{"a": 123}, [4.5e6]], "meta": {"x": [1, 2]}}', [{"a": 123}, [4.5e6]]),
+            (' \n{ "meta" : {} ,\t"predictions" : [ 123 ] } \n', [123]),
+            ('{"predictions": []}', []),
+        ]:
+            self.assertEqual(exp_pred_dicts, list(prediction_dicts_from_json_io_file(io.StringIO(json_str), 3)))
+
+        # case: invalid files
+        for json_str, exp_error in [('', 'was not a dict'),
+                                    ('[]', 'was not a dict'),
+                                    ('{}', "had no 'predictions' key"),
+                                    ('{"meta": {}}', "had no 'predictions' key"),
+                                    ('{"predictions": null}', "'predictions' was not a list"),
+                                    ('{"predictions": [1, 2', "invalid JSON"),
+                                    ('{"predictions": [1 2]}', "invalid JSON"),
+                                    ('{"predictions": [{"a": tru}]}', "invalid JSON"),
+                                    ('{"predictions": []} x', "extra data")]:
+            with self.assertRaisesRegex(RuntimeError, exp_error):
+                list(prediction_dicts_from_json_io_file(io.StringIO(json_str), 3))
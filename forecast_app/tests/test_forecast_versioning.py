@@ -8,7 +8,7 @@ from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 
-from forecast_app.models import Forecast, TimeZero, ForecastModel
+from forecast_app.models import Forecast, TimeZero, ForecastModel, CurrentPredictionElement, PredictionElement
 from utils.forecast import load_predictions_from_json_io_dict, json_io_dict_from_forecast, cache_forecast_metadata, \
     forecast_metadata, data_rows_from_forecast
 from utils.make_minimal_projects import _make_docs_project
@@ -420,6 +420,147 @@ class ForecastVersionsTestCase(TestCase):
         self.assertEqual(exp_predictions, act_predictions)
 
 
+    def test_current_pred_eles_on_versions(self):
+        def current_pred_ele_tuples():
+            return sorted(CurrentPredictionElement.objects.filter(forecast_model=forecast_model)
+                          .values_list('unit__name', 'pred_class', 'forecast__source', 'is_retract'))
+
+
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        tz1 = TimeZero.objects.create(project=project, timezero_date=datetime.date(2020, 10, 4))
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        point_1 = {"unit": "location1", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}}
+        named_1 = {"unit": "location1", "target": "pct next week", "class": "named",
+                   "prediction": {"family": "norm", "param1": 1.1, "param2": 2.2}}
+        point_2 = {"unit": "location2", "target": "pct next week", "class": "point", "prediction": {"value": 2.0}}
+
+        # case: f1, then f2 retracts one element, changes another, and adds a third
+        f1 = Forecast.objects.create(forecast_model=forecast_model, source='f1', time_zero=tz1,
+                                     issued_at=datetime.datetime.combine(tz1.timezero_date, datetime.time(),
+                                                                         tzinfo=datetime.timezone.utc))
+        load_predictions_from_json_io_dict(f1, {'predictions': [point_1, named_1]})
+        self.assertEqual([('location1', PredictionElement.NAMED_CLASS, 'f1', False),
+                          ('location1', PredictionElement.POINT_CLASS, 'f1', False)],
+                         current_pred_ele_tuples())
+
+        f2 = Forecast.objects.create(forecast_model=forecast_model, source='f2', time_zero=tz1,
+                                     issued_at=f1.issued_at + datetime.timedelta(days=1))
+        named_2 = dict(named_1, prediction={"family": "norm", "param1": 3.3, "param2": 2.2})
+        load_predictions_from_json_io_dict(f2, {'predictions': [dict(point_1, prediction=None), named_2, point_2]})
+        self.assertEqual([('location1', PredictionElement.NAMED_CLASS, 'f2', False),
+                          ('location1', PredictionElement.POINT_CLASS, 'f2', True),
+                          ('location2', PredictionElement.POINT_CLASS, 'f2', False)],
+                         current_pred_ele_tuples())
+        self.assertEqual([named_2, point_2], json_io_dict_from_forecast(f2, None)['predictions'])  # no as_of
+        self.assertEqual([named_1, point_1], json_io_dict_from_forecast(f1, None)['predictions'])  # as_of
+
+        # case: an empty older version (f3) that's loaded after a newer one (f4) does not replace f4's rows
+        f3 = Forecast.objects.create(forecast_model=forecast_model, source='f3', time_zero=tz1,
+                                     issued_at=f2.issued_at + datetime.timedelta(days=1))
+        f4 = Forecast.objects.create(forecast_model=forecast_model, source='f4', time_zero=tz1,
+                                     issued_at=f3.issued_at + datetime.timedelta(days=1))
+        load_predictions_from_json_io_dict(f4, {'predictions': [
+            dict(point_1, prediction={"value": 9.9}),
+            dict(named_1, prediction={"family": "norm", "param1": 5.5, "param2": 2.2}),
+            dict(point_2, prediction={"value": 3.0})]})
+        load_predictions_from_json_io_dict(f3, {'predictions': [
+            dict(point_1, prediction={"value": 7.7}),
+            named_2,  # a dup of f2's, so it's not stored
+            dict(point_2, prediction=None)]})
+        self.assertEqual([('location1', PredictionElement.NAMED_CLASS, 'f4', False),
+                          ('location1', PredictionElement.POINT_CLASS, 'f4', False),
+                          ('location2', PredictionElement.POINT_CLASS, 'f4', False)],
+                         current_pred_ele_tuples())
+
+        # case: deleting the newest version rebuilds its (forecast_model, time_zero)'s rows from the remaining ones
+        f4.delete()
+        self.assertEqual([('location1', PredictionElement.NAMED_CLASS, 'f2', False),
+                          ('location1', PredictionElement.POINT_CLASS, 'f3', False),
+                          ('location2', PredictionElement.POINT_CLASS, 'f3', True)],
+                         current_pred_ele_tuples())
+
+
+    def test_pred_ele_validity_on_versions(self):
+        def pred_ele_intervals():
+            # NB: (forecast.source, valid_from, valid_to) -> (source, valid_from's source, valid_to's source)
+            issued_at_to_source = {f.issued_at: f.source for f in Forecast.objects.filter(forecast_model=forecast_model)}
+            return sorted((pred_ele.unit.name, pred_ele.pred_class, pred_ele.forecast.source,
+                           issued_at_to_source[pred_ele.valid_from],
+                           issued_at_to_source[pred_ele.valid_to] if pred_ele.valid_to else None)
+                          for pred_ele in PredictionElement.objects.filter(forecast__forecast_model=forecast_model))
+
+
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        tz1 = TimeZero.objects.create(project=project, timezero_date=datetime.date(2020, 10, 4))
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        point_1 = {"unit": "location1", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}}
+        named_1 = {"unit": "location1", "target": "pct next week", "class": "named",
+                   "prediction": {"family": "norm", "param1": 1.1, "param2": 2.2}}
+        point_2 = {"unit": "location2", "target": "pct next week", "class": "point", "prediction": {"value": 2.0}}
+        named_2 = dict(named_1, prediction={"family": "norm", "param1": 3.3, "param2": 2.2})
+
+        # case: f2 retracts one of f1's elements and changes the other, ending both of their intervals
+        f1 = Forecast.objects.create(forecast_model=forecast_model, source='f1', time_zero=tz1,
+                                     issued_at=datetime.datetime.combine(tz1.timezero_date, datetime.time(),
+                                                                         tzinfo=datetime.timezone.utc))
+        f2 = Forecast.objects.create(forecast_model=forecast_model, source='f2', time_zero=tz1,
+                                     issued_at=f1.issued_at + datetime.timedelta(days=1))
+        load_predictions_from_json_io_dict(f1, {'predictions': [point_1, named_1]})
+        load_predictions_from_json_io_dict(f2, {'predictions': [dict(point_1, prediction=None), named_2, point_2]})
+        self.assertEqual([('location1', PredictionElement.NAMED_CLASS, 'f1', 'f1', 'f2'),
+                          ('location1', PredictionElement.NAMED_CLASS, 'f2', 'f2', None),
+                          ('location1', PredictionElement.POINT_CLASS, 'f1', 'f1', 'f2'),
+                          ('location1', PredictionElement.POINT_CLASS, 'f2', 'f2', None),
+                          ('location2', PredictionElement.POINT_CLASS, 'f2', 'f2', None)],
+                         pred_ele_intervals())
+
+        # case: an empty older version (f3) that's loaded after a newer one (f4) is inserted between them. named_2 is a
+        # dup of f2's, so it's not stored and f2's interval continues until f4
+        f3 = Forecast.objects.create(forecast_model=forecast_model, source='f3', time_zero=tz1,
+                                     issued_at=f2.issued_at + datetime.timedelta(days=1))
+        f4 = Forecast.objects.create(forecast_model=forecast_model, source='f4', time_zero=tz1,
+                                     issued_at=f3.issued_at + datetime.timedelta(days=1))
+        load_predictions_from_json_io_dict(f4, {'predictions': [
+            dict(point_1, prediction={"value": 9.9}),
+            dict(named_1, prediction={"family": "norm", "param1": 5.5, "param2": 2.2}),
+            dict(point_2, prediction={"value": 3.0})]})
+        load_predictions_from_json_io_dict(f3, {'predictions': [dict(point_1, prediction={"value": 7.7}), named_2,
+                                                                dict(point_2, prediction=None)]})
+        exp_intervals = [('location1', PredictionElement.NAMED_CLASS, 'f1', 'f1', 'f2'),
+                         ('location1', PredictionElement.NAMED_CLASS, 'f2', 'f2', 'f4'),
+                         ('location1', PredictionElement.NAMED_CLASS, 'f4', 'f4', None),
+                         ('location1', PredictionElement.POINT_CLASS, 'f1', 'f1', 'f2'),
+                         ('location1', PredictionElement.POINT_CLASS, 'f2', 'f2', 'f3'),
+                         ('location1', PredictionElement.POINT_CLASS, 'f3', 'f3', 'f4'),
+                         ('location1', PredictionElement.POINT_CLASS, 'f4', 'f4', None),
+                         ('location2', PredictionElement.POINT_CLASS, 'f2', 'f2', 'f3'),
+                         ('location2', PredictionElement.POINT_CLASS, 'f3', 'f3', 'f4'),
+                         ('location2', PredictionElement.POINT_CLASS, 'f4', 'f4', None)]
+        self.assertEqual(exp_intervals, pred_ele_intervals())
+        self.assertEqual([named_2, point_2], json_io_dict_from_forecast(f2, None)['predictions'])  # as_of
+        self.assertEqual([named_2, dict(point_1, prediction={"value": 7.7})],
+                         json_io_dict_from_forecast(f3, None)['predictions'])  # as_of
+
+        # case: editing a version's issued_at moves the interval endpoints that copy it
+        f3.issued_at = f3.issued_at + datetime.timedelta(hours=12)
+        f3.save()
+        self.assertEqual(exp_intervals, pred_ele_intervals())
+        self.assertFalse(PredictionElement.objects.filter(forecast=f3).exclude(valid_from=f3.issued_at).exists())
+
+        # case: deleting the newest version re-opens the intervals that its elements ended
+        f4.delete()
+        self.assertEqual([('location1', PredictionElement.NAMED_CLASS, 'f1', 'f1', 'f2'),
+                          ('location1', PredictionElement.NAMED_CLASS, 'f2', 'f2', None),
+                          ('location1', PredictionElement.POINT_CLASS, 'f1', 'f1', 'f2'),
+                          ('location1', PredictionElement.POINT_CLASS, 'f2', 'f2', 'f3'),
+                          ('location1', PredictionElement.POINT_CLASS, 'f3', 'f3', None),
+                          ('location2', PredictionElement.POINT_CLASS, 'f2', 'f2', 'f3'),
+                          ('location2', PredictionElement.POINT_CLASS, 'f3', 'f3', None)],
+                         pred_ele_intervals())
+
+
     def test_json_io_dict_from_forecast_on_versions_as_of(self):
         """
         exposes a bug when running against sqlite where _query_forecasts_sql_for_pred_class() was using
@@ -492,25 +633,25 @@ class ForecastVersionsTestCase(TestCase):
         cache_forecast_metadata(f2)
 
         # test f1
-        # forecast_meta_prediction (pnbsq), forecast_meta_unit_qs, forecast_meta_target_qs:
+        # forecast_meta_prediction (pnbsq), unit_qs, target_qs:
         exp_meta = ((1, 1, 0, 0, 0), {'location1', 'location2'}, {'cases next week'})
         act_meta = forecast_metadata(f1)
         act_fmp_counts = act_meta[0].point_count, act_meta[0].named_count, act_meta[0].bin_count, \
                          act_meta[0].sample_count, act_meta[0].quantile_count
-        act_fm_units = set([fmu.unit.name for fmu in act_meta[1]])
-        act_fm_targets = set([fmu.target.name for fmu in act_meta[2]])
+        act_fm_units = set([unit.name for unit in act_meta[1]])
+        act_fm_targets = set([target.name for target in act_meta[2]])
         self.assertEqual(exp_meta[0], act_fmp_counts)
         self.assertEqual(exp_meta[1], act_fm_units)
         self.assertEqual(exp_meta[2], act_fm_targets)
 
         # test f2
-        # forecast_meta_prediction (pnbsq), forecast_meta_unit_qs, forecast_meta_target_qs:
+        # forecast_meta_prediction (pnbsq), unit_qs, target_qs:
         exp_meta = ((0, 0, 1, 1, 1), {'location1', 'location3'}, {'pct next week', 'Season peak week'})
         act_meta = forecast_metadata(f2)
         act_fmp_counts = act_meta[0].point_count, act_meta[0].named_count, act_meta[0].bin_count, \
                          act_meta[0].sample_count, act_meta[0].quantile_count
-        act_fm_units = set([fmu.unit.name for fmu in act_meta[1]])
-        act_fm_targets = set([fmu.target.name for fmu in act_meta[2]])
+        act_fm_units = set([unit.name for unit in act_meta[1]])
+        act_fm_targets = set([target.name for target in act_meta[2]])
         self.assertEqual(exp_meta[0], act_fmp_counts)
         self.assertEqual(exp_meta[1], act_fm_units)
         self.assertEqual(exp_meta[2], act_fm_targets)
@@ -1,13 +1,19 @@
 import datetime
+import json
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
+from django.db.models import F, OuterRef, Subquery
 from django.test import TestCase
 
-from forecast_app.models import ForecastModel, TimeZero, Forecast, Target
+from forecast_app.models import ForecastModel, TimeZero, Forecast, Target, Unit, PredictionElement, \
+    ProjectSchemaVersion
 from forecast_app.models.prediction_data import PredictionData
 from forecast_app.models.target import TargetRange
-from utils.forecast import load_predictions_from_json_io_dict, NamedData
+from utils.forecast import load_predictions_from_json_io_dict, NamedData, validation_schema_for_project, \
+    _validated_pred_ele_rows_for_pred_dicts, validation_errors_for_json_io_dict, clear_validation_schema_cache, \
+    _PROJECT_PK_TO_VALIDATION_SCHEMA
 from utils.project import create_project_from_json
 from utils.project_truth import load_truth_data, truth_data_qs, oracle_model_for_project
 from utils.utilities import get_or_create_super_po_mo_users
@@ -48,6 +54,255 @@ class PredictionValidationTestCase(TestCase):
         cls.forecast = Forecast.objects.create(forecast_model=cls.forecast_model, time_zero=time_zero)
 
 
+    # ----
+    # Tests for the validation schema
+    # ----
+
+    def test_validation_schema_for_project(self):
+        validation_schema = validation_schema_for_project(self.project)
+        self.assertEqual(self.project.pk, validation_schema.project_pk)
+        self.assertEqual({unit.name: unit.pk for unit in self.project.units.all()},
+                         dict(validation_schema.unit_name_to_pk))
+        self.assertEqual({target.name for target in self.project.targets.all()},
+                         set(validation_schema.target_name_to_schema.keys()))
+        for target in self.project.targets.all():
+            target_schema = validation_schema.target_name_to_schema[target.name]
+            self.assertEqual((target.pk, target.type), (target_schema.pk, target_schema.type))
+            self.assertEqual(target.range_tuple(), target_schema.range_tuple)
+            self.assertEqual(set(target.cats_values()), target_schema.cats_values)
+            self.assertEqual({family_abbrev for family_abbrev in NamedData.FAMILY_CHOICES
+                              if Target.is_valid_named_family_for_target_type(family_abbrev, target.type)},
+                             target_schema.named_families)
+            self.assertEqual(target.type == Target.BINARY_TARGET_TYPE, target_schema.is_binary)
+
+        # date cats are pre-parsed
+        self.assertEqual({datetime.date(2019, 12, 15), datetime.date(2019, 12, 22), datetime.date(2019, 12, 29),
+                          datetime.date(2020, 1, 5)},
+                         validation_schema.target_name_to_schema['Season peak week'].cats_values)
+
+        # immutable
+        with self.assertRaises(AttributeError):
+            validation_schema.target_name_to_schema['pct next week'].range_tuple = None
+        with self.assertRaises(TypeError):
+            validation_schema.unit_name_to_pk['new unit'] = -1
+
+        # cached
+        self.assertIs(validation_schema, validation_schema_for_project(self.project))
+
+        # the only query done during the validation pass once the schema is cached is its data version check
+        prediction_dicts = [{"unit": "location1", "target": "pct next week", "class": "bin",
+                             "prediction": {"cat": [0.0, 1.0, 1.1, 2.0, 2.2], "prob": [0.1, 0.2, 0.3, 0.3, 0.1]}},
+                            {"unit": "location2", "target": "cases next week", "class": "sample",
+                             "prediction": {"sample": [0, 2, 5]}},
+                            {"unit": "location3", "target": "Season peak week", "class": "quantile",
+                             "prediction": {"quantile": [0.5, 0.75], "value": ["2019-12-22", "2019-12-29"]}},
+                            {"unit": "location1", "target": "season severity", "class": "point",
+                             "prediction": {"value": "mild"}}]
+        with self.assertNumQueries(1):
+            _validated_pred_ele_rows_for_pred_dicts(self.forecast, prediction_dicts, False, True)
+
+
+    def test_validation_schema_for_project_invalidation(self):
+        # use a new project so that our changes don't affect the class's cached schema
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        with open(Path('forecast_app/tests/projects/docs-project.json')) as fp:
+            project_dict = json.load(fp)
+            project_dict['name'] = 'schema project'
+        project = create_project_from_json(project_dict, po_user)
+        validation_schema = validation_schema_for_project(project)
+        target = project.targets.get(name='pct next week')
+        self.assertEqual((0.0, 100.0), validation_schema.target_name_to_schema['pct next week'].range_tuple)
+
+        # Target.set_range()
+        target.set_range(0.0, 50.0)
+        validation_schema = validation_schema_for_project(project)
+        self.assertEqual((0.0, 50.0), validation_schema.target_name_to_schema['pct next week'].range_tuple)
+
+        # Target.set_cats()
+        target.set_cats([0.0, 1.0])
+        validation_schema = validation_schema_for_project(project)
+        self.assertEqual({0.0, 1.0}, validation_schema.target_name_to_schema['pct next week'].cats_values)
+
+        # Target.save()
+        target.name = 'pct next week 2'
+        target.save()
+        validation_schema = validation_schema_for_project(project)
+        self.assertIn('pct next week 2', validation_schema.target_name_to_schema)
+        self.assertNotIn('pct next week', validation_schema.target_name_to_schema)
+
+        # Unit.save() and Unit.delete()
+        unit = project.units.get(name='location1')
+        unit.delete()
+        self.assertNotIn('location1', validation_schema_for_project(project).unit_name_to_pk)
+        Unit.objects.create(project=project, name='location4')
+        self.assertIn('location4', validation_schema_for_project(project).unit_name_to_pk)
+
+        # Target.delete()
+        target.delete()
+        self.assertNotIn('pct next week 2', validation_schema_for_project(project).target_name_to_schema)
+
+        # changes made by other processes, which do not clear this process's cache, are detected via the project's
+        # ProjectSchemaVersion. simulated here by bypassing Target.set_range()
+        target = project.targets.get(name='cases next week')
+        validation_schema = validation_schema_for_project(project)
+        TargetRange.objects.filter(target=target, value_i=100000).update(value_i=40)
+        self.assertIs(validation_schema, validation_schema_for_project(project))  # version not bumped yet
+        ProjectSchemaVersion.objects.filter(project=project).update(version=F('version') + 1)
+        validation_schema = validation_schema_for_project(project)
+        self.assertEqual((0, 40), validation_schema.target_name_to_schema['cases next week'].range_tuple)
+
+        # loading forecasts does not invalidate the schema
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        forecast = Forecast.objects.create(forecast_model=forecast_model, source='f',
+                                           time_zero=project.timezeros.first())
+        load_predictions_from_json_io_dict(forecast, {'meta': {}, 'predictions': [
+            {'unit': 'location2', 'target': 'cases next week', 'class': 'point', 'prediction': {'value': 5}}]},
+                                           is_validate_cats=False)
+        self.assertIs(validation_schema, validation_schema_for_project(project))
+
+
+    def test_validation_schema_for_project_max_size(self):
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        with open(Path('forecast_app/tests/projects/docs-project.json')) as fp:
+            project_dict = json.load(fp)
+            project_dict['name'] = 'schema project'
+        project2 = create_project_from_json(project_dict, po_user)
+        with patch('forecast_repo.settings.base.VALIDATION_SCHEMA_CACHE_MAX_SIZE', 2):
+            clear_validation_schema_cache()
+            validation_schema = validation_schema_for_project(self.project)
+            validation_schema_for_project(project2)
+            self.assertIs(validation_schema, validation_schema_for_project(self.project))  # now most recently used
+            self.assertEqual([project2.pk, self.project.pk], list(_PROJECT_PK_TO_VALIDATION_SCHEMA.keys()))
+
+            project3 = create_project_from_json(dict(project_dict, name='schema project 3'), po_user)
+            validation_schema_for_project(project3)  # removes the least recently used one
+            self.assertEqual([self.project.pk, project3.pk], list(_PROJECT_PK_TO_VALIDATION_SCHEMA.keys()))
+
+
+    def test_batched_validation_same_errors_as_unbatched(self):
+        ok_quantile_dict = {"unit": "location1", "target": "pct next week", "class": "quantile",
+                            "prediction": {"quantile": [0.025, 0.25, 0.5], "value": [1.0, 2.2, 2.2]}}
+        bad_pred_dicts = [
+            # bin: different lengths, NA cat, incompatible cat, cat not in cats, bad prob type, prob out of range, prob
+            # sum, binary not two cats
+            {"unit": "location2", "target": "pct next week", "class": "bin",
+             "prediction": {"cat": [0.0, 1.0], "prob": [1.0]}},
+            {"unit": "location2", "target": "season severity", "class": "bin",
+             "prediction": {"cat": ["mild", "NA"], "prob": [0.5, 0.5]}},
+            {"unit": "location2", "target": "cases next week", "class": "bin",
+             "prediction": {"cat": [0, 1.1], "prob": [0.5, 0.5]}},
+            {"unit": "location2", "target": "Season peak week", "class": "bin",
+             "prediction": {"cat": ["2019-12-15", "2019-12-16"], "prob": [0.5, 0.5]}},
+            {"unit": "location2", "target": "pct next week", "class": "bin",
+             "prediction": {"cat": [0.0, 1.0], "prob": ["0.5", 0.5]}},
+            {"unit": "location2", "target": "pct next week", "class": "bin",
+             "prediction": {"cat": [0.0, 1.0], "prob": [-0.5, 1.5]}},
+            {"unit": "location2", "target": "pct next week", "class": "bin",
+             "prediction": {"cat": [0.0, 1.0], "prob": [0.5, 0.6]}},
+            {"unit": "location2", "target": "above baseline", "class": "bin",
+             "prediction": {"cat": [True], "prob": [1.0]}},
+            # sample: NA, incompatible, out of range
+            {"unit": "location2", "target": "season severity", "class": "sample",
+             "prediction": {"sample": ["mild", ""]}},
+            {"unit": "location2", "target": "cases next week", "class": "sample",
+             "prediction": {"sample": [1, 2.5]}},
+            {"unit": "location2", "target": "pct next week", "class": "sample",
+             "prediction": {"sample": [1.0, 100.0]}},
+            {"unit": "location2", "target": "pct next week", "class": "sample",
+             "prediction": {"sample": [1.0, float('nan')]}},
+            # quantile: bad target type, lengths, quantile type, quantile range, not unique, incompatible value,
+            # decreasing, out of range
+            {"unit": "location2", "target": "season severity", "class": "quantile",
+             "prediction": {"quantile": [0.5], "value": ["mild"]}},
+            {"unit": "location2", "target": "pct next week", "class": "quantile",
+             "prediction": {"quantile": [0.5], "value": [1.0, 2.0]}},
+            {"unit": "location2", "target": "pct next week", "class": "quantile",
+             "prediction": {"quantile": ["0.5"], "value": [1.0]}},
+            {"unit": "location2", "target": "pct next week", "class": "quantile",
+             "prediction": {"quantile": [0.5, 1.5], "value": [1.0, 2.0]}},
+            {"unit": "location2", "target": "pct next week", "class": "quantile",
+             "prediction": {"quantile": [0.5, 0.5], "value": [1.0, 2.0]}},
+            {"unit": "location2", "target": "Season peak week", "class": "quantile",
+             "prediction": {"quantile": [0.5, 0.75], "value": ["2019-12-15", "2019-12"]}},
+            {"unit": "location2", "target": "Season peak week", "class": "quantile",
+             "prediction": {"quantile": [0.5, 0.75], "value": ["2019-12-22", "2019-12-15"]}},
+            {"unit": "location2", "target": "cases next week", "class": "quantile",
+             "prediction": {"quantile": [0.75, 0.5], "value": [2, 3]}},
+            {"unit": "location2", "target": "cases next week", "class": "quantile",
+             "prediction": {"quantile": [0.5, 0.75], "value": [2, 100000]}},
+        ]
+        for bad_pred_dict in bad_pred_dicts:
+            exp_exception = None  # set next
+            for is_batch_validation in [False, True]:
+                with self.assertRaises(RuntimeError) as context:
+                    _validated_pred_ele_rows_for_pred_dicts(self.forecast, [ok_quantile_dict, bad_pred_dict], False,
+                                                            True, is_batch_validation)
+                if exp_exception is None:
+                    exp_exception = str(context.exception)
+                else:
+                    self.assertEqual(exp_exception, str(context.exception))
+
+        # the first invalid prediction dict is reported, even if a later one fails outside of a batch
+        bad_unit_dict = {"unit": "bad unit", "target": "pct next week", "class": "point", "prediction": {"value": 1.0}}
+        with self.assertRaises(RuntimeError) as context:
+            _validated_pred_ele_rows_for_pred_dicts(self.forecast, [bad_pred_dicts[-1], bad_unit_dict], False, True)
+        self.assertIn("Entries in `value` must obey existing ranges for targets", str(context.exception))
+
+        # tolerance is honored
+        try:
+            _validated_pred_ele_rows_for_pred_dicts(
+                self.forecast, [{"unit": "location2", "target": "pct next week", "class": "quantile",
+                                 "prediction": {"quantile": [0.5, 0.75], "value": [2.0000001, 2.0]}}], False, True)
+        except Exception as ex:
+            self.fail(f"unexpected exception: {ex}")
+
+
+    def test_validation_errors_for_json_io_dict(self):
+        # case: valid. nothing is loaded
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+        self.assertEqual([], validation_errors_for_json_io_dict(self.project, json_io_dict))
+        self.assertEqual(0, PredictionElement.objects.count())
+
+        # case: invalid json_io_dicts
+        for json_io_dict, exp_message in [([], "json_io_dict was not a dict"),
+                                          ({}, "json_io_dict had no 'predictions' key"),
+                                          ({'predictions': {}}, "json_io_dict's 'predictions' was not a list"),
+                                          ({'predictions': []}, "cannot load empty data")]:
+            errors = validation_errors_for_json_io_dict(self.project, json_io_dict)
+            self.assertEqual(1, len(errors))
+            self.assertIsNone(errors[0]['index'])
+            self.assertIn(exp_message, errors[0]['message'])
+
+        # case: all errors are reported, each with the same message that loading it alone would raise, plus prediction-
+        # level ones. NB: the batched (bin and sample) ones are validated after the others, but are reported in order
+        ok_point_dict = {"unit": "location1", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}}
+        bad_pred_dicts = [
+            {"unit": "location2", "target": "pct next week", "class": "bin",
+             "prediction": {"cat": [0.0, 1.0], "prob": [0.5, 0.6]}},
+            {"unit": "bad unit", "target": "pct next week", "class": "point", "prediction": {"value": 1.0}},
+            {"unit": "location1", "target": "bad target", "class": "point", "prediction": {"value": 1.0}},
+            {"unit": "location1", "target": "pct next week", "class": "bad class", "prediction": {"value": 1.0}},
+            {"unit": "location2", "target": "pct next week", "class": "sample",
+             "prediction": {"sample": [1.0, 100.0]}},
+            {"unit": "location2", "target": "cases next week", "class": "point", "prediction": {"value": 1.1}},
+        ]
+        exp_messages = []
+        for bad_pred_dict in bad_pred_dicts:
+            with self.assertRaises(RuntimeError) as context:
+                _validated_pred_ele_rows_for_pred_dicts(self.forecast, [bad_pred_dict], False, True)
+            exp_messages.append(str(context.exception))
+        missing_key_dict = {"unit": "location2", "target": "pct next week", "class": "point"}
+        json_io_dict = {'predictions': [ok_point_dict] + bad_pred_dicts + [missing_key_dict, ok_point_dict]}
+        errors = validation_errors_for_json_io_dict(self.project, json_io_dict)
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7, None], [error['index'] for error in errors])
+        self.assertEqual(exp_messages, [error['message'] for error in errors[:6]])
+        self.assertIn("prediction_dict was missing required key(s): ['prediction']", errors[6]['message'])
+        self.assertIn("Within a Prediction, there cannot be more than 1 Prediction Element of the same class",
+                      errors[7]['message'])
+        self.assertEqual(0, PredictionElement.objects.count())
+
+
     # ----
     # Tests for all Prediction Elements
     # ----
@@ -978,10 +1233,10 @@ class PredictionValidationTestCase(TestCase):
                     (datetime.date(2011, 10, 16), 'location1', 'pct next week', 0.0)]
         # note: https://code.djangoproject.com/ticket/32483 sqlite3 json query bug -> we manually access field instead
         # of using 'data__value'
-        pred_data_qs = PredictionData.objects \
-            .filter(pred_ele__forecast__forecast_model=oracle_model_for_project(self.project)) \
-            .values_list('pred_ele__forecast__time_zero__timezero_date', 'pred_ele__unit__name',
-                         'pred_ele__target__name', 'data')
+        pred_data_qs = PredictionElement.objects \
+            .filter(forecast__forecast_model=oracle_model_for_project(self.project), is_retract=False) \
+            .annotate(data=Subquery(PredictionData.objects.filter(data_hash=OuterRef('data_hash')).values('data'))) \
+            .values_list('forecast__time_zero__timezero_date', 'unit__name', 'target__name', 'data')
         act_rows = [(tz_date, unit__name, target__name, data['value'])
                     for tz_date, unit__name, target__name, data in pred_data_qs]
         self.assertEqual(sorted(exp_rows), sorted(act_rows))
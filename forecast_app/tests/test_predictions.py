@@ -1,18 +1,25 @@
+import csv
 import datetime
+import io
 import json
 import unittest
+import uuid
 from pathlib import Path
+from unittest.mock import patch
 
 from django.test import TestCase
 
-from forecast_app.models import Forecast, PredictionElement, PredictionData
+from forecast_app.models import Forecast, PredictionElement, PredictionData, Job, StagedPredictionElement
 from forecast_app.models import ForecastModel, TimeZero
-from forecast_app.models.prediction_element import PRED_CLASS_NAME_TO_INT
+from forecast_app.models.prediction_element import PRED_CLASS_NAME_TO_INT, RETRACT_DATA_HASH
 from forecast_app.tests.test_project_queries import ProjectQueriesTestCase
-from utils.forecast import load_predictions_from_json_io_dict, _validated_pred_ele_rows_for_pred_dicts
+from utils.forecast import load_predictions_from_json_io_dict, _validated_pred_ele_rows_for_pred_dicts, \
+    json_io_dict_from_forecast, load_predictions_from_json_io_dict_chunked, NUM_STAGED_PRED_DICTS_KEY, \
+    stage_prediction_dicts_chunked, publish_staged_predictions
+from utils.forecast_csv import prediction_dicts_from_forecast_csv
 from utils.make_minimal_projects import _make_docs_project
 from utils.project import create_project_from_json
-from utils.project_queries import query_truth_for_project, query_forecasts_for_project
+from utils.project_queries import query_truth_for_project, query_forecasts_for_project, FORECAST_CSV_HEADER
 from utils.project_truth import load_truth_data, truth_data_qs
 from utils.utilities import get_or_create_super_po_mo_users
 
@@ -27,20 +34,32 @@ class PredictionsTestCase(TestCase):
 
 
     def test_hash_for_prediction_dict(self):
-        for exp_hash, prediction_dict in [
-            ('845e3d041b6be23a381b6afd263fb113', {"family": "pois", "param1": 1.1}),
-            ('2ed5d7d59eb10044644ab28a1b292efb', {"value": 5}),
-            ('74135c30ddfd5427c8b1e86b2989a642', {"sample": [0, 2, 5]}),
-            ('a74ea3f2472e0aec511eb1f604282220', {"cat": [0, 2, 50], "prob": [0.0, 0.1, 0.9]}),
-            ('838e6e3f77075f69eef3bb3d7bcdffdc', {"quantile": [0.25, 0.75], "value": [0, 50]}),
-            ('bc55989f596fd157ccc6e3279b1f694a', {"value": "mild"}),
-            ('ac263a19694da72f65e903c2ec2000d1', {"cat": ["mild", "moderate", "severe"], "prob": [0.0, 0.1, 0.9]}),
-            ('19d0e94bc24114abfa0d07ca41b8b3bf', {"value": True}),
-            ('1b98c3c7b5b09d3ba0ea43566d5e9d03', {"cat": [True, False], "prob": [0.9, 0.1]}),
-            ('c74e3f626224eeb482368d9fb7a387da',
+        for exp_md5_hash, exp_blake2b_hash, prediction_dict in [
+            ('845e3d041b6be23a381b6afd263fb113', 'e145610073ce7699d984a0381ad636c5', {"family": "pois", "param1": 1.1}),
+            ('2ed5d7d59eb10044644ab28a1b292efb', '3e2955abad71fa9f9efa005aae5d55b2', {"value": 5}),
+            ('74135c30ddfd5427c8b1e86b2989a642', '196b32e2edcb594c860d8638a965637a', {"sample": [0, 2, 5]}),
+            ('a74ea3f2472e0aec511eb1f604282220', '872dccf31d30e1904af354b2b6a34d1c',
+             {"cat": [0, 2, 50], "prob": [0.0, 0.1, 0.9]}),
+            ('838e6e3f77075f69eef3bb3d7bcdffdc', '43680e641a1cbf0d6a5682187968bf34',
+             {"quantile": [0.25, 0.75], "value": [0, 50]}),
+            ('bc55989f596fd157ccc6e3279b1f694a', '7eca9d777ca4635875006a68971d8591', {"value": "mild"}),
+            ('ac263a19694da72f65e903c2ec2000d1', '6cf6a21263f4e7b4e7a2bbe1564eb7c5',
+             {"cat": ["mild", "moderate", "severe"], "prob": [0.0, 0.1, 0.9]}),
+            ('19d0e94bc24114abfa0d07ca41b8b3bf', '3e6438a1f78a0d02bf64924507e9cee1', {"value": True}),
+            ('1b98c3c7b5b09d3ba0ea43566d5e9d03', '97ea56d5103f8c7561909c57eb74cddc',
+             {"cat": [True, False], "prob": [0.9, 0.1]}),
+            ('c74e3f626224eeb482368d9fb7a387da', '647343a5df5ee1540855aec792152157',
              {"cat": ["2019-12-15", "2019-12-22", "2019-12-29"], "prob": [0.01, 0.1, 0.89]}),
         ]:
-            self.assertEqual(exp_hash, PredictionElement.hash_for_prediction_data_dict(prediction_dict))
+            self.assertEqual(exp_blake2b_hash, PredictionElement.hash_for_prediction_data_dict(prediction_dict))
+            self.assertEqual(exp_blake2b_hash,
+                             PredictionElement.hash_for_prediction_data_dict(prediction_dict, 'blake2b'))
+            self.assertEqual(exp_md5_hash, PredictionElement.hash_for_prediction_data_dict(prediction_dict, 'md5'))
+
+        # the stored json is the same string that was hashed, and is compact
+        json_str, data_hash = PredictionElement.json_and_hash_for_prediction_data_dict({"value": 5, "family": "pois"})
+        self.assertEqual('{"family":"pois","value":5}', json_str)
+        self.assertEqual(PredictionElement.hash_for_prediction_data_dict({"family": "pois", "value": 5}), data_hash)
 
 
     def test_load_predictions_from_json_io_dict_existing_pred_eles(self):
@@ -72,40 +91,40 @@ class PredictionsTestCase(TestCase):
         self.assertEqual(29, forecast.pred_eles.count())
         self.assertEqual(0, PredictionElement.objects.filter(is_retract=True).count())
 
-        exp_rows = [('point', 'location1', 'pct next week', '2c343e1ea37e8b493c219066a8664276'),
-                    ('named', 'location1', 'pct next week', '58a7f8487958446d57333b262aaa8271'),
-                    ('point', 'location2', 'pct next week', '2b9db448ae1a3b7065ffee67d4857268'),
-                    ('bin', 'location2', 'pct next week', '7d1485af48de540dbcd954ee5cba51cb'),
-                    ('quantile', 'location2', 'pct next week', '0d3698e4e39456b8e36c750d73bb6870'),
-                    ('point', 'location3', 'pct next week', '5d321ea39f0af08cb3f40a58fa7c54d4'),
-                    ('sample', 'location3', 'pct next week', '0b431a76d5ad343981944c4b0792d738'),
-                    ('named', 'location1', 'cases next week', '845e3d041b6be23a381b6afd263fb113'),
-                    ('point', 'location2', 'cases next week', '2ed5d7d59eb10044644ab28a1b292efb'),
-                    ('sample', 'location2', 'cases next week', '74135c30ddfd5427c8b1e86b2989a642'),
-                    ('point', 'location3', 'cases next week', 'a6ff82cc0637f67254df41352e1c00f9'),
-                    ('bin', 'location3', 'cases next week', 'a74ea3f2472e0aec511eb1f604282220'),
-                    ('quantile', 'location3', 'cases next week', '838e6e3f77075f69eef3bb3d7bcdffdc'),
-                    ('point', 'location1', 'season severity', 'bc55989f596fd157ccc6e3279b1f694a'),
-                    ('bin', 'location1', 'season severity', 'ac263a19694da72f65e903c2ec2000d1'),
-                    ('point', 'location2', 'season severity', 'ec5add7ea7a8abf3e68e9570d0b73898'),
-                    ('sample', 'location2', 'season severity', '51d07bda3e8a39da714f5767d93704ff'),
-                    ('point', 'location1', 'above baseline', '19d0e94bc24114abfa0d07ca41b8b3bf'),
-                    ('bin', 'location2', 'above baseline', '1b98c3c7b5b09d3ba0ea43566d5e9d03'),
-                    ('sample', 'location2', 'above baseline', 'ae168d5bfdad1463672120d51787fed2'),
-                    ('sample', 'location3', 'above baseline', '380b79bea27bfa66e8864cfec9e3403a'),
-                    ('point', 'location1', 'Season peak week', 'fad04bc4cd443ca7cd7cd53f5de4fa99'),
-                    ('bin', 'location1', 'Season peak week', 'c74e3f626224eeb482368d9fb7a387da'),
-                    ('sample', 'location1', 'Season peak week', '2f0fdc8a293046d38eb912601cf0a5cf'),
-                    ('point', 'location2', 'Season peak week', '39c511635eb21cfde3657ab144521b94'),
-                    ('bin', 'location2', 'Season peak week', '4fa62ed754c3fc9b9ede90926efe8f7f'),
-                    ('quantile', 'location2', 'Season peak week', 'd06cb30665b099e471c6dd9d50ba2c30'),
-                    ('point', 'location3', 'Season peak week', 'f15fab078daf9adb53f464272b31dbf6'),
-                    ('sample', 'location3', 'Season peak week', '213d829834bceaaa4376a79b989161c3'), ]
+        exp_rows = [('point', 'location1', 'pct next week', '962a68049a7a2e3ea9ebac63de564951'),
+                    ('named', 'location1', 'pct next week', '15ff4c86c4afcfd325a7f9119ab974c9'),
+                    ('point', 'location2', 'pct next week', '22163c75c2e68c40540b33566d7b01e0'),
+                    ('bin', 'location2', 'pct next week', '7215cd578e3278e1a077d941586efc73'),
+                    ('quantile', 'location2', 'pct next week', '99d0e86602b17fa4db7de6f3ae51927a'),
+                    ('point', 'location3', 'pct next week', 'de0aaf3bb78433c44a9424cb98ad566d'),
+                    ('sample', 'location3', 'pct next week', '654f0165440d8a79385b1fc6b1c7319e'),
+                    ('named', 'location1', 'cases next week', 'e145610073ce7699d984a0381ad636c5'),
+                    ('point', 'location2', 'cases next week', '3e2955abad71fa9f9efa005aae5d55b2'),
+                    ('sample', 'location2', 'cases next week', '196b32e2edcb594c860d8638a965637a'),
+                    ('point', 'location3', 'cases next week', '0233bdea0fbab281a89cfd5fc3d34ddb'),
+                    ('bin', 'location3', 'cases next week', '872dccf31d30e1904af354b2b6a34d1c'),
+                    ('quantile', 'location3', 'cases next week', '43680e641a1cbf0d6a5682187968bf34'),
+                    ('point', 'location1', 'season severity', '7eca9d777ca4635875006a68971d8591'),
+                    ('bin', 'location1', 'season severity', '6cf6a21263f4e7b4e7a2bbe1564eb7c5'),
+                    ('point', 'location2', 'season severity', '67c519bf6f4a4bef25009d51548ee48c'),
+                    ('sample', 'location2', 'season severity', '706e3028a25371c86f9e51a35dc36b96'),
+                    ('point', 'location1', 'above baseline', '3e6438a1f78a0d02bf64924507e9cee1'),
+                    ('bin', 'location2', 'above baseline', '97ea56d5103f8c7561909c57eb74cddc'),
+                    ('sample', 'location2', 'above baseline', '33ef04d9c75b18d8ff4134f3c621230f'),
+                    ('sample', 'location3', 'above baseline', 'f9ee7a79d1a176d3ffe86f1f35ff2c87'),
+                    ('point', 'location1', 'Season peak week', 'f579182b3829b73131f461f25f4f17bc'),
+                    ('bin', 'location1', 'Season peak week', '647343a5df5ee1540855aec792152157'),
+                    ('sample', 'location1', 'Season peak week', 'b3f658428fb7a45ee5be1d857cedd8e7'),
+                    ('point', 'location2', 'Season peak week', '9326a5afabae44acbd932180535eb001'),
+                    ('bin', 'location2', 'Season peak week', 'ee0f4acfca4ba18eb018095676f82a9d'),
+                    ('quantile', 'location2', 'Season peak week', 'b7cbc5140323e6a9968e2b1ca0fb017e'),
+                    ('point', 'location3', 'Season peak week', 'f006dc56ba2388f16651d75f30b5a7d2'),
+                    ('sample', 'location3', 'Season peak week', '0dddc976c03208f0d90f83de1e39deaa'), ]
         pred_data_qs = PredictionElement.objects \
             .filter(forecast=forecast) \
             .values_list('pred_class', 'unit__name', 'target__name', 'data_hash') \
             .order_by('id')
-        act_rows = [(PredictionElement.prediction_class_int_as_str(row[0]), row[1], row[2], row[3])
+        act_rows = [(PredictionElement.prediction_class_int_as_str(row[0]), row[1], row[2], row[3].hex)
                     for row in pred_data_qs]
         self.assertEqual(sorted(exp_rows), sorted(act_rows))
 
@@ -130,7 +149,7 @@ class PredictionsTestCase(TestCase):
 
         # test prediction element counts match number in .json file
         pred_ele_qs = forecast.pred_eles.all()
-        pred_data_qs = PredictionData.objects.filter(pred_ele__forecast=forecast)
+        pred_data_qs = PredictionData.objects.filter(data_hash__in=pred_ele_qs.values('data_hash'))
         self.assertEqual(29, len(pred_ele_qs))
         self.assertEqual(29, len(pred_data_qs))
 
@@ -145,7 +164,7 @@ class PredictionsTestCase(TestCase):
             pred_ele = pred_ele_qs.filter(pred_class=pred_class_int, unit=unit, target=target, is_retract=False,
                                           data_hash=data_hash).first()
             self.assertIsNotNone(pred_ele)
-            self.assertIsNotNone(pred_data_qs.filter(pred_ele=pred_ele).first())
+            self.assertEqual(pred_ele_dict['prediction'], pred_data_qs.get(data_hash=pred_ele.data_hash).data)
 
 
     def test_prediction_dicts_to_db_rows_invalid(self):
@@ -199,14 +218,14 @@ class PredictionsTestCase(TestCase):
         ]
         load_predictions_from_json_io_dict(f2, {'predictions': predictions}, is_validate_cats=False)
         self.assertEqual(5, f2.pred_eles.count())
-        self.assertEqual('', f2.pred_eles.first().data_hash)
+        self.assertEqual(uuid.UUID(RETRACT_DATA_HASH), f2.pred_eles.first().data_hash)
 
         # test loading an initial version that includes retractions (we are sure what this means, but it is valid and
         # should not fail :-)
         f3 = Forecast.objects.create(forecast_model=forecast_model, source='f3', time_zero=tz2)
         load_predictions_from_json_io_dict(f3, {'predictions': predictions}, is_validate_cats=False)
         self.assertEqual(5, f3.pred_eles.count())
-        self.assertEqual('', f3.pred_eles.first().data_hash)
+        self.assertEqual(uuid.UUID(RETRACT_DATA_HASH), f3.pred_eles.first().data_hash)
 
         # test querying same
         try:
@@ -269,6 +288,188 @@ class PredictionsTestCase(TestCase):
         self.assertEqual(27 + 28 + 2 + 1, project.num_pred_ele_rows_all_models(is_oracle=False))
 
 
+    def test_load_predictions_from_json_io_dict_shared_data(self):
+        # elements with identical data share a single PredictionData whose ref_count is the number of elements that
+        # reference it, across forecasts. retractions reference none. deleting forecasts decrements ref_counts and
+        # deletes PredictionData that are no longer referenced
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        tz1 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 2)).first()
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        forecast_model2 = ForecastModel.objects.create(project=project, name='name2', abbreviation='abbrev2')
+        forecast = Forecast.objects.create(forecast_model=forecast_model, time_zero=tz1)
+        predictions = [
+            {"unit": "location1", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}},
+            {"unit": "location2", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}},
+            {"unit": "location3", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}},
+            {"unit": "location3", "target": "pct next week", "class": "sample", "prediction": {"sample": [1.0]}},
+            {"unit": "location1", "target": "pct next week", "class": "quantile", "prediction": None},
+        ]
+        load_predictions_from_json_io_dict(forecast, {'predictions': predictions})
+        self.assertEqual(5, forecast.pred_eles.count())
+        point_hash = uuid.UUID(PredictionElement.hash_for_prediction_data_dict({"value": 2.1}))
+        sample_hash = uuid.UUID(PredictionElement.hash_for_prediction_data_dict({"sample": [1.0]}))
+        self.assertEqual(sorted([(point_hash, {'value': 2.1}, 3), (sample_hash, {'sample': [1.0]}, 1)]),
+                         sorted(PredictionData.objects.values_list('data_hash', 'data', 'ref_count')))
+        self.assertEqual({point_hash, sample_hash, uuid.UUID(RETRACT_DATA_HASH)},
+                         set(forecast.pred_eles.values_list('data_hash', flat=True)))
+
+        # a forecast in another model with some of the same data
+        forecast2 = Forecast.objects.create(forecast_model=forecast_model2, time_zero=tz1)
+        load_predictions_from_json_io_dict(forecast2, {'predictions': predictions[2:4] + [
+            {"unit": "location1", "target": "pct next week", "class": "point", "prediction": {"value": 3.3}}]})
+        point_hash2 = uuid.UUID(PredictionElement.hash_for_prediction_data_dict({"value": 3.3}))
+        self.assertEqual(sorted([(point_hash, 4), (sample_hash, 2), (point_hash2, 1)]),
+                         sorted(PredictionData.objects.values_list('data_hash', 'ref_count')))
+
+        forecast.delete()
+        self.assertEqual(sorted([(point_hash, 1), (sample_hash, 1), (point_hash2, 1)]),
+                         sorted(PredictionData.objects.values_list('data_hash', 'ref_count')))
+        json_io_dict = json_io_dict_from_forecast(forecast2, None)
+        self.assertEqual([{'value': 3.3}, {'value': 2.1}, {'sample': [1.0]}],
+                         [pred_dict['prediction'] for pred_dict in json_io_dict['predictions']])
+
+        forecast2.delete()
+        self.assertFalse(PredictionData.objects.exists())
+
+
+    def test_load_predictions_from_json_io_dict_chunked(self):
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project = create_project_from_json(Path('forecast_app/tests/projects/docs-project.json'), po_user)
+        tz1 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 2)).first()
+        tz2 = project.timezeros.filter(timezero_date=datetime.date(2011, 10, 9)).first()
+        forecast_model = ForecastModel.objects.create(project=project, name='name', abbreviation='abbrev')
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+
+        # case: blue sky: same result as loading in one transaction. 29 prediction dicts -> 3 chunks
+        forecast = Forecast.objects.create(forecast_model=forecast_model, time_zero=tz1)
+        job = Job.objects.create()
+        load_predictions_from_json_io_dict_chunked(forecast, json_io_dict, job, 10, is_validate_cats=False)
+        self.assertEqual(29, forecast.pred_eles.count())
+        self.assertFalse(StagedPredictionElement.objects.exists())
+        self.assertEqual({NUM_STAGED_PRED_DICTS_KEY: 29}, job.output_json)
+
+        forecast2 = Forecast.objects.create(forecast_model=forecast_model, time_zero=tz2)
+        load_predictions_from_json_io_dict(forecast2, json_io_dict, is_validate_cats=False)
+        self.assertEqual(json_io_dict_from_forecast(forecast2, None)['predictions'],
+                         json_io_dict_from_forecast(forecast, None)['predictions'])
+
+        # case: the version rules are enforced at publish time, and nothing is published
+        forecast.issued_at -= datetime.timedelta(days=1)  # older version avoids unique constraint errors
+        forecast.save()
+        forecast3 = Forecast.objects.create(forecast_model=forecast_model, time_zero=tz1)
+        with self.assertRaisesRegex(RuntimeError, 'cannot load 100% duplicate data'):
+            load_predictions_from_json_io_dict_chunked(forecast3, json_io_dict, Job.objects.create(), 10,
+                                                       is_validate_cats=False)
+        self.assertEqual(0, forecast3.pred_eles.count())
+
+        # case: resume after being killed partway through staging: 2 of 3 chunks are staged. the killed worker is
+        # simulated by failing validation of the third chunk
+        forecast3.delete()
+        forecast_model2 = ForecastModel.objects.create(project=project, name='name2', abbreviation='abbrev2')
+        forecast4 = Forecast.objects.create(forecast_model=forecast_model2, time_zero=tz1)
+        job = Job.objects.create()
+        with patch('utils.forecast._validated_pred_ele_rows_for_pred_dicts',
+                   side_effect=[_validated_pred_ele_rows_for_pred_dicts(forecast4, json_io_dict['predictions'][:10],
+                                                                        False, False),
+                                _validated_pred_ele_rows_for_pred_dicts(forecast4, json_io_dict['predictions'][10:20],
+                                                                        False, False),
+                                RuntimeError('killed')]):
+            with self.assertRaisesRegex(RuntimeError, 'killed'):
+                load_predictions_from_json_io_dict_chunked(forecast4, json_io_dict, job, 10, is_validate_cats=False)
+        job.refresh_from_db()
+        self.assertEqual({NUM_STAGED_PRED_DICTS_KEY: 20}, job.output_json)
+        self.assertEqual(20, forecast4.staged_pred_eles.count())
+        self.assertEqual(0, forecast4.pred_eles.count())  # not visible
+
+        with patch('utils.forecast._validated_pred_ele_rows_for_pred_dicts',
+                   wraps=_validated_pred_ele_rows_for_pred_dicts) as validated_mock:
+            load_predictions_from_json_io_dict_chunked(forecast4, json_io_dict, job, 10, is_validate_cats=False)
+            validated_mock.assert_called_once()  # only the last chunk
+        self.assertEqual(29, forecast4.pred_eles.count())
+        self.assertEqual(0, forecast4.staged_pred_eles.count())
+
+        # case: "prediction"-level validation across chunks
+        point_dict = {"unit": "location1", "target": "pct next week", "class": "point", "prediction": {"value": 2.1}}
+        named_dict = {"unit": "location1", "target": "pct next week", "class": "named",
+                      "prediction": {"family": "norm", "param1": 1.1, "param2": 2.2}}
+        bin_dict = {"unit": "location1", "target": "pct next week", "class": "bin",
+                    "prediction": {"cat": [1.1, 2.2], "prob": [0.5, 0.5]}}
+        for pred_dicts, exp_error in [
+            ([point_dict, point_dict], "Within a Prediction, there cannot be more than 1 Prediction Element of the "
+                                       "same class. Found these duplicate unit/target tuples: "
+                                       "[('location1', 'pct next week', ['point', 'point'])]"),
+            ([named_dict, bin_dict], "Within one prediction, there can be at most one of the following prediction "
+                                     "elements, but not both: `Named`, `Bin`"),
+        ]:
+            forecast5 = Forecast.objects.create(forecast_model=forecast_model2, time_zero=tz2)
+            with self.assertRaises(RuntimeError) as context:
+                load_predictions_from_json_io_dict_chunked(forecast5, {'predictions': pred_dicts}, Job.objects.create(),
+                                                           1, is_validate_cats=False)
+            self.assertIn(exp_error, str(context.exception))
+            self.assertEqual(0, forecast5.pred_eles.count())
+            forecast5.delete()  # deletes staged rows
+        self.assertFalse(StagedPredictionElement.objects.exists())
+
+
+    def test_prediction_dicts_from_forecast_csv(self):
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project, time_zero, forecast_model, forecast = _make_docs_project(po_user)
+
+        # case: round trip: a forecast's query csv parses to the same prediction dicts it was loaded from
+        csv_rows = list(query_forecasts_for_project(project, {'models': [forecast_model.abbreviation]}))
+        csv_fp = io.StringIO()
+        csv.writer(csv_fp).writerows(csv_rows)
+        csv_fp.seek(0)
+        act_pred_dicts = list(prediction_dicts_from_forecast_csv(project, csv_fp))
+        exp_pred_dicts = json_io_dict_from_forecast(forecast, None)['predictions']
+        self.assertEqual(29, len(act_pred_dicts))
+        sort_key = lambda _: (_['unit'], _['target'], _['class'])
+        self.assertEqual(sorted(exp_pred_dicts, key=sort_key), sorted(act_pred_dicts, key=sort_key))
+
+        # case: loaded via staging. recall the query csv has no retractions
+        forecast_model2 = ForecastModel.objects.create(project=project, name='name2', abbreviation='abbrev2')
+        forecast2 = Forecast.objects.create(forecast_model=forecast_model2, time_zero=time_zero)
+        csv_fp.seek(0)
+        stage_prediction_dicts_chunked(forecast2, prediction_dicts_from_forecast_csv(project, csv_fp),
+                                       Job.objects.create(), 10)
+        publish_staged_predictions(forecast2)
+        self.assertEqual(29, forecast2.pred_eles.count())
+
+        # case: retractions, data types, and unconvertible values, which are passed through for validation to report
+        header = ','.join(FORECAST_CSV_HEADER)
+        csv_fp = io.StringIO(f"{header}\n"
+                             "m,2011-10-02,s,loc1,pct next week,point,,,,,,,,,\n"  # retraction
+                             "m,2011-10-02,s,loc1,cases next week,sample,,,,3,,,,,\n"
+                             "m,2011-10-02,s,loc1,cases next week,sample,,,,x,,,,,\n"
+                             "m,2011-10-02,s,loc1,Season peak week,point,2019-12-15,,,,,,,,\n"
+                             "m,2011-10-02,s,loc1,above baseline,bin,,True,0.9,,,,,,\n"
+                             "m,2011-10-02,s,loc1,above baseline,bin,,false,0.1,,,,,,\n"
+                             "m,2011-10-02,s,loc1,pct next week,named,,,,,,norm,1.1,2,\n"
+                             "m,2011-10-02,s,loc1,pct next week,quantile,1,,,,0.5,,,,\n"
+                             "m,2011-10-02,s,loc1,pct next week,quantile,2.5,,,,0.75,,,,\n")
+        self.assertEqual([{'unit': 'loc1', 'target': 'pct next week', 'class': 'point', 'prediction': None},
+                          {'unit': 'loc1', 'target': 'cases next week', 'class': 'sample',
+                           'prediction': {'sample': [3, 'x']}},
+                          {'unit': 'loc1', 'target': 'Season peak week', 'class': 'point',
+                           'prediction': {'value': '2019-12-15'}},
+                          {'unit': 'loc1', 'target': 'above baseline', 'class': 'bin',
+                           'prediction': {'cat': [True, False], 'prob': [0.9, 0.1]}},
+                          {'unit': 'loc1', 'target': 'pct next week', 'class': 'named',
+                           'prediction': {'family': 'norm', 'param1': 1.1, 'param2': 2.0}},
+                          {'unit': 'loc1', 'target': 'pct next week', 'class': 'quantile',
+                           'prediction': {'quantile': [0.5, 0.75], 'value': [1, 2.5]}}],
+                         list(prediction_dicts_from_forecast_csv(project, csv_fp)))
+
+        # case: invalid files
+        for csv_str, exp_error in [('', 'empty file'),
+                                   ('unit,target,class,value\n', 'invalid header'),
+                                   (f"{header}\nm,2011-10-02,s,loc1,pct next week,point,1\n", 'invalid row')]:
+            with self.assertRaisesRegex(RuntimeError, exp_error):
+                list(prediction_dicts_from_forecast_csv(project, io.StringIO(csv_str)))
+
+
     #
     # test "retracted" and skipped predictions for truth
     #
@@ -6,9 +6,10 @@ from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.test import TestCase
 
-from forecast_app.models import Project, TimeZero, Job, Forecast, PredictionData
+from forecast_app.models import Project, TimeZero, Job, Forecast, PredictionData, PredictionElement
 from forecast_app.models.forecast_model import ForecastModel
 from forecast_app.views import ProjectDetailView, _upload_truth_worker
 from utils.cdc_io import load_cdc_csv_forecast_file, make_cdc_units_and_targets
@@ -132,10 +133,10 @@ class ProjectTestCase(TestCase):
 
         # note: https://code.djangoproject.com/ticket/32483 sqlite3 json query bug -> we manually access field instead
         # of using 'data__value'
-        pred_data_qs = PredictionData.objects \
-            .filter(pred_ele__forecast__forecast_model=oracle_model_for_project(self.project)) \
-            .values_list('pred_ele__forecast__time_zero__timezero_date', 'pred_ele__unit__name',
-                         'pred_ele__target__name', 'data')
+        pred_data_qs = PredictionElement.objects \
+            .filter(forecast__forecast_model=oracle_model_for_project(self.project), is_retract=False) \
+            .annotate(data=Subquery(PredictionData.objects.filter(data_hash=OuterRef('data_hash')).values('data'))) \
+            .values_list('forecast__time_zero__timezero_date', 'unit__name', 'target__name', 'data')
         act_rows = [(tz_date, unit__name, target__name, data['value'])
                     for tz_date, unit__name, target__name, data in pred_data_qs]
         self.assertEqual(sorted(exp_rows), sorted(list(act_rows)))
@@ -155,10 +156,10 @@ class ProjectTestCase(TestCase):
                     (datetime.date(2016, 10, 30), 'US National', 'Season peak week', '2017-02-05')]
         # note: https://code.djangoproject.com/ticket/32483 sqlite3 json query bug -> we manually access field instead
         # of using 'data__value'
-        pred_data_qs = PredictionData.objects \
-            .filter(pred_ele__forecast__forecast_model=oracle_model_for_project(project2)) \
-            .values_list('pred_ele__forecast__time_zero__timezero_date', 'pred_ele__unit__name',
-                         'pred_ele__target__name', 'data')
+        pred_data_qs = PredictionElement.objects \
+            .filter(forecast__forecast_model=oracle_model_for_project(project2), is_retract=False) \
+            .annotate(data=Subquery(PredictionData.objects.filter(data_hash=OuterRef('data_hash')).values('data'))) \
+            .values_list('forecast__time_zero__timezero_date', 'unit__name', 'target__name', 'data')
         act_rows = [(tz_date, unit__name, target__name, data['value'])
                     for tz_date, unit__name, target__name, data in pred_data_qs]
         self.assertEqual(sorted(exp_rows), sorted(list(act_rows)))
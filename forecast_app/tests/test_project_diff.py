@@ -7,6 +7,8 @@ from pathlib import Path
 from django.test import TestCase
 from rest_framework.test import APIRequestFactory
 
+from forecast_app.models import Target
+from utils.forecast import validation_schema_for_project
 from utils.make_minimal_projects import _make_docs_project
 from utils.project import config_dict_from_project
 from utils.project_diff import project_config_diff, Change, order_project_config_diff, execute_project_config_diff, \
@@ -210,6 +212,27 @@ class ProjectDiffTestCase(TestCase):
         self._do_make_some_changes_tests(project)
 
 
+    def test_execute_project_config_diff_clears_validation_schema(self):
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project, _, _, _ = _make_docs_project(po_user)
+        validation_schema = validation_schema_for_project(project)  # cache it
+        self.assertIn('location3', validation_schema.unit_name_to_pk)
+        self.assertEqual(Target.CONTINUOUS_TARGET_TYPE, validation_schema.target_name_to_schema['pct next week'].type)
+
+        out_config_dict = config_dict_from_project(project, APIRequestFactory().request())
+        edit_config_dict = copy.deepcopy(out_config_dict)
+        _make_some_changes(edit_config_dict)
+        changes = project_config_diff(out_config_dict, edit_config_dict)
+        execute_project_config_diff(project, changes)
+
+        validation_schema = validation_schema_for_project(project)
+        self.assertNotIn('location3', validation_schema.unit_name_to_pk)
+        self.assertIn('location4', validation_schema.unit_name_to_pk)
+        self.assertEqual(Target.DISCRETE_TARGET_TYPE, validation_schema.target_name_to_schema['pct next week'].type)
+        self.assertEqual(project.targets.get(name='pct next week').pk,
+                         validation_schema.target_name_to_schema['pct next week'].pk)
+
+
     def test_diff_from_file(self):
         _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
         project, _, _, _ = _make_docs_project(po_user)
@@ -1,24 +1,31 @@
+import csv
 import datetime
+import io
 import json
 import logging
+import unittest
 from numbers import Number
 from pathlib import Path
 from unittest.mock import patch
 
 from botocore.exceptions import BotoCoreError
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 
-from forecast_app.models import TimeZero, Forecast, Job, Unit, Target, PredictionElement
+from forecast_app.models import TimeZero, Forecast, Job, Unit, Target, PredictionElement, CurrentPredictionElement
 from forecast_app.models.forecast_model import ForecastModel
 from forecast_app.models.prediction_element import PRED_CLASS_INT_TO_NAME
-from utils.forecast import load_predictions_from_json_io_dict, NamedData
+from utils.forecast import load_predictions_from_json_io_dict, NamedData, cache_forecast_metadata, \
+    clear_forecast_metadata
 from utils.make_minimal_projects import _make_docs_project
 from utils.project import create_project_from_json
 from utils.project_queries import FORECAST_CSV_HEADER, query_forecasts_for_project, _forecasts_query_worker, \
-    validate_truth_query, _truth_query_worker, query_truth_for_project
+    validate_truth_query, _truth_query_worker, query_truth_for_project, copy_forecasts_csv_for_project, \
+    is_parquet_available, forecasts_query_partitions, query_forecasts_partitioned, estimate_forecasts_query, \
+    _query_forecasts_sql_for_pred_class, IterCounter
 from utils.project_queries import validate_forecasts_query
 from utils.project_truth import TRUTH_CSV_HEADER, oracle_model_for_project, load_truth_data
-from utils.utilities import get_or_create_super_po_mo_users, YYYY_MM_DD_DATE_FORMAT
+from utils.utilities import get_or_create_super_po_mo_users, YYYY_MM_DD_DATE_FORMAT, server_side_cursor
 
 
 logging.getLogger().setLevel(logging.ERROR)
@@ -83,6 +90,17 @@ class ProjectQueriesTestCase(TestCase):
         self.assertEqual(1, len(error_messages))
         self.assertIn("one or more types were invalid prediction types", error_messages[0])
 
+        # case: bad projection keys
+        for query_dict, exp_error_msg in [
+            ({'quantiles': 0.5}, "'quantiles' was not a non-empty list"), ({'quantiles': []}, "'quantiles' was not"),
+            ({'quantiles': ['0.5']}, "'quantiles' was not"), ({'quantiles': [1.5]}, "'quantiles' was not"),
+            ({'max_samples': 0}, "'max_samples' was not a positive integer"), ({'max_samples': '2'}, "'max_samples'"),
+            ({'max_samples': True}, "'max_samples' was not"), ({'bin_cats': 'a'}, "'bin_cats' was not a non-empty"),
+            ({'bin_cats': [[1]]}, "'bin_cats' was not")]:
+            error_messages, _ = validate_forecasts_query(self.project, query_dict)
+            self.assertEqual(1, len(error_messages))
+            self.assertIn(exp_error_msg, error_messages[0])
+
         # case: object references from other project (!)
         project2, time_zero2, forecast_model2, forecast2 = _make_docs_project(self.po_user)
         for query_dict, exp_error_msg in [
@@ -104,6 +122,13 @@ class ProjectQueriesTestCase(TestCase):
         error_messages, _ = validate_forecasts_query(self.project, query)
         self.assertEqual(0, len(error_messages))
 
+        error_messages, (_, _, _, _, _, _, projection) = validate_forecasts_query(self.project, {})
+        self.assertEqual({'quantiles': None, 'max_samples': None, 'bin_cats': None}, projection)
+        error_messages, (_, _, _, _, _, _, projection) = validate_forecasts_query(
+            self.project, {'quantiles': [0.025, 1], 'max_samples': 2, 'bin_cats': ['cat', 1.1, True]})
+        self.assertEqual(0, len(error_messages))
+        self.assertEqual({'quantiles': [0.025, 1], 'max_samples': 2, 'bin_cats': ['cat', 1.1, True]}, projection)
+
 
     def test_query_forecasts_for_project_no_versions(self):
         model = self.forecast_model.abbreviation
@@ -282,16 +307,231 @@ class ProjectQueriesTestCase(TestCase):
         self.assertIn("number of rows exceeded maximum", str(context.exception))
 
 
+    def test_query_forecasts_for_project_server_side_cursor(self):
+        # NB: on sqlite server_side_cursor() falls back to a regular cursor, so this only tests streaming on postgres
+        exp_rows = list(query_forecasts_for_project(self.project, {}))
+        for itersize in [0, 1, 5, 2000]:  # 0 disables server-side cursors
+            with patch('forecast_repo.settings.base.SERVER_SIDE_CURSOR_ITERSIZE', itersize):
+                with server_side_cursor() as cursor:
+                    self.assertEqual(bool(itersize and connection.vendor == 'postgresql'),
+                                     bool(getattr(cursor, 'name', None)))
+                self.assertEqual(exp_rows, list(query_forecasts_for_project(self.project, {})))
+
+
+    def test__query_forecasts_sql_for_pred_class_params(self):
+        as_of = datetime.datetime(2011, 10, 22, tzinfo=datetime.timezone.utc)
+        sql_1, params_1 = _query_forecasts_sql_for_pred_class([1], [2], [3], [4], [5], as_of, True)
+        sql_2, params_2 = _query_forecasts_sql_for_pred_class([1, 2], [3, 4], [5, 6], [7, 8], [9, 10],
+                                                              as_of + datetime.timedelta(days=1), True)
+        self.assertNotIn("2011", sql_1)  # the values are bound, not interpolated
+        self.assertNotEqual(params_1, params_2)
+        if connection.vendor == 'postgresql':  # one array param per ID list, so the number of IDs does not matter
+            self.assertEqual(sql_1, sql_2)
+            self.assertEqual([[2], [1], [3], [4], [5]], params_1[:5])
+
+        # case: the bound params work, including for both query tables (CurrentPredictionElement and
+        # PredictionElement)
+        for query in [{'units': ['location1', 'location2'], 'types': ['point', 'bin']},
+                      {'units': ['location1', 'location2'], 'types': ['point', 'bin'],
+                       'as_of': '2099-01-01T00:00+00:00'}]:
+            rows = list(query_forecasts_for_project(self.project, query))
+            self.assertTrue(len(rows) > 1)
+            self.assertEqual({('location1', 'point'), ('location1', 'bin'), ('location2', 'point'),
+                              ('location2', 'bin')}, {(row[3], row[5]) for row in rows[1:]})
+
+
+    def test_query_forecasts_for_project_projection(self):
+        all_rows = list(query_forecasts_for_project(self.project, {}))
+
+        # case: each key removes only the rows of its class that it does not select
+        for query, class_name, is_keep_row in [
+            ({'quantiles': [0.5, 0.975]}, 'quantile', lambda row: row[10] in [0.5, 0.975]),
+            ({'bin_cats': ['mild', 1.1, True]}, 'bin', lambda row: row[7] in ['mild', 1.1, True]),
+            ({'max_samples': 1}, 'sample', None)]:
+            act_rows = list(query_forecasts_for_project(self.project, query))
+            other_rows = [row for row in all_rows if row[5] != class_name]
+            self.assertEqual(other_rows, [row for row in act_rows if row[5] != class_name])
+            class_rows = [row for row in act_rows if row[5] == class_name]
+            self.assertTrue(class_rows)
+            if is_keep_row:
+                self.assertEqual([row for row in all_rows if (row[5] == class_name) and is_keep_row(row)], class_rows)
+            else:  # one sample per (unit, target)
+                self.assertEqual(len({(row[3], row[4]) for row in class_rows}), len(class_rows))
+                self.assertTrue(len(class_rows) < len([row for row in all_rows if row[5] == class_name]))
+
+        # case: projections are applied by copy_forecasts_csv_for_project() too, and by both query tables
+        if connection.vendor != 'postgresql':
+            return
+
+        for query in [{'quantiles': [0.5, 0.975], 'bin_cats': ['mild', 1.1, True], 'max_samples': 1},
+                      {'quantiles': [0.5], 'max_samples': 2, 'as_of': '2099-01-01T00:00+00:00'}]:
+            with io.BytesIO() as bytes_io:  # as written by _query_worker()
+                text_io_wrapper = io.TextIOWrapper(bytes_io, 'utf-8', newline='')
+                csv.writer(text_io_wrapper).writerows(query_forecasts_for_project(self.project, query))
+                text_io_wrapper.flush()
+                exp_csv_bytes = bytes_io.getvalue()
+            with io.BytesIO() as bytes_io:
+                copy_forecasts_csv_for_project(self.project, query, bytes_io)
+                self.assertEqual(exp_csv_bytes, bytes_io.getvalue())
+
+
+    @unittest.skipIf(connection.vendor != 'postgresql', "COPY requires postgres")
+    def test_copy_forecasts_csv_for_project(self):
+        def python_csv_bytes(query):
+            with io.BytesIO() as bytes_io:  # as written by _query_worker()
+                text_io_wrapper = io.TextIOWrapper(bytes_io, 'utf-8', newline='')
+                csv.writer(text_io_wrapper).writerows(query_forecasts_for_project(self.project, query))
+                text_io_wrapper.flush()
+                return bytes_io.getvalue()
+
+
+        # add a forecast with values whose formatting and quoting differ between Python and postgres
+        unit = Unit.objects.create(project=self.project, name='loc, "4"\nfour')
+        time_zero = TimeZero.objects.create(project=self.project, timezero_date=datetime.date(2011, 10, 23))
+        forecast = Forecast.objects.create(forecast_model=self.forecast_model, source='f2', time_zero=time_zero)
+        load_predictions_from_json_io_dict(forecast, {'predictions': [
+            {"unit": unit.name, "target": "pct next week", "class": "point", "prediction": {"value": 2.5e-07}},
+            {"unit": unit.name, "target": "pct next week", "class": "named",
+             "prediction": {"family": "norm", "param1": 5.0, "param2": 1000000000000000.0}},
+            {"unit": unit.name, "target": "pct next week", "class": "quantile",
+             "prediction": {"quantile": [0.25, 0.75], "value": [0.30000000000000004, 12.5]}},
+            {"unit": unit.name, "target": "above baseline", "class": "point", "prediction": {"value": True}},
+            {"unit": unit.name, "target": "above baseline", "class": "bin",
+             "prediction": {"cat": [True, False], "prob": [0.1, 0.9]}},
+            {"unit": unit.name, "target": "cases next week", "class": "sample", "prediction": {"sample": [3, 0]}},
+            {"unit": unit.name, "target": "season severity", "class": "point", "prediction": {"value": "mild"}},
+        ]}, is_validate_cats=False)
+
+        for query in [{}, {'types': ['bin', 'quantile']}, {'units': [unit.name]}, {'as_of': '2099-01-01T00:00+00:00'}]:
+            with io.BytesIO() as bytes_io:
+                num_rows = copy_forecasts_csv_for_project(self.project, query, bytes_io)
+                exp_csv_bytes = python_csv_bytes(query)
+                self.assertEqual(exp_csv_bytes, bytes_io.getvalue())
+                self.assertEqual(len(list(csv.reader(io.StringIO(exp_csv_bytes.decode('utf-8'))))), num_rows)
+
+        # case: max_num_rows, which counts prediction elements
+        with self.assertRaises(RuntimeError) as context:
+            copy_forecasts_csv_for_project(self.project, {}, io.BytesIO(), max_num_rows=35)  # 36 elements
+        self.assertIn("number of rows exceeded maximum", str(context.exception))
+
+
+    def test_estimate_forecasts_query(self):
+        def estimate(query):
+            error_messages, validated_query = validate_forecasts_query(self.project, query)
+            self.assertEqual([], error_messages)
+            return estimate_forecasts_query(self.project, validated_query)
+
+
+        # case: no metadata -> nothing is counted
+        clear_forecast_metadata(self.forecast)
+        self.assertEqual({'num_elements': 0, 'num_rows': 0, 'num_bytes': len(','.join(FORECAST_CSV_HEADER)) + 2},
+                         estimate({}))
+
+        # case: the docs forecast's rows are sampled entirely, so the number of rows is exact for type filters and
+        # close for unit and target filters, which assume elements are spread evenly. sizes are approximate
+        cache_forecast_metadata(self.forecast)
+        for query in [{}, {'types': ['bin']}, {'types': ['point', 'sample']}, {'units': ['location1']},
+                      {'targets': ['pct next week']}]:
+            with io.BytesIO() as bytes_io:  # as written by _query_worker()
+                text_io_wrapper = io.TextIOWrapper(bytes_io, 'utf-8', newline='')
+                csv.writer(text_io_wrapper).writerows(query_forecasts_for_project(self.project, query))
+                text_io_wrapper.flush()
+                exp_num_rows, exp_num_bytes = len(bytes_io.getvalue().splitlines()) - 1, len(bytes_io.getvalue())
+            act_estimate = estimate(query)
+            if ('units' in query) or ('targets' in query):
+                self.assertAlmostEqual(exp_num_rows, act_estimate['num_rows'], delta=exp_num_rows)
+            else:
+                self.assertEqual(exp_num_rows, act_estimate['num_rows'])
+            self.assertAlmostEqual(exp_num_bytes, act_estimate['num_bytes'], delta=exp_num_bytes * 0.5)
+
+        # case: as_of before the forecast was issued
+        self.assertEqual(0, estimate({'as_of': '2000-01-01 00:00 UTC'})['num_elements'])
+
+
+    def test_query_forecasts_partitioned(self):
+        def csv_bytes(rows):
+            with io.BytesIO() as bytes_io:  # as written by _query_worker()
+                text_io_wrapper = io.TextIOWrapper(bytes_io, 'utf-8', newline='')
+                csv.writer(text_io_wrapper).writerows(rows)
+                text_io_wrapper.flush()
+                return bytes_io.getvalue()
+
+
+        # add a second model and a second timezero, both with the same predictions as the docs forecast
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            json_io_dict = json.load(fp)
+        forecast_model2 = ForecastModel.objects.create(project=self.project, name='docs model 2',
+                                                       abbreviation='docs_mod2')
+        time_zero2 = self.project.timezeros.get(timezero_date=datetime.date(2011, 10, 9))
+        for forecast_model, time_zero in [(forecast_model2, self.time_zero), (self.forecast_model, time_zero2)]:
+            forecast = Forecast.objects.create(forecast_model=forecast_model, source='f2', time_zero=time_zero)
+            load_predictions_from_json_io_dict(forecast, json_io_dict, is_validate_cats=False)
+
+        # case: partitions are blocks of models, or of timezeros if there is only one model
+        self.assertEqual([{'models': ['docs_mod']}, {'models': ['docs_mod2']}],
+                         forecasts_query_partitions(self.project, {}, 4))
+        self.assertEqual([{'models': ['docs_mod', 'docs_mod2']}], forecasts_query_partitions(self.project, {}, 1))
+        self.assertEqual([{'models': ['docs_mod'], 'timezeros': ['2011-10-02']},
+                          {'models': ['docs_mod'], 'timezeros': ['2011-10-09']}],
+                         forecasts_query_partitions(self.project, {'models': ['docs_mod']}, 4))
+        query = {'models': ['docs_mod'], 'timezeros': ['2011-10-02']}
+        self.assertEqual([query], forecasts_query_partitions(self.project, query, 4))
+
+        # case: concatenated partitions are the same as the unpartitioned query
+        for is_copy in [False, True] if connection.vendor == 'postgresql' else [False]:
+            for query in [{}, {'models': ['docs_mod']}, {'types': ['bin', 'sample']}, {'units': ['location2']}]:
+                self.assertEqual(csv_bytes(query_forecasts_for_project(self.project, query)),
+                                 csv_bytes(query_forecasts_partitioned(self.project, query, 1, is_copy)))
+
+        # case: max_num_rows applies to the total number of prediction elements, not rows. each of the two
+        # partitions has half of them
+        num_rows = len(list(query_forecasts_for_project(self.project, {}))) - 1
+        num_pred_eles = CurrentPredictionElement.objects.filter(forecast_model__project=self.project,
+                                                                forecast_model__is_oracle=False,
+                                                                is_retract=False).count()
+        self.assertTrue(num_pred_eles < num_rows)
+        rows = IterCounter(query_forecasts_for_project(self.project, {}))
+        self.assertEqual((num_rows + 1, num_pred_eles), (len(list(rows)), rows.return_value))  # the generator's count
+        for is_copy in [False, True] if connection.vendor == 'postgresql' else [False]:
+            self.assertEqual(num_rows + 1, len(list(query_forecasts_partitioned(self.project, {}, 1, is_copy,
+                                                                                max_num_rows=num_pred_eles))))
+            with self.assertRaises(RuntimeError) as context:
+                list(query_forecasts_partitioned(self.project, {}, 1, is_copy, max_num_rows=num_pred_eles - 1))
+            self.assertIn("number of rows exceeded maximum", str(context.exception))
+
+        # case: the worker uses it if QUERY_POOL_SIZE > 1
+        job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {}})
+        with patch('forecast_repo.settings.base.QUERY_POOL_SIZE', 2), \
+                patch('utils.project_queries.query_forecasts_partitioned') as partitioned_mock, \
+                patch('utils.cloud_file.upload_file'):
+            _forecasts_query_worker(job.pk)
+            partitioned_mock.assert_called_once_with(self.project, {}, 2, connection.vendor == 'postgresql')
+
+
     def test__forecasts_query_worker(self):
         # tests the worker directly. above test verifies that it's called from `query_forecasts_endpoint()`
 
         # ensure query_forecasts_for_project() is called
         job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {}})
-        with patch('utils.project_queries.query_forecasts_for_project') as query_mock, \
+        with patch('forecast_repo.settings.base.IS_QUERY_CSV_COPY', False), \
+                patch('utils.project_queries.query_forecasts_for_project') as query_mock, \
                 patch('utils.cloud_file.upload_file'):
             _forecasts_query_worker(job.pk)
             query_mock.assert_called_once_with(self.project, {})
 
+        # ensure copy_forecasts_csv_for_project() is called instead on postgres
+        job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {}})
+        with patch('utils.project_queries.query_forecasts_for_project') as query_mock, \
+                patch('utils.project_queries.copy_forecasts_csv_for_project', return_value=1) as copy_mock, \
+                patch('utils.cloud_file.upload_file'):
+            _forecasts_query_worker(job.pk)
+            if connection.vendor == 'postgresql':
+                query_mock.assert_not_called()
+                copy_mock.assert_called_once()
+            else:
+                query_mock.assert_called_once_with(self.project, {})
+                copy_mock.assert_not_called()
+
         # case: upload_file() does not error
         job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {}})
         with patch('utils.cloud_file.upload_file') as upload_mock:
@@ -300,6 +540,8 @@ class ProjectQueriesTestCase(TestCase):
 
             job.refresh_from_db()
             self.assertEqual(Job.SUCCESS, job.status)
+            self.assertEqual(len(list(query_forecasts_for_project(self.project, {}))),  # includes the header
+                             job.output_json['num_rows'])
 
         # case: upload_file() errors. BotoCoreError: alt: Boto3Error, ClientError, ConnectionClosedError:
         job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {}})
@@ -319,6 +561,72 @@ class ProjectQueriesTestCase(TestCase):
         # self.assertEqual(Job.SUCCESS, job.status)
 
 
+    @unittest.skipIf(not is_parquet_available(), "pyarrow is not installed")
+    def test__query_worker_parquet(self):
+        import pyarrow.parquet
+
+
+        def uploaded_table(query_worker_fcn):
+            job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {},
+                                                                    'format': 'parquet'})
+            uploaded_bytes = []  # the worker closes its BytesIO, so we read it when it's uploaded
+            with patch('utils.cloud_file.upload_file',
+                       side_effect=lambda job, data_file: uploaded_bytes.append(data_file.read())):
+                query_worker_fcn(job.pk)
+                job.refresh_from_db()
+                self.assertEqual(Job.SUCCESS, job.status)
+                return job, pyarrow.parquet.read_table(io.BytesIO(uploaded_bytes[0]))
+
+
+        # add a forecast for a timezero before the first season starts, whose rows' season is None
+        time_zero2 = TimeZero.objects.create(project=self.project, timezero_date=datetime.date(2000, 1, 1))
+        forecast2 = Forecast.objects.create(forecast_model=self.forecast_model, source='f2', time_zero=time_zero2)
+        load_predictions_from_json_io_dict(forecast2, {'meta': {}, 'predictions': [
+            {'unit': 'location1', 'target': 'pct next week', 'class': 'point', 'prediction': {'value': 2.2}}]},
+                                           is_subset_allowed=True)
+
+        def exp_number_values(value):  # a 'number' column's value -> its (float, text) column values
+            if value in ('', None):
+                return [None, None]
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                return [float(value), None]
+            else:
+                return [None, str(value)]
+
+
+        # case: forecasts. the rows are the same as the CSV's (with '' and None -> None and typed values), with
+        # dictionary-encoded name columns, and with 'value' and 'sample' split into numeric and text columns.
+        # num_rows includes the header, as it does for the CSV
+        job, table = uploaded_table(_forecasts_query_worker)
+        exp_rows = list(query_forecasts_for_project(self.project, {}))
+        self.assertEqual(FORECAST_CSV_HEADER[:7] + ['value_text'] + FORECAST_CSV_HEADER[7:10] + ['sample_text']
+                         + FORECAST_CSV_HEADER[10:], table.column_names)
+        self.assertEqual(len(exp_rows) - 1, table.num_rows)
+        self.assertEqual(len(exp_rows), job.output_json['num_rows'])
+        self.assertIn(None, table.column('season').to_pylist())
+        self.assertNotIn('None', table.column('season').to_pylist())
+        for column_name in ['model', 'unit', 'target', 'class']:
+            self.assertTrue(pyarrow.types.is_dictionary(table.schema.field(column_name).type))
+        self.assertTrue(pyarrow.types.is_date32(table.schema.field('timezero').type))
+        for column_name in ['prob', 'value', 'sample']:
+            self.assertTrue(pyarrow.types.is_float64(table.schema.field(column_name).type))
+        self.assertIn(2.2, table.column('value').to_pylist())
+        self.assertIn('True', table.column('sample_text').to_pylist())
+        for exp_row, act_row in zip(exp_rows[1:], zip(*[table.column(i).to_pylist() for i in range(table.num_columns)])):
+            value_cols, sample_cols = exp_number_values(exp_row[6]), exp_number_values(exp_row[9])
+            exp_row = [None if value in ('', None) else value for value in exp_row]
+            exp_row[1] = datetime.date.fromisoformat(exp_row[1])
+            exp_row[7] = str(exp_row[7]) if exp_row[7] is not None else None
+            exp_row = exp_row[:6] + value_cols + exp_row[7:9] + sample_cols + exp_row[10:]
+            self.assertEqual(exp_row, list(act_row))
+
+        # case: truth
+        load_truth_data(self.project, Path('forecast_app/tests/truth_data/truths-ok.csv'), is_convert_na_none=True)
+        job, table = uploaded_table(_truth_query_worker)
+        self.assertEqual(TRUTH_CSV_HEADER + ['value_text'], table.column_names)
+        self.assertEqual(len(list(query_truth_for_project(self.project, {}))) - 1, table.num_rows)
+
+
     #
     # test truth queries
     #
@@ -557,6 +865,8 @@ class ProjectQueriesTestCase(TestCase):
 
             job.refresh_from_db()
             self.assertEqual(Job.SUCCESS, job.status)
+            self.assertEqual(len(list(query_truth_for_project(self.project, {}))),  # includes the header
+                             job.output_json['num_rows'])
 
         # case: upload_file() errors. BotoCoreError: alt: Boto3Error, ClientError, ConnectionClosedError:
         job = Job.objects.create(user=self.po_user, input_json={'project_pk': self.project.pk, 'query': {}})
@@ -1093,3 +1403,30 @@ class ProjectQueriesTestCase(TestCase):
         act_rows = list(query_forecasts_for_project(project,
                                                     {'as_of': f2.issued_at.isoformat()}))[1:]  # skip header
         self.assertEqual(sorted(exp_rows), sorted(act_rows))
+
+
+@unittest.skipIf(connection.vendor != 'postgresql', "forked pool workers cannot share sqlite's in-memory test database")
+class QueryForecastsPoolTestCase(TransactionTestCase):
+    """
+    Tests `query_forecasts_partitioned()` with a process pool. This is a TransactionTestCase because the pool's forked
+    workers open their own database connections, which means they can only see committed data.
+    """
+
+
+    def test_query_forecasts_partitioned_pool(self):
+        _, _, po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        project, time_zero, forecast_model, forecast = _make_docs_project(po_user)
+        forecast_model2 = ForecastModel.objects.create(project=project, name='docs model 2', abbreviation='docs_mod2')
+        forecast2 = Forecast.objects.create(forecast_model=forecast_model2, source='f2', time_zero=time_zero)
+        with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
+            load_predictions_from_json_io_dict(forecast2, json.load(fp), is_validate_cats=False)
+
+        # case: the same rows as the unpartitioned query, in the same order
+        exp_rows = [[str(value) for value in row] for row in query_forecasts_for_project(project, {})]
+        for is_copy in [False, True]:
+            self.assertEqual(exp_rows, list(query_forecasts_partitioned(project, {}, 2, is_copy)))
+
+        # case: a partition's error is raised in the parent
+        with self.assertRaises(RuntimeError) as context:
+            list(query_forecasts_partitioned(project, {}, 2, False, max_num_rows=1))
+        self.assertIn("number of rows exceeded maximum", str(context.exception))
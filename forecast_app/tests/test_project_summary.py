@@ -0,0 +1,116 @@
+import logging
+from pathlib import Path
+
+from django.test import TestCase
+
+from forecast_app.models import Forecast, ForecastModel, Project, ProjectSummary
+from forecast_app.tests.test_query_cache import run_on_commit_callbacks
+from utils.forecast import load_predictions_from_json_io_dict, clear_forecast_metadata
+from utils.make_minimal_projects import _make_docs_project
+from utils.project_summary import project_summary, refresh_project_summary
+from utils.project_truth import truth_batches, truth_delete_batch, load_truth_data
+from utils.utilities import get_or_create_super_po_mo_users
+
+
+logging.getLogger().setLevel(logging.ERROR)
+
+
+class ProjectSummaryTestCase(TestCase):
+    """
+    """
+
+
+    @classmethod
+    def setUpTestData(cls):
+        _, _, cls.po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        with run_on_commit_callbacks():
+            cls.project, cls.time_zero, cls.forecast_model, cls.forecast = _make_docs_project(cls.po_user)
+
+
+    def assert_summary(self, exp_summary_tuple):
+        # checks the incrementally-maintained summary, and that it matches one computed from scratch
+        def summary_tuple():
+            summary = ProjectSummary.objects.get(project=self.project)
+            return (summary.num_models, summary.num_forecasts, summary.num_rows, summary.last_update,
+                    summary.num_truth_batches, summary.truth_latest_source, summary.truth_latest_issued_at)
+
+
+        self.assertEqual(exp_summary_tuple, summary_tuple())
+        refresh_project_summary(self.project.pk)
+        self.assertEqual(exp_summary_tuple, summary_tuple())
+
+
+    def test_project_summary(self):
+        # case: created with the project and then maintained
+        batches = truth_batches(self.project)
+        exp_summary = [1, 1, 29, self.forecast.created_at, 1, 'docs-ground-truth.csv', batches[-1][1]]
+        self.assert_summary(tuple(exp_summary))
+
+        # case: a missing one (e.g., after `loaddata`) is created when needed
+        ProjectSummary.objects.filter(project=self.project).delete()
+        summary = project_summary(Project.objects.get(pk=self.project.pk))
+        self.assertEqual(tuple(exp_summary), (summary.num_models, summary.num_forecasts, summary.num_rows,
+                                              summary.last_update, summary.num_truth_batches,
+                                              summary.truth_latest_source, summary.truth_latest_issued_at))
+        self.assertIsNone(refresh_project_summary(0, is_create=False))  # no such summary
+
+        # case: a new model and a forecast with data and metadata (which is cached by the load). the updates are
+        # applied after the writer's transaction commits
+        with run_on_commit_callbacks():
+            forecast_model2 = ForecastModel.objects.create(project=self.project, name='model 2', abbreviation='m2')
+        exp_summary[0] = 2
+        self.assert_summary(tuple(exp_summary))
+
+        with run_on_commit_callbacks():
+            forecast2 = Forecast.objects.create(forecast_model=forecast_model2, source='f2', time_zero=self.time_zero)
+            load_predictions_from_json_io_dict(forecast2, {'meta': {}, 'predictions': [
+                {'unit': 'location1', 'target': 'pct next week', 'class': 'point', 'prediction': {'value': 2.2}}]},
+                                               is_subset_allowed=True)
+            self.assertEqual((1, 29), ProjectSummary.objects.filter(project=self.project)
+                             .values_list('num_forecasts', 'num_rows')
+                             .first())
+        exp_summary[1:4] = [2, 30, forecast2.created_at]
+        self.assert_summary(tuple(exp_summary))
+
+        # case: clearing metadata
+        with run_on_commit_callbacks():
+            clear_forecast_metadata(forecast2)
+        exp_summary[2] = 29
+        self.assert_summary(tuple(exp_summary))
+
+        # case: deleting the newest forecast
+        with run_on_commit_callbacks():
+            forecast2.delete()
+        exp_summary[1:4] = [1, 29, self.forecast.created_at]
+        self.assert_summary(tuple(exp_summary))
+
+        # case: truth loads and deletes
+        load_truth_data(self.project, Path('forecast_app/tests/truth_data/docs-ground-truth-non-dup.csv'),
+                        file_name='docs-ground-truth-non-dup.csv')
+        batches = truth_batches(self.project)
+        oracle_forecast = Forecast.objects.filter(forecast_model__project=self.project,
+                                                  forecast_model__is_oracle=True) \
+            .order_by('-created_at') \
+            .first()
+        exp_summary[3:] = [oracle_forecast.created_at, 2, 'docs-ground-truth-non-dup.csv', batches[-1][1]]
+        self.assert_summary(tuple(exp_summary))
+
+        truth_delete_batch(self.project, *batches[-1])
+        exp_summary[3:] = [Forecast.objects.filter(forecast_model__project=self.project)
+                               .order_by('-created_at').first().created_at, 1, 'docs-ground-truth.csv', batches[0][1]]
+        self.assert_summary(tuple(exp_summary))
+
+        # case: deleting a model
+        with run_on_commit_callbacks():
+            self.forecast_model.delete()
+        exp_summary[0:4] = [1, 0, 0, Forecast.objects.filter(forecast_model__project=self.project)
+            .order_by('-created_at').first().created_at]
+        self.assert_summary(tuple(exp_summary))
+
+        # case: new projects start out empty, and deleting a project deletes its summary
+        project2 = Project.objects.create(name='project 2')
+        self.assertEqual((0, 0, 0, None, 0), ProjectSummary.objects.filter(project=project2)
+                         .values_list('num_models', 'num_forecasts', 'num_rows', 'last_update', 'num_truth_batches')
+                         .first())
+        self.project.delete()
+        self.assertEqual([project2.pk], list(ProjectSummary.objects.values_list('project_id', flat=True)))
@@ -0,0 +1,182 @@
+import datetime
+import logging
+from contextlib import contextmanager
+from unittest.mock import patch, MagicMock
+
+from django.db import connection
+from django.test import TestCase
+from django.utils.timezone import now
+
+from forecast_app.api_views import _create_query_job, _download_job_data_request
+from forecast_app.models import Forecast, Job, QueryCacheEntry, ProjectDataVersion
+from forecast_app.models.job import JOB_TYPE_QUERY_FORECAST, JOB_TYPE_QUERY_TRUTH
+from utils.forecast import load_predictions_from_json_io_dict
+from utils.make_minimal_projects import _make_docs_project
+from utils.project_queries import validate_forecasts_query, _forecasts_query_worker
+from utils.query_cache import query_cache_key, project_data_version, evict_query_cache, bump_project_data_version
+from utils.utilities import get_or_create_super_po_mo_users
+
+
+logging.getLogger().setLevel(logging.ERROR)
+
+
+@contextmanager
+def run_on_commit_callbacks():
+    """
+    Runs the `transaction.on_commit()` callbacks that are registered in the block when it exits, which is needed because
+    TestCase's transaction never commits. NB: Django 3.2 added `TestCase.captureOnCommitCallbacks()` for this
+    """
+    num_callbacks = len(connection.run_on_commit)
+    yield
+    callbacks = [callback for _, callback in connection.run_on_commit[num_callbacks:]]
+    del connection.run_on_commit[num_callbacks:]
+    for callback in callbacks:
+        callback()
+
+
+class QueryCacheTestCase(TestCase):
+    """
+    """
+
+
+    @classmethod
+    def setUpTestData(cls):
+        _, _, cls.po_user, _, _, _, _, _ = get_or_create_super_po_mo_users(is_create_super=True)
+        cls.project, cls.time_zero, cls.forecast_model, cls.forecast = _make_docs_project(cls.po_user)
+
+
+    def test_query_cache_key(self):
+        def forecasts_key(query, query_format='csv'):
+            error_messages, validated_query = validate_forecasts_query(self.project, query)
+            self.assertEqual([], error_messages)
+            return query_cache_key(JOB_TYPE_QUERY_FORECAST, query_format, validated_query)
+
+
+        # equivalent queries have the same key: order, duplicates, and as_of's timezone do not matter
+        self.assertEqual(forecasts_key({'units': ['location1', 'location2'], 'types': ['point', 'bin']}),
+                         forecasts_key({'units': ['location2', 'location1', 'location2'],
+                                        'types': ['bin', 'point']}))
+        self.assertEqual(forecasts_key({'as_of': '2020-10-11 12:00 UTC'}),
+                         forecasts_key({'as_of': '2020-10-11 08:00-04:00'}))
+
+        # different queries, formats, and query types have different keys
+        self.assertNotEqual(forecasts_key({}), forecasts_key({'units': ['location1']}))
+        self.assertNotEqual(forecasts_key({}), forecasts_key({'as_of': '2020-10-11 12:00 UTC'}))
+        self.assertNotEqual(forecasts_key({}), forecasts_key({}, 'parquet'))
+        self.assertNotEqual(forecasts_key({}), forecasts_key({'max_samples': 1}))
+        self.assertEqual(forecasts_key({'quantiles': [0.5, 0.025], 'bin_cats': ['b', 'a']}),
+                         forecasts_key({'quantiles': [0.025, 0.5, 0.5], 'bin_cats': ['a', 'b']}))
+        self.assertNotEqual(forecasts_key({}),
+                            query_cache_key(JOB_TYPE_QUERY_TRUTH, 'csv', ([], [], [], None)))
+
+        # case: no validated query
+        self.assertIsNone(query_cache_key(JOB_TYPE_QUERY_FORECAST, 'csv', None))
+
+
+    def test_project_data_version(self):
+        self.assertFalse(ProjectDataVersion.objects.filter(project=self.project).exists())
+        self.assertEqual(0, project_data_version(self.project.pk))  # creates it
+
+        # creating an empty forecast does not change query results
+        forecast2 = Forecast.objects.create(forecast_model=self.forecast_model, source='f2', time_zero=self.time_zero)
+        self.assertEqual(0, project_data_version(self.project.pk))
+
+        # loading data, editing a forecast, deleting one, and renaming a unit do. the bumps are applied after the
+        # writer's transaction commits
+        with run_on_commit_callbacks():
+            load_predictions_from_json_io_dict(forecast2, {'meta': {}, 'predictions': [
+                {'unit': 'location1', 'target': 'pct next week', 'class': 'point', 'prediction': {'value': 2.2}}]},
+                                               is_subset_allowed=True)
+            self.assertEqual(0, project_data_version(self.project.pk))
+        self.assertEqual(1, project_data_version(self.project.pk))
+
+        forecast2.notes = 'edited'
+        with run_on_commit_callbacks():
+            forecast2.save()
+        self.assertEqual(2, project_data_version(self.project.pk))
+
+        with run_on_commit_callbacks():
+            forecast2.delete()
+        self.assertEqual(3, project_data_version(self.project.pk))
+
+        unit = self.project.units.first()
+        unit.name = unit.name + ' renamed'
+        with run_on_commit_callbacks():
+            unit.save()
+        self.assertEqual(4, project_data_version(self.project.pk))
+
+
+    @patch('django_rq.queues.Queue.enqueue')
+    def test_create_query_job_cache(self, enqueue_mock):
+        request = MagicMock(user=self.po_user)
+
+
+        def create_query_job(query):
+            _, validated_query = validate_forecasts_query(self.project, query)
+            return _create_query_job(self.project.pk, query, JOB_TYPE_QUERY_FORECAST, _forecasts_query_worker,
+                                     request, validated_query=validated_query)
+
+
+        # case: cache miss -> the job is enqueued, and running it adds an entry
+        job = create_query_job({'units': ['location1', 'location2']})
+        enqueue_mock.assert_called_once_with(_forecasts_query_worker, job.pk)
+        self.assertEqual(Job.QUEUED, job.status)
+        self.assertIn('cache_key', job.input_json)
+        with patch('utils.cloud_file.upload_file'):
+            _forecasts_query_worker(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(Job.SUCCESS, job.status)
+
+        cache_entry = QueryCacheEntry.objects.get(project=self.project)
+        self.assertEqual((job, job.input_json['cache_key'], job.output_json['num_rows']),
+                         (cache_entry.job, cache_entry.cache_key, cache_entry.num_rows))
+        self.assertTrue(cache_entry.num_bytes > 0)
+
+        # case: cache hit for an equivalent query -> the job succeeds immediately and shares the first job's file
+        enqueue_mock.reset_mock()
+        cached_job = create_query_job({'units': ['location2', 'location1']})
+        enqueue_mock.assert_not_called()
+        self.assertEqual(Job.SUCCESS, cached_job.status)
+        self.assertEqual({'num_rows': job.output_json['num_rows'], 'cached_job_pk': job.pk}, cached_job.output_json)
+        with patch('utils.cloud_file.download_file') as download_file_mock:
+            _download_job_data_request(cached_job)
+            download_file_mock.assert_called_once()
+            self.assertEqual(job.pk, download_file_mock.call_args[0][0].pk)
+
+        # case: the project's data changed -> cache miss
+        self.forecast.issued_at = self.forecast.issued_at + datetime.timedelta(seconds=1)
+        with run_on_commit_callbacks():
+            self.forecast.save()
+        job = create_query_job({'units': ['location1', 'location2']})
+        enqueue_mock.assert_called_once_with(_forecasts_query_worker, job.pk)
+
+        # case: cache disabled
+        enqueue_mock.reset_mock()
+        with patch('forecast_repo.settings.base.IS_QUERY_CACHE', False):
+            job = create_query_job({'units': ['location1', 'location2']})
+            enqueue_mock.assert_called_once_with(_forecasts_query_worker, job.pk)
+            self.assertNotIn('cache_key', job.input_json)
+
+
+    def test_evict_query_cache(self):
+        project_data_version(self.project.pk)  # creates it
+        with run_on_commit_callbacks():
+            bump_project_data_version(self.project.pk)
+        data_version = project_data_version(self.project.pk)
+        job = Job.objects.create(user=self.po_user)
+        entry_old, entry_lru, entry_mru, entry_stale = [
+            QueryCacheEntry.objects.create(project=self.project, cache_key=cache_key, data_version=version, job=job,
+                                           num_rows=1, num_bytes=100)
+            for cache_key, version in [('old', data_version), ('lru', data_version), ('mru', data_version),
+                                       ('stale', data_version - 1)]]
+        QueryCacheEntry.objects.filter(pk=entry_old.pk).update(created_at=now() - datetime.timedelta(days=2))
+        QueryCacheEntry.objects.filter(pk=entry_lru.pk).update(last_used_at=now() - datetime.timedelta(hours=1))
+
+        # case: nothing to evict except the stale entry
+        self.assertEqual(1, evict_query_cache(max_age_days=7, max_size=1000))
+        self.assertEqual({'old', 'lru', 'mru'}, set(QueryCacheEntry.objects.values_list('cache_key', flat=True)))
+
+        # case: by age, and then by size, least recently used first
+        self.assertEqual(1, evict_query_cache(max_age_days=1, max_size=1000))
+        self.assertEqual(1, evict_query_cache(max_age_days=1, max_size=150))
+        self.assertEqual({'mru'}, set(QueryCacheEntry.objects.values_list('cache_key', flat=True)))
@@ -3,12 +3,14 @@ import datetime
 import io
 import json
 import logging
+import zipfile
 from pathlib import Path
 from unittest.mock import patch
 
 from botocore.exceptions import BotoCoreError
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
@@ -20,8 +22,9 @@ from forecast_app.serializers import TargetSerializer, TimeZeroSerializer
 from forecast_app.views import _delete_forecast_worker
 from utils.cdc_io import load_cdc_csv_forecast_file, make_cdc_units_and_targets
 from utils.project import delete_project_iteratively, create_project_from_json
-from utils.project_queries import _forecasts_query_worker, _truth_query_worker
-from utils.project_truth import load_truth_data
+from utils.project_queries import _forecasts_query_worker, _truth_query_worker, FORECAST_CSV_HEADER, \
+    query_forecasts_for_project, query_truth_for_project
+from utils.project_truth import load_truth_data, TRUTH_CSV_HEADER
 from utils.utilities import YYYY_MM_DD_DATE_FORMAT, get_or_create_super_po_mo_users
 
 
@@ -1290,6 +1293,176 @@ class ViewsTestCase(TestCase):
             self.assertIn("Badly formatted 'timezero_date' form field", json_response.json()['error'])
 
 
+    def test_api_upload_forecasts_bulk(self):
+        # to avoid the requirement of RQ, redis, and S3, we patch _upload_file() to return (is_error, job)
+        # with desired return args
+        zip_bytes_io = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes_io, 'w') as zip_file:
+            zip_file.writestr('f1.json', '{"predictions": []}')
+            zip_file.writestr('f2.json', '{"predictions": []}')
+        zip_bytes = zip_bytes_io.getvalue()
+        tz1_str = self.public_tz1.timezero_date.strftime(YYYY_MM_DD_DATE_FORMAT)
+        tz2_str = self.public_tz2.timezero_date.strftime(YYYY_MM_DD_DATE_FORMAT)
+        manifest = [{'filename': 'f1.json', 'timezero_date': tz1_str},
+                    {'filename': 'f2.json', 'timezero_date': tz2_str, 'notes': 'some notes'}]
+        with patch('forecast_app.views._upload_file') as upload_file_mock:
+            upload_bulk_url = reverse('api-forecast-bulk-upload', args=[str(self.public_model.pk)])
+
+            # case: not authorized
+            json_response = self.client.post(upload_bulk_url, {
+                'Authorization': f'JWT {self._authenticate_jwt_user(self.non_staff_user, self.non_staff_user_password)}',
+                'data_file': SimpleUploadedFile('file.zip', zip_bytes),
+                'manifest': json.dumps(manifest),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_403_FORBIDDEN, json_response.status_code)
+
+            # case: no 'data_file'
+            jwt_token = self._authenticate_jwt_user(self.mo_user, self.mo_user_password)
+            json_response = self.client.post(upload_bulk_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'manifest': json.dumps(manifest),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertEqual({'error': "No 'data_file' form field."}, json_response.json())
+
+            # case: 'data_file' not an archive
+            json_response = self.client.post(upload_bulk_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'data_file': SimpleUploadedFile('file.csv', b'file_content', content_type='text/csv'),
+                'manifest': json.dumps(manifest),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertIn("Invalid 'data_file' form field", json_response.json()['error'])
+
+            # case: no 'manifest'
+            json_response = self.client.post(upload_bulk_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'data_file': SimpleUploadedFile('file.zip', zip_bytes),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertEqual({'error': "No 'manifest' form field."}, json_response.json())
+
+            # case: bad manifests
+            for bad_manifest, exp_error in [
+                ('x[', "Badly formatted 'manifest' form field"),
+                ('[]', "'manifest' form field was not a non-empty list"),
+                ('[{"filename": "f1.json"}]', "'manifest' form field was not a non-empty list"),
+                (json.dumps([manifest[0], manifest[0]]), "'manifest' form field had duplicate filenames"),
+                (json.dumps([{'filename': 'f3.json', 'timezero_date': tz1_str}]), "file not found in archive"),
+                (json.dumps([{'filename': 'f1.json', 'timezero_date': 'x20171202'}]),
+                 "Badly formatted 'manifest' 'timezero_date'"),
+                (json.dumps([{'filename': 'f1.json', 'timezero_date': '2017-12-03'}]),  # NOT public_tz1 or public_tz2
+                 "TimeZero not found for 'manifest' 'timezero_date'"),
+            ]:
+                json_response = self.client.post(upload_bulk_url, {
+                    'Authorization': f'JWT {jwt_token}',
+                    'data_file': SimpleUploadedFile('file.zip', zip_bytes),
+                    'manifest': bad_manifest,
+                }, format='multipart')
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+                self.assertIn(exp_error, json_response.json()['error'])
+            upload_file_mock.assert_not_called()
+
+            # case: blue sky: _upload_file() -> NOT is_error
+            upload_file_mock.return_value = False, Job.objects.create()  # is_error, job
+            json_response = self.client.post(upload_bulk_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'data_file': SimpleUploadedFile('file.zip', zip_bytes),
+                'manifest': json.dumps(manifest),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            call_dict = upload_file_mock.call_args[1]
+            self.assertEqual(self.public_model.pk, call_dict['forecast_model_pk'])
+            self.assertEqual([{'filename': 'f1.json', 'timezero_pk': self.public_tz1.pk, 'notes': ''},
+                              {'filename': 'f2.json', 'timezero_pk': self.public_tz2.pk, 'notes': 'some notes'}],
+                             call_dict['manifest'])
+
+            # case: _upload_file() -> is_error
+            upload_file_mock.return_value = True, None  # is_error, job
+            json_response = self.client.post(upload_bulk_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'data_file': SimpleUploadedFile('file.zip', zip_bytes),
+                'manifest': json.dumps(manifest),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertIn("There was an error uploading the file", json_response.json()['error'])
+
+
+    def test_api_validate_forecast(self):
+        validate_url = reverse('api-forecast-validate', args=[str(self.public_model.pk)])
+        ok_pred_dict = {"unit": "HHS Region 1", "target": "Season peak percentage", "class": "point",
+                        "prediction": {"value": 2.1}}
+        bad_pred_dict = {"unit": "bad unit", "target": "Season peak percentage", "class": "point",
+                         "prediction": {"value": 2.1}}
+        num_forecasts = Forecast.objects.count()
+        with patch('forecast_app.views._upload_file') as upload_file_mock:
+            # case: not authorized
+            json_response = self.client.post(validate_url, {
+                'Authorization': f'JWT {self._authenticate_jwt_user(self.non_staff_user, self.non_staff_user_password)}',
+                'data_file': SimpleUploadedFile('file.json', json.dumps({'predictions': [ok_pred_dict]}).encode()),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_403_FORBIDDEN, json_response.status_code)
+
+            # case: no 'data_file'
+            jwt_token = self._authenticate_jwt_user(self.mo_user, self.mo_user_password)
+            json_response = self.client.post(validate_url, {'Authorization': f'JWT {jwt_token}'}, format='multipart')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertEqual({'error': "No 'data_file' form field."}, json_response.json())
+
+            # case: not JSON or csv
+            for file_name, exp_message in [('file.json', "data_file was not valid JSON"),
+                                           ('file.csv', "data_file was not valid csv")]:
+                json_response = self.client.post(validate_url, {
+                    'Authorization': f'JWT {jwt_token}',
+                    'data_file': SimpleUploadedFile(file_name, b'file_content'),
+                }, format='multipart')
+                self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+                self.assertFalse(json_response.json()['is_valid'])
+                self.assertIn(exp_message, json_response.json()['errors'][0]['message'])
+
+            # case: csv files are validated like JSON ones
+            csv_header = ','.join(FORECAST_CSV_HEADER)
+            for unit_name, exp_is_valid in [('HHS Region 1', True), ('bad unit', False)]:
+                json_response = self.client.post(validate_url, {
+                    'Authorization': f'JWT {jwt_token}',
+                    'data_file': SimpleUploadedFile('file.csv', f"{csv_header}\nm,2017-01-01,s,{unit_name},"
+                                                                f"Season peak percentage,point,2.1,,,,,,,,\n".encode()),
+                }, format='multipart')
+                self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+                self.assertEqual(exp_is_valid, json_response.json()['is_valid'])
+
+            # case: cats are not validated, as for uploads
+            with patch('utils.forecast.validation_errors_for_json_io_dict', return_value=[]) as validation_mock:
+                self.client.post(validate_url, {
+                    'Authorization': f'JWT {jwt_token}',
+                    'data_file': SimpleUploadedFile('file.json', json.dumps({'predictions': [ok_pred_dict]}).encode()),
+                }, format='multipart')
+                self.assertFalse(validation_mock.call_args[1]['is_validate_cats'])
+
+            # case: valid
+            json_response = self.client.post(validate_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'data_file': SimpleUploadedFile('file.json', json.dumps({'predictions': [ok_pred_dict]}).encode()),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertEqual({'is_valid': True, 'errors': []}, json_response.json())
+
+            # case: invalid. all errors are reported
+            json_response = self.client.post(validate_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'data_file': SimpleUploadedFile('file.json', json.dumps(
+                    {'predictions': [bad_pred_dict, ok_pred_dict, dict(bad_pred_dict, unit='bad unit 2')]}).encode()),
+            }, format='multipart')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertFalse(json_response.json()['is_valid'])
+            self.assertEqual([0, 2], [error['index'] for error in json_response.json()['errors']])
+            self.assertIn("prediction_dict referred to an undefined Unit", json_response.json()['errors'][0]['message'])
+
+            # nothing was uploaded or loaded
+            upload_file_mock.assert_not_called()
+            self.assertEqual(num_forecasts, Forecast.objects.count())
+
+
     @patch('rq.queue.Queue.enqueue')
     def test_api_forecast_queries(self, enqueue_mock):
         forecast_queries_url = reverse('api-forecast-queries', args=[str(self.public_project.pk)])
@@ -1326,6 +1499,156 @@ class ViewsTestCase(TestCase):
 
         self.assertEqual(status.HTTP_200_OK, json_response.status_code)
         self.assertEqual(Job.QUEUED, response_json['status'])
+        self.assertNotIn('format', Job.objects.get(pk=response_json['id']).input_json)
+
+        # case: invalid 'format'
+        json_response = self.client.post(forecast_queries_url, {
+            'Authorization': f'JWT {jwt_token}',
+            'query': {},
+            'format': 'xlsx',
+        }, format='json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+        self.assertIn("Invalid 'format'", json_response.json()['error'])
+
+        # case: 'parquet' format, with and without pyarrow installed
+        with patch('forecast_app.api_views.is_parquet_available', return_value=False):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'format': 'parquet',
+            }, format='json')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertIn("format is not available", json_response.json()['error'])
+
+        with patch('forecast_app.api_views.is_parquet_available', return_value=True):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'format': 'parquet',
+            }, format='json')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertEqual('parquet', Job.objects.get(pk=json_response.json()['id']).input_json['format'])
+
+        # case: invalid 'dry_run'
+        json_response = self.client.post(forecast_queries_url, {
+            'Authorization': f'JWT {jwt_token}',
+            'query': {},
+            'dry_run': 'yes',
+        }, format='json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+        self.assertIn("'dry_run' was not a boolean", json_response.json()['error'])
+
+        # case: 'dry_run' returns the estimate without creating a Job. the actual estimate is tested in
+        # test_project_queries.py
+        enqueue_mock.reset_mock()
+        num_jobs = Job.objects.count()
+        estimate = {'num_elements': 10, 'num_rows': 20, 'num_bytes': 1000}
+        with patch('utils.project_queries.estimate_forecasts_query', return_value=estimate) as estimate_mock:
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'dry_run': True,
+            }, format='json')
+            estimate_mock.assert_called_once()
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertEqual({'estimate': estimate}, json_response.json())
+            enqueue_mock.assert_not_called()
+            self.assertEqual(num_jobs, Job.objects.count())
+
+        # case: queries with more rows than MAX_NUM_QUERY_ROWS but few enough elements are not rejected, because the
+        # limit is on elements
+        with patch('utils.project_queries.estimate_forecasts_query', return_value=estimate), \
+                patch('forecast_repo.settings.base.MAX_NUM_QUERY_ROWS', 9):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+            }, format='json')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            enqueue_mock.assert_called_once()
+
+        # case: obviously oversized queries are rejected
+        enqueue_mock.reset_mock()
+        with patch('utils.project_queries.estimate_forecasts_query', return_value=estimate), \
+                patch('forecast_repo.settings.base.MAX_NUM_QUERY_ROWS', 4):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+            }, format='json')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertIn("Query is too large", json_response.json()['error'])
+            enqueue_mock.assert_not_called()
+
+        # case: 'sync' for a small query streams the CSV without creating a Job. the query runs with postgres's timeouts
+        enqueue_mock.reset_mock()
+        num_jobs = Job.objects.count()
+        with patch('forecast_app.api_views._set_local_query_timeouts') as set_timeouts_mock:
+            response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'sync': True,
+            }, format='json')
+            self.assertEqual(1 if connection.vendor == 'postgresql' else 0, set_timeouts_mock.call_count)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual('text/csv', response['Content-Type'])
+        csv_rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(FORECAST_CSV_HEADER, csv_rows[0])
+        self.assertEqual(len(list(query_forecasts_for_project(self.public_project, {}))), len(csv_rows))
+        enqueue_mock.assert_not_called()
+        self.assertEqual(num_jobs, Job.objects.count())
+
+        # case: 'sync' for a large query falls back to a Job
+        with patch('utils.project_queries.estimate_forecasts_query', return_value=estimate), \
+                patch('forecast_repo.settings.base.QUERY_SYNC_MAX_ROWS', 19):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'sync': True,
+            }, format='json')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertEqual(Job.QUEUED, json_response.json()['status'])
+            enqueue_mock.assert_called_once()
+
+        # case: 'sync' for a large query whose estimate is too small (e.g., b/c its metadata is not cached) also falls
+        # back to a Job
+        enqueue_mock.reset_mock()
+        with patch('utils.project_queries.estimate_forecasts_query',
+                   return_value={'num_elements': 0, 'num_rows': 0, 'num_bytes': 0}), \
+                patch('forecast_repo.settings.base.QUERY_SYNC_MAX_ROWS', 1):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'sync': True,
+            }, format='json')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertEqual(Job.QUEUED, json_response.json()['status'])
+            enqueue_mock.assert_called_once()
+
+        # case: 'sync' for a query that times out also falls back to a Job
+        enqueue_mock.reset_mock()
+        with patch('utils.project_queries.query_forecasts_for_project',
+                   side_effect=OperationalError('canceling statement due to statement timeout')):
+            json_response = self.client.post(forecast_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'sync': True,
+            }, format='json')
+            self.assertEqual(status.HTTP_200_OK, json_response.status_code)
+            self.assertEqual(Job.QUEUED, json_response.json()['status'])
+            enqueue_mock.assert_called_once()
+
+        # case: invalid 'sync'
+        for sync, query_format, exp_error in [('yes', 'csv', "'sync' was not a boolean"),
+                                              (True, 'parquet', "'sync' requires the 'csv' format")]:
+            with patch('forecast_app.api_views.is_parquet_available', return_value=True):
+                json_response = self.client.post(forecast_queries_url, {
+                    'Authorization': f'JWT {jwt_token}',
+                    'query': {},
+                    'format': query_format,
+                    'sync': sync,
+                }, format='json')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+            self.assertIn(exp_error, json_response.json()['error'])
 
         # case: unauthenticated user (authenticated tested above)
         self.client.logout()  # AnonymousUser
@@ -1375,6 +1698,39 @@ class ViewsTestCase(TestCase):
         self.assertEqual(status.HTTP_200_OK, json_response.status_code)
         self.assertEqual(Job.QUEUED, response_json['status'])
 
+        # case: 'dry_run' is not supported
+        json_response = self.client.post(truth_queries_url, {
+            'Authorization': f'JWT {jwt_token}',
+            'query': {},
+            'dry_run': True,
+        }, format='json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, json_response.status_code)
+        self.assertIn("'dry_run' is not supported", json_response.json()['error'])
+
+        # case: 'sync' streams small queries and falls back to a Job for ones with more than QUERY_SYNC_MAX_ROWS rows
+        enqueue_mock.reset_mock()
+        num_truth_rows = len(list(query_truth_for_project(self.public_project, {}))) - 1
+        response = self.client.post(truth_queries_url, {
+            'Authorization': f'JWT {jwt_token}',
+            'query': {},
+            'sync': True,
+        }, format='json')
+        self.assertTrue(response.streaming)
+        csv_rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([TRUTH_CSV_HEADER] + [[str(value) for value in row]
+                                               for row in list(query_truth_for_project(self.public_project, {}))[1:]],
+                         csv_rows)
+        enqueue_mock.assert_not_called()
+
+        with patch('forecast_repo.settings.base.QUERY_SYNC_MAX_ROWS', num_truth_rows - 1):
+            json_response = self.client.post(truth_queries_url, {
+                'Authorization': f'JWT {jwt_token}',
+                'query': {},
+                'sync': True,
+            }, format='json')
+            self.assertEqual(Job.QUEUED, json_response.json()['status'])
+            enqueue_mock.assert_called_once()
+
         # case: unauthenticated user (authenticated tested above)
         self.client.logout()  # AnonymousUser
         json_response = self.client.post(truth_queries_url, {
@@ -1416,6 +1772,15 @@ class ViewsTestCase(TestCase):
             response = self.client.get(job_data_download_url)
             download_file_mock.assert_called_once()
             self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual('text/csv', response['Content-Type'])
+            self.assertIn('.csv"', response['Content-Disposition'])
+
+            # case: a 'parquet' format job
+            parquet_job = Job.objects.create(user=self.po_user, input_json={'query': {}, 'format': 'parquet'})
+            response = self.client.get(reverse('api-job-data-download', args=[parquet_job.pk]))
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual('application/vnd.apache.parquet', response['Content-Type'])
+            self.assertIn('.parquet"', response['Content-Disposition'])
 
             # case: authorized: self.po_user
             self._authenticate_jwt_user(self.po_user, self.po_user_password)
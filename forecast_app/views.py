@@ -1,7 +1,9 @@
 import enum
 import json
 import logging
+import os
 from collections import defaultdict
+from pathlib import Path
 
 import django
 import django_rq
@@ -22,20 +24,21 @@ from django.views.generic import DetailView, ListView
 from rq.timeouts import JobTimeoutException
 
 from forecast_app.forms import ProjectForm, ForecastModelForm, UserModelForm, UserPasswordChangeForm, QueryForm
-from forecast_app.models import Project, ForecastModel, Forecast, TimeZero, Unit, Target, ForecastMetaPrediction, \
-    PredictionElement
+from forecast_app.models import Project, ForecastModel, Forecast, TimeZero, Unit, Target, PredictionElement
 from forecast_app.models.job import Job, JOB_TYPE_DELETE_FORECAST, JOB_TYPE_UPLOAD_TRUTH, \
     JOB_TYPE_UPLOAD_FORECAST, JOB_TYPE_QUERY_FORECAST, JOB_TYPE_QUERY_TRUTH
 from forecast_app.models.prediction_element import PRED_CLASS_INT_TO_NAME
 from forecast_repo.settings.base import S3_BUCKET_PREFIX, UPLOAD_FILE_QUEUE_NAME, DELETE_FORECAST_QUEUE_NAME, \
-    MAX_NUM_QUERY_ROWS, MAX_UPLOAD_FILE_SIZE
+    MAX_NUM_QUERY_ROWS, MAX_UPLOAD_FILE_SIZE, MAX_FORECAST_UPLOAD_FILE_SIZE
 from utils.forecast import data_rows_from_forecast, is_forecast_metadata_available, forecast_metadata, \
     forecast_metadata_counts_for_project
 from utils.project import config_dict_from_project, create_project_from_json, group_targets, unit_rows_for_project, \
     models_summary_table_rows_for_project, target_rows_for_project, latest_forecast_ids_for_project
 from utils.project_diff import project_config_diff, database_changes_for_project_config_diff, Change, \
     execute_project_config_diff, order_project_config_diff
-from utils.project_queries import _forecasts_query_worker, _truth_query_worker
+from utils.project_queries import _forecasts_query_worker, _truth_query_worker, validate_forecasts_query, \
+    validate_truth_query
+from utils.project_summary import project_summary
 from utils.project_truth import is_truth_data_loaded, oracle_model_for_project, truth_batches, \
     truth_batch_summary_table, truth_delete_batch
 from utils.utilities import YYYY_MM_DD_DATE_FORMAT
@@ -65,15 +68,16 @@ def about(request):
 
 
 def projects(request):
-    # we cache Project.last_update() to avoid duplicate calls. recall last_update can be None.
-    # per https://stackoverflow.com/questions/19868767/how-do-i-sort-a-list-with-nones-last
-    projects_last_updates = sorted([(project, project.last_update()) for project in Project.objects.all()
-                                    if is_user_ok_view_project(request.user, project)],
-                                   reverse=True, key=lambda _: (_[1] is not None, _[1]))
+    # we get each project's counts and last update from its ProjectSummary, which is loaded in the same query. recall
+    # last_update can be None. per https://stackoverflow.com/questions/19868767/how-do-i-sort-a-list-with-nones-last
+    projects_qs = Project.objects.select_related('summary', 'owner').prefetch_related('model_owners')
+    projects_summaries = sorted([(project, project_summary(project)) for project in projects_qs
+                                 if is_user_ok_view_project(request.user, project)],
+                                reverse=True, key=lambda _: (_[1].last_update is not None, _[1].last_update))
 
     # list of 4-tuples: (project, num_models, num_forecasts, num_rows_exact):
-    projects_info = [(project_last_update[0], *project_summary_info(project_last_update[0]))
-                     for project_last_update in projects_last_updates]
+    projects_info = [(project, summary.num_models, summary.num_forecasts, summary.num_rows)
+                     for project, summary in projects_summaries]
     return render(
         request,
         'projects.html',
@@ -83,24 +87,6 @@ def projects(request):
                  'num_private_projects': len(Project.objects.filter(is_public=False))})
 
 
-def project_summary_info(project):
-    """
-    Helper for views showing project summary information like # models, # forecasts, and # rows.
-
-    :param project: a Project
-    :return a 3-tuple: (num_models, num_forecasts, num_rows_exact). num_rows_exact is None if no exact count is
-        available
-    """
-    # set num_rows_exact. note that ideally we would verify that every Forecast in all of project's models has a
-    # ForecastMetaPrediction, but for simplicity we simply sum them all, which will be zero if none are present. this
-    # case cannot be differentiated from the one where there are ForecastMetaPredictions but their counts are all zero,
-    # but that seems unlikely
-    num_rows_exact = sum([sum([fmp.point_count, fmp.named_count, fmp.bin_count, fmp.sample_count, fmp.quantile_count])
-                          for fmp in ForecastMetaPrediction.objects.filter(forecast__forecast_model__project=project,
-                                                                           forecast__forecast_model__is_oracle=False)])
-    return (*project.num_models_forecasts(), num_rows_exact)
-
-
 #
 # ---- admin-related view functions ----
 #
@@ -127,6 +113,7 @@ def zadmin(request):
                  's3_bucket_prefix': S3_BUCKET_PREFIX,
                  'max_num_query_rows': MAX_NUM_QUERY_ROWS,
                  'max_upload_file_size': MAX_UPLOAD_FILE_SIZE,
+                 'max_forecast_upload_file_size': MAX_FORECAST_UPLOAD_FILE_SIZE,
                  'projects_sort_pk': projects_sort_pk})
 
 
@@ -324,8 +311,13 @@ def query_project(request, project_pk, query_type):
             query_worker_fcn = {QueryType.FORECASTS: _forecasts_query_worker,
                                 QueryType.TRUTH: _truth_query_worker,
                                 }[query_type]
+            query_validation_fcn = {QueryType.FORECASTS: validate_forecasts_query,
+                                    QueryType.TRUTH: validate_truth_query,
+                                    }[query_type]
             query = json.loads(cleaned_query_data)
-            job = _create_query_job(project_pk, query, query_job_type, query_worker_fcn, request)
+            _, validated_query = query_validation_fcn(project, query)  # for the query cache
+            job = _create_query_job(project_pk, query, query_job_type, query_worker_fcn, request,
+                                    validated_query=validated_query)
             messages.success(request, f"Query has been submitted.")
             return redirect('job-detail', pk=job.pk)
     else:  # GET (or any other method): create the default form
@@ -752,7 +744,7 @@ class ProjectDetailView(UserPassesTestMixin, DetailView):
         target_groups = sorted([(group_name, sorted(target_list, key=lambda target: target.name))
                                 for group_name, target_list in target_groups.items()],
                                key=lambda _: _[0])  # [(group_name, group_targets), ...]
-        batches = truth_batches(project)
+        summary = project_summary(project)
         context = super().get_context_data(**kwargs)
         context['models_rows'] = models_summary_table_rows_for_project(project)
         context['is_user_ok_edit_project'] = is_user_ok_edit_project(self.request.user, project)
@@ -764,10 +756,11 @@ class ProjectDetailView(UserPassesTestMixin, DetailView):
         context['is_truth_data_loaded'] = is_truth_data_loaded(project)
 
         # num_batches, latest_batch_source, latest_batch_timezero:
-        context['truth_batch_info'] = len(batches), batches[-1][0] if batches else None, \
-                                      batches[-1][1] if batches else None
+        context['truth_batch_info'] = summary.num_truth_batches, summary.truth_latest_source, \
+                                      summary.truth_latest_issued_at
 
-        context['project_summary_info'] = project_summary_info(project)  # num_models, num_forecasts, num_rows_exact
+        # num_models, num_forecasts, num_rows_exact. the last is zero if no metadata is cached
+        context['project_summary_info'] = summary.num_models, summary.num_forecasts, summary.num_rows
         return context
 
 
@@ -973,17 +966,15 @@ class ForecastDetailView(UserPassesTestMixin, DetailView):
             is a 2-tuple: (PRED_CLASS_INT_TO_NAME, count)
         """
         forecast = self.get_object()
-        forecast_meta_prediction, forecast_meta_unit_qs, forecast_meta_target_qs = forecast_metadata(forecast)
+        forecast_meta_prediction, unit_qs, target_qs = forecast_metadata(forecast)
         pred_type_count_pairs = [
             (PRED_CLASS_INT_TO_NAME[PredictionElement.BIN_CLASS], forecast_meta_prediction.bin_count),
             (PRED_CLASS_INT_TO_NAME[PredictionElement.NAMED_CLASS], forecast_meta_prediction.named_count),
             (PRED_CLASS_INT_TO_NAME[PredictionElement.POINT_CLASS], forecast_meta_prediction.point_count),
             (PRED_CLASS_INT_TO_NAME[PredictionElement.SAMPLE_CLASS], forecast_meta_prediction.sample_count),
             (PRED_CLASS_INT_TO_NAME[PredictionElement.QUANTILE_CLASS], forecast_meta_prediction.quantile_count)]
-        found_units = [forecast_meta_unit.unit for forecast_meta_unit
-                       in forecast_meta_unit_qs.select_related('unit')]
-        found_targets = [forecast_meta_target.target for forecast_meta_target
-                         in forecast_meta_target_qs.select_related('target')]
+        found_units = list(unit_qs.order_by('id'))
+        found_targets = list(target_qs.order_by('id'))
         return pred_type_count_pairs, found_units, found_targets
 
 
@@ -1222,7 +1213,8 @@ def upload_forecast(request, forecast_model_pk, timezero_pk):
     if not is_user_ok_upload_forecast(request, forecast_model):
         return HttpResponseForbidden(render(request, '403.html').content)
 
-    is_error = validate_data_file(request)  # 'data_file' in request.FILES, data_file.size <= MAX_UPLOAD_FILE_SIZE
+    # 'data_file' in request.FILES, data_file.size <= MAX_FORECAST_UPLOAD_FILE_SIZE
+    is_error = validate_data_file(request, MAX_FORECAST_UPLOAD_FILE_SIZE)
     if is_error:
         return is_error
 
@@ -1259,14 +1251,28 @@ def _upload_forecast_worker(job_pk):
     An _upload_file() enqueue() function that loads a forecast data file. Called by upload_forecast(). It is passed an
     empty Forecast's id to load into. Deletes that forecast if there were errors loading the data.
 
+    Files at least CHUNKED_LOAD_MIN_FILE_SIZE in size are streamed (see `prediction_dicts_from_json_io_file()`) rather
+    than read into memory, and are staged in chunks (see `stage_prediction_dicts_chunked()`) that are checkpointed to
+    the Job. They are then published in the same transaction that marks the Job as successful. If the worker is killed
+    then re-running this function with the same job_pk (e.g., by requeuing its RQ job) resumes from the last
+    checkpoint. NB: timeouts and errors still delete the forecast.
+
+    Files whose 'filename' ends in '.csv' are parsed as forecast csv files (see `prediction_dicts_from_forecast_csv()`)
+    rather than JSON. They are always streamed and staged in chunks.
+
     - Expected Job.input_json key(s): 'forecast_pk', 'filename' - passed to _upload_file()
-    - Saves Job.output_json key(s): 'forecast_pk' (passed through from input_json for API caller convenience)
+    - Saves Job.output_json key(s): 'forecast_pk' (passed through from input_json for API caller convenience), and
+      `stage_prediction_dicts_chunked()`'s checkpoint if chunked
 
     :param job_pk: the Job's pk
     """
     # imported here so that tests can patch via mock:
     from forecast_app.models.job import job_cloud_file
-    from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata
+    from forecast_repo.settings.base import CHUNKED_LOAD_CHUNK_SIZE, CHUNKED_LOAD_MIN_FILE_SIZE
+    from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata, \
+        is_forecast_metadata_available, prediction_dicts_from_json_io_file, stage_prediction_dicts_chunked, \
+        publish_staged_predictions
+    from utils.forecast_csv import prediction_dicts_from_forecast_csv
 
 
     with job_cloud_file(job_pk) as (job, cloud_file_fp):
@@ -1294,17 +1300,32 @@ def _upload_forecast_worker(job_pk):
         forecast.source = job.input_json['filename']
         forecast.save()
         try:
-            with transaction.atomic():
+            notes = job.input_json.get('notes', '')
+            is_csv = Path(job.input_json['filename']).suffix.lower() == '.csv'
+            is_chunked = is_csv or (os.fstat(cloud_file_fp.fileno()).st_size >= CHUNKED_LOAD_MIN_FILE_SIZE)
+            if is_chunked:  # NB: not in the transaction below b/c each chunk is committed as it's staged
+                logger.debug(f"_upload_forecast_worker(): 1/4 streaming prediction dicts. is_csv={is_csv}. "
+                             f"forecast={forecast}. job={job}")
+                prediction_dicts = prediction_dicts_from_forecast_csv(forecast.forecast_model.project, cloud_file_fp) \
+                    if is_csv else prediction_dicts_from_json_io_file(cloud_file_fp)
+                logger.debug(f"_upload_forecast_worker(): 2/4 staging predictions. job={job}")
+                stage_prediction_dicts_chunked(forecast, prediction_dicts, job, CHUNKED_LOAD_CHUNK_SIZE,
+                                               is_validate_cats=False)
+            else:
                 logger.debug(f"_upload_forecast_worker(): 1/4 loading json_io_dict. forecast={forecast}. job={job}")
-                notes = job.input_json.get('notes', '')
                 json_io_dict = json.load(cloud_file_fp)
 
-                logger.debug(f"_upload_forecast_worker(): 2/4 loading predictions. job={job}")
-                load_predictions_from_json_io_dict(forecast, json_io_dict, is_validate_cats=False)  # transaction.atomic
+            with transaction.atomic():
+                if is_chunked:
+                    publish_staged_predictions(forecast)  # transaction.atomic
+                else:
+                    logger.debug(f"_upload_forecast_worker(): 2/4 loading predictions. job={job}")
+                    load_predictions_from_json_io_dict(forecast, json_io_dict, is_validate_cats=False)  # atomic
 
                 logger.debug(f"_upload_forecast_worker(): 3/4 caching metadata. job={job}")
-                cache_forecast_metadata(forecast)  # transaction.atomic
-                job.output_json = {'forecast_pk': forecast_pk}
+                if not is_forecast_metadata_available(forecast):  # o/w cached incrementally by the load
+                    cache_forecast_metadata(forecast)  # transaction.atomic
+                job.output_json = {**(job.output_json or {}), 'forecast_pk': forecast_pk}
                 job.status = Job.SUCCESS
                 job.save()
                 logger.debug(f"_upload_forecast_worker(): 4/4 done. job={job}")
@@ -1322,6 +1343,58 @@ def _upload_forecast_worker(job_pk):
             logger.error(job.failure_message + f". job={job}")
 
 
+def _upload_forecasts_bulk_worker(job_pk):
+    """
+    An _upload_file() enqueue() function that loads an archive of forecast data files. Called by
+    `api_views.upload_forecasts_bulk()`. Each file is loaded into a new Forecast in its own transaction, so the Job
+    fails only if at least one file could not be loaded, in which case the others were still loaded.
+
+    - Expected Job.input_json key(s): 'forecast_model_pk', 'manifest', 'filename' - passed to _upload_file()
+    - Saves Job.output_json key(s): 'forecasts' - a list of per-file status dicts as returned by
+      `load_forecast_archive()`
+
+    :param job_pk: the Job's pk
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_app.models.job import job_cloud_file
+    from forecast_repo.settings.base import BULK_UPLOAD_POOL_SIZE
+    from utils.forecast_archive import load_forecast_archive
+
+
+    with job_cloud_file(job_pk) as (job, cloud_file_fp):
+        for input_key in ['forecast_model_pk', 'manifest']:
+            if input_key not in job.input_json:
+                job.status = Job.FAILED
+                job.failure_message = f"_upload_forecasts_bulk_worker(): error: missing '{input_key}'"
+                job.save()
+                logger.error(job.failure_message + f". job={job}")
+                return
+
+        forecast_model = ForecastModel.objects.filter(pk=job.input_json['forecast_model_pk']).first()
+        if not forecast_model:
+            job.status = Job.FAILED
+            job.failure_message = f"_upload_forecasts_bulk_worker(): error: no ForecastModel found for " \
+                                  f"forecast_model_pk={job.input_json['forecast_model_pk']}"
+            job.save()
+            logger.error(job.failure_message + f". job={job}")
+            return
+
+        # NB: cloud_file_fp is a TextIOWrapper, but archives are binary
+        logger.debug(f"_upload_forecasts_bulk_worker(): 1/2 loading archive. job={job}")
+        file_statuses = load_forecast_archive(forecast_model, cloud_file_fp.buffer, job.input_json['manifest'],
+                                              BULK_UPLOAD_POOL_SIZE)
+        num_failed = len([file_status for file_status in file_statuses if file_status['status'] != 'SUCCESS'])
+        job.output_json = {'forecasts': file_statuses}
+        if num_failed:
+            job.status = Job.FAILED
+            job.failure_message = f"_upload_forecasts_bulk_worker(): error: {num_failed} of {len(file_statuses)} " \
+                                  f"files failed to load. see output_json for details"
+        else:
+            job.status = Job.SUCCESS
+        job.save()
+        logger.debug(f"_upload_forecasts_bulk_worker(): 2/2 done. num_failed={num_failed}. job={job}")
+
+
 def delete_forecast(request, forecast_pk):
     """
     Enqueues the deletion of a Forecast, returning a Job for it. Assumes that confirmation has already been given by the
@@ -1471,10 +1544,12 @@ def _upload_file(user, data_file, process_job_fcn, **kwargs):
     return False, job
 
 
-def validate_data_file(request):
+def validate_data_file(request, max_upload_file_size=MAX_UPLOAD_FILE_SIZE):
     """
     An upload_*() helper function that checks the file in request.
 
+    :param request: the request
+    :param max_upload_file_size: the maximum allowed file size
     :return is_error: True if there was an error, and False o/w. If true, it is actually a render()'d error message to
         return from the calling view function
     """
@@ -1484,8 +1559,8 @@ def validate_data_file(request):
                                'message': "No file selected to upload. Please go back and select one."})
 
     data_file = request.FILES['data_file']
-    if data_file.size > MAX_UPLOAD_FILE_SIZE:
-        message = "File was too large to upload. size={}, max={}.".format(data_file.size, MAX_UPLOAD_FILE_SIZE)
+    if data_file.size > max_upload_file_size:
+        message = "File was too large to upload. size={}, max={}.".format(data_file.size, max_upload_file_size)
         return render(request, 'message.html',
                       context={'title': "Error uploading file.",
                                'message': message})
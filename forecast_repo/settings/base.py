@@ -302,3 +302,171 @@ if 'MAX_UPLOAD_FILE_SIZE' in os.environ:
         raise RuntimeError(
             f"base.py: MAX_UPLOAD_FILE_SIZE config var could not be coerced to float: "
             f"{max_upload_file_size_value!r}")
+
+# used by the forecast upload methods instead of MAX_UPLOAD_FILE_SIZE. it can be larger b/c large forecast files are
+# streamed and loaded in chunks rather than read into memory - see CHUNKED_LOAD_MIN_FILE_SIZE
+MAX_FORECAST_UPLOAD_FILE_SIZE = 100E+06
+
+if 'MAX_FORECAST_UPLOAD_FILE_SIZE' in os.environ:
+    max_forecast_upload_file_size_value = os.environ.get('MAX_FORECAST_UPLOAD_FILE_SIZE')
+    try:
+        MAX_FORECAST_UPLOAD_FILE_SIZE = float(max_forecast_upload_file_size_value)
+    except ValueError:
+        raise RuntimeError(
+            f"base.py: MAX_FORECAST_UPLOAD_FILE_SIZE config var could not be coerced to float: "
+            f"{max_forecast_upload_file_size_value!r}")
+
+# used by the bulk forecast upload API to limit the size of the uploaded archive. NB: each file within it is limited to
+# MAX_UPLOAD_FILE_SIZE (uncompressed)
+MAX_BULK_UPLOAD_FILE_SIZE = 100E+06
+
+if 'MAX_BULK_UPLOAD_FILE_SIZE' in os.environ:
+    max_bulk_upload_file_size_value = os.environ.get('MAX_BULK_UPLOAD_FILE_SIZE')
+    try:
+        MAX_BULK_UPLOAD_FILE_SIZE = float(max_bulk_upload_file_size_value)
+    except ValueError:
+        raise RuntimeError(
+            f"base.py: MAX_BULK_UPLOAD_FILE_SIZE config var could not be coerced to float: "
+            f"{max_bulk_upload_file_size_value!r}")
+
+# number of processes that the bulk forecast upload worker uses to load an archive's files. 1 loads them serially in
+# the worker's own process
+BULK_UPLOAD_POOL_SIZE = 1
+
+if 'BULK_UPLOAD_POOL_SIZE' in os.environ:
+    bulk_upload_pool_size_value = os.environ.get('BULK_UPLOAD_POOL_SIZE')
+    try:
+        BULK_UPLOAD_POOL_SIZE = int(bulk_upload_pool_size_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: BULK_UPLOAD_POOL_SIZE config var could not be coerced to int: "
+                           f"{bulk_upload_pool_size_value!r}")
+
+# forecast files at least this large are streamed by `_upload_forecast_worker()` and loaded in chunks (see
+# `prediction_dicts_from_json_io_file()` and `stage_prediction_dicts_chunked()`) rather than in a single transaction
+CHUNKED_LOAD_MIN_FILE_SIZE = 5E+06
+
+if 'CHUNKED_LOAD_MIN_FILE_SIZE' in os.environ:
+    chunked_load_min_file_size_value = os.environ.get('CHUNKED_LOAD_MIN_FILE_SIZE')
+    try:
+        CHUNKED_LOAD_MIN_FILE_SIZE = float(chunked_load_min_file_size_value)
+    except ValueError:
+        raise RuntimeError(
+            f"base.py: CHUNKED_LOAD_MIN_FILE_SIZE config var could not be coerced to float: "
+            f"{chunked_load_min_file_size_value!r}")
+
+# the number of prediction dicts in each of those chunks
+CHUNKED_LOAD_CHUNK_SIZE = 20_000
+
+if 'CHUNKED_LOAD_CHUNK_SIZE' in os.environ:
+    chunked_load_chunk_size_value = os.environ.get('CHUNKED_LOAD_CHUNK_SIZE')
+    try:
+        CHUNKED_LOAD_CHUNK_SIZE = int(chunked_load_chunk_size_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: CHUNKED_LOAD_CHUNK_SIZE config var could not be coerced to int: "
+                           f"{chunked_load_chunk_size_value!r}")
+
+# the number of rows that `server_side_cursor()` fetches from postgres at a time, i.e., the psycopg2 named cursor's
+# itersize. 0 disables server-side cursors, which means that results are fetched all at once, as they are on sqlite
+SERVER_SIDE_CURSOR_ITERSIZE = 2000
+
+if 'SERVER_SIDE_CURSOR_ITERSIZE' in os.environ:
+    server_side_cursor_itersize_value = os.environ.get('SERVER_SIDE_CURSOR_ITERSIZE')
+    try:
+        SERVER_SIDE_CURSOR_ITERSIZE = int(server_side_cursor_itersize_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: SERVER_SIDE_CURSOR_ITERSIZE config var could not be coerced to int: "
+                           f"{server_side_cursor_itersize_value!r}")
+
+# number of processes that the forecast query worker runs a query's partitions in (see `query_forecasts_partitioned()`).
+# 1 runs the whole query in the worker's own process
+QUERY_POOL_SIZE = 1
+
+if 'QUERY_POOL_SIZE' in os.environ:
+    query_pool_size_value = os.environ.get('QUERY_POOL_SIZE')
+    try:
+        QUERY_POOL_SIZE = int(query_pool_size_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: QUERY_POOL_SIZE config var could not be coerced to int: "
+                           f"{query_pool_size_value!r}")
+
+# whether the forecast query worker has postgres write the query's CSV via `COPY ... TO STDOUT` (see
+# `copy_forecasts_csv_for_project()`) rather than building its rows in Python. ignored on sqlite
+IS_QUERY_CSV_COPY = True
+
+if 'IS_QUERY_CSV_COPY' in os.environ:
+    is_query_csv_copy_value = os.environ.get('IS_QUERY_CSV_COPY')
+    if is_query_csv_copy_value.lower() not in ['true', 'false']:
+        raise RuntimeError(f"base.py: IS_QUERY_CSV_COPY config var was not 'true' or 'false': "
+                           f"{is_query_csv_copy_value!r}")
+
+    IS_QUERY_CSV_COPY = is_query_csv_copy_value.lower() == 'true'
+
+# whether query Jobs reuse the output file of an earlier Job that ran the same normalized query against the same
+# project data (see `query_cache_key()` and ProjectDataVersion) rather than re-running the query
+IS_QUERY_CACHE = True
+
+if 'IS_QUERY_CACHE' in os.environ:
+    is_query_cache_value = os.environ.get('IS_QUERY_CACHE')
+    if is_query_cache_value.lower() not in ['true', 'false']:
+        raise RuntimeError(f"base.py: IS_QUERY_CACHE config var was not 'true' or 'false': {is_query_cache_value!r}")
+
+    IS_QUERY_CACHE = is_query_cache_value.lower() == 'true'
+
+# the number of days after which `evict_query_cache()` removes query cache entries, regardless of use
+QUERY_CACHE_MAX_AGE_DAYS = 7
+
+if 'QUERY_CACHE_MAX_AGE_DAYS' in os.environ:
+    query_cache_max_age_days_value = os.environ.get('QUERY_CACHE_MAX_AGE_DAYS')
+    try:
+        QUERY_CACHE_MAX_AGE_DAYS = float(query_cache_max_age_days_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: QUERY_CACHE_MAX_AGE_DAYS config var could not be coerced to float: "
+                           f"{query_cache_max_age_days_value!r}")
+
+# the total size (bytes) of the query cache's files above which `evict_query_cache()` removes the least recently used
+# entries
+QUERY_CACHE_MAX_SIZE = 10E+09
+
+if 'QUERY_CACHE_MAX_SIZE' in os.environ:
+    query_cache_max_size_value = os.environ.get('QUERY_CACHE_MAX_SIZE')
+    try:
+        QUERY_CACHE_MAX_SIZE = float(query_cache_max_size_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: QUERY_CACHE_MAX_SIZE config var could not be coerced to float: "
+                           f"{query_cache_max_size_value!r}")
+
+# the RQ job timeout (seconds) for each project's `forecast_metadata_util.py rebuild` job. this is much longer than the
+# queues' DEFAULT_TIMEOUT because a large project's rebuild can take a long time
+REBUILD_FORECAST_METADATA_JOB_TIMEOUT = 4 * 60 * 60
+
+if 'REBUILD_FORECAST_METADATA_JOB_TIMEOUT' in os.environ:
+    rebuild_forecast_metadata_job_timeout_value = os.environ.get('REBUILD_FORECAST_METADATA_JOB_TIMEOUT')
+    try:
+        REBUILD_FORECAST_METADATA_JOB_TIMEOUT = int(rebuild_forecast_metadata_job_timeout_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: REBUILD_FORECAST_METADATA_JOB_TIMEOUT config var could not be coerced to int: "
+                           f"{rebuild_forecast_metadata_job_timeout_value!r}")
+
+# the maximum number of projects whose compiled validation schemas each process caches. the least recently used ones are
+# removed first. see `validation_schema_for_project()`
+VALIDATION_SCHEMA_CACHE_MAX_SIZE = 32
+
+if 'VALIDATION_SCHEMA_CACHE_MAX_SIZE' in os.environ:
+    validation_schema_cache_max_size_value = os.environ.get('VALIDATION_SCHEMA_CACHE_MAX_SIZE')
+    try:
+        VALIDATION_SCHEMA_CACHE_MAX_SIZE = int(validation_schema_cache_max_size_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: VALIDATION_SCHEMA_CACHE_MAX_SIZE config var could not be coerced to int: "
+                           f"{validation_schema_cache_max_size_value!r}")
+
+# the maximum number of rows (estimated for forecast queries) that a query endpoint request with 'sync' set returns
+# directly as a streamed CSV response. larger queries fall back to creating a Job. see `_sync_query_rows()`
+QUERY_SYNC_MAX_ROWS = 10_000
+
+if 'QUERY_SYNC_MAX_ROWS' in os.environ:
+    query_sync_max_rows_value = os.environ.get('QUERY_SYNC_MAX_ROWS')
+    try:
+        QUERY_SYNC_MAX_ROWS = int(query_sync_max_rows_value)
+    except ValueError:
+        raise RuntimeError(f"base.py: QUERY_SYNC_MAX_ROWS config var could not be coerced to int: "
+                           f"{query_sync_max_rows_value!r}")
@@ -0,0 +1,102 @@
+import json
+import time
+from pathlib import Path
+
+import click
+import django
+
+
+# set up django. must be done before loading models. NB: requires DJANGO_SETTINGS_MODULE to be set
+django.setup()
+
+from django.db import connection, transaction
+
+from forecast_app.models import PredictionElement
+from forecast_app.models.prediction_element import DATA_HASH_SCHEMES
+
+
+#
+# ---- application----
+#
+
+@click.command()
+@click.argument('forecast_json_file', type=click.Path(file_okay=True, exists=True))
+@click.option('--repeat', type=click.INT, default=5, help="number of times to time each operation. best is reported")
+@click.option('--num-rows', type=click.INT, default=1_000_000, help="number of rows in each dedup join table")
+def benchmark_data_hash_app(forecast_json_file, repeat, num_rows):
+    """
+    App that compares the DATA_HASH_SCHEMES used for PredictionElement.data_hash. Reports: 1) the per-element cost of
+    encoding and hashing FORECAST_JSON_FILE's prediction dicts with each scheme, and 2) the time to find duplicates via
+    the same kind of join that `_insert_pred_ele_rows()` does, comparing the original varchar(32) data_hash column to
+    the current uuid one. (2) is Postgres-only b/c SQLite stores both as text.
+    """
+    with open(Path(forecast_json_file)) as forecast_json_fp:
+        prediction_datas = [prediction_dict['prediction'] for prediction_dict
+                            in json.load(forecast_json_fp)['predictions']]
+    click.echo(f"* hashing. # prediction dicts={len(prediction_datas)}, repeat={repeat}")
+
+    # 'md5+dumps' is how we originally loaded: hash a sort_keys dump, and then separately dump the dict for storage
+    def md5_and_dumps():
+        for prediction_data in prediction_datas:
+            PredictionElement.hash_for_prediction_data_dict(prediction_data, 'md5')
+            json.dumps(prediction_data)
+
+
+    _echo_timing('md5+dumps', _best_time(md5_and_dumps, repeat), len(prediction_datas))
+    for scheme_name in DATA_HASH_SCHEMES:
+        def json_and_hash():
+            for prediction_data in prediction_datas:
+                PredictionElement.json_and_hash_for_prediction_data_dict(prediction_data, scheme_name)
+
+
+        _echo_timing(scheme_name, _best_time(json_and_hash, repeat), len(prediction_datas))
+
+    if connection.vendor != 'postgresql':
+        click.echo(f"* skipping dedup join: not Postgres. vendor={connection.vendor!r}")
+        return
+
+    click.echo(f"* dedup join. num_rows={num_rows}, repeat={repeat}")
+    for hash_type, hash_expr in [('varchar(32)', 'md5(i::text)'), ('uuid', 'md5(i::text)::uuid')]:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # half of the load rows are duplicates of existing ones
+            cursor.execute(f"""
+                CREATE TEMP TABLE bench_existing ON COMMIT DROP AS
+                SELECT {hash_expr}::{hash_type} AS data_hash FROM generate_series(1, %s) AS i;
+            """, (num_rows,))
+            cursor.execute("CREATE INDEX ON bench_existing (data_hash);")
+            cursor.execute(f"""
+                CREATE TEMP TABLE bench_load ON COMMIT DROP AS
+                SELECT {hash_expr}::{hash_type} AS data_hash FROM generate_series(%s, %s) AS i;
+            """, (num_rows // 2 + 1, num_rows // 2 + num_rows))
+            cursor.execute("ANALYZE bench_existing; ANALYZE bench_load;")
+
+
+            def dedup_join():
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM bench_load
+                    WHERE EXISTS(SELECT 1 FROM bench_existing WHERE bench_existing.data_hash = bench_load.data_hash);
+                """)
+                cursor.fetchone()
+
+
+            _echo_timing(hash_type, _best_time(dedup_join, repeat), num_rows)
+    click.echo("* done")
+
+
+def _best_time(func, repeat):
+    best_time = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        elapsed_time = time.perf_counter() - start_time
+        best_time = elapsed_time if best_time is None else min(best_time, elapsed_time)
+    return best_time
+
+
+def _echo_timing(label, elapsed_time, num_items):
+    click.echo(f"  {label}: {elapsed_time:.3f}s total, {elapsed_time / num_items * 1e6:.2f}us per item")
+
+
+if __name__ == '__main__':
+    benchmark_data_hash_app()
@@ -10,7 +10,7 @@ from django.db import transaction
 from forecast_app.models import PredictionElement
 from forecast_app.models.forecast import Forecast
 from forecast_app.models.prediction_element import PRED_CLASS_INT_TO_NAME
-from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata
+from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata, is_forecast_metadata_available
 from utils.project import _validate_and_create_units, _validate_and_create_targets
 from utils.utilities import YYYY_MM_DD_DATE_FORMAT
 
@@ -61,7 +61,8 @@ def load_cdc_csv_forecast_file(season_start_year, forecast_model, cdc_csv_file_p
     with open(cdc_csv_file_path) as cdc_csv_file_fp:
         json_io_dict = json_io_dict_from_cdc_csv_file(season_start_year, cdc_csv_file_fp)
         load_predictions_from_json_io_dict(new_forecast, json_io_dict, is_validate_cats=False)  # atomic
-        cache_forecast_metadata(new_forecast)  # atomic
+        if not is_forecast_metadata_available(new_forecast):  # o/w cached incrementally by the load
+            cache_forecast_metadata(new_forecast)  # atomic
     return new_forecast
 
 
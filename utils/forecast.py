@@ -1,21 +1,29 @@
 import csv
 import datetime
 import io
+import itertools
 import json
 import logging
 import math
-from collections import defaultdict
+import operator
+import re
+from collections import OrderedDict, defaultdict, namedtuple
+from types import MappingProxyType
 
 from django.db import connection, transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 
-from forecast_app.models import Forecast, Target, ForecastMetaPrediction, ForecastMetaUnit, ForecastMetaTarget, \
-    ForecastModel, PredictionElement, PredictionData
-from forecast_app.models.prediction_element import PRED_CLASS_NAME_TO_INT, PRED_CLASS_INT_TO_NAME
+from forecast_app.models import Forecast, Target, ForecastMetaPrediction, ForecastModel, PredictionElement, \
+    PredictionData, StagedPredictionElement, TargetCat, TargetRange, CurrentPredictionElement, Project, \
+    ProjectSchemaVersion, Unit
+from forecast_app.models.forecast_metadata import bitset_to_mask, count_mask_ids, ids_to_mask
+from forecast_app.models.prediction_element import PRED_CLASS_NAME_TO_INT, PRED_CLASS_INT_TO_NAME, RETRACT_DATA_HASH
 from utils.project import _target_dict_for_target
 from utils.project_queries import _query_forecasts_sql_for_pred_class
-from utils.project_truth import POSTGRES_NULL_VALUE
-from utils.utilities import YYYY_MM_DD_DATE_FORMAT, batched_rows
+from utils.project_summary import refresh_project_summary
+from utils.query_cache import bump_project_data_version
+from utils.utilities import YYYY_MM_DD_DATE_FORMAT, batched_rows, server_side_cursor
 
 
 logger = logging.getLogger(__name__)
@@ -60,10 +68,11 @@ def json_io_dict_from_forecast(forecast, request, is_include_retract=False):
     # args: pred_classes, model_ids, unit_ids, target_ids, timezero_ids, as_of, is_exclude_oracle:
     unit_id_to_obj = {unit.pk: unit for unit in forecast.forecast_model.project.units.all()}
     target_id_to_obj = {target.pk: target for target in forecast.forecast_model.project.targets.all()}
-    sql = _query_forecasts_sql_for_pred_class([], [forecast.forecast_model.pk], [], [], [forecast.time_zero.pk],
-                                              forecast.issued_at, False, is_include_retract)
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (forecast.forecast_model.project.pk,))
+    sql, sql_params = _query_forecasts_sql_for_pred_class([], [forecast.forecast_model.pk], [], [],
+                                                          [forecast.time_zero.pk], _as_of_for_forecast(forecast),
+                                                          False, is_include_retract)
+    with server_side_cursor() as cursor:
+        cursor.execute(sql, [forecast.forecast_model.project.pk] + sql_params)
         # counterintuitively must use json.loads per https://code.djangoproject.com/ticket/31991
         prediction_dicts = [
             {'unit': unit_id_to_obj[unit_id].name,
@@ -77,12 +86,150 @@ def json_io_dict_from_forecast(forecast, request, is_include_retract=False):
     return {'meta': meta, 'predictions': sorted(prediction_dicts, key=lambda _: (_['unit'], _['target']))}
 
 
+def _as_of_for_forecast(forecast):
+    """
+    A helper for functions that query `forecast`'s merged versions. Returns the `as_of` to pass to
+    `_query_forecasts_sql_for_pred_class()` for them: None if `forecast` is the newest version of its
+    (forecast_model, time_zero), in which case its data is exactly what the CurrentPredictionElement table has, and
+    `forecast.issued_at` o/w.
+
+    :param forecast: a Forecast
+    """
+    is_newer_versions = Forecast.objects.filter(forecast_model_id=forecast.forecast_model_id,
+                                                time_zero_id=forecast.time_zero_id,
+                                                issued_at__gt=forecast.issued_at).exists()
+    return forecast.issued_at if is_newer_versions else None
+
+
+#
+# ProjectValidationSchema
+#
+
+class TargetSchema(namedtuple('TargetSchema', ['pk', 'name', 'type', 'range_tuple', 'cats_values', 'named_families',
+                                               'is_binary'])):
+    """
+    An immutable snapshot of the Target information that's needed to validate prediction dicts, so that validation
+    does not have to query the database for each prediction. Fields:
+
+    - pk, name, type: from the Target
+    - range_tuple: as returned by Target.range_tuple(): a 2-tuple ordered by min, max, or None if no range
+    - cats_values: a frozenset of Target.cats_values(). datetime.date instances for date targets (i.e., pre-parsed)
+    - named_families: a frozenset of the NamedData.FAMILY_CHOICES that are valid for the Target's type
+    - is_binary: True if the Target is a binary one
+    """
+    __slots__ = ()
+
+
+class ProjectValidationSchema(namedtuple('ProjectValidationSchema', ['project_pk', 'unit_name_to_pk',
+                                                                     'target_name_to_schema'])):
+    """
+    An immutable, compiled snapshot of a Project's Units and Targets that's used to validate prediction dicts with no
+    database access. Instances are built and cached by validation_schema_for_project(). Fields:
+
+    - project_pk: the Project's pk
+    - unit_name_to_pk: a read-only dict that maps Unit.name -> Unit.pk
+    - target_name_to_schema: a read-only dict that maps Target.name -> TargetSchema
+    """
+    __slots__ = ()
+
+
+# caches validation_schema_for_project(). maps Project.pk -> (ProjectSchemaVersion.version, ProjectValidationSchema),
+# ordered from least to most recently used. NB: this cache is per-process, which is why each entry is only used if its
+# version matches the project's current one: clear_validation_schema_cache() removes the entry from this process and
+# bumps the version for all others
+_PROJECT_PK_TO_VALIDATION_SCHEMA = OrderedDict()
+
+
+def validation_schema_for_project(project):
+    """
+    Returns a ProjectValidationSchema for `project`, compiling and caching it if necessary. Compiling takes a fixed
+    number of queries regardless of how many Targets and cats `project` has. Checking the cache takes one query (of the
+    project's ProjectSchemaVersion), which forecast and truth loads do not change. At most
+    VALIDATION_SCHEMA_CACHE_MAX_SIZE projects are cached, and the least recently used ones are removed first.
+
+    :param project: a Project
+    :return: a ProjectValidationSchema
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import VALIDATION_SCHEMA_CACHE_MAX_SIZE
+
+
+    # NB: we get the version before compiling so that a change made while compiling makes the entry stale
+    schema_version = ProjectSchemaVersion.objects.filter(project_id=project.pk) \
+        .values_list('version', flat=True) \
+        .first()
+    if schema_version is None:
+        schema_version = ProjectSchemaVersion.objects.get_or_create(project_id=project.pk)[0].version
+    cached_version, validation_schema = _PROJECT_PK_TO_VALIDATION_SCHEMA.get(project.pk, (None, None))
+    if cached_version == schema_version:
+        _PROJECT_PK_TO_VALIDATION_SCHEMA.move_to_end(project.pk)
+        return validation_schema
+
+    # ranges. recall that Target.range_tuple() picks the first non-None of value_i and value_f, and that ranges have
+    # exactly two TargetRanges
+    target_id_to_range_vals = defaultdict(list)  # target_id -> [value1, value2]
+    for target_id, value_i, value_f in TargetRange.objects.filter(target__project=project) \
+            .values_list('target_id', 'value_i', 'value_f'):
+        target_id_to_range_vals[target_id].append(Target.first_non_none_value(value_i, value_f, None, None, None))
+
+    # cats. like Target.cats_values() we use only the field corresponding to the Target's preferred data type
+    data_type_to_cat_idx = {Target.INTEGER_DATA_TYPE: 0, Target.FLOAT_DATA_TYPE: 1, Target.TEXT_DATA_TYPE: 2,
+                            Target.DATE_DATA_TYPE: 3, Target.BOOLEAN_DATA_TYPE: 4}
+    target_id_to_cat_rows = defaultdict(list)  # target_id -> [(cat_i, cat_f, cat_t, cat_d, cat_b), ...]
+    for target_id, *cat_row in TargetCat.objects.filter(target__project=project) \
+            .values_list('target_id', 'cat_i', 'cat_f', 'cat_t', 'cat_d', 'cat_b'):
+        target_id_to_cat_rows[target_id].append(cat_row)
+
+    target_name_to_schema = {}
+    for target in project.targets.all():
+        range_vals = target_id_to_range_vals[target.pk]
+        cat_idx = data_type_to_cat_idx[target.data_types()[0]]  # the first is the preferred one
+        named_families = [family_abbrev for family_abbrev in NamedData.FAMILY_CHOICES
+                          if Target.is_valid_named_family_for_target_type(family_abbrev, target.type)]
+        target_name_to_schema[target.name] = TargetSchema(
+            pk=target.pk, name=target.name, type=target.type,
+            range_tuple=(min(range_vals), max(range_vals)) if range_vals else None,
+            cats_values=frozenset(cat_row[cat_idx] for cat_row in target_id_to_cat_rows[target.pk]),
+            named_families=frozenset(named_families),
+            is_binary=target.type == Target.BINARY_TARGET_TYPE)
+
+    unit_name_to_pk = {name: pk for name, pk in project.units.values_list('name', 'id')}
+    validation_schema = ProjectValidationSchema(project_pk=project.pk,
+                                                unit_name_to_pk=MappingProxyType(unit_name_to_pk),
+                                                target_name_to_schema=MappingProxyType(target_name_to_schema))
+    _PROJECT_PK_TO_VALIDATION_SCHEMA[project.pk] = (schema_version, validation_schema)
+    _PROJECT_PK_TO_VALIDATION_SCHEMA.move_to_end(project.pk)
+    while len(_PROJECT_PK_TO_VALIDATION_SCHEMA) > VALIDATION_SCHEMA_CACHE_MAX_SIZE:
+        _PROJECT_PK_TO_VALIDATION_SCHEMA.popitem(last=False)
+    return validation_schema
+
+
+def clear_validation_schema_cache(project_pk=None):
+    """
+    Invalidates validation_schema_for_project()'s cache. Called when a Project's Units or Targets change.
+
+    :param project_pk: the pk of the Project whose schema should be removed. its ProjectSchemaVersion is also bumped so
+        that other processes' caches are invalidated. NB: uses an UPDATE rather than an upsert so that it is safe to
+        call while the project is being deleted. pass None to remove all Projects' from this process's cache only
+    """
+    if project_pk is None:
+        _PROJECT_PK_TO_VALIDATION_SCHEMA.clear()
+    else:
+        _PROJECT_PK_TO_VALIDATION_SCHEMA.pop(project_pk, None)
+        ProjectSchemaVersion.objects.filter(project_id=project_pk).update(version=F('version') + 1)
+
+
 #
 # load_predictions_from_json_io_dict()
 #
 
 BIN_SUM_REL_TOL = 0.001  # hard-coded magic number for prediction probability sums
 
+# prediction classes that `_validated_pred_ele_rows_for_pred_dicts()` validates in batches if is_batch_validation
+BATCHED_PRED_CLASS_NAMES = (PRED_CLASS_INT_TO_NAME[PredictionElement.BIN_CLASS],
+                            PRED_CLASS_INT_TO_NAME[PredictionElement.SAMPLE_CLASS],
+                            PRED_CLASS_INT_TO_NAME[PredictionElement.QUANTILE_CLASS])
+
 
 @transaction.atomic
 def load_predictions_from_json_io_dict(forecast, json_io_dict, is_skip_validation=False, is_validate_cats=True,
@@ -116,6 +263,29 @@ def load_predictions_from_json_io_dict(forecast, json_io_dict, is_skip_validatio
     :param is_subset_allowed: controls whether `_is_pred_eles_subset_prev_versions()` is called:
         True: don't call, False: do call.
     """
+    _validate_forecast_and_json_io_dict(forecast, json_io_dict)  # raises o/w
+
+    # we have two types of tables to insert into (PredictionElement and PredictionData). we load both in a single pass:
+    # 1) iterate over incoming prediction dicts, validating them and generating staging rows that contain both the
+    #    PredictionElement columns and the serialized PredictionData
+    # 2) bulk-load those rows into a staging table and let the database fill both tables from it using set-based
+    #    INSERT ... SELECTs. NB: `_insert_pred_ele_rows()` does some rule validation b/c it needs the staging table of
+    #    the incoming forecast's prediction elements to work with
+    pred_ele_rows = _validated_pred_ele_rows_for_pred_dicts(forecast, json_io_dict['predictions'], is_skip_validation,
+                                                            is_validate_cats)
+    del json_io_dict  # hopefully frees up memory
+    # raises. tests version rules then inserts, deleting any dups first
+    _insert_pred_ele_rows(forecast, pred_ele_rows, is_subset_allowed)
+
+
+def _validate_forecast_and_json_io_dict(forecast, json_io_dict):
+    """
+    Does the validation that's common to all loading functions.
+
+    :param forecast: the Forecast being loaded into
+    :param json_io_dict: the "JSON IO dict" being loaded
+    :raises RuntimeError: if `forecast` is not empty or `json_io_dict` is not a dict with non-empty 'predictions'
+    """
     if forecast.pred_eles.count() != 0:
         raise RuntimeError(f"cannot load data into a non-empty forecast: {forecast}")
     elif not isinstance(json_io_dict, dict):
@@ -125,36 +295,9 @@ def load_predictions_from_json_io_dict(forecast, json_io_dict, is_skip_validatio
     elif not json_io_dict['predictions']:  # validate the rule: "cannot load empty data"
         raise RuntimeError(f"cannot load empty data")
 
-    # we have two types of tables to insert into (PredictionElement and PredictionData), which requires loading via two
-    # passes:
-    # 1) iterate over incoming prediction dicts, validating them and generating rows to insert into the
-    #    PredictionElement table
-    # 2) load those just-inserted rows from the database so we can get their PRIMARY KEY (autoincrement) ids, and then
-    #    re-iterate over prediction dict data (cached in memory) to generate rows to insert into the PredictionData
-    #    table
-
-    # pass 1/2. NB: `_insert_pred_ele_rows()` does some rule validation b/c it creates a temp table of the incoming
-    # forecast's prediction elements to work with
-    data_hash_to_pred_data, pred_ele_rows = \
-        _validated_pred_ele_rows_for_pred_dicts(forecast, json_io_dict['predictions'], is_skip_validation,
-                                                is_validate_cats)
-    del json_io_dict  # hopefully frees up memory
-    # raises. tests version rules then inserts, deleting any dups first
-    _insert_pred_ele_rows(forecast, pred_ele_rows, is_subset_allowed)
 
-    # pass 2/2
-    pred_data_rows = []  # appended-to next
-    pred_ele_qs = PredictionElement.objects \
-        .filter(forecast=forecast, is_retract=False) \
-        .values_list('id', 'data_hash')
-    for pred_ele_id, data_hash in pred_ele_qs.iterator():
-        prediction_data = data_hash_to_pred_data[data_hash]
-        pred_data_rows.append((pred_ele_id, prediction_data))
-    if pred_data_rows:
-        _insert_pred_data_rows(pred_data_rows)  # pred_ele_id, prediction_data
-
-
-def _validated_pred_ele_rows_for_pred_dicts(forecast, prediction_dicts, is_skip_validation, is_validate_cats):
+def _validated_pred_ele_rows_for_pred_dicts(forecast, prediction_dicts, is_skip_validation, is_validate_cats,
+                                            is_batch_validation=True):
     """
     Validates prediction_dicts and returns a list of rows suitable for bulk-loading into the PredictionElement table.
 
@@ -163,116 +306,163 @@ def _validated_pred_ele_rows_for_pred_dicts(forecast, prediction_dicts, is_skip_
         json_io_dict_from_cdc_csv_file()
     :param is_skip_validation: same as load_predictions_from_json_io_dict()
     :param is_validate_cats: ""
-    :return: a 2-tuple: (data_hash_to_pred_data, pred_ele_rows):
-        data_hash_to_pred_data: a dict that maps data_hash -> prediction_data. does not include if is_retract (None)
-        pred_ele_rows: a list of 6-tuples: (forecast_id, pred_class_int, unit_id, target_id, is_retract, data_hash)
+    :param is_batch_validation: controls how bin, sample, and quantile prediction dicts are validated. True: they are
+        grouped by class and target and then validated together (see `_is_valid_batched_prediction_dicts()`). False:
+        they are validated one at a time. either way, the error raised is the one for the first invalid prediction
+        dict
+    :return: pred_ele_rows: a list of 7-tuples: (forecast_id, pred_class_int, unit_id, target_id, is_retract, data_hash,
+        data_json) where data_json is the prediction's data serialized to JSON, or None if is_retract
     """
-    unit_name_to_obj = {unit.name: unit for unit in forecast.forecast_model.project.units.all()}
-    target_name_to_obj = {target.name: target for target in forecast.forecast_model.project.targets.all()}
+    validation_schema = validation_schema_for_project(forecast.forecast_model.project)
+    unit_name_to_pk = validation_schema.unit_name_to_pk
+    target_name_to_schema = validation_schema.target_name_to_schema
 
     # this variable helps to do "prediction"-level validations at the end of this function. it maps 2-tuples to a list
     # of prediction classes (strs):
     loc_targ_to_pred_classes = defaultdict(list)  # (unit_name, target_name) -> [prediction_class1, ...]
 
-    data_hash_to_pred_data = {}  # return value. filled next
-    pred_ele_rows = []  # ""
-    for prediction_dict in prediction_dicts:
-        unit_name = prediction_dict['unit']
-        target_name = prediction_dict['target']
-        pred_class = prediction_dict['class']
-        prediction_data = prediction_dict['prediction']  # None if a "retracted" prediction -> insert a single NULL row
-        is_retract = prediction_data is None
-        loc_targ_to_pred_classes[(unit_name, target_name)].append(pred_class)
-        if not is_skip_validation:
-            # validate prediction class, and unit and target names (applies to all prediction classes)
-            if unit_name not in unit_name_to_obj:
-                raise RuntimeError(f"prediction_dict referred to an undefined Unit. unit_name={unit_name!r}. "
-                                   f"existing_unit_names={unit_name_to_obj.keys()}")
-            elif target_name not in target_name_to_obj:
-                raise RuntimeError(f"prediction_dict referred to an undefined Target. target_name={target_name!r}. "
-                                   f"existing_target_names={target_name_to_obj.keys()}")
-
-            if pred_class not in PRED_CLASS_NAME_TO_INT:
-                raise RuntimeError(f"invalid pred_class: {pred_class!r}. must be one of: "
-                                   f"{list(PRED_CLASS_INT_TO_NAME.values())}. "
-                                   f"prediction_dict={prediction_dict}")
+    # these variables are used if is_batch_validation. we keep the batched prediction dicts in their original order so
+    # that we can report the first invalid one
+    batched_pred_dict_schemas = []  # [(prediction_dict, target_schema), ...]
+    class_target_to_pred_dicts = defaultdict(list)  # (pred_class, target_name) -> [prediction_dict1, ...]
 
-            # do class-specific validation
-            target = target_name_to_obj[target_name]
-            if (pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.BIN_CLASS]) \
-                    and not is_retract:
-                _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target)  # raises o/w
-            elif (pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.NAMED_CLASS]) \
-                    and not is_retract:
-                family_abbrev = prediction_data['family']
-                _validate_named_prediction_dict(family_abbrev, prediction_dict, target)  # raises o/w
-            elif (pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.POINT_CLASS]) \
-                    and not is_retract:
-                _validate_point_prediction_dict(prediction_dict, target, prediction_data['value'])  # raises o/w
-            elif (pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.SAMPLE_CLASS]) \
-                    and not is_retract:
-                _validate_sample_prediction_dict(prediction_dict, target)  # raises o/w
-            elif not is_retract:  # pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.QUANTILE_CLASS]:
-                _validate_quantile_prediction_dict(prediction_dict, target)  # raises o/w
-
-        # valid, so update data_hash_to_pred_data and append the row. we store '' if is_retract b/c there is no
-        # PredictionData and therefore no hash
-        data_hash = PredictionElement.hash_for_prediction_data_dict(prediction_data) if not is_retract else ''
-        if not is_retract:
-            data_hash_to_pred_data[data_hash] = prediction_data
-        pred_ele_rows.append((forecast.pk, PRED_CLASS_NAME_TO_INT[pred_class],
-                              unit_name_to_obj[unit_name].pk, target_name_to_obj[target_name].pk,
-                              is_retract, data_hash))
+    pred_ele_rows = []  # return value. filled next
+    try:
+        for prediction_dict in prediction_dicts:
+            unit_name = prediction_dict['unit']
+            target_name = prediction_dict['target']
+            pred_class = prediction_dict['class']
+            prediction_data = prediction_dict['prediction']  # None if a "retracted" prediction -> insert one NULL row
+            is_retract = prediction_data is None
+            loc_targ_to_pred_classes[(unit_name, target_name)].append(pred_class)
+            if not is_skip_validation:
+                # validate prediction class, and unit and target names (applies to all prediction classes)
+                _validate_prediction_dict_names(prediction_dict, validation_schema)  # raises o/w
+
+                # do class-specific validation, either now or later in a batch
+                target_schema = target_name_to_schema[target_name]
+                if is_retract:
+                    pass
+                elif is_batch_validation and (pred_class in BATCHED_PRED_CLASS_NAMES):
+                    batched_pred_dict_schemas.append((prediction_dict, target_schema))
+                    class_target_to_pred_dicts[(pred_class, target_name)].append(prediction_dict)
+                else:
+                    _validate_prediction_dict(is_validate_cats, prediction_dict, target_schema)  # raises o/w
+
+            # valid, so append the row. we store RETRACT_DATA_HASH if is_retract b/c there is no PredictionData and
+            # therefore no hash. o/w we store the same canonical json that was hashed, which saves encoding it twice
+            data_json, data_hash = PredictionElement.json_and_hash_for_prediction_data_dict(prediction_data) \
+                if not is_retract else (None, RETRACT_DATA_HASH)
+            pred_ele_rows.append((forecast.pk, PRED_CLASS_NAME_TO_INT[pred_class],
+                                  unit_name_to_pk[unit_name], target_name_to_schema[target_name].pk,
+                                  is_retract, data_hash, data_json))
+    except RuntimeError:
+        # a batched prediction dict that came before the invalid one might itself be invalid, in which case it's the
+        # one to report
+        for prediction_dict, target_schema in batched_pred_dict_schemas:
+            _validate_prediction_dict(is_validate_cats, prediction_dict, target_schema)  # raises o/w
+        raise
+
+    # validate the batched prediction dicts. if a batch is invalid then we re-validate one at a time (in their original
+    # order) to get the error for the first invalid prediction dict
+    if not all(_is_valid_batched_prediction_dicts(is_validate_cats, pred_class, pred_dicts,
+                                                  target_name_to_schema[target_name])
+               for (pred_class, target_name), pred_dicts in class_target_to_pred_dicts.items()):
+        for prediction_dict, target_schema in batched_pred_dict_schemas:
+            _validate_prediction_dict(is_validate_cats, prediction_dict, target_schema)  # raises o/w
 
     # finally, do "prediction"-level validation. recall that "prediction" is defined as "a group of a prediction
     # elements(s) specific to a unit and target"
     if not is_skip_validation:
-        # validate: "Within a Prediction, there cannot be more than 1 Prediction Element of the same type".
-        duplicate_unit_target_tuples = [(unit, target, pred_classes) for (unit, target), pred_classes
-                                        in loc_targ_to_pred_classes.items()
-                                        if len(pred_classes) != len(set(pred_classes))]
-        if duplicate_unit_target_tuples:
-            raise RuntimeError(f"Within a Prediction, there cannot be more than 1 Prediction Element of the same "
-                               f"class. Found these duplicate unit/target tuples: {duplicate_unit_target_tuples}")
-
-        # validate: (for both continuous and discrete target types): Within one prediction, there can be at most one of
-        # the following prediction elements, but not both: {`Named`, `Bin`}.
-        named_bin_conflict_tuples = [(unit, target, pred_classes) for (unit, target), pred_classes
-                                     in loc_targ_to_pred_classes.items()
-                                     if (PRED_CLASS_INT_TO_NAME[
-                                             PredictionElement.BIN_CLASS] in pred_classes)
-                                     and (PRED_CLASS_INT_TO_NAME[
-                                              PredictionElement.NAMED_CLASS] in pred_classes)]
-        if named_bin_conflict_tuples:
-            raise RuntimeError(f"Within one prediction, there can be at most one of the following prediction elements, "
-                               f"but not both: `Named`, `Bin`. Found these conflicting unit/target tuples: "
-                               f"{named_bin_conflict_tuples}")
+        prediction_error_messages = _prediction_level_error_messages(loc_targ_to_pred_classes)
+        if prediction_error_messages:
+            raise RuntimeError(prediction_error_messages[0])
 
     # done!
-    return data_hash_to_pred_data, pred_ele_rows
+    return pred_ele_rows
+
+
+def _validate_prediction_dict_names(prediction_dict, validation_schema):
+    """
+    Validates the names in `prediction_dict` that apply to all prediction classes: its unit, target, and class.
+
+    :param prediction_dict: a prediction dict from a "JSON IO dict"'s 'predictions'
+    :param validation_schema: a ProjectValidationSchema to validate against
+    :raises RuntimeError: if a name is invalid
+    """
+    unit_name = prediction_dict['unit']
+    target_name = prediction_dict['target']
+    pred_class = prediction_dict['class']
+    if unit_name not in validation_schema.unit_name_to_pk:
+        raise RuntimeError(f"prediction_dict referred to an undefined Unit. unit_name={unit_name!r}. "
+                           f"existing_unit_names={validation_schema.unit_name_to_pk.keys()}")
+    elif target_name not in validation_schema.target_name_to_schema:
+        raise RuntimeError(f"prediction_dict referred to an undefined Target. "
+                           f"target_name={target_name!r}. "
+                           f"existing_target_names={validation_schema.target_name_to_schema.keys()}")
+
+    if pred_class not in PRED_CLASS_NAME_TO_INT:
+        raise RuntimeError(f"invalid pred_class: {pred_class!r}. must be one of: "
+                           f"{list(PRED_CLASS_INT_TO_NAME.values())}. "
+                           f"prediction_dict={prediction_dict}")
+
+
+def _prediction_level_error_messages(loc_targ_to_pred_classes):
+    """
+    Does "prediction"-level validation. Recall that "prediction" is defined as "a group of a prediction elements(s)
+    specific to a unit and target".
+
+    :param loc_targ_to_pred_classes: a dict that maps (unit_name, target_name) 2-tuples to a list of prediction classes
+        (strs)
+    :return: a list of error messages (strs), in the order the validations are done. empty if valid
+    """
+    error_messages = []  # return value. filled next
+
+    # validate: "Within a Prediction, there cannot be more than 1 Prediction Element of the same type".
+    duplicate_unit_target_tuples = [(unit, target, pred_classes) for (unit, target), pred_classes
+                                    in loc_targ_to_pred_classes.items()
+                                    if len(pred_classes) != len(set(pred_classes))]
+    if duplicate_unit_target_tuples:
+        error_messages.append(f"Within a Prediction, there cannot be more than 1 Prediction Element of the same "
+                              f"class. Found these duplicate unit/target tuples: {duplicate_unit_target_tuples}")
+
+    # validate: (for both continuous and discrete target types): Within one prediction, there can be at most one of
+    # the following prediction elements, but not both: {`Named`, `Bin`}.
+    named_bin_conflict_tuples = [(unit, target, pred_classes) for (unit, target), pred_classes
+                                 in loc_targ_to_pred_classes.items()
+                                 if (PRED_CLASS_INT_TO_NAME[
+                                         PredictionElement.BIN_CLASS] in pred_classes)
+                                 and (PRED_CLASS_INT_TO_NAME[
+                                          PredictionElement.NAMED_CLASS] in pred_classes)]
+    if named_bin_conflict_tuples:
+        error_messages.append(f"Within one prediction, there can be at most one of the following prediction "
+                              f"elements, but not both: `Named`, `Bin`. Found these conflicting unit/target tuples: "
+                              f"{named_bin_conflict_tuples}")
+    return error_messages
 
 
 def _insert_pred_ele_rows(forecast, pred_ele_rows, is_subset_allowed):
     """
-    Validates forecast against previous data and then loads pred_ele_rows into the PredictionElement table. Skips
-    duplicate prediction elements in `forecast`'s model. See note in _insert_pred_data_rows() re: postgres vs. sqlite.
+    Validates forecast against previous data and then loads pred_ele_rows into the PredictionElement and
+    PredictionData tables. Skips duplicate prediction elements in `forecast`'s model. For speed, we directly insert via
+    SQL rather than the ORM. We use psycopg2 extensions to the DB API if we're connected to a Postgres server. Otherwise
+    we use execute_many() as a fallback. The reason we don't simply use the latter for Postgres is because its
+    implementation is slow ( http://initd.org/psycopg/docs/extras.html#fast-execution-helpers ).
 
     :param forecast: the new, empty Forecast being inserted into
     :param pred_ele_rows: as returned by _validated_pred_ele_rows_for_pred_dicts():
-        list of 6-tuples: (forecast_id, pred_class_int, unit_id, target_id, is_retract, data_hash)
+        list of 7-tuples: (forecast_id, pred_class_int, unit_id, target_id, is_retract, data_hash, data_json)
     :param is_subset_allowed: controls whether `_is_pred_eles_subset_prev_versions()` is called:
         True: don't call, False: do call.
     :raises RuntimeError: if forecast version is invalid
     """
     # in order to validate and to skip inserting duplicate rows, we insert in these steps:
-    # - create a temp table with the same structure as PredictionElement
+    # - create a staging temp table with the same structure as PredictionElement plus PredictionData's `data` column
     # - insert `pred_ele_rows` into the temp table (some might be duplicates)
-    # - validate forecast against previous data
-    # - delete duplicates from the temp table
-    # - insert the temp table into PredictionElement
-    # - drop the temp table
+    # - validate forecast against previous data, delete duplicates, and insert (see `_publish_pred_ele_temp_table()`)
     temp_table_name = 'pred_ele_temp'
     pred_ele_table_name = PredictionElement._meta.db_table
+    pred_data_table_name = PredictionData._meta.db_table
 
     # create temp table
     with connection.cursor() as cursor:
@@ -285,36 +475,73 @@ def _insert_pred_ele_rows(forecast, pred_ele_rows, is_subset_allowed):
                pred_ele.unit_id,
                pred_ele.target_id,
                pred_ele.is_retract,
-               pred_ele.data_hash
+               pred_ele.data_hash,
+               pred_data.data
         FROM {pred_ele_table_name} AS pred_ele
+                 JOIN {pred_data_table_name} AS pred_data ON pred_ele.data_hash = pred_data.data_hash
         LIMIT 0;
     """
     with connection.cursor() as cursor:
         cursor.execute(sql)
 
-    # insert rows into temp table
+    # insert rows into temp table, and then publish it
+    _bulk_insert_pred_ele_rows(temp_table_name, pred_ele_rows)
+    _publish_pred_ele_temp_table(forecast, temp_table_name, is_subset_allowed)
+
+
+def _bulk_insert_pred_ele_rows(table_name, pred_ele_rows):
+    """
+    An `_insert_pred_ele_rows()` helper that inserts pred_ele_rows into table_name as fast as possible.
+
+    :param table_name: a table with the same columns as `_insert_pred_ele_rows()`'s temp table
+    :param pred_ele_rows: as passed to `_insert_pred_ele_rows()`
+    """
     columns_names = [PredictionElement._meta.get_field('forecast').column,
                      PredictionElement._meta.get_field('pred_class').column,
                      PredictionElement._meta.get_field('unit').column,
                      PredictionElement._meta.get_field('target').column,
                      PredictionElement._meta.get_field('is_retract').column,
-                     PredictionElement._meta.get_field('data_hash').column]
+                     PredictionElement._meta.get_field('data_hash').column,
+                     PredictionData._meta.get_field('data').column]
     with connection.cursor() as cursor:
         if connection.vendor == 'postgresql':
+            # bulk insert via COPY FROM. to avoid possible problems with CSV quoting and delimiters, we follow this
+            # advice: http://adpgtech.blogspot.com/2014/09/importing-json-data.html :
+            #   There is a small set of single-byte characters that happen to be illegal in JSON: e'\x01' and e'\x02'
+            # data is NULL for retractions (written as an empty unquoted value). NB: assumes no CR or LFs in the JSON
             string_io = io.StringIO()
-            csv_writer = csv.writer(string_io, delimiter=',')
+            csv_writer = csv.writer(string_io, quotechar=chr(1), delimiter=chr(2))
             csv_writer.writerows(pred_ele_rows)
             string_io.seek(0)
-            cursor.copy_from(string_io, temp_table_name, columns=columns_names, sep=',', null=POSTGRES_NULL_VALUE)
+            sql = f"""
+                COPY {table_name}({', '.join(columns_names)}) FROM STDIN
+                WITH CSV QUOTE e'\x01' DELIMITER e'\x02';
+            """
+            cursor.copy_expert(sql, string_io)
         else:  # 'sqlite', etc.
             column_names = (', '.join(columns_names))
             values_percent_s = ', '.join(['%s'] * len(columns_names))
             sql = f"""
-                    INSERT INTO {temp_table_name} ({column_names})
+                    INSERT INTO {table_name} ({column_names})
                     VALUES ({values_percent_s});
                     """
             cursor.executemany(sql, pred_ele_rows)
 
+
+def _publish_pred_ele_temp_table(forecast, temp_table_name, is_subset_allowed):
+    """
+    An `_insert_pred_ele_rows()` helper that validates the forecast version rules against `temp_table_name`'s rows,
+    skips duplicates, and then inserts the rest into the PredictionElement and PredictionData tables. Drops
+    temp_table_name when done.
+
+    :param forecast: as passed to `_insert_pred_ele_rows()`
+    :param temp_table_name: a temp table created by `_insert_pred_ele_rows()` that contains forecast's new rows
+    :param is_subset_allowed: as passed to `_insert_pred_ele_rows()`
+    :raises RuntimeError: if forecast version is invalid
+    """
+    pred_ele_table_name = PredictionElement._meta.db_table
+    pred_data_table_name = PredictionData._meta.db_table
+
     # validate the rule: "cannot load data that's a subset of previous data"
     if (not is_subset_allowed) and _is_pred_eles_subset_prev_versions(forecast, temp_table_name):
         raise RuntimeError(f"new data is a subset of previous. forecast={forecast}")
@@ -348,15 +575,45 @@ def _insert_pred_ele_rows(forecast, pred_ele_rows, is_subset_allowed):
         if is_empty:
             raise RuntimeError(f"cannot load 100% duplicate data. forecast={forecast}")
 
-    # step 5/6: insert temp table into PredictionElement
+    # insert temp table into PredictionElement and PredictionData. the latter is content-addressed by data_hash, so we
+    # insert only one row per distinct new data and, for data that's already stored, add the number of new elements
+    # that reference it to its ref_count. NB: Postgres does not allow the "bare" `data` column in the GROUP BY (SQLite
+    # does, taking it from an arbitrary row in the group), so we pick the first one. rows are upserted in data_hash
+    # order so that concurrent uploads lock shared rows in the same order
+    # NB: valid_from is copied from the forecast table rather than passed so that it's stored exactly as issued_at is
     sql = f"""
-        INSERT INTO {pred_ele_table_name} AS pred_ele (forecast_id, pred_class, unit_id, target_id,
-                                                       is_retract, data_hash)
-        SELECT %s, pred_class, unit_id, target_id, is_retract, data_hash
+        INSERT INTO {pred_ele_table_name} (forecast_id, pred_class, unit_id, target_id, is_retract, data_hash,
+                                           valid_from)
+        SELECT %s, pred_class, unit_id, target_id, is_retract, data_hash,
+               (SELECT issued_at FROM {Forecast._meta.db_table} WHERE id = %s)
         FROM {temp_table_name};
     """
     with connection.cursor() as cursor:
-        cursor.execute(sql, (forecast.pk,))
+        cursor.execute(sql, (forecast.pk, forecast.pk))
+
+    data_column = '(ARRAY_AGG(data))[1]' if connection.vendor == 'postgresql' else 'data'
+    sql = f"""
+        INSERT INTO {pred_data_table_name} (data_hash, data, ref_count)
+        SELECT data_hash, {data_column}, COUNT(*)
+        FROM {temp_table_name}
+        WHERE NOT is_retract
+        GROUP BY data_hash
+        ORDER BY data_hash
+        ON CONFLICT (data_hash) DO UPDATE SET ref_count = {pred_data_table_name}.ref_count + excluded.ref_count;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+
+    # forecast's metadata is derived from the previous version's plus temp_table_name's changes, which must be counted
+    # before the CurrentPredictionElement table is updated
+    pred_class_to_count, prev_unit_ids, prev_target_ids = _incremental_forecast_metadata_counts(forecast,
+                                                                                               temp_table_name)
+    _update_pred_ele_validity(forecast)
+    _upsert_current_pred_eles(forecast)
+    if pred_class_to_count is not None:
+        _cache_forecast_metadata_incremental(forecast, temp_table_name, pred_class_to_count, prev_unit_ids,
+                                             prev_target_ids)
+    bump_project_data_version(forecast.forecast_model.project_id)  # NB: after the load commits
 
     # drop temp table
     with connection.cursor() as cursor:
@@ -391,7 +648,30 @@ def _is_pred_eles_subset_prev_versions(forecast, temp_table_name):
         return is_subset
 
 
-def _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target):
+def _validate_prediction_dict(is_validate_cats, prediction_dict, target_schema):
+    """
+    Does class-specific validation of a single non-retracted prediction_dict, raising RuntimeError if invalid.
+
+    :param is_validate_cats: same as load_predictions_from_json_io_dict()
+    :param prediction_dict: a prediction dict whose unit, target, and class have already been validated
+    :param target_schema: the TargetSchema of prediction_dict's target
+    """
+    pred_class = prediction_dict['class']
+    prediction_data = prediction_dict['prediction']
+    if pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.BIN_CLASS]:
+        _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target_schema)  # raises o/w
+    elif pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.NAMED_CLASS]:
+        family_abbrev = prediction_data['family']
+        _validate_named_prediction_dict(family_abbrev, prediction_dict, target_schema)  # raises o/w
+    elif pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.POINT_CLASS]:
+        _validate_point_prediction_dict(prediction_dict, target_schema, prediction_data['value'])  # raises o/w
+    elif pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.SAMPLE_CLASS]:
+        _validate_sample_prediction_dict(prediction_dict, target_schema)  # raises o/w
+    else:  # pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.QUANTILE_CLASS]:
+        _validate_quantile_prediction_dict(prediction_dict, target_schema)  # raises o/w
+
+
+def _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target_schema):
     prediction_data = prediction_dict['prediction']
 
     # validate: "The number of elements in the `cat` and `prob` vectors should be identical"
@@ -409,7 +689,7 @@ def _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target):
 
     # validate: "The data format of `cat` should correspond or be translatable to the `type` as in the target
     # definition"
-    is_all_compatible = all([Target.is_value_compatible_with_target_type(target.type, cat)[0]  # is_compatible
+    is_all_compatible = all([Target.is_value_compatible_with_target_type(target_schema.type, cat)[0]  # is_compatible
                              for cat in prediction_data['cat']])
     if not is_all_compatible:
         raise RuntimeError(f"The data format of `cat` should correspond or be translatable to the `type` as "
@@ -418,13 +698,13 @@ def _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target):
 
     # validate: "Entries in `cat` must be a subset of `Target.cats` from the target definition".
     # note: for date targets we format as strings for the comparison (incoming are strings)
-    cats_values = set(target.cats_values())  # datetime.date instances for date targets
+    cats_values = target_schema.cats_values  # datetime.date instances for date targets
     pred_data_cat_parsed = [datetime.datetime.strptime(cat, YYYY_MM_DD_DATE_FORMAT).date()
                             for cat in prediction_data['cat']] \
-        if target.type == Target.DATE_TARGET_TYPE else prediction_data['cat']  # valid - see is_all_compatible above
+        if target_schema.type == Target.DATE_TARGET_TYPE else prediction_data['cat']  # valid - see is_all_compatible
     if is_validate_cats and not (set(pred_data_cat_parsed) <= cats_values):
         raise RuntimeError(f"Entries in `cat` must be a subset of `Target.cats` from the target definition. "
-                           f"cat={prediction_data['cat']}, cats_values={cats_values}, "
+                           f"cat={prediction_data['cat']}, cats_values={set(cats_values)}, "
                            f"prediction_dict={prediction_dict}")
 
     # validate: "Entries in the database rows in the `prob` column must be numbers in [0, 1]"
@@ -447,13 +727,13 @@ def _validate_bin_prediction_dict(is_validate_cats, prediction_dict, target):
 
     # validate: "for `Bin` Prediction Elements, there must be exactly two `cat` values labeled `true` and `false`. These
     # are the two `cats` that are implied (but not allowed to be specified) by binary target types."
-    if (target.type == Target.BINARY_TARGET_TYPE) and (len(prediction_data['cat']) != 2):
+    if target_schema.is_binary and (len(prediction_data['cat']) != 2):
         raise RuntimeError(f"for `Bin` Prediction Elements, there must be exactly two `cat` values labeled `true` and "
                            f"`false`. prediction_data['cat']={prediction_data['cat']}, "
                            f"prediction_dict={prediction_dict}")
 
 
-def _validate_named_prediction_dict(family_abbrev, prediction_dict, target):
+def _validate_named_prediction_dict(family_abbrev, prediction_dict, target_schema):
     prediction_data = prediction_dict['prediction']
 
     # validate: "`family`: must be one of the abbreviations shown in the table below"
@@ -465,9 +745,10 @@ def _validate_named_prediction_dict(family_abbrev, prediction_dict, target):
 
     # validate: "The Prediction's class must be valid for its target's type". note that only named and quantile
     # predictions are constrained; all other target_type/prediction_class combinations are valid
-    if not Target.is_valid_named_family_for_target_type(family_abbrev, target.type):
-        raise RuntimeError(f"family {family_abbrev!r} is not valid for {target.type_as_str()!r} "
-                           f"target types. prediction_dict={prediction_dict}")
+    if family_abbrev not in target_schema.named_families:
+        target_type_str = Target.str_for_target_type(target_schema.type)
+        raise RuntimeError(f"family {family_abbrev!r} is not valid for {target_type_str!r} target types. "
+                           f"prediction_dict={prediction_dict}")
 
     # validate: "The number of param columns with non-NULL entries count must match family definition"
     num_params = 0
@@ -503,7 +784,7 @@ def _validate_named_prediction_dict(family_abbrev, prediction_dict, target):
                            f"prediction_dict={prediction_dict}")
 
 
-def _validate_point_prediction_dict(prediction_dict, target, value):
+def _validate_point_prediction_dict(prediction_dict, target_schema, value):
     prediction_data = prediction_dict['prediction']
 
     # validate: "Entries in the database rows in the `value` column cannot be `“”`, `“NA”` or `NULL` (case does
@@ -515,21 +796,21 @@ def _validate_point_prediction_dict(prediction_dict, target, value):
 
     # validate: "The data format of `value` should correspond or be translatable to the `type` as in the target
     # definition". note: for date targets we format as strings for the comparison (incoming are strings)
-    if not Target.is_value_compatible_with_target_type(target.type, value)[0]:  # is_compatible
+    if not Target.is_value_compatible_with_target_type(target_schema.type, value)[0]:  # is_compatible
         raise RuntimeError(f"The data format of `value` should correspond or be translatable to the `type` as "
                            f"in the target definition. value={value!r}, prediction_dict={prediction_dict}")
 
     # validate: "if `range` is specified, any values in `Point` or `Sample` Prediction Elements should be contained
     # within `range`". recall: "The range is assumed to be inclusive on the lower bound and open on the upper bound,
     # e.g. [a, b)."
-    range_tuple = target.range_tuple()
+    range_tuple = target_schema.range_tuple
     if range_tuple and not (range_tuple[0] <= value < range_tuple[1]):
         raise RuntimeError(f"if `range` is specified, any values in `Point` Prediction Elements should be contained "
                            f"within `range`. value={value!r}, range_tuple={range_tuple}, "
                            f"prediction_dict={prediction_dict}")
 
 
-def _validate_sample_prediction_dict(prediction_dict, target):
+def _validate_sample_prediction_dict(prediction_dict, target_schema):
     prediction_data = prediction_dict['prediction']
 
     # validate: "Entries in the database rows in the `sample` column cannot be `“”`, `“NA”` or `NULL` (case does
@@ -542,7 +823,7 @@ def _validate_sample_prediction_dict(prediction_dict, target):
 
     # validate: "The data format of `sample` should correspond or be translatable to the `type` as in the
     # target definition"
-    is_all_compatible = all([Target.is_value_compatible_with_target_type(target.type, sample)[0]  # is_compatible
+    is_all_compatible = all([Target.is_value_compatible_with_target_type(target_schema.type, sample)[0]  # is_compatible
                              for sample in prediction_data['sample']])
     if not is_all_compatible:
         raise RuntimeError(f"The data format of `sample` should correspond or be translatable to the `type` as "
@@ -552,7 +833,7 @@ def _validate_sample_prediction_dict(prediction_dict, target):
     # validate: "if `range` is specified, any values in `Point` or `Sample` Prediction Elements should be contained
     # within `range`". recall: "The range is assumed to be inclusive on the lower bound and open on the upper bound,
     # e.g. [a, b)."
-    range_tuple = target.range_tuple()
+    range_tuple = target_schema.range_tuple
     if range_tuple:
         is_all_in_range = all([range_tuple[0] <= sample < range_tuple[1] for sample in prediction_data['sample']])
         if not is_all_in_range:
@@ -569,13 +850,13 @@ def _le_with_tolerance(a, b):  # a <= b ?
         return a <= b
 
 
-def _validate_quantile_prediction_dict(prediction_dict, target):
+def _validate_quantile_prediction_dict(prediction_dict, target_schema):
     prediction_data = prediction_dict['prediction']
 
     # validate: "The Prediction's class must be valid for its target's type". note that only named and quantile
     # predictions are constrained; all other target_type/prediction_class combinations are valid
-    if (target.type == Target.NOMINAL_TARGET_TYPE) or (target.type == Target.BINARY_TARGET_TYPE):
-        raise RuntimeError(f"quantile data is not valid for target type={target.type}. "
+    if (target_schema.type == Target.NOMINAL_TARGET_TYPE) or target_schema.is_binary:
+        raise RuntimeError(f"quantile data is not valid for target type={target_schema.type}. "
                            f"prediction_dict={prediction_dict}")
 
     # validate: "The number of elements in the `quantile` and `value` vectors should be identical."
@@ -603,7 +884,7 @@ def _validate_quantile_prediction_dict(prediction_dict, target):
 
     # validate: "The data format of `value` should correspond or be translatable to the `type` as in the target
     # definition."
-    is_all_compatible = all([Target.is_value_compatible_with_target_type(target.type, value)[0]  # is_compatible
+    is_all_compatible = all([Target.is_value_compatible_with_target_type(target_schema.type, value)[0]  # is_compatible
                              for value in pred_data_values])
     if not is_all_compatible:
         raise RuntimeError(f"The data format of `value` should correspond or be translatable to the `type` as "
@@ -615,7 +896,7 @@ def _validate_quantile_prediction_dict(prediction_dict, target):
     # note: we do not assume quantiles are sorted, so we first sort before checking for non-decreasing
     pred_data_values = [datetime.datetime.strptime(value, YYYY_MM_DD_DATE_FORMAT).date()
                         for value in pred_data_values] \
-        if target.type == Target.DATE_TARGET_TYPE else pred_data_values  # valid - see is_all_compatible above
+        if target_schema.type == Target.DATE_TARGET_TYPE else pred_data_values  # valid - see is_all_compatible above
 
     # per https://stackoverflow.com/questions/7558908/unpacking-a-list-tuple-of-pairs-into-two-lists-tuples
     pred_data_quantiles, pred_data_values = zip(*sorted(zip(pred_data_quantiles, pred_data_values), key=lambda _: _[0]))
@@ -628,7 +909,7 @@ def _validate_quantile_prediction_dict(prediction_dict, target):
 
     # validate: "Entries in `value` must obey existing ranges for targets." recall: "The range is assumed to be
     # inclusive on the lower bound and open on the upper bound, # e.g. [a, b)."
-    range_tuple = target.range_tuple()
+    range_tuple = target_schema.range_tuple
     if range_tuple:
         is_all_in_range = all([range_tuple[0] <= value < range_tuple[1] for value in pred_data_values])
         if not is_all_in_range:
@@ -636,41 +917,721 @@ def _validate_quantile_prediction_dict(prediction_dict, target):
                                f"pred_data_values={pred_data_values}, prediction_dict={prediction_dict}")
 
 
-def _insert_pred_data_rows(rows):
+#
+# batched validation. these functions check many prediction dicts of the same class and target at once by flattening
+# their values into single lists and then using builtins like set(map(type, ...)), min(), max(), and sum(), which do
+# their loops in C. each returns True if all of its prediction dicts are valid, and False if at least one /might/ be
+# invalid, in which case callers re-validate them one at a time to get the actual error
+#
+
+def _is_valid_batched_prediction_dicts(is_validate_cats, pred_class, prediction_dicts, target_schema):
+    """
+    :param is_validate_cats: same as load_predictions_from_json_io_dict()
+    :param pred_class: one of BATCHED_PRED_CLASS_NAMES
+    :param prediction_dicts: non-retracted prediction dicts, all of class `pred_class` and for the same target
+    :param target_schema: the TargetSchema of prediction_dicts' target
+    :return: True if all prediction_dicts are valid, and False if one or more might be invalid
+    """
+    if pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.BIN_CLASS]:
+        return _is_valid_bin_prediction_dicts(is_validate_cats, prediction_dicts, target_schema)
+    elif pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.SAMPLE_CLASS]:
+        return _is_valid_sample_prediction_dicts(prediction_dicts, target_schema)
+    else:  # pred_class == PRED_CLASS_INT_TO_NAME[PredictionElement.QUANTILE_CLASS]:
+        return _is_valid_quantile_prediction_dicts(prediction_dicts, target_schema)
+
+
+def _compatible_values(target_type, values):
+    """
+    A batched version of `Target.is_value_compatible_with_target_type()` (with is_coerce=False) that also does the
+    "cannot be `“”`, `“NA”` or `NULL`" check.
+
+    :param target_type: one of Target.*_TARGET_TYPE
+    :param values: a list of values to check
+    :return: values if they are all compatible with target_type, except for date targets, in which case the
+        returned list contains datetime.date instances parsed from values. returns None if any value is incompatible
+    """
+    value_types_set = set(map(type, values))
+    if target_type == Target.DATE_TARGET_TYPE:
+        if value_types_set - {str}:
+            return None
+
+        date_str_to_date = {}  # there are usually many repeated dates
+        try:
+            for date_str in set(values):
+                date_str_to_date[date_str] = datetime.datetime.strptime(date_str, YYYY_MM_DD_DATE_FORMAT).date()
+        except ValueError:
+            return None
+
+        return [date_str_to_date[date_str] for date_str in values]
+    elif not (value_types_set <= set(Target.data_types_for_target_type(target_type))):
+        return None  # also catches None values and non-str '' and 'NA'
+    elif (target_type == Target.NOMINAL_TARGET_TYPE) and ({value.lower() for value in set(values)} & {'', 'na'}):
+        return None
+    else:
+        return values
+
+
+def _is_numbers_within(values, lower, upper, is_upper_inclusive):
+    """
+    :param values: a non-empty list of ints or floats
+    :param lower: the inclusive lower bound
+    :param upper: the upper bound
+    :param is_upper_inclusive: True if `upper` is inclusive, False if exclusive
+    :return: True if all values are within the bounds. NB: False if any value is a NaN, which min() and max() do not
+        handle
+    """
+    values_sum = sum(values)
+    if values_sum != values_sum:  # NaN
+        return False
+
+    return (lower <= min(values)) and ((max(values) <= upper) if is_upper_inclusive else (max(values) < upper))
+
+
+def _is_valid_bin_prediction_dicts(is_validate_cats, prediction_dicts, target_schema):
+    # batched version of `_validate_bin_prediction_dict()`
+    all_cats, all_probs = [], []
+    for prediction_dict in prediction_dicts:
+        cats, probs = prediction_dict['prediction']['cat'], prediction_dict['prediction']['prob']
+        if (not cats) or (len(cats) != len(probs)) or (target_schema.is_binary and (len(cats) != 2)):
+            return False
+
+        all_cats.extend(cats)
+        all_probs.extend(probs)
+
+    parsed_cats = _compatible_values(target_schema.type, all_cats)
+    if (parsed_cats is None) or (is_validate_cats and not (set(parsed_cats) <= target_schema.cats_values)):
+        return False
+    elif (not (set(map(type, all_probs)) <= {int, float})) or (not _is_numbers_within(all_probs, 0.0, 1.0, True)):
+        return False
+
+    return all(math.isclose(1.0, sum(prediction_dict['prediction']['prob']), rel_tol=BIN_SUM_REL_TOL)
+               for prediction_dict in prediction_dicts)
+
+
+def _is_valid_sample_prediction_dicts(prediction_dicts, target_schema):
+    # batched version of `_validate_sample_prediction_dict()`
+    all_samples = []
+    for prediction_dict in prediction_dicts:
+        all_samples.extend(prediction_dict['prediction']['sample'])
+    if not all_samples:
+        return True
+
+    if _compatible_values(target_schema.type, all_samples) is None:
+        return False
+
+    range_tuple = target_schema.range_tuple
+    return (not range_tuple) or _is_numbers_within(all_samples, range_tuple[0], range_tuple[1], False)
+
+
+def _is_valid_quantile_prediction_dicts(prediction_dicts, target_schema):
+    # batched version of `_validate_quantile_prediction_dict()`
+    if (target_schema.type == Target.NOMINAL_TARGET_TYPE) or target_schema.is_binary:
+        return False
+
+    all_quantiles, all_values = [], []
+    for prediction_dict in prediction_dicts:
+        quantiles, values = prediction_dict['prediction']['quantile'], prediction_dict['prediction']['value']
+        if (not quantiles) or (len(quantiles) != len(values)) or (len(set(quantiles)) != len(quantiles)):
+            return False
+
+        all_quantiles.extend(quantiles)
+        all_values.extend(values)
+
+    if (not (set(map(type, all_quantiles)) <= {int, float})) \
+            or (not _is_numbers_within(all_quantiles, 0.0, 1.0, True)):
+        return False
+
+    parsed_values = _compatible_values(target_schema.type, all_values)  # datetime.date instances for date targets
+    if parsed_values is None:
+        return False
+
+    range_tuple = target_schema.range_tuple
+    if range_tuple and not _is_numbers_within(parsed_values, range_tuple[0], range_tuple[1], False):
+        return False
+
+    # validate: "Entries in `value` must be non-decreasing as quantiles increase". we first try plain `<=` and fall back
+    # to `_le_with_tolerance()` only if that fails
+    start_idx = 0
+    for prediction_dict in prediction_dicts:
+        quantiles = prediction_dict['prediction']['quantile']
+        values = parsed_values[start_idx:start_idx + len(quantiles)]
+        start_idx += len(quantiles)
+        if not all(map(operator.le, quantiles, quantiles[1:])):  # not sorted
+            quantiles, values = zip(*sorted(zip(quantiles, values), key=lambda _: _[0]))
+        if not all(map(operator.le, values, values[1:])) \
+                and not all(map(_le_with_tolerance, values, values[1:])):
+            return False
+
+    return True
+
+
+#
+# load_predictions_from_json_io_dict_chunked()
+#
+
+# the Job.output_json key that `stage_predictions_chunked()` checkpoints to
+NUM_STAGED_PRED_DICTS_KEY = 'num_staged_pred_dicts'
+
+# the maximum number of invalid (unit, target) pairs that `_publish_staged_pred_eles()` reports
+MAX_NUM_STAGED_ERROR_PAIRS = 100
+
+
+def load_predictions_from_json_io_dict_chunked(forecast, json_io_dict, job, chunk_size, is_validate_cats=True,
+                                               is_subset_allowed=False):
+    """
+    A version of `load_predictions_from_json_io_dict()` for forecasts that are too large to load in one transaction.
+    Rather than building and inserting all of json_io_dict's rows at once, we work in two phases:
+
+    1) stage: validate json_io_dict's predictions `chunk_size` at a time and insert each chunk's rows into the
+       StagedPredictionElement table, committing each chunk with a checkpoint - see `stage_predictions_chunked()`
+    2) publish: validate and insert all of the staged rows in a single transaction - see `publish_staged_predictions()`
+
+    Callers that need to do more work in the publishing transaction (e.g., `_upload_forecast_worker()`) can call those
+    two functions directly.
+
+    :param forecast: as passed to `load_predictions_from_json_io_dict()`
+    :param json_io_dict: ""
+    :param job: as passed to `stage_predictions_chunked()`
+    :param chunk_size: ""
+    :param is_validate_cats: as passed to `load_predictions_from_json_io_dict()`
+    :param is_subset_allowed: ""
     """
-    Does the actual INSERT of rows into the database table corresponding to pred_data_class. For speed, we directly
-    insert via SQL rather than the ORM. We use psycopg2 extensions to the DB API if we're connected to a Postgres
-    server. Otherwise we use execute_many() as a fallback. The reason we don't simply use the latter for Postgres
-    is because its implementation is slow ( http://initd.org/psycopg/docs/extras.html#fast-execution-helpers ).
+    stage_predictions_chunked(forecast, json_io_dict, job, chunk_size, is_validate_cats)
+    publish_staged_predictions(forecast, is_subset_allowed)
 
-    :param rows: list of 2-tuples: (pred_ele_id, prediction_data), where pred_ele_id is a PredictionElement.pk, and
-        prediction_data is the "raw" prediction_data dict, i.e., the prediction_element dict's "prediction" dict.
+
+def stage_predictions_chunked(forecast, json_io_dict, job, chunk_size, is_validate_cats=True):
+    """
+    Validates json_io_dict's predictions `chunk_size` at a time and inserts each chunk's rows into the
+    StagedPredictionElement table. Each chunk is committed in its own transaction along with a checkpoint that's saved
+    in `job.output_json[NUM_STAGED_PRED_DICTS_KEY]` (the number of prediction dicts staged so far). If this function is
+    called again for the same forecast and job (e.g., after the worker running it was killed), it resumes after the last
+    checkpoint. NB: Only the rows are chunked, i.e., callers still pass the entire json_io_dict. Also,
+    "prediction"-level validation across chunks is done by `publish_staged_predictions()`.
+
+    :param forecast: as passed to `load_predictions_from_json_io_dict()`
+    :param json_io_dict: ""
+    :param job: the Job to checkpoint to. its output_json is updated and saved after each chunk
+    :param chunk_size: the number of prediction dicts to stage in each transaction
+    :param is_validate_cats: as passed to `load_predictions_from_json_io_dict()`
+    """
+    _validate_forecast_and_json_io_dict(forecast, json_io_dict)  # raises o/w
+    stage_prediction_dicts_chunked(forecast, json_io_dict['predictions'], job, chunk_size, is_validate_cats)
+
+
+def stage_prediction_dicts_chunked(forecast, prediction_dicts, job, chunk_size, is_validate_cats=True):
+    """
+    The implementation of `stage_predictions_chunked()`, which takes any iterable of prediction dicts rather than a
+    json_io_dict. This lets callers stream prediction dicts from a file (e.g., `prediction_dicts_from_forecast_csv()`)
+    so that only one chunk of them is in memory at a time. When resuming, the already-staged prediction dicts at the
+    start of `prediction_dicts` are skipped, which means the iterable must produce the same ones in the same order each
+    time. NB: Does not check the rule "cannot load empty data" - `publish_staged_predictions()` does.
+
+    :param forecast: as passed to `stage_predictions_chunked()`
+    :param prediction_dicts: an iterable of prediction dicts as found in a json_io_dict's 'predictions'
+    :param job: as passed to `stage_predictions_chunked()`
+    :param chunk_size: ""
+    :param is_validate_cats: ""
+    """
+    if forecast.pred_eles.count() != 0:
+        raise RuntimeError(f"cannot load data into a non-empty forecast: {forecast}")
+
+    # NB: a chunk's rows and its checkpoint are committed together, so the staged rows always match the checkpoint
+    num_staged = (job.output_json or {}).get(NUM_STAGED_PRED_DICTS_KEY, 0)
+    logger.debug(f"stage_prediction_dicts_chunked(): started. num_staged={num_staged}, chunk_size={chunk_size}, "
+                 f"forecast={forecast}")
+    prediction_dicts = itertools.islice(prediction_dicts, num_staged, None)  # skip the staged ones
+    while True:
+        chunk_pred_dicts = list(itertools.islice(prediction_dicts, chunk_size))
+        if not chunk_pred_dicts:
+            break
+
+        pred_ele_rows = _validated_pred_ele_rows_for_pred_dicts(forecast, chunk_pred_dicts, False, is_validate_cats)
+        num_staged += len(chunk_pred_dicts)
+        with transaction.atomic():
+            _bulk_insert_pred_ele_rows(StagedPredictionElement._meta.db_table, pred_ele_rows)
+            job.output_json = {**(job.output_json or {}), NUM_STAGED_PRED_DICTS_KEY: num_staged}
+            job.save()
+    logger.debug(f"stage_prediction_dicts_chunked(): done. num_staged={num_staged}, forecast={forecast}")
+
+
+@transaction.atomic
+def publish_staged_predictions(forecast, is_subset_allowed=False):
+    """
+    Publishes the rows that `stage_predictions_chunked()` staged for `forecast` by inserting them into
+    PredictionElement and PredictionData, and then deletes them. Does the "prediction"-level validation that chunks
+    could not do individually, and enforces the FORECAST VERSION RULES as `load_predictions_from_json_io_dict()` does.
+    Only then does forecast's data become visible.
+
+    :param forecast: as passed to `stage_predictions_chunked()`
+    :param is_subset_allowed: as passed to `load_predictions_from_json_io_dict()`
+    :raises RuntimeError: if the staged rows are invalid or forecast version is invalid
+    """
+    if forecast.pred_eles.count() != 0:
+        raise RuntimeError(f"cannot load data into a non-empty forecast: {forecast}")
+    elif not forecast.staged_pred_eles.exists():  # validate the rule: "cannot load empty data"
+        raise RuntimeError(f"cannot load empty data")
+
+    logger.debug(f"publish_staged_predictions(): started. forecast={forecast}")
+    _publish_staged_pred_eles(forecast, is_subset_allowed)
+    logger.debug(f"publish_staged_predictions(): done. forecast={forecast}")
+
+
+def _publish_staged_pred_eles(forecast, is_subset_allowed):
+    """
+    A `publish_staged_predictions()` helper that validates and publishes `forecast`'s staged rows, and then deletes
+    them.
+
+    :param forecast: as passed to `publish_staged_predictions()`
+    :param is_subset_allowed: ""
+    :raises RuntimeError: if the staged rows are invalid or forecast version is invalid
+    """
+    staged_table_name = StagedPredictionElement._meta.db_table
+
+    # do the "prediction"-level validation that chunks could not do individually. to keep memory bounded we first find
+    # invalid (unit, target) pairs in the database, and then load only those pairs' classes to build the error message
+    sql = f"""
+        SELECT unit_id, target_id
+        FROM {staged_table_name}
+        WHERE forecast_id = %s
+        GROUP BY unit_id, target_id
+        HAVING COUNT(*) != COUNT(DISTINCT pred_class)
+            OR (SUM(CASE WHEN pred_class = %s THEN 1 ELSE 0 END) > 0
+                AND SUM(CASE WHEN pred_class = %s THEN 1 ELSE 0 END) > 0)
+        LIMIT %s;
     """
-    # serialize to json. NB: assumes no CR or LFs in dicts!
-    rows = [(idx, json.dumps(pred_data)) for idx, pred_data in rows]
-    table_name = PredictionData._meta.db_table
-    columns_names = PredictionData._meta.get_field('pred_ele').column, PredictionData._meta.get_field('data').column
     with connection.cursor() as cursor:
-        if connection.vendor == 'postgresql':
-            # bulk insert via COPY FROM. to avoid possible problems with CSV quoting and delimiters, we follow this
-            # advice: http://adpgtech.blogspot.com/2014/09/importing-json-data.html :
-            #   There is a small set of single-byte characters that happen to be illegal in JSON: e'\x01' and e'\x02'
-            string_io = io.StringIO()
-            csv_writer = csv.writer(string_io, quotechar=chr(1), delimiter=chr(2))
-            csv_writer.writerows(rows)
-            string_io.seek(0)
-            sql = f"""
-                COPY {table_name}({', '.join(columns_names)}) FROM STDIN WITH CSV QUOTE e'\x01' DELIMITER e'\x02';
-            """
-            cursor.copy_expert(sql, string_io)
-        else:  # 'sqlite', etc.
-            column_names = (', '.join(columns_names))
-            values_percent_s = ', '.join(['%s'] * len(columns_names))
-            sql = f"""
-                    INSERT INTO {table_name} ({column_names})
-                    VALUES ({values_percent_s});
-                    """
-            cursor.executemany(sql, rows)
+        cursor.execute(sql, (forecast.pk, PredictionElement.BIN_CLASS, PredictionElement.NAMED_CLASS,
+                             MAX_NUM_STAGED_ERROR_PAIRS))
+        invalid_unit_target_ids = cursor.fetchall()
+    if invalid_unit_target_ids:
+        loc_targ_to_pred_classes = defaultdict(list)  # as in `_validated_pred_ele_rows_for_pred_dicts()`
+        for unit_id, target_id in invalid_unit_target_ids:
+            for unit_name, target_name, pred_class in StagedPredictionElement.objects \
+                    .filter(forecast=forecast, unit_id=unit_id, target_id=target_id) \
+                    .order_by('id') \
+                    .values_list('unit__name', 'target__name', 'pred_class'):
+                loc_targ_to_pred_classes[(unit_name, target_name)].append(PRED_CLASS_INT_TO_NAME[pred_class])
+        raise RuntimeError(_prediction_level_error_messages(loc_targ_to_pred_classes)[0])
+
+    # copy the staged rows to the temp table that `_publish_pred_ele_temp_table()` expects, publish, and clean up
+    temp_table_name = 'pred_ele_temp'
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {temp_table_name};")
+        cursor.execute(f"""
+            CREATE TEMP TABLE {temp_table_name} AS
+            SELECT forecast_id, pred_class, unit_id, target_id, is_retract, data_hash, data
+            FROM {staged_table_name}
+            WHERE forecast_id = %s;
+        """, (forecast.pk,))
+    _publish_pred_ele_temp_table(forecast, temp_table_name, is_subset_allowed)
+    forecast.staged_pred_eles.all().delete()
+
+
+#
+# prediction_dicts_from_json_io_file()
+#
+
+# the number of characters that `prediction_dicts_from_json_io_file()` reads at a time
+JSON_READ_SIZE = 1_000_000
+
+_JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')  # same as json.decoder.WHITESPACE
+
+
+def prediction_dicts_from_json_io_file(json_file_fp, read_size=JSON_READ_SIZE):
+    """
+    A generator that incrementally parses json_file_fp as a "JSON IO dict" and yields its 'predictions' one at a time,
+    i.e., without loading the whole file into memory like `json.load()` does. Only the current prediction dict plus
+    at most about `read_size` characters of the file are in memory at once, which lets callers like
+    `stage_prediction_dicts_chunked()` load forecasts of any size. Other top-level keys such as 'meta' are parsed and
+    then discarded. NB: Errors are raised as they are found, so some prediction dicts might be yielded before one is.
+
+    :param json_file_fp: an open "JSON IO dict" file-like object. NB: must be text, not binary
+    :param read_size: the number of characters to read at a time
+    :raises RuntimeError: if the file is invalid JSON or is not a dict with a 'predictions' list
+    """
+    reader = _JsonTextReader(json_file_fp, read_size)
+    if reader.next_char() != '{':
+        raise RuntimeError(f"json_io_dict was not a dict. first char={reader.next_char()!r}")
+
+    is_found_predictions = False
+    for _ in reader.iter_elements('{', '}'):
+        key = reader.decode_value()
+        reader.expect_char(':')
+        if key != 'predictions':
+            reader.decode_value()  # e.g., 'meta'
+            continue
+        elif reader.next_char() != '[':
+            raise RuntimeError(f"json_io_dict's 'predictions' was not a list. first char={reader.next_char()!r}")
+
+        is_found_predictions = True
+        for _ in reader.iter_elements('[', ']'):
+            yield reader.decode_value()
+    if reader.next_char() != '':
+        raise RuntimeError(f"invalid JSON: extra data after json_io_dict. next char={reader.next_char()!r}")
+    elif not is_found_predictions:
+        raise RuntimeError(f"json_io_dict had no 'predictions' key")
+
+
+class _JsonTextReader:
+    """
+    A `prediction_dicts_from_json_io_file()` helper that decodes a JSON text file's tokens and values one at a time
+    using `json.JSONDecoder.raw_decode()`, reading more of the file as needed. Consumed characters are discarded on
+    each read.
+    """
+
+
+    def __init__(self, json_file_fp, read_size):
+        self.json_file_fp = json_file_fp
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0  # index of the next unconsumed character in buffer
+        self.is_eof = False
+
+
+    def _read_more(self):
+        """
+        :return: True if more characters were read, and False if at EOF
+        """
+        # read at least as many characters as are unconsumed so that re-decoding a large value is linear in its size
+        read_size = max(self.read_size, len(self.buffer) - self.pos)
+        text = '' if self.is_eof else self.json_file_fp.read(read_size)
+        if not text:
+            self.is_eof = True
+            return False
+
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+
+    def next_char(self):
+        """
+        Skips whitespace and returns the next character without consuming it, or '' if at EOF.
+        """
+        while True:
+            self.pos = _JSON_WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            elif not self._read_more():
+                return ''
+
+
+    def expect_char(self, chars):
+        """
+        Consumes and returns the next non-whitespace character, which must be one of `chars`.
+        """
+        char = self.next_char()
+        if (not char) or (char not in chars):
+            raise RuntimeError(f"invalid JSON: expected one of {chars!r} but found {char!r}")
+
+        self.pos += 1
+        return char
+
+
+    def decode_value(self):
+        """
+        Consumes and returns the next JSON value, reading more of the file until it is complete.
+        """
+        self.next_char()  # skip whitespace
+        while True:
+            try:
+                value, end_pos = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as jde:
+                if self._read_more():  # the value might be incomplete
+                    continue
+
+                raise RuntimeError(f"invalid JSON: {jde}")
+
+            # a number at the end of the buffer might be incomplete, e.g., `12` of `123`
+            if (end_pos == len(self.buffer)) and self._read_more():
+                continue
+
+            self.pos = end_pos
+            return value
+
+
+    def iter_elements(self, open_char, close_char):
+        """
+        A generator that consumes an object or array's delimiters, yielding once per element. The caller must consume
+        each element (or key/value pair) before resuming this generator.
+        """
+        self.expect_char(open_char)
+        if self.next_char() == close_char:
+            self.pos += 1
+            return
+
+        while True:
+            yield
+            if self.expect_char(',' + close_char) == close_char:
+                return
+
+
+#
+# validation_errors_for_json_io_dict()
+#
+
+def validation_errors_for_json_io_dict(project, json_io_dict, is_validate_cats=True):
+    """
+    A validate-only version of `load_predictions_from_json_io_dict()` that checks json_io_dict's predictions against
+    `project`'s Units and Targets entirely in memory using `validation_schema_for_project()`, i.e., without creating a
+    Forecast or writing to the database. Unlike loading, which stops at the first error, this collects all of them.
+    NB: the forecast version rules are not checked b/c they depend on the existing versions that a forecast is loaded
+    alongside.
+
+    :param project: the Project to validate against
+    :param json_io_dict: a "JSON IO dict" as passed to `load_predictions_from_json_io_dict()`
+    :param is_validate_cats: same as `load_predictions_from_json_io_dict()`
+    :return: a list of error dicts, each with these keys: 'index' (the index of the invalid prediction dict in
+        json_io_dict['predictions'], or None if the error is not specific to one) and 'message'. ordered by 'index',
+        with the None ones last. empty if json_io_dict is valid
+    """
+    if not isinstance(json_io_dict, dict):
+        return [{'index': None, 'message': f"json_io_dict was not a dict: type={type(json_io_dict)}"}]
+    elif 'predictions' not in json_io_dict:
+        return [{'index': None, 'message': "json_io_dict had no 'predictions' key"}]
+    elif not isinstance(json_io_dict['predictions'], list):
+        return [{'index': None, 'message': f"json_io_dict's 'predictions' was not a list: "
+                                           f"type={type(json_io_dict['predictions'])}"}]
+    elif not json_io_dict['predictions']:
+        return [{'index': None, 'message': "cannot load empty data"}]
+
+    validation_schema = validation_schema_for_project(project)
+    errors = []  # return value. filled next
+    loc_targ_to_pred_classes = defaultdict(list)  # as in `_validated_pred_ele_rows_for_pred_dicts()`
+    class_target_to_idx_pred_dicts = defaultdict(list)  # (pred_class, target_name) -> [(idx, prediction_dict), ...]
+    for idx, prediction_dict in enumerate(json_io_dict['predictions']):
+        try:
+            if not isinstance(prediction_dict, dict):
+                raise RuntimeError(f"prediction_dict was not a dict: {prediction_dict!r}")
+
+            missing_keys = {'unit', 'target', 'class', 'prediction'} - prediction_dict.keys()
+            if missing_keys:
+                raise RuntimeError(f"prediction_dict was missing required key(s): {sorted(missing_keys)}. "
+                                   f"prediction_dict={prediction_dict}")
+
+            loc_targ_to_pred_classes[(prediction_dict['unit'], prediction_dict['target'])] \
+                .append(prediction_dict['class'])
+            _validate_prediction_dict_names(prediction_dict, validation_schema)  # raises o/w
+            if prediction_dict['prediction'] is None:  # retraction
+                continue
+
+            target_schema = validation_schema.target_name_to_schema[prediction_dict['target']]
+            if prediction_dict['class'] in BATCHED_PRED_CLASS_NAMES:
+                class_target_to_idx_pred_dicts[(prediction_dict['class'], prediction_dict['target'])] \
+                    .append((idx, prediction_dict))
+            else:
+                _validate_prediction_dict(is_validate_cats, prediction_dict, target_schema)  # raises o/w
+        except Exception as ex:  # e.g., RuntimeError, or TypeError or KeyError from a malformed 'prediction'
+            errors.append({'index': idx, 'message': str(ex) if isinstance(ex, RuntimeError) else repr(ex)})
+
+    # validate the batched prediction dicts. like `_validated_pred_ele_rows_for_pred_dicts()`, only invalid batches are
+    # re-validated one at a time
+    for (pred_class, target_name), idx_pred_dicts in class_target_to_idx_pred_dicts.items():
+        target_schema = validation_schema.target_name_to_schema[target_name]
+        try:
+            if _is_valid_batched_prediction_dicts(is_validate_cats, pred_class,
+                                                  [prediction_dict for _, prediction_dict in idx_pred_dicts],
+                                                  target_schema):
+                continue
+        except Exception:  # a malformed prediction dict. it's reported next
+            pass
+
+        for idx, prediction_dict in idx_pred_dicts:
+            try:
+                _validate_prediction_dict(is_validate_cats, prediction_dict, target_schema)  # raises o/w
+            except Exception as ex:
+                errors.append({'index': idx, 'message': str(ex) if isinstance(ex, RuntimeError) else repr(ex)})
+
+    # order by index, and then add "prediction"-level errors
+    errors.sort(key=lambda error: error['index'])
+    errors.extend({'index': None, 'message': error_message}
+                  for error_message in _prediction_level_error_messages(loc_targ_to_pred_classes))
+    return errors
+
+
+#
+# PredictionElement validity interval maintenance
+#
+
+def _update_pred_ele_validity(forecast):
+    """
+    A `_publish_pred_ele_temp_table()` helper that maintains PredictionElement.valid_to after `forecast`'s elements
+    were inserted (with valid_to = NULL) by ending the intervals of the older versions' elements that they mask or
+    retract. NB: Forecasts are normally loaded in issued_at order, but an empty older version can be loaded after a
+    newer one, in which case we rebuild the (forecast_model, time_zero)'s intervals.
+
+    :param forecast: the Forecast whose PredictionElements were just inserted
+    """
+    if Forecast.objects.filter(forecast_model=forecast.forecast_model, time_zero=forecast.time_zero,
+                               issued_at__gt=forecast.issued_at, pred_eles__isnull=False).exists():
+        rebuild_pred_ele_validity(forecast.forecast_model.pk, forecast.time_zero.pk)
+        return
+
+    pred_ele_table_name = PredictionElement._meta.db_table
+    sql = f"""
+        UPDATE {pred_ele_table_name}
+        SET valid_to = new_pred_ele.valid_from
+        FROM {Forecast._meta.db_table} AS f,
+             {pred_ele_table_name} AS new_pred_ele
+        WHERE {pred_ele_table_name}.forecast_id = f.id
+          AND f.forecast_model_id = %s
+          AND f.time_zero_id = %s
+          AND new_pred_ele.forecast_id = %s
+          AND {pred_ele_table_name}.unit_id = new_pred_ele.unit_id
+          AND {pred_ele_table_name}.target_id = new_pred_ele.target_id
+          AND {pred_ele_table_name}.pred_class = new_pred_ele.pred_class
+          AND {pred_ele_table_name}.valid_from < new_pred_ele.valid_from
+          AND {pred_ele_table_name}.valid_to IS NULL;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk, forecast.pk))
+
+
+def rebuild_pred_ele_validity(forecast_model_id, time_zero_id):
+    """
+    Recomputes PredictionElement.valid_from and valid_to for all versions of one (forecast_model, time_zero) from its
+    forecasts' issued_ats. Called when a version is deleted or its issued_at is edited (via Forecast signals), and by
+    `_update_pred_ele_validity()` for out-of-order loads.
+
+    :param forecast_model_id: a ForecastModel.pk
+    :param time_zero_id: a TimeZero.pk
+    """
+    pred_ele_table_name = PredictionElement._meta.db_table
+    sql = f"""
+        UPDATE {pred_ele_table_name}
+        SET valid_from = intervals.valid_from,
+            valid_to   = intervals.valid_to
+        FROM (SELECT pred_ele.id AS pred_ele_id,
+                     f.issued_at AS valid_from,
+                     LEAD(f.issued_at) OVER (
+                         PARTITION BY pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class
+                         ORDER BY f.issued_at) AS valid_to
+              FROM {pred_ele_table_name} AS pred_ele
+                       JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id
+              WHERE f.forecast_model_id = %s
+                AND f.time_zero_id = %s) AS intervals
+        WHERE {pred_ele_table_name}.id = intervals.pred_ele_id;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast_model_id, time_zero_id))
+
+
+#
+# CurrentPredictionElement maintenance
+#
+
+def _upsert_current_pred_eles(forecast):
+    """
+    A `_publish_pred_ele_temp_table()` helper that copies `forecast`'s just-inserted PredictionElements into the
+    CurrentPredictionElement table, replacing existing rows only if they are from older versions. NB: Forecasts are
+    normally loaded in issued_at order, but an empty older version can be loaded after a newer one, in which case the
+    newer one's rows are kept.
+
+    :param forecast: the Forecast whose PredictionElements were just inserted
+    """
+    current_table_name = CurrentPredictionElement._meta.db_table
+    forecast_table_name = Forecast._meta.db_table
+    sql = f"""
+        INSERT INTO {current_table_name} (forecast_model_id, time_zero_id, unit_id, target_id, pred_class, forecast_id,
+                                          is_retract, data_hash)
+        SELECT %s, %s, unit_id, target_id, pred_class, forecast_id, is_retract, data_hash
+        FROM {PredictionElement._meta.db_table}
+        WHERE forecast_id = %s
+        ON CONFLICT (forecast_model_id, time_zero_id, unit_id, target_id, pred_class) DO UPDATE
+            SET forecast_id = excluded.forecast_id,
+                is_retract  = excluded.is_retract,
+                data_hash   = excluded.data_hash
+            WHERE (SELECT issued_at FROM {forecast_table_name} WHERE id = {current_table_name}.forecast_id)
+                < (SELECT issued_at FROM {forecast_table_name} WHERE id = excluded.forecast_id);
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk, forecast.pk))
+
+
+def rebuild_current_pred_eles(forecast_model_id, time_zero_id):
+    """
+    Replaces the CurrentPredictionElement rows for one (forecast_model, time_zero) with the latest version of each of
+    its PredictionElements. Called by the Forecast post_delete signal, i.e., after the deleted forecast's
+    PredictionElements are gone. Only that (forecast_model, time_zero)'s versions are ranked, so this is cheap
+    regardless of how many other forecasts the project has.
+
+    :param forecast_model_id: a ForecastModel.pk
+    :param time_zero_id: a TimeZero.pk
+    """
+    current_table_name = CurrentPredictionElement._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            DELETE
+            FROM {current_table_name}
+            WHERE forecast_model_id = %s
+              AND time_zero_id = %s;
+        """, (forecast_model_id, time_zero_id))
+
+    # about the query: see _query_forecasts_sql_for_pred_class() for a description of a similar query
+    sql = f"""
+        INSERT INTO {current_table_name} (forecast_model_id, time_zero_id, unit_id, target_id, pred_class, forecast_id,
+                                          is_retract, data_hash)
+        SELECT %s, %s, unit_id, target_id, pred_class, forecast_id, is_retract, data_hash
+        FROM (SELECT pred_ele.unit_id     AS unit_id,
+                     pred_ele.target_id   AS target_id,
+                     pred_ele.pred_class  AS pred_class,
+                     pred_ele.forecast_id AS forecast_id,
+                     pred_ele.is_retract  AS is_retract,
+                     pred_ele.data_hash   AS data_hash,
+                     RANK() OVER (
+                         PARTITION BY pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class
+                         ORDER BY f.issued_at DESC) AS rownum
+              FROM {PredictionElement._meta.db_table} AS pred_ele
+                       JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id
+              WHERE f.forecast_model_id = %s
+                AND f.time_zero_id = %s) AS ranked_rows
+        WHERE rownum = 1;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast_model_id, time_zero_id, forecast_model_id, time_zero_id))
+
+
+#
+# decrement_prediction_data_ref_counts()
+#
+
+def decrement_prediction_data_ref_counts(forecast):
+    """
+    Garbage collects PredictionData for a Forecast that's about to be deleted. Called by the Forecast pre_delete signal,
+    i.e., while `forecast`'s PredictionElements still exist. Decrements the ref_count of each PredictionData that
+    `forecast` references by the number of its elements that reference it, and then deletes those that are no longer
+    referenced by any element. Only `forecast`'s data is touched, so this is cheap regardless of table size.
+
+    :param forecast: a Forecast that's being deleted
+    """
+    pred_ele_table_name = PredictionElement._meta.db_table
+    pred_data_table_name = PredictionData._meta.db_table
+    sql = f"""
+        UPDATE {pred_data_table_name}
+        SET ref_count = {pred_data_table_name}.ref_count - forecast_refs.num_refs
+        FROM (SELECT data_hash, COUNT(*) AS num_refs
+              FROM {pred_ele_table_name}
+              WHERE forecast_id = %s
+                AND NOT is_retract
+              GROUP BY data_hash) AS forecast_refs
+        WHERE {pred_data_table_name}.data_hash = forecast_refs.data_hash;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast.pk,))
+
+    sql = f"""
+        DELETE
+        FROM {pred_data_table_name}
+        WHERE ref_count <= 0
+          AND data_hash IN (SELECT data_hash
+                            FROM {pred_ele_table_name}
+                            WHERE forecast_id = %s
+                              AND NOT is_retract);
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast.pk,))
 
 
 #
@@ -697,10 +1658,11 @@ def data_rows_from_forecast(forecast, unit, target):
     # fill rows by leveraging `query_forecasts_for_project()`'s `_query_forecasts_sql_for_pred_class()`,
     # which does the necessary work of merging versions and picking latest issued_at data.
     # args: pred_classes, model_ids, unit_ids, target_ids, timezero_ids, as_of, is_exclude_oracle:
-    sql = _query_forecasts_sql_for_pred_class([], [forecast.forecast_model.pk], [unit.pk], [target.pk],
-                                              [forecast.time_zero.pk], forecast.issued_at, False)
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (forecast.forecast_model.project.pk,))
+    sql, sql_params = _query_forecasts_sql_for_pred_class([], [forecast.forecast_model.pk], [unit.pk], [target.pk],
+                                                          [forecast.time_zero.pk], _as_of_for_forecast(forecast),
+                                                          False)
+    with server_side_cursor() as cursor:
+        cursor.execute(sql, [forecast.forecast_model.project.pk] + sql_params)
         for fm_id, tz_id, pred_class, unit_id, target_id, is_retract, pred_data in batched_rows(cursor):
             # we do not have to check is_retract b/c we pass `is_include_retract=False`, which skips retractions.
             # counterintuitively must use json.loads per https://code.djangoproject.com/ticket/31991
@@ -731,40 +1693,49 @@ def data_rows_from_forecast(forecast, unit, target):
 @transaction.atomic
 def cache_forecast_metadata(forecast):
     """
-    Top-level function that caches metadata information for forecast. Clears existing first.
+    Top-level function that caches metadata information for forecast. Clears existing first. NB: loading a forecast
+    normally caches its metadata incrementally (see `_cache_forecast_metadata_incremental()`), so callers that load
+    one only need to call this if `is_forecast_metadata_available()` is False afterward.
 
     :param forecast: a Forecast whose metata is to be cached
     """
     clear_forecast_metadata(forecast)
-    _cache_forecast_metadata_predictions(forecast)
-    _cache_forecast_metadata_units(forecast)
-    _cache_forecast_metadata_targets(forecast)
+    as_of = _as_of_for_forecast(forecast)
+    unit_ids = _forecast_metadata_present_ids(forecast, as_of, True)
+    target_ids = _forecast_metadata_present_ids(forecast, as_of, False)
+    _cache_forecast_metadata_predictions(forecast, as_of, unit_ids, target_ids)
 
 
-def _cache_forecast_metadata_predictions(forecast):
-    # cache one ForecastMetaPrediction row for forecast.
+def _cache_forecast_metadata_predictions(forecast, as_of, unit_ids, target_ids):
+    # cache one ForecastMetaPrediction row for forecast, including unit_ids' and target_ids' bitsets. uses the
+    # CurrentPredictionElement table if as_of is None, and PredictionElement validity intervals otherwise - see
+    # _as_of_for_forecast()
     # about the query: see _query_forecasts_sql_for_pred_class() for a description of a similar query
-    sql = f"""
-        WITH ranked_rows AS (
-            SELECT pred_ele.pred_class             AS pred_class,
-                   pred_ele.is_retract             AS is_retract,
-                   RANK() OVER (
-                       PARTITION BY f.forecast_model_id, f.time_zero_id, pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class
-                       ORDER BY f.issued_at DESC) AS rownum
+    if not as_of:
+        sql = f"""
+            SELECT pred_class, COUNT(*)
+            FROM {CurrentPredictionElement._meta.db_table}
+            WHERE forecast_model_id = %s
+              AND time_zero_id = %s
+              AND NOT is_retract
+            GROUP BY pred_class;
+        """
+        sql_params = (forecast.forecast_model.pk, forecast.time_zero.pk)
+    else:
+        sql = f"""
+            SELECT pred_ele.pred_class, COUNT(*)
             FROM {PredictionElement._meta.db_table} AS pred_ele
                      JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id
             WHERE f.forecast_model_id = %s
               AND f.time_zero_id = %s
-              AND f.issued_at <= %s
-        )
-        SELECT ranked_rows.pred_class, COUNT(*)
-        FROM ranked_rows
-        WHERE ranked_rows.rownum = 1
-          AND NOT is_retract
-        GROUP BY ranked_rows.pred_class;
-    """
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk, forecast.issued_at,))
+              AND pred_ele.valid_from <= %s
+              AND (pred_ele.valid_to IS NULL OR pred_ele.valid_to > %s)
+              AND NOT pred_ele.is_retract
+            GROUP BY pred_ele.pred_class;
+        """
+        sql_params = (forecast.forecast_model.pk, forecast.time_zero.pk, as_of, as_of)
+    with server_side_cursor() as cursor:
+        cursor.execute(sql, sql_params)
         pred_class_to_counts = defaultdict(int)
         for pred_class, count in batched_rows(cursor):
             pred_class_to_counts[pred_class] = count
@@ -773,55 +1744,153 @@ def _cache_forecast_metadata_predictions(forecast):
                                               named_count=pred_class_to_counts[PredictionElement.NAMED_CLASS],
                                               point_count=pred_class_to_counts[PredictionElement.POINT_CLASS],
                                               sample_count=pred_class_to_counts[PredictionElement.SAMPLE_CLASS],
-                                              quantile_count=pred_class_to_counts[PredictionElement.QUANTILE_CLASS])
-
-
-def _cache_forecast_metadata_units(forecast):
-    # cache ForecastMetaUnit rows for forecast
-    unit_id_to_obj = {unit.id: unit for unit in forecast.forecast_model.project.units.all()}
-    sql = _cache_forecast_metadata_sql_for_forecast(True)
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk, forecast.issued_at,))
-        for unit_id in batched_rows(cursor):
-            ForecastMetaUnit.objects.create(forecast=forecast, unit=unit_id_to_obj[unit_id[0]])
+                                              quantile_count=pred_class_to_counts[PredictionElement.QUANTILE_CLASS],
+                                              **ForecastMetaPrediction.presence_fields(unit_ids, target_ids))
 
 
-def _cache_forecast_metadata_targets(forecast):
-    # cache ForecastMetaTarget rows for forecast
-    target_id_to_object = {target.id: target for target in forecast.forecast_model.project.targets.all()}
-    sql = _cache_forecast_metadata_sql_for_forecast(False)
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk, forecast.issued_at,))
-        for target_id in batched_rows(cursor):
-            ForecastMetaTarget.objects.create(forecast=forecast, target=target_id_to_object[target_id[0]])
+def _forecast_metadata_present_ids(forecast, as_of, is_units):
+    # returns the unit or target IDs that are present in forecast, for its ForecastMetaPrediction bitsets
+    sql, sql_params = _cache_forecast_metadata_sql_for_forecast(forecast, as_of, is_units)
+    with server_side_cursor() as cursor:
+        cursor.execute(sql, sql_params)
+        return [obj_id for obj_id, in batched_rows(cursor)]
 
 
-def _cache_forecast_metadata_sql_for_forecast(is_units):
+def _cache_forecast_metadata_sql_for_forecast(forecast, as_of, is_units):
     """
-    _cache_forecast_metadata_units() and _cache_forecast_metadata_targets() helper that returns a common SQL query
-    string based on my args. The query returns DISTINCT unit or target IDs for the latest version of `forecast`.
+    `_forecast_metadata_present_ids()` helper that returns a common SQL query string and its params based on my args.
+    The query returns DISTINCT unit or target IDs for the latest version of `forecast`. Uses the
+    CurrentPredictionElement table if `as_of` is None, and PredictionElement validity intervals otherwise - see
+    `_as_of_for_forecast()`.
     """
+    if not as_of:
+        select_column = 'unit_id' if is_units else 'target_id'
+        sql = f"""
+            SELECT DISTINCT {select_column}
+            FROM {CurrentPredictionElement._meta.db_table}
+            WHERE forecast_model_id = %s
+              AND time_zero_id = %s
+              AND NOT is_retract;
+        """
+        return sql, (forecast.forecast_model.pk, forecast.time_zero.pk)
+
     # about the query: see _query_forecasts_sql_for_pred_class() for a description of a similar query
     select_column = 'pred_ele.unit_id' if is_units else 'pred_ele.target_id'
     sql = f"""
-        WITH ranked_rows AS (
-            SELECT {select_column}                 AS unit_or_target_id,
-                   pred_ele.is_retract             AS is_retract,
-                   RANK() OVER (
-                       PARTITION BY f.forecast_model_id, f.time_zero_id, pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class
-                       ORDER BY f.issued_at DESC) AS rownum
-            FROM {PredictionElement._meta.db_table} AS pred_ele
-                     JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id
-            WHERE f.forecast_model_id = %s
-              AND f.time_zero_id = %s
-              AND f.issued_at <= %s
-        )
-        SELECT DISTINCT ranked_rows.unit_or_target_id
-        FROM ranked_rows
-        WHERE ranked_rows.rownum = 1
-          AND NOT is_retract;
+        SELECT DISTINCT {select_column}
+        FROM {PredictionElement._meta.db_table} AS pred_ele
+                 JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id
+        WHERE f.forecast_model_id = %s
+          AND f.time_zero_id = %s
+          AND pred_ele.valid_from <= %s
+          AND (pred_ele.valid_to IS NULL OR pred_ele.valid_to > %s)
+          AND NOT pred_ele.is_retract;
+    """
+    return sql, (forecast.forecast_model.pk, forecast.time_zero.pk, as_of, as_of)
+
+
+def _incremental_forecast_metadata_counts(forecast, temp_table_name):
+    """
+    A `_publish_pred_ele_temp_table()` helper that starts `forecast`'s metadata from the previous version's: its
+    prediction counts plus the change due to temp_table_name's rows, which is computed by matching them against the
+    CurrentPredictionElement table before it is updated: each non-retraction adds one to its class, and each row that
+    masks a non-retracted current element subtracts one. Only applies if forecast is the newest version of its
+    (forecast_model, time_zero), its model is not an oracle (by convention they have no metadata), and the previous
+    version (if any) has metadata.
+
+    :param forecast: as passed to `_publish_pred_ele_temp_table()`
+    :param temp_table_name: ""
+    :return: a 3-tuple: (pred_class_to_count, prev_unit_ids, prev_target_ids) where the first is a dict that maps
+        PredictionElement.*_CLASS -> count, and the last two are the previous version's present Unit and Target IDs
+        as sets. all three are None if metadata cannot be computed incrementally
+    """
+    if forecast.forecast_model.is_oracle or _as_of_for_forecast(forecast):
+        return None, None, None
+
+    prev_forecast = Forecast.objects.filter(forecast_model_id=forecast.forecast_model_id,
+                                            time_zero_id=forecast.time_zero_id,
+                                            issued_at__lt=forecast.issued_at) \
+        .order_by('-issued_at') \
+        .first()
+    pred_class_to_count = defaultdict(int)
+    prev_unit_ids, prev_target_ids = set(), set()
+    if prev_forecast:
+        forecast_meta_prediction = ForecastMetaPrediction.objects.filter(forecast=prev_forecast).first()
+        if not forecast_meta_prediction:
+            return None, None, None
+
+        pred_class_to_count.update({PredictionElement.BIN_CLASS: forecast_meta_prediction.bin_count,
+                                    PredictionElement.NAMED_CLASS: forecast_meta_prediction.named_count,
+                                    PredictionElement.POINT_CLASS: forecast_meta_prediction.point_count,
+                                    PredictionElement.SAMPLE_CLASS: forecast_meta_prediction.sample_count,
+                                    PredictionElement.QUANTILE_CLASS: forecast_meta_prediction.quantile_count})
+        prev_unit_ids = forecast_meta_prediction.unit_ids()
+        prev_target_ids = forecast_meta_prediction.target_ids()
+
+    sql = f"""
+        SELECT temp.pred_class,
+               SUM(CASE WHEN temp.is_retract THEN 0 ELSE 1 END - CASE WHEN NOT cur.is_retract THEN 1 ELSE 0 END)
+        FROM {temp_table_name} AS temp
+                 LEFT JOIN {CurrentPredictionElement._meta.db_table} AS cur
+                           ON cur.forecast_model_id = %s
+                               AND cur.time_zero_id = %s
+                               AND cur.unit_id = temp.unit_id
+                               AND cur.target_id = temp.target_id
+                               AND cur.pred_class = temp.pred_class
+        GROUP BY temp.pred_class;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk))
+        for pred_class, count_delta in cursor.fetchall():
+            pred_class_to_count[pred_class] += count_delta
+    return pred_class_to_count, prev_unit_ids, prev_target_ids
+
+
+def _cache_forecast_metadata_incremental(forecast, temp_table_name, pred_class_to_count, prev_unit_ids,
+                                         prev_target_ids):
+    """
+    A `_publish_pred_ele_temp_table()` helper that caches `forecast`'s metadata after the CurrentPredictionElement
+    table has been updated. Only the units and targets that temp_table_name's rows touch can change: each is kept if it
+    still has a non-retracted current element. Untouched ones are carried over from the previous version. Thus the
+    cost is proportional to the number of new elements rather than to the number of elements in all versions.
+
+    :param forecast: as passed to `_publish_pred_ele_temp_table()`
+    :param temp_table_name: ""
+    :param pred_class_to_count: as returned by `_incremental_forecast_metadata_counts()`
+    :param prev_unit_ids: ""
+    :param prev_target_ids: ""
     """
-    return sql
+    def current_ids(prev_ids, column_name):
+        sql = f"""
+            SELECT touched.{column_name},
+                   EXISTS(SELECT *
+                          FROM {CurrentPredictionElement._meta.db_table} AS cur
+                          WHERE cur.forecast_model_id = %s
+                            AND cur.time_zero_id = %s
+                            AND cur.{column_name} = touched.{column_name}
+                            AND NOT cur.is_retract)
+            FROM (SELECT DISTINCT {column_name} FROM {temp_table_name}) AS touched;
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (forecast.forecast_model.pk, forecast.time_zero.pk))
+            ids = set(prev_ids)
+            for obj_id, is_current in cursor.fetchall():
+                if is_current:
+                    ids.add(obj_id)
+                else:
+                    ids.discard(obj_id)
+            return ids
+
+
+    unit_ids = current_ids(prev_unit_ids, 'unit_id')
+    target_ids = current_ids(prev_target_ids, 'target_id')
+    ForecastMetaPrediction.objects.create(forecast=forecast,
+                                          bin_count=pred_class_to_count[PredictionElement.BIN_CLASS],
+                                          named_count=pred_class_to_count[PredictionElement.NAMED_CLASS],
+                                          point_count=pred_class_to_count[PredictionElement.POINT_CLASS],
+                                          sample_count=pred_class_to_count[PredictionElement.SAMPLE_CLASS],
+                                          quantile_count=pred_class_to_count[PredictionElement.QUANTILE_CLASS],
+                                          **ForecastMetaPrediction.presence_fields(unit_ids, target_ids))
 
 
 def clear_forecast_metadata(forecast):
@@ -831,8 +1900,6 @@ def clear_forecast_metadata(forecast):
     :param forecast: a Forecast whose metadata is to be cached
     """
     ForecastMetaPrediction.objects.filter(forecast=forecast).delete()
-    ForecastMetaUnit.objects.filter(forecast=forecast).delete()
-    ForecastMetaTarget.objects.filter(forecast=forecast).delete()
 
 
 def _cache_forecast_metadata_worker(forecast_pk):
@@ -848,6 +1915,111 @@ def _cache_forecast_metadata_worker(forecast_pk):
         logger.error(f"_cache_forecast_metadata_worker(): error: {ex!r}. forecast={forecast}")
 
 
+#
+# rebuild_forecast_metadata_for_project()
+#
+
+def rebuild_forecast_metadata_for_project(project):
+    """
+    Top-level function that replaces the metadata of all of `project`'s non-oracle forecasts (by convention oracle
+    forecasts have no metadata) using a few set-based SQL statements per ForecastModel rather than one
+    `cache_forecast_metadata()` call per forecast. Each model is done in its own transaction, and progress is logged
+    after each one.
+
+    :param project: a Project
+    :return: the number of forecasts whose metadata was rebuilt
+    """
+    forecast_models = project.models.filter(is_oracle=False).order_by('id')
+    num_forecasts = 0
+    for model_idx, forecast_model in enumerate(forecast_models):
+        num_forecasts += _rebuild_forecast_metadata_for_model(forecast_model)
+        logger.info(f"rebuild_forecast_metadata_for_project(): {model_idx + 1}/{len(forecast_models)} models done. "
+                    f"forecast_model={forecast_model}, num_forecasts={num_forecasts}")
+    refresh_project_summary(project.pk, is_create=False)  # the rebuild's SQL bypasses ForecastMetaPrediction signals
+    return num_forecasts
+
+
+@transaction.atomic
+def _rebuild_forecast_metadata_for_model(forecast_model):
+    """
+    A `rebuild_forecast_metadata_for_project()` helper that rebuilds the metadata of all of forecast_model's forecasts.
+    Each forecast's metadata is computed from the elements that were current as of its issued_at, i.e., from all
+    versions of its (forecast_model, time_zero) via PredictionElement validity intervals, exactly as
+    `cache_forecast_metadata()` does for one forecast.
+
+    :param forecast_model: a ForecastModel
+    :return: the number of forecasts whose metadata was rebuilt
+    """
+    forecast_table_name = Forecast._meta.db_table
+    forecast_ids_sql = f"SELECT id FROM {forecast_table_name} WHERE forecast_model_id = %s"
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {ForecastMetaPrediction._meta.db_table} "
+                       f"WHERE forecast_id IN ({forecast_ids_sql});", (forecast_model.pk,))
+
+    # the join from each forecast to its merged elements. LEFT JOINs so that forecasts without any get zero counts
+    versions_join_sql = f"""
+        FROM {forecast_table_name} AS f
+                 LEFT JOIN {forecast_table_name} AS version_f
+                           ON version_f.forecast_model_id = f.forecast_model_id
+                               AND version_f.time_zero_id = f.time_zero_id
+                               AND version_f.issued_at <= f.issued_at
+                 LEFT JOIN {PredictionElement._meta.db_table} AS pred_ele
+                           ON pred_ele.forecast_id = version_f.id
+                               AND pred_ele.valid_from <= f.issued_at
+                               AND (pred_ele.valid_to IS NULL OR pred_ele.valid_to > f.issued_at)
+                               AND NOT pred_ele.is_retract
+        WHERE f.forecast_model_id = %s
+    """
+    pred_class_counts_sql = ', '.join(f"SUM(CASE WHEN pred_ele.pred_class = {pred_class} THEN 1 ELSE 0 END)"
+                                      for pred_class in [PredictionElement.POINT_CLASS, PredictionElement.NAMED_CLASS,
+                                                         PredictionElement.BIN_CLASS, PredictionElement.SAMPLE_CLASS,
+                                                         PredictionElement.QUANTILE_CLASS])
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {ForecastMetaPrediction._meta.db_table} (forecast_id, point_count, named_count, bin_count,
+                                                                 sample_count, quantile_count)
+            SELECT f.id, {pred_class_counts_sql}
+            {versions_join_sql}
+            GROUP BY f.id;
+        """, (forecast_model.pk,))
+        num_forecasts = cursor.rowcount
+
+    # encode each forecast's units and targets as bitsets. done here b/c SQL has no portable way to aggregate them
+    forecast_id_to_unit_target_ids = defaultdict(lambda: (set(), set()))
+    for ids_idx, column_name in enumerate(['unit_id', 'target_id']):
+        with server_side_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT DISTINCT f.id, pred_ele.{column_name}
+                {versions_join_sql}
+                  AND pred_ele.id IS NOT NULL;
+            """, (forecast_model.pk,))
+            for forecast_id, obj_id in batched_rows(cursor):
+                forecast_id_to_unit_target_ids[forecast_id][ids_idx].add(obj_id)
+    forecast_meta_predictions = list(ForecastMetaPrediction.objects.filter(forecast__forecast_model=forecast_model))
+    for forecast_meta_prediction in forecast_meta_predictions:
+        unit_ids, target_ids = forecast_id_to_unit_target_ids[forecast_meta_prediction.forecast_id]
+        for field_name, value in ForecastMetaPrediction.presence_fields(unit_ids, target_ids).items():
+            setattr(forecast_meta_prediction, field_name, value)
+    ForecastMetaPrediction.objects.bulk_update(forecast_meta_predictions,
+                                               list(ForecastMetaPrediction.presence_fields([], []).keys()),
+                                               batch_size=1000)
+    return num_forecasts
+
+
+def _rebuild_forecast_metadata_worker(project_pk):
+    """
+    enqueue() helper function
+    """
+    project = get_object_or_404(Project, pk=project_pk)
+    try:
+        logger.debug(f"_rebuild_forecast_metadata_worker(): 1/2 starting: project_pk={project_pk}")
+        num_forecasts = rebuild_forecast_metadata_for_project(project)
+        logger.debug(f"_rebuild_forecast_metadata_worker(): 2/2 done: project_pk={project_pk}, "
+                     f"num_forecasts={num_forecasts}")
+    except Exception as ex:
+        logger.error(f"_rebuild_forecast_metadata_worker(): error: {ex!r}. project={project}")
+
+
 #
 # forecast_metadata()
 #
@@ -857,21 +2029,22 @@ def forecast_metadata(forecast):
     Returns all metadata associated with Forecast.
 
     :param forecast: a Forecast
-    :return: a 3-tuple: (forecast_meta_prediction, forecast_meta_unit_qs, forecast_meta_target_qs) where the latter two
-        are QuerySets. The first is None if there is no cached data. The second two are empty QuerySets if no cached
-        data.
+    :return: a 3-tuple: (forecast_meta_prediction, unit_qs, target_qs) where the latter two are QuerySets of the Units
+        and Targets that are present in forecast, decoded from the first's bitsets. The first is None if there is no
+        cached data. The second two are empty QuerySets if no cached data.
     """
     forecast_meta_prediction = ForecastMetaPrediction.objects.filter(forecast=forecast).first()
-    forecast_meta_unit_qs = ForecastMetaUnit.objects.filter(forecast=forecast)
-    forecast_meta_target_qs = ForecastMetaTarget.objects.filter(forecast=forecast)
-    return forecast_meta_prediction, forecast_meta_unit_qs, forecast_meta_target_qs
+    unit_ids = forecast_meta_prediction.unit_ids() if forecast_meta_prediction else set()
+    target_ids = forecast_meta_prediction.target_ids() if forecast_meta_prediction else set()
+    unit_qs = Unit.objects.filter(project_id=forecast.forecast_model.project_id, id__in=unit_ids)
+    target_qs = Target.objects.filter(project_id=forecast.forecast_model.project_id, id__in=target_ids)
+    return forecast_meta_prediction, unit_qs, target_qs
 
 
 def is_forecast_metadata_available(forecast):
     """
     :param forecast: a Forecast
-    :return: True if `forecast` has a ForecastMetaPrediction, and False o/w. we only check it instead of all three
-        (ForecastMetaPrediction, ForecastMetaUnit, and ForecastMetaTarget) for efficiency
+    :return: True if `forecast` has a ForecastMetaPrediction, and False o/w
     """
     return ForecastMetaPrediction.objects.filter(forecast=forecast).exists()
 
@@ -887,43 +2060,28 @@ def forecast_metadata_counts_for_project(project):
     """
     forecast_id_to_counts = defaultdict(lambda: [None, None, None])  # return value. filled next
 
-    # query 1/2: get ForecastMetaPrediction counts
-    logger.debug(f"forecast_metadata_counts_for_project(): getting prediction counts")
+    # units and targets are stored alongside prediction counts as bitsets, so one row per forecast has everything. the
+    # bitsets are intersected with the project's current units and targets to skip deleted ones - see `ids_to_bitset()`
+    logger.debug(f"forecast_metadata_counts_for_project(): getting counts")
+    unit_mask = ids_to_mask(project.units.values_list('id', flat=True))
+    target_mask = ids_to_mask(project.targets.values_list('id', flat=True))
     sql = f"""
-        SELECT fmp.forecast_id AS forecast_id, fmp.point_count, fmp.named_count, fmp.bin_count, fmp.sample_count, fmp.quantile_count
+        SELECT fmp.forecast_id AS forecast_id, fmp.point_count, fmp.named_count, fmp.bin_count, fmp.sample_count,
+               fmp.quantile_count, fmp.unit_bits, fmp.unit_bits_offset, fmp.target_bits, fmp.target_bits_offset
         FROM {ForecastMetaPrediction._meta.db_table} AS fmp
                  JOIN {Forecast._meta.db_table} AS f ON fmp.forecast_id = f.id
                  JOIN {ForecastModel._meta.db_table} AS fm ON f.forecast_model_id = fm.id
         WHERE fm.project_id = %s;
     """
-    with connection.cursor() as cursor:
+    with server_side_cursor() as cursor:
         cursor.execute(sql, (project.pk,))
-        for forecast_id, point_count, named_count, bin_count, sample_count, quantile_count in batched_rows(cursor):
-            forecast_id_to_counts[forecast_id][0] = (point_count, named_count, bin_count, sample_count, quantile_count)
-
-    # query 2/2: get ForecastMetaUnit and ForecastMetaTarget counts
-    logger.debug(f"forecast_metadata_counts_for_project(): getting unit and target counts")
-    sql = f"""
-        SELECT fmt.forecast_id AS forecast_id, count(*) AS num_targets, 1 AS is_target_count
-        FROM {ForecastMetaTarget._meta.db_table} AS fmt
-                 JOIN {Forecast._meta.db_table} AS f ON fmt.forecast_id = f.id
-                 JOIN {ForecastModel._meta.db_table} AS fm ON f.forecast_model_id = fm.id
-        WHERE fm.project_id = %s
-        GROUP BY fmt.forecast_id, fm.project_id
-        
-        UNION
-        
-        SELECT fmu.forecast_id AS forecast_id, count(*) AS num_units, 0 AS is_target_count
-        FROM {ForecastMetaUnit._meta.db_table} AS fmu
-                 JOIN {Forecast._meta.db_table} AS f ON fmu.forecast_id = f.id
-                 JOIN {ForecastModel._meta.db_table} AS fm ON f.forecast_model_id = fm.id
-        WHERE fm.project_id = %s
-        GROUP BY fmu.forecast_id, fm.project_id;
-    """
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (project.pk, project.pk))
-        for forecast_id, count, is_target_count in batched_rows(cursor):
-            forecast_id_to_counts[forecast_id][2 if is_target_count else 1] = count
+        for forecast_id, point_count, named_count, bin_count, sample_count, quantile_count, unit_bits, \
+            unit_bits_offset, target_bits, target_bits_offset in batched_rows(cursor):
+            forecast_id_to_counts[forecast_id] = [(point_count, named_count, bin_count, sample_count, quantile_count),
+                                                  count_mask_ids(bitset_to_mask(unit_bits, unit_bits_offset)
+                                                                 & unit_mask),
+                                                  count_mask_ids(bitset_to_mask(target_bits, target_bits_offset)
+                                                                 & target_mask)]
 
     # done
     return forecast_id_to_counts
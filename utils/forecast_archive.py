@@ -0,0 +1,217 @@
+import json
+import logging
+import multiprocessing
+import tarfile
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+
+from forecast_app.models import Forecast, ForecastModel, TimeZero
+from utils.utilities import YYYY_MM_DD_DATE_FORMAT
+
+
+logger = logging.getLogger(__name__)
+
+
+#
+# ---- archive utilities ----
+#
+# an "archive" is a zip or tar (optionally compressed) file of forecast data files in the same JSON format that
+# `load_predictions_from_json_io_dict()` takes. a "manifest" is a list of dicts, one per archive file to load, with
+# these keys:
+# - 'filename': the file's name within the archive. names must be unique
+# - 'timezero_pk': the pk of the TimeZero to load the file's forecast into
+# - 'notes': optional Forecast.notes
+# manifest order matters when more than one file has the same TimeZero: they are loaded as successive versions in that
+# order
+#
+
+def archive_member_sizes(archive_fp):
+    """
+    :param archive_fp: a seekable binary file-like object containing a zip or tar archive
+    :return: a dict that maps each of the archive's (non-directory) file names to its uncompressed size
+    :raises RuntimeError: if `archive_fp` is not a zip or tar archive
+    """
+    archive_fp.seek(0)
+    if zipfile.is_zipfile(archive_fp):
+        archive_fp.seek(0)
+        with zipfile.ZipFile(archive_fp) as zip_file:
+            return {zip_info.filename: zip_info.file_size for zip_info in zip_file.infolist() if not zip_info.is_dir()}
+
+    archive_fp.seek(0)
+    try:
+        with tarfile.open(fileobj=archive_fp, mode='r:*') as tar_file:
+            return {tar_info.name: tar_info.size for tar_info in tar_file.getmembers() if tar_info.isfile()}
+    except tarfile.TarError as te:
+        raise RuntimeError(f"file was not a zip or tar archive: {te!r}")
+
+
+@contextmanager
+def _archive_member_opener(archive_fp):
+    """
+    A context manager that opens `archive_fp` once so that its members can be read one at a time.
+
+    :param archive_fp: as passed to `archive_member_sizes()`
+    :return: a function that takes a file name in the archive and returns a binary file-like object for reading it
+    """
+    archive_fp.seek(0)
+    if zipfile.is_zipfile(archive_fp):
+        archive_fp.seek(0)
+        with zipfile.ZipFile(archive_fp) as zip_file:
+            yield zip_file.open
+        return
+
+    archive_fp.seek(0)
+    with tarfile.open(fileobj=archive_fp, mode='r:*') as tar_file:
+        yield tar_file.extractfile
+
+
+def _archive_member_bytes(open_member, filename, max_size):
+    """
+    :param open_member: a function as returned by `_archive_member_opener()`
+    :param filename: a file name in the archive
+    :param max_size: the maximum number of uncompressed bytes to read. NB: we do not trust the size in the archive's
+        header, which can be forged, e.g., by a "zip bomb"
+    :return: the file's bytes
+    :raises RuntimeError: if the file is larger than max_size
+    """
+    with open_member(filename) as member_fp:
+        member_bytes = member_fp.read(max_size + 1)
+    if len(member_bytes) > max_size:
+        raise RuntimeError(f"archive file was too large. filename={filename!r}, max={max_size}")
+
+    return member_bytes
+
+
+#
+# load_forecast_archive()
+#
+
+def load_forecast_archive(forecast_model, archive_fp, manifest, pool_size):
+    """
+    Loads the files in `archive_fp` that are listed in `manifest` into new Forecasts in `forecast_model`. Each file is
+    loaded in its own transaction, so an invalid file does not prevent others from loading, and only valid files'
+    Forecasts are created. Files are grouped by TimeZero, and each group is loaded in manifest order by a single
+    worker so that versions are created in a predictable order. Groups are fanned out across a process pool of size
+    `pool_size`, or loaded serially in the current process if `pool_size` is 1.
+
+    Files are read from the archive one group at a time, just before the group is loaded, and at most `pool_size`
+    groups are in flight at once. This means that memory is bounded by the size of those groups rather than by the
+    archive's uncompressed size. Files larger than MAX_UPLOAD_FILE_SIZE (uncompressed) fail without being loaded.
+
+    For speed, we build `forecast_model`'s project's `validation_schema_for_project()` once before forking so that all
+    workers share it rather than each re-querying the project's units and targets. It stays valid for the whole archive
+    because it is keyed on the project's ProjectSchemaVersion, which loads do not change. Similarly, loads do not update
+    any rows shared with other groups' transactions: the project's ProjectDataVersion and ProjectSummary are updated
+    after each file's transaction commits (see `bump_project_data_version()` and `add_to_project_summary()`), which
+    means workers do not wait on each other's row locks.
+
+    :param forecast_model: the ForecastModel to load into
+    :param archive_fp: as passed to `archive_member_sizes()`
+    :param manifest: a list of dicts as documented at the top of this file
+    :param pool_size: the number of processes to load groups in. 1 means load them in the current process
+    :return: a list of per-file status dicts, in manifest order, with these keys: 'filename', 'timezero_date',
+        'forecast_pk' (None if failed), 'status' ('SUCCESS' or 'FAILED'), and 'failure_message' ('' if succeeded)
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import MAX_UPLOAD_FILE_SIZE
+    from utils.forecast import validation_schema_for_project  # avoid circular imports
+
+
+    def group_with_bytes(group):  # reads group's files. a file that cannot be read has None bytes and an error
+        group_entries = []
+        for filename, timezero_pk, notes in group:
+            try:
+                json_bytes, read_error = _archive_member_bytes(open_member, filename, int(MAX_UPLOAD_FILE_SIZE)), ''
+            except Exception as ex:
+                json_bytes, read_error = None, f"{ex!r}"
+            group_entries.append((filename, timezero_pk, notes, json_bytes, read_error))
+        return group_entries
+
+
+    # group manifest entries by timezero, preserving manifest order within each group
+    timezero_pk_to_entries = OrderedDict()
+    for manifest_entry in manifest:
+        timezero_pk_to_entries.setdefault(manifest_entry['timezero_pk'], []).append(manifest_entry)
+    groups = [[(manifest_entry['filename'], timezero_pk, manifest_entry.get('notes', ''))
+               for manifest_entry in manifest_entries]
+              for timezero_pk, manifest_entries in timezero_pk_to_entries.items()]
+
+    # warm the validation schema cache, then load
+    validation_schema_for_project(forecast_model.project)
+    logger.debug(f"load_forecast_archive(): loading. # files={len(manifest)}, # groups={len(groups)}, "
+                 f"pool_size={pool_size}, forecast_model={forecast_model}")
+    with _archive_member_opener(archive_fp) as open_member:
+        if pool_size <= 1:
+            group_statuses = [_load_forecast_archive_group(forecast_model.pk, group_with_bytes(group))
+                              for group in groups]
+        else:
+            # NB: workers are forked so that they inherit the warmed schema cache. we close the parent's database
+            # connections first so that workers open their own rather than sharing the parent's socket. we submit a
+            # group only when a worker is free so that only pool_size groups' bytes are in memory
+            connections.close_all()
+            group_statuses = [None] * len(groups)
+            with ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context('fork')) \
+                    as executor:
+                future_to_group_idx = {}
+                for group_idx, group in enumerate(groups):
+                    if len(future_to_group_idx) >= pool_size:
+                        done_futures, _ = wait(future_to_group_idx, return_when=FIRST_COMPLETED)
+                        for future in done_futures:
+                            group_statuses[future_to_group_idx.pop(future)] = future.result()
+                    future = executor.submit(_load_forecast_archive_group, forecast_model.pk, group_with_bytes(group))
+                    future_to_group_idx[future] = group_idx
+                for future, group_idx in future_to_group_idx.items():
+                    group_statuses[group_idx] = future.result()
+
+    # done
+    filename_to_status = {file_status['filename']: file_status
+                          for file_statuses in group_statuses for file_status in file_statuses}
+    logger.debug(f"load_forecast_archive(): done. forecast_model={forecast_model}")
+    return [filename_to_status[manifest_entry['filename']] for manifest_entry in manifest]
+
+
+def _load_forecast_archive_group(forecast_model_pk, group):
+    """
+    A `load_forecast_archive()` helper that loads one TimeZero's files, in order. Runs in a pool worker process if
+    pool_size > 1, so its args and return value must be picklable.
+
+    :param forecast_model_pk: the pk of the ForecastModel to load into
+    :param group: a list of 5-tuples: (filename, timezero_pk, notes, json_bytes, read_error). read_error is '' if
+        the file was read, and o/w is why it could not be, in which case json_bytes is None and it is not loaded
+    :return: a list of per-file status dicts as documented in `load_forecast_archive()`
+    """
+    from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata, \
+        is_forecast_metadata_available  # avoid circular imports
+
+
+    forecast_model = ForecastModel.objects.get(pk=forecast_model_pk)
+    file_statuses = []
+    for filename, timezero_pk, notes, json_bytes, read_error in group:
+        time_zero = TimeZero.objects.get(pk=timezero_pk)
+        file_status = {'filename': filename,
+                       'timezero_date': time_zero.timezero_date.strftime(YYYY_MM_DD_DATE_FORMAT),
+                       'forecast_pk': None, 'status': 'FAILED', 'failure_message': read_error}
+        if read_error:
+            logger.error(f"_load_forecast_archive_group(): error reading file. filename={filename!r}, "
+                         f"error={read_error}")
+            file_statuses.append(file_status)
+            continue
+
+        try:
+            with transaction.atomic():
+                forecast = Forecast.objects.create(forecast_model=forecast_model, time_zero=time_zero,
+                                                   source=filename, notes=notes)
+                load_predictions_from_json_io_dict(forecast, json.loads(json_bytes), is_validate_cats=False)
+                if not is_forecast_metadata_available(forecast):  # o/w cached incrementally by the load
+                    cache_forecast_metadata(forecast)
+            file_status['forecast_pk'] = forecast.pk
+            file_status['status'] = 'SUCCESS'
+        except Exception as ex:
+            file_status['failure_message'] = f"{ex!r}"
+            logger.error(f"_load_forecast_archive_group(): error loading file. filename={filename!r}, error={ex!r}")
+        file_statuses.append(file_status)
+    return file_statuses
@@ -0,0 +1,136 @@
+import csv
+import itertools
+
+from forecast_app.models import PredictionElement, Target
+from forecast_app.models.prediction_element import PRED_CLASS_INT_TO_NAME
+from utils.forecast import validation_schema_for_project
+from utils.project_queries import FORECAST_CSV_HEADER
+
+
+#
+# ---- forecast csv utilities ----
+#
+# a "forecast csv" file is a forecast data file in the same Zoltar-specific CSV format that
+# `query_forecasts_for_project()` returns, i.e., the columns are FORECAST_CSV_HEADER and each prediction element is
+# 'spread' across one or more consecutive rows that have the same unit, target, and class. the 'model', 'timezero', and
+# 'season' columns are ignored b/c the forecast being loaded into determines them. a prediction element with exactly
+# one row whose data columns ('value' through 'param3') are all empty is a retraction
+#
+
+# the data columns' indexes in FORECAST_CSV_HEADER
+_VALUE_IDX, _CAT_IDX, _PROB_IDX, _SAMPLE_IDX, _QUANTILE_IDX, _FAMILY_IDX, _PARAM1_IDX, _PARAM2_IDX, _PARAM3_IDX = \
+    range(6, 15)
+
+
+def prediction_dicts_from_forecast_csv(project, csv_file_fp):
+    """
+    A generator that parses csv_file_fp as a forecast csv file and yields one prediction dict per prediction element,
+    in the same format as a json_io_dict's 'predictions'. The file is read one prediction element at a time, which
+    means that callers like `stage_prediction_dicts_chunked()` can load files that are too large to fit in memory.
+
+    Values are converted from strs based on their target's type (see `Target.data_types_for_target_type()`). Values
+    that cannot be converted are passed through as strs so that the usual validation (e.g.,
+    `_validated_pred_ele_rows_for_pred_dicts()`) reports them, as it does invalid units, targets, and classes. Note that
+    we do not check that a prediction element's rows are consecutive. If they are not then the element is yielded more
+    than once, which loading reports as a duplicate prediction.
+
+    :param project: the Project whose targets are used to convert values
+    :param csv_file_fp: an open forecast csv file-like object. NB: must be text, not binary
+    :raises RuntimeError: if the file is empty or has an invalid header or row
+    """
+    csv_reader = csv.reader(csv_file_fp, delimiter=',')
+
+    # validate header
+    try:
+        orig_header = next(csv_reader)
+    except StopIteration:
+        raise RuntimeError("empty file")
+
+    header = [h.lower() for h in [i.replace('"', '') for i in orig_header]]
+    if header != FORECAST_CSV_HEADER:
+        raise RuntimeError(f"invalid header. orig_header={orig_header!r}, expected header={FORECAST_CSV_HEADER!r}")
+
+    target_name_to_schema = validation_schema_for_project(project).target_name_to_schema
+    for (unit_name, target_name, class_name), rows in itertools.groupby(_validated_forecast_csv_rows(csv_reader),
+                                                                        key=lambda row: (row[3], row[4], row[5])):
+        target_schema = target_name_to_schema.get(target_name)  # None if invalid target
+        target_type = target_schema.type if target_schema else None
+        yield {'unit': unit_name, 'target': target_name, 'class': class_name,
+               'prediction': _prediction_data_for_rows(target_type, class_name, list(rows))}
+
+
+def _validated_forecast_csv_rows(csv_reader):
+    """
+    A `prediction_dicts_from_forecast_csv()` helper that yields csv_reader's rows, checking each one's length.
+    """
+    for row in csv_reader:
+        if len(row) != len(FORECAST_CSV_HEADER):
+            raise RuntimeError(f"invalid row (wasn't {len(FORECAST_CSV_HEADER)} columns): {row!r}")
+
+        yield row
+
+
+def _prediction_data_for_rows(target_type, class_name, rows):
+    """
+    A `prediction_dicts_from_forecast_csv()` helper that returns the 'prediction' dict for one prediction element's
+    rows, or None if they are a retraction. Invalid classes result in an empty dict, which validation reports.
+
+    :param target_type: the rows' Target.type, or None if their target is invalid
+    :param class_name: the rows' class name. one of PRED_CLASS_INT_TO_NAME's values
+    :param rows: a non-empty list of the prediction element's rows
+    """
+    if (len(rows) == 1) and not any(rows[0][_VALUE_IDX:]):
+        return None
+    elif class_name == PRED_CLASS_INT_TO_NAME[PredictionElement.BIN_CLASS]:
+        return {'cat': [_parsed_csv_value(target_type, row[_CAT_IDX]) for row in rows],
+                'prob': [_parsed_csv_float(row[_PROB_IDX]) for row in rows]}
+    elif class_name == PRED_CLASS_INT_TO_NAME[PredictionElement.NAMED_CLASS]:
+        row = rows[0]  # named elements have only one row. extra ones are ignored
+        prediction_data = {'family': row[_FAMILY_IDX]}
+        for param_name, param_idx in [('param1', _PARAM1_IDX), ('param2', _PARAM2_IDX), ('param3', _PARAM3_IDX)]:
+            if row[param_idx] != '':
+                prediction_data[param_name] = _parsed_csv_float(row[param_idx])
+        return prediction_data
+    elif class_name == PRED_CLASS_INT_TO_NAME[PredictionElement.POINT_CLASS]:
+        return {'value': _parsed_csv_value(target_type, rows[0][_VALUE_IDX])}
+    elif class_name == PRED_CLASS_INT_TO_NAME[PredictionElement.QUANTILE_CLASS]:
+        return {'quantile': [_parsed_csv_float(row[_QUANTILE_IDX]) for row in rows],
+                'value': [_parsed_csv_value(target_type, row[_VALUE_IDX]) for row in rows]}
+    elif class_name == PRED_CLASS_INT_TO_NAME[PredictionElement.SAMPLE_CLASS]:
+        return {'sample': [_parsed_csv_value(target_type, row[_SAMPLE_IDX]) for row in rows]}
+    else:
+        return {}
+
+
+def _parsed_csv_value(target_type, value):
+    """
+    A `prediction_dicts_from_forecast_csv()` helper that converts a 'value', 'cat', or 'sample' str to target_type's
+    data type, or returns it unchanged if it cannot be. Continuous values are parsed as ints if possible so that they
+    round-trip as `query_forecasts_for_project()` wrote them. Dates stay strs b/c that is how JSON represents them.
+    """
+    try:
+        if target_type == Target.CONTINUOUS_TARGET_TYPE:
+            try:
+                return int(value)
+            except ValueError:
+                return float(value)
+        elif target_type == Target.DISCRETE_TARGET_TYPE:
+            return int(value)
+        elif target_type == Target.BINARY_TARGET_TYPE:
+            # csv.writer() writes Python bools as 'True' and 'False', but the docs use `true` and `false`
+            return {'true': True, 'false': False}.get(value.lower(), value)
+        else:  # Target.NOMINAL_TARGET_TYPE, Target.DATE_TARGET_TYPE, or invalid target
+            return value
+    except ValueError:
+        return value
+
+
+def _parsed_csv_float(value):
+    """
+    A `prediction_dicts_from_forecast_csv()` helper that converts a 'prob', 'quantile', or 'param*' str to a float, or
+    returns it unchanged if it cannot be.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return value
@@ -8,9 +8,9 @@ from django.shortcuts import get_object_or_404
 django.setup()
 
 from utils.forecast import _cache_forecast_metadata_worker, cache_forecast_metadata, clear_forecast_metadata, \
-    forecast_metadata
+    forecast_metadata, _rebuild_forecast_metadata_worker, rebuild_forecast_metadata_for_project
 
-from forecast_app.models import Project, ForecastMetaPrediction, ForecastMetaUnit, ForecastMetaTarget
+from forecast_app.models import Project, ForecastMetaPrediction
 
 
 # https://stackoverflow.com/questions/44051647/get-params-sent-to-a-subcommand-of-a-click-group
@@ -43,15 +43,12 @@ def print_forecast_metadata_all_projects(project_pk):
         for forecast_model in project.models.all().order_by('abbreviation'):
             print(f"- {forecast_model}")
             for forecast in forecast_model.forecasts.all().order_by('time_zero__timezero_date'):
-                forecast_meta_prediction, forecast_meta_unit_qs, forecast_meta_target_qs = forecast_metadata(forecast)
-                if all([forecast_meta_prediction, forecast_meta_unit_qs.count(), forecast_meta_target_qs.count()]):
+                forecast_meta_prediction, unit_qs, target_qs = forecast_metadata(forecast)
+                if forecast_meta_prediction:
                     print(f"  = {forecast.pk}|{forecast.source}: pnbsq: {forecast_meta_prediction.point_count}|"
                           f"{forecast_meta_prediction.named_count}|{forecast_meta_prediction.bin_count}|"
                           f"{forecast_meta_prediction.sample_count}|{forecast_meta_prediction.quantile_count}, "
-                          f"{len(forecast_meta_unit_qs)} units, {len(forecast_meta_target_qs)} targets")
-                elif any([forecast_meta_prediction, forecast_meta_unit_qs.count(), forecast_meta_target_qs.count()]):
-                    print(f"  = {forecast.pk}|{forecast.source}: not all! {forecast_meta_prediction}, "
-                          f"{forecast_meta_unit_qs.count()}, {forecast_meta_target_qs.count()}")
+                          f"{unit_qs.count()} units, {target_qs.count()} targets")
     print("print done")
 
 
@@ -69,8 +66,6 @@ def clear(project_pk):
     for project in projects:
         print(f"* {project}")
         ForecastMetaPrediction.objects.filter(forecast__forecast_model__project=project).delete()
-        ForecastMetaUnit.objects.filter(forecast__forecast_model__project=project).delete()
-        ForecastMetaTarget.objects.filter(forecast__forecast_model__project=project).delete()
     print("clear done")
 
 
@@ -109,5 +104,38 @@ def update(project_pk, no_enqueue):
     print("update done")
 
 
+@cli.command()
+@click.option('--project-pk')
+@click.option('--no-enqueue', is_flag=True, default=False)
+def rebuild(project_pk, no_enqueue):
+    """
+    A subcommand that rebuilds one or all projects' forecast metadata. Unlike `update`, this uses a few set-based SQL
+    statements per model (see `rebuild_forecast_metadata_for_project()`) and, if enqueued, one RQ job per project
+    rather than per forecast. Jobs use REBUILD_FORECAST_METADATA_JOB_TIMEOUT rather than the queue's default timeout,
+    which is too short for large projects. This is the one to use after a schema change.
+
+    :param project_pk: if a valid Project pk then only that project's metadata is rebuilt. o/w rebuilds all
+    :param no_enqueue: controls whether the rebuild will be immediate in the calling thread (blocks), or enqueued for RQ
+    """
+    from forecast_repo.settings.base import CACHE_FORECAST_METADATA_QUEUE_NAME, \
+        REBUILD_FORECAST_METADATA_JOB_TIMEOUT  # avoid circular imports
+
+
+    projects = [get_object_or_404(Project, pk=project_pk)] if project_pk else Project.objects.all()
+    if no_enqueue:
+        print("rebuilding metadata (no enqueue)")
+        for project_idx, project in enumerate(projects):
+            num_forecasts = rebuild_forecast_metadata_for_project(project)
+            print(f"* {project_idx + 1}/{len(projects)} {project}: {num_forecasts} forecasts")
+    else:
+        print("enqueuing rebuilding metadata")
+        queue = django_rq.get_queue(CACHE_FORECAST_METADATA_QUEUE_NAME)
+        for project in projects:
+            print(f"* {project}")
+            queue.enqueue(_rebuild_forecast_metadata_worker, project.pk,
+                          job_timeout=REBUILD_FORECAST_METADATA_JOB_TIMEOUT)
+    print("rebuild done")
+
+
 if __name__ == '__main__':
     cli()
@@ -10,7 +10,7 @@ from django.db import transaction
 
 
 django.setup()
-from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata
+from utils.forecast import load_predictions_from_json_io_dict, cache_forecast_metadata, is_forecast_metadata_available
 
 from utils.project import create_project_from_json, delete_project_iteratively
 from utils.project_truth import load_truth_data
@@ -149,7 +149,8 @@ def _make_docs_project(user):
     with open('forecast_app/tests/predictions/docs-predictions.json') as fp:
         json_io_dict_in = json.load(fp)
         load_predictions_from_json_io_dict(forecast, json_io_dict_in, is_validate_cats=False)  # atomic
-        cache_forecast_metadata(forecast)  # atomic
+        if not is_forecast_metadata_available(forecast):  # o/w cached incrementally by the load
+            cache_forecast_metadata(forecast)  # atomic
 
     return project, time_zero, forecast_model, forecast
 
@@ -3,16 +3,16 @@ import json
 import logging
 import re
 from collections import defaultdict
-from itertools import groupby
 from pathlib import Path
 from string import digits, ascii_letters, punctuation
 
 from django.db import connection
 from django.db import transaction
 
-from forecast_app.models import Project, Unit, Target, Forecast, ForecastModel, ForecastMetaUnit, ForecastMetaTarget
+from forecast_app.models import Project, Unit, Target, Forecast, ForecastModel, ForecastMetaPrediction
+from forecast_app.models.forecast_metadata import bitset_to_ids
 from forecast_app.models.project import TimeZero
-from utils.utilities import YYYY_MM_DD_DATE_FORMAT
+from utils.utilities import YYYY_MM_DD_DATE_FORMAT, sql_in_values
 
 
 logger = logging.getLogger(__name__)
@@ -611,7 +611,7 @@ def _project_explorer_unit_rows(project):
     all_unit_ids = set(unit_id_to_obj.keys())
     rows = []  # return value. filled next
     for model, newest_forecast_tz_date, newest_forecast_id in models_rows:
-        present_unit_ids = forecast_id_to_unit_id_set.get(newest_forecast_id, set())
+        present_unit_ids = forecast_id_to_unit_id_set.get(newest_forecast_id, set()) & all_unit_ids
         missing_unit_ids = all_unit_ids - present_unit_ids
         rows.append((model, newest_forecast_tz_date, newest_forecast_id,
                      {unit_id_to_obj[_].name for _ in present_unit_ids},
@@ -625,26 +625,16 @@ def _forecast_ids_to_present_unit_or_target_id_sets(forecast_ids, is_unit):
     :param forecast_ids: a list of Forecast IDs
     :param is_unit: True if should return Unit information. returns Target information o/w
     :return: a dict mapping each forecast_id to a set of either its Unit or Targets ids, based on is_unit:
-        {forecast_id -> set(unit_or_target_ids)}
+        {forecast_id -> set(unit_or_target_ids)}. the sets are decoded from ForecastMetaPrediction's bitsets, which
+        means they might include deleted Units or Targets - see `ids_to_bitset()`
     """
     if not forecast_ids:
         return {}
 
-    forecast_id_to_unit_id_set = {}
-    if is_unit:
-        forecast_meta_unit_or_target_qs = ForecastMetaUnit.objects \
-            .filter(forecast__id__in=forecast_ids) \
-            .order_by('forecast__id', 'unit__id') \
-            .values_list('forecast__id', 'unit__id')  # ordered so we can groupby()
-    else:
-        forecast_meta_unit_or_target_qs = ForecastMetaTarget.objects \
-            .filter(forecast__id__in=forecast_ids) \
-            .order_by('forecast__id', 'target__id') \
-            .values_list('forecast__id', 'target__id')  # ordered so we can groupby()
-    for forecast_id, unit_or_target_id_grouper in groupby(forecast_meta_unit_or_target_qs, key=lambda _: _[0]):
-        forecast_id_to_unit_id_set[forecast_id] = {unit_id for forecast_id, unit_id in unit_or_target_id_grouper}
-
-    return forecast_id_to_unit_id_set
+    bits_field_name = 'unit_bits' if is_unit else 'target_bits'
+    return {forecast_id: bitset_to_ids(bitset, offset) for forecast_id, bitset, offset
+            in ForecastMetaPrediction.objects.filter(forecast__id__in=forecast_ids)
+                .values_list('forecast_id', bits_field_name, f'{bits_field_name}_offset')}
 
 
 #
@@ -688,7 +678,8 @@ def target_rows_for_project(project):
     target_id_to_object = {target.id: target for target in project.targets.all()}
     for forecast_model, newest_forecast_tz_date, newest_forecast_id in models_rows:
         newest_forecast_target_ids = forecast_id_to_target_id_set.get(newest_forecast_id, [])
-        newest_forecast_targets = [target_id_to_object[target_id] for target_id in newest_forecast_target_ids]
+        newest_forecast_targets = [target_id_to_object[target_id] for target_id in newest_forecast_target_ids
+                                   if target_id in target_id_to_object]
         if newest_forecast_targets:
             # for target_group_name, targets in group_targets(newest_forecast_targets).items():
             target_groups = group_targets(newest_forecast_targets)
@@ -721,8 +712,13 @@ def latest_forecast_ids_for_project(project, is_only_f_id, model_ids=None, timez
     """
     # build up the query based on args
     select_ids = "f.id AS f_id" if is_only_f_id else "fm_tz_max_issued_ats.fm_id AS fm_id, fm_tz_max_issued_ats.tz_id AS tz_id, f.id AS f_id"
-    and_model_ids = f"AND fm.id IN ({', '.join(map(str, model_ids))})" if model_ids else ""
-    and_timezero_ids = f"AND f.time_zero_id IN ({', '.join(map(str, timezero_ids))})" if timezero_ids else ""
+    and_filters, params = [], [project.pk]
+    for column, ids in [('fm.id', model_ids), ('f.time_zero_id', timezero_ids)]:
+        if ids:  # bound rather than interpolated so that the SQL does not vary by ID
+            in_sql, in_params = sql_in_values(column, ids)
+            and_filters.append(f"AND {in_sql}")
+            params.extend(in_params)
+    and_filters = ' '.join(and_filters)
     sql = f"""
         WITH fm_tz_max_issued_ats AS (
             SELECT f.forecast_model_id AS fm_id,
@@ -731,7 +727,7 @@ def latest_forecast_ids_for_project(project, is_only_f_id, model_ids=None, timez
             FROM {Forecast._meta.db_table} AS f
                      JOIN {TimeZero._meta.db_table} AS tz ON f.time_zero_id = tz.id
                      JOIN {ForecastModel._meta.db_table} AS fm ON f.forecast_model_id = fm.id
-            WHERE fm.project_id = %s AND NOT fm.is_oracle  {and_model_ids}  {and_timezero_ids}
+            WHERE fm.project_id = %s AND NOT fm.is_oracle  {and_filters}
             GROUP BY f.forecast_model_id, f.time_zero_id
         )
         SELECT {select_ids}
@@ -742,7 +738,7 @@ def latest_forecast_ids_for_project(project, is_only_f_id, model_ids=None, timez
                           AND f.issued_at = fm_tz_max_issued_ats.max_issued_at;
     """
     with connection.cursor() as cursor:
-        cursor.execute(sql, (project.pk,))
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
 
     return [row[0] for row in rows] if is_only_f_id else {(fm_id, tz_id): f_id for fm_id, tz_id, f_id, in rows}
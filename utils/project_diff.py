@@ -6,6 +6,7 @@ from django.db import transaction
 
 from forecast_app.models import Unit, Target, PredictionElement
 from forecast_app.models.project import TimeZero
+from utils.forecast import clear_validation_schema_cache
 from utils.project import create_project_from_json, _validate_and_create_units, _validate_and_create_targets, \
     _validate_and_create_timezeros
 from utils.project_truth import truth_data_qs
@@ -367,6 +368,14 @@ def execute_project_config_diff(project, changes):
     :param project: the Project that's being modified
     :param changes: list of Changes as returned by project_config_diff()
     """
+    try:
+        _execute_project_config_diff(project, changes)
+    finally:
+        clear_validation_schema_cache(project.pk)  # Units and Targets might have changed, even if we failed midway
+
+
+def _execute_project_config_diff(project, changes):
+    # execute_project_config_diff() helper
     objects_to_save = []
     for change in order_project_config_diff(changes):
         if change.change_type == ChangeType.OBJ_ADDED:
@@ -1,20 +1,31 @@
 import csv
+import datetime
+import importlib.util
 import io
 import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 import dateutil
 from boto3.exceptions import Boto3Error
 from botocore.exceptions import BotoCoreError, ClientError, ConnectionClosedError
-from django.db import connection, transaction
+from django.db import connection, transaction, connections
+from django.db.models import Count, Exists, OuterRef, Sum
+from more_itertools import chunked
 from rest_framework.generics import get_object_or_404
 from rq.timeouts import JobTimeoutException
 
-from forecast_app.models import Job, Project, Forecast, ForecastModel, PredictionElement, PredictionData
-from forecast_app.models.prediction_element import PRED_CLASS_NAME_TO_INT
+from forecast_app.models import Job, Project, Forecast, ForecastModel, PredictionElement, PredictionData, \
+    CurrentPredictionElement, TimeZero, Unit, Target, ForecastMetaPrediction
+from forecast_app.models.forecast_metadata import bitset_to_mask, count_mask_ids, ids_to_mask
+from forecast_app.models.prediction_element import PRED_CLASS_NAME_TO_INT, PRED_CLASS_INT_TO_NAME
 from forecast_repo.settings.base import MAX_NUM_QUERY_ROWS
 from utils.project import logger
 from utils.project_truth import TRUTH_CSV_HEADER, oracle_model_for_project
-from utils.utilities import YYYY_MM_DD_DATE_FORMAT, batched_rows
+from utils.query_cache import cache_query_result, project_data_version
+from utils.utilities import YYYY_MM_DD_DATE_FORMAT, batched_rows, server_side_cursor, sql_in_values
 
 
 #
@@ -49,6 +60,13 @@ def query_forecasts_for_project(project, query, max_num_rows=MAX_NUM_QUERY_ROWS)
     - 'as_of': Passing a datetime string in the optional as_of field causes the query to return only those forecast
         versions whose issued_at is <= the as_of datetime (AKA timestamp).
 
+    The last three keys limit which rows bin, quantile, and sample predictions are expanded into. They do not affect
+    which predictions are returned, i.e., a prediction none of whose rows are kept is simply omitted:
+    - 'quantiles': Pass a list of quantile levels (numbers in [0, 1]) to return only quantile rows for those levels.
+    - 'max_samples': Pass a positive integer to return only each sample prediction's first max_samples samples.
+    - 'bin_cats': Pass a list of cats (as they appear in predictions, e.g., strings, numbers, or booleans) to return
+        only bin rows for those cats.
+
     Note that _strings_ are passed to refer to object *contents*, not database IDs, which means validation will fail if
     the referred-to objects are not found. NB: If multiple objects are found with the same name then the program will
     arbitrarily choose one.
@@ -57,12 +75,13 @@ def query_forecasts_for_project(project, query, max_num_rows=MAX_NUM_QUERY_ROWS)
     :param query: a dict specifying the query parameters as described above. NB: assumes it has passed validation via
         `validate_forecasts_query()`
     :param max_num_rows: the number of rows at which this function raises a RuntimeError
-    :return: a list of CSV rows including the header
+    :return: a list of CSV rows including the header. NB: this is a generator whose return value is the number of
+        prediction elements the rows were expanded from, which `IterCounter.return_value` makes available
     """
     logger.debug(f"query_forecasts_for_project(): 1/3 validating query. query={query}, project={project}")
 
     # validate query
-    error_messages, (model_ids, unit_ids, target_ids, timezero_ids, type_ints, as_of) = \
+    error_messages, (model_ids, unit_ids, target_ids, timezero_ids, type_ints, as_of, projection) = \
         validate_forecasts_query(project, query)
     if error_messages:
         raise RuntimeError(f"invalid query. query={query}, errors={error_messages}")
@@ -76,13 +95,14 @@ def query_forecasts_for_project(project, query, max_num_rows=MAX_NUM_QUERY_ROWS)
     yield FORECAST_CSV_HEADER
 
     # get the SQL then execute and iterate over resulting data
-    sql = _query_forecasts_sql_for_pred_class(type_ints, model_ids, unit_ids, target_ids, timezero_ids, as_of, True)
+    sql, sql_params = _query_forecasts_sql_for_pred_class(type_ints, model_ids, unit_ids, target_ids, timezero_ids,
+                                                          as_of, True)
     logger.debug(f"query_forecasts_for_project(): 2/3 executing sql. type_ints, model_ids, unit_ids, target_ids, "
                  f"timezero_ids, as_of= {type_ints}, {model_ids}, {unit_ids}, {target_ids}, {timezero_ids}, "
                  f"{as_of}")
     num_rows = 0
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (project.pk,))
+    with server_side_cursor() as cursor:
+        cursor.execute(sql, [project.pk] + sql_params)
         for fm_id, tz_id, pred_class, unit_id, target_id, is_retract, pred_data in batched_rows(cursor):
             # we do not have to check is_retract b/c we pass `is_include_retract=False`, which skips retractions
             num_rows += 1
@@ -96,7 +116,7 @@ def query_forecasts_for_project(project, query, max_num_rows=MAX_NUM_QUERY_ROWS)
                 forecast_model_id_to_obj[fm_id], timezero_id_to_obj[tz_id], timezero_to_season_name, pred_class)
             value, cat, prob, sample, quantile, family, param1, param2, param3 = '', '', '', '', '', '', '', '', ''
             if pred_class == PredictionElement.BIN_CLASS:
-                for cat, prob in zip(pred_data['cat'], pred_data['prob']):
+                for cat, prob in _project_pred_data_rows(pred_class, pred_data, projection):
                     yield [model_str, timezero_str, season, unit_id_to_obj[unit_id].name,
                            target_id_to_obj[target_id].name, class_str,
                            value, cat, prob, sample, quantile, family, param1, param2, param3]
@@ -114,18 +134,43 @@ def query_forecasts_for_project(project, query, max_num_rows=MAX_NUM_QUERY_ROWS)
                        target_id_to_obj[target_id].name, class_str,
                        value, cat, prob, sample, quantile, family, param1, param2, param3]
             elif pred_class == PredictionElement.QUANTILE_CLASS:
-                for quantile, value in zip(pred_data['quantile'], pred_data['value']):
+                for quantile, value in _project_pred_data_rows(pred_class, pred_data, projection):
                     yield [model_str, timezero_str, season, unit_id_to_obj[unit_id].name,
                            target_id_to_obj[target_id].name, class_str,
                            value, cat, prob, sample, quantile, family, param1, param2, param3]
             elif pred_class == PredictionElement.SAMPLE_CLASS:
-                for sample in pred_data['sample']:
+                for sample, in _project_pred_data_rows(pred_class, pred_data, projection):
                     yield [model_str, timezero_str, season, unit_id_to_obj[unit_id].name,
                            target_id_to_obj[target_id].name, class_str,
                            value, cat, prob, sample, quantile, family, param1, param2, param3]
 
     # done
     logger.debug(f"query_forecasts_for_project(): 3/3 done. num_rows={num_rows}, query={query}, project={project}")
+    return num_rows
+
+
+def _project_pred_data_rows(pred_class, pred_data, projection):
+    """
+    A `query_forecasts_for_project()` helper that returns the rows that a bin, quantile, or sample prediction expands
+    into, limited by projection.
+
+    :param pred_class: one of PredictionElement.BIN_CLASS, QUANTILE_CLASS, or SAMPLE_CLASS
+    :param pred_data: the prediction's data dict
+    :param projection: the projection dict returned by `validate_forecasts_query()`
+    :return: a list of tuples: (cat, prob) for bins, (quantile, value) for quantiles, and (sample,) for samples
+    """
+    if pred_class == PredictionElement.BIN_CLASS:
+        bin_cats = projection['bin_cats']
+        return [(cat, prob) for cat, prob in zip(pred_data['cat'], pred_data['prob'])
+                if (bin_cats is None) or (cat in bin_cats)]
+    elif pred_class == PredictionElement.QUANTILE_CLASS:
+        quantiles = projection['quantiles']
+        return [(quantile, value) for quantile, value in zip(pred_data['quantile'], pred_data['value'])
+                if (quantiles is None) or (quantile in quantiles)]
+    elif pred_class == PredictionElement.SAMPLE_CLASS:
+        return [(sample,) for sample in pred_data['sample'][:projection['max_samples']]]  # [:None] is all
+    else:
+        raise RuntimeError(f"invalid pred_class: {pred_class!r}")
 
 
 def _query_forecasts_sql_for_pred_class(pred_classes, model_ids, unit_ids, target_ids, timezero_ids, as_of,
@@ -137,66 +182,91 @@ def _query_forecasts_sql_for_pred_class(pred_classes, model_ids, unit_ids, targe
     - pred_class: PRED_CLASS_CHOICES int
     - data: the stored json
 
+    The IDs and as_of are bound as params (via `sql_in_values()`) rather than interpolated, which means that the SQL
+    only varies by which of the args are passed, and not by their values. This lets postgres reuse the statement's
+    parsing and planning work, e.g., via pg_stat_statements and prepared statements.
+
     :param pred_classes: list of PredictionElement.PRED_CLASS_CHOICES to include or [] (includes all)
     :param model_ids: list of ForecastsModel IDs to include or None (includes all)
     :param unit_ids: "" Unit ""
     :param target_ids: "" Target ""
     :param timezero_ids: "" TimeZero ""
-    :param as_of: optional as_of timezone-aware datetime object, or None if not passed in query
+    :param as_of: optional as_of timezone-aware datetime object, or None if not passed in query. if None then the
+        CurrentPredictionElement table is used. otherwise PredictionElement validity intervals are used
     :param is_exclude_oracle: True if oracle forecasts should be excluded from results
     :param is_include_retract: as passed to query_forecasts_for_project()
-    :return SQL to execute. returns columns as described above
-    """
-    # about the query: the ranked_rows CTE groups prediction elements and then ranks then in issued_at order, which
-    # implements our masking (newer issued_ats mask older ones) and merging (discarded duplicates are merged back in
-    # via previous versions) search semantics. it is crucial that the CTE /not/ include is_retract b/c that's how
-    # retractions are implemented: they are ranked higher than the prediction elements they mask if they're newer.
-    # retracted ones are optionally removed in the outer query. the outer query's LEFT JOIN is to cover retractions,
-    # which do not have prediction data.
+    :return a 2-tuple: (sql, params). the SQL takes the project's pk followed by params, i.e., execute it via
+        `cursor.execute(sql, [project.pk] + params)`. returns columns as described above, ordered by
+        (forecast_model_id, timezero_id, unit_id, target_id, pred_class). NB: the SQL has no trailing ';' so that
+        `copy_forecasts_csv_for_project()` can use it as a subquery
+    """
     and_oracle = f"AND NOT fm.is_oracle" if is_exclude_oracle else ""
-    and_model_ids = f"AND fm.id IN ({', '.join(map(str, model_ids))})" if model_ids else ""
-    and_pred_classes = f"AND pred_ele.pred_class IN ({', '.join(map(str, pred_classes))})" if pred_classes else ""
-    and_unit_ids = f"AND pred_ele.unit_id IN ({', '.join(map(str, unit_ids))})" if unit_ids else ""
-    and_target_ids = f"AND pred_ele.target_id IN ({', '.join(map(str, target_ids))})" if target_ids else ""
-    and_timezero_ids = f"AND f.time_zero_id IN ({', '.join(map(str, timezero_ids))})" if timezero_ids else ""
-
-    # NB: `as_of.isoformat()` (e.g., '2021-05-05T16:11:47.302099+00:00') works with postgres but not sqlite. however,
-    # the default str ('2021-05-05 16:11:47.302099+00:00') works with both:
-    and_issued_at = f"AND f.issued_at <= '{as_of}'" if as_of else ""
-
     and_is_retract = "" if is_include_retract else "AND NOT is_retract"
-    sql = f"""
-        WITH ranked_rows AS (
-            SELECT f.forecast_model_id             AS fm_id,
-                   f.time_zero_id                  AS tz_id,
-                   pred_ele.id                     AS pred_ele_id,
-                   pred_ele.pred_class             AS pred_class,
-                   pred_ele.unit_id                AS unit_id,
-                   pred_ele.target_id              AS target_id,
-                   pred_ele.is_retract             AS is_retract,
-                   RANK() OVER (
-                       PARTITION BY fm.id, f.time_zero_id, pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class
-                       ORDER BY f.issued_at DESC) AS rownum
-            FROM {PredictionElement._meta.db_table} AS pred_ele
-                             JOIN {Forecast._meta.db_table} AS f
-            ON pred_ele.forecast_id = f.id
-                JOIN {ForecastModel._meta.db_table} AS fm on f.forecast_model_id = fm.id
+
+    # the optional filters, in the order that they appear in the SQL, and their params
+    table_alias = 'cur' if not as_of else 'pred_ele'
+    timezero_column = 'cur.time_zero_id' if not as_of else 'f.time_zero_id'
+    and_filters, params = [], []
+    for column, ids in [('fm.id', model_ids), (f'{table_alias}.pred_class', pred_classes),
+                        (f'{table_alias}.unit_id', unit_ids), (f'{table_alias}.target_id', target_ids),
+                        (timezero_column, timezero_ids)]:
+        if ids:
+            in_sql, in_params = sql_in_values(column, ids)
+            and_filters.append(f"AND {in_sql}")
+            params.extend(in_params)
+    and_filters = ' '.join(and_filters)
+
+    if not as_of:
+        # about the query: without as_of we want the latest version of each prediction element, which is exactly what
+        # the CurrentPredictionElement table contains, including retractions
+        sql = f"""
+            SELECT cur.forecast_model_id AS fm_id,
+                   cur.time_zero_id      AS tz_id,
+                   cur.pred_class        AS pred_class,
+                   cur.unit_id           AS unit_id,
+                   cur.target_id         AS target_id,
+                   cur.is_retract        AS is_retract,
+                   pred_data.data        AS pred_data
+            FROM {CurrentPredictionElement._meta.db_table} AS cur
+                     JOIN {ForecastModel._meta.db_table} AS fm ON cur.forecast_model_id = fm.id
+                     LEFT JOIN {PredictionData._meta.db_table} AS pred_data ON cur.data_hash = pred_data.data_hash
             WHERE fm.project_id = %s
-                {and_oracle} {and_model_ids} {and_pred_classes} {and_unit_ids} {and_target_ids} {and_timezero_ids} {and_issued_at}
-        )
-        SELECT ranked_rows.fm_id       AS fm_id,
-               ranked_rows.tz_id       AS tz_id,
-               ranked_rows.pred_class  AS pred_class,
-               ranked_rows.unit_id     AS unit_id,
-               ranked_rows.target_id   AS target_id,
-               ranked_rows.is_retract  AS is_retract,
-               pred_data.data          AS pred_data
-        FROM ranked_rows
-                 LEFT JOIN {PredictionData._meta.db_table} AS pred_data
-        ON ranked_rows.pred_ele_id = pred_data.pred_ele_id
-        WHERE ranked_rows.rownum = 1 {and_is_retract};
-    """
-    return sql
+                {and_oracle} {and_filters} {and_is_retract}
+            ORDER BY cur.forecast_model_id, cur.time_zero_id, cur.unit_id, cur.target_id, cur.pred_class
+        """
+        return sql, params
+
+    # about the query: as of a particular issued_at we want the version of each prediction element whose
+    # [valid_from, valid_to) interval contains it, which implements our masking (newer issued_ats mask older ones) and
+    # merging (discarded duplicates are merged back in via previous versions) search semantics without ranking all
+    # versions. retractions have intervals too, which is how they mask older elements. retracted ones are optionally
+    # removed via and_is_retract. the LEFT JOIN is to cover retractions, which do not have prediction data.
+    # PredictionData is content-addressed, so we join on data_hash, which is RETRACT_DATA_HASH (i.e., matches no
+    # PredictionData) for retractions.
+    #
+    # NB: as_of is adapted as the ORM does for DateTimeFields b/c sqlite stores them as naive UTC strings, which means
+    # that binding the datetime as-is would compare them to its local time string
+    as_of_param = connection.ops.adapt_datetimefield_value(as_of)
+    params.extend([as_of_param, as_of_param])
+    sql = f"""
+        SELECT f.forecast_model_id   AS fm_id,
+               f.time_zero_id        AS tz_id,
+               pred_ele.pred_class   AS pred_class,
+               pred_ele.unit_id      AS unit_id,
+               pred_ele.target_id    AS target_id,
+               pred_ele.is_retract   AS is_retract,
+               pred_data.data        AS pred_data
+        FROM {PredictionElement._meta.db_table} AS pred_ele
+                 JOIN {Forecast._meta.db_table} AS f ON pred_ele.forecast_id = f.id
+                 JOIN {ForecastModel._meta.db_table} AS fm ON f.forecast_model_id = fm.id
+                 LEFT JOIN {PredictionData._meta.db_table} AS pred_data ON pred_ele.data_hash = pred_data.data_hash
+        WHERE fm.project_id = %s
+            {and_oracle} {and_filters}
+            AND pred_ele.valid_from <= %s AND (pred_ele.valid_to IS NULL OR pred_ele.valid_to > %s)
+            {and_is_retract}
+        ORDER BY f.forecast_model_id, f.time_zero_id, pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class
+    """
+    return sql, params
 
 
 def _model_tz_season_class_strs(forecast_model, time_zero, timezero_to_season_name, class_int):
@@ -210,43 +280,272 @@ def _model_tz_season_class_strs(forecast_model, time_zero, timezero_to_season_na
     return model_str, timezero_str, season, class_str
 
 
+#
+# copy_forecasts_csv_for_project()
+#
+
+def copy_forecasts_csv_for_project(project, query, bytes_io, max_num_rows=MAX_NUM_QUERY_ROWS):
+    """
+    A postgres-only alternative to `query_forecasts_for_project()` that writes the same CSV (including the header) that
+    `_query_worker()` writes for it to `bytes_io`, but has postgres expand each prediction's bins, quantiles, and
+    samples into rows and write them via `COPY ... TO STDOUT WITH CSV`. This avoids all per-row Python work, i.e.,
+    `json.loads()`, looking up names, and `csv.writer()`.
+
+    Values are formatted as `csv.writer()` formats them after `json.loads()`: booleans as 'True' and 'False', integers
+    as-is, and floats as `repr()` does (which relies on postgres 12+'s shortest-precise float8 output). NB: numbers
+    that were stored in exponent notation without a decimal point (e.g., `1e+16`) are formatted as integers.
+
+    :param project: a Project
+    :param query: as passed to `query_forecasts_for_project()`
+    :param bytes_io: a binary file-like object to write the CSV to
+    :param max_num_rows: the number of rows at which this function raises a RuntimeError
+    :return: the number of rows written, including the header
+    """
+    return _copy_forecasts_csv(project, query, bytes_io, max_num_rows)[0]
+
+
+def _copy_forecasts_csv(project, query, bytes_io, max_num_rows):
+    """
+    `copy_forecasts_csv_for_project()` helper that does the work. Args are as passed to it.
+
+    :return: a 2-tuple: (num_rows, num_pred_eles) - the number of rows written (including the header), and the number
+        of prediction elements they were expanded from
+    """
+    if connection.vendor != 'postgresql':
+        raise RuntimeError(f"copy_forecasts_csv_for_project() requires postgres. vendor={connection.vendor!r}")
+
+    error_messages, (model_ids, unit_ids, target_ids, timezero_ids, type_ints, as_of, projection) = \
+        validate_forecasts_query(project, query)
+    if error_messages:
+        raise RuntimeError(f"invalid query. query={query}, errors={error_messages}")
+
+    # like query_forecasts_for_project(), max_num_rows limits the number of prediction elements, not CSV rows. we
+    # count them first so that we do not copy any rows if there are too many
+    pred_ele_sql, pred_ele_params = _query_forecasts_sql_for_pred_class(type_ints, model_ids, unit_ids, target_ids,
+                                                                        timezero_ids, as_of, True)
+    num_pred_eles = _num_query_pred_eles(project, pred_ele_sql, pred_ele_params, max_num_rows)
+
+    # write the header via csv.writer() so that it is formatted like the other rows
+    with io.StringIO() as header_io:
+        csv.writer(header_io).writerow(FORECAST_CSV_HEADER)
+        bytes_io.write(header_io.getvalue().encode('utf-8'))
+
+    logger.debug(f"copy_forecasts_csv_for_project(): copying. type_ints, model_ids, unit_ids, target_ids, "
+                 f"timezero_ids, as_of= {type_ints}, {model_ids}, {unit_ids}, {target_ids}, {timezero_ids}, {as_of}")
+    csv_writer = _CopyCsvWriter(bytes_io)
+    with connection.cursor() as cursor:
+        # copy_expert() does not take params, so we bind them first
+        csv_rows_sql, projection_params = _forecast_csv_rows_sql(pred_ele_sql, projection)
+        copy_sql = cursor.mogrify(f"COPY ({csv_rows_sql}) TO STDOUT WITH CSV",
+                                  [project.pk, project.pk] + pred_ele_params + projection_params).decode('utf-8')
+        cursor.copy_expert(copy_sql, csv_writer)
+    return csv_writer.num_rows + 1, num_pred_eles  # + 1 for the header
+
+
+def _num_query_pred_eles(project, pred_ele_sql, pred_ele_params, max_num_rows):
+    """
+    :param project: a Project
+    :param pred_ele_sql: a `_query_forecasts_sql_for_pred_class()` query
+    :param pred_ele_params: its params, not including the leading project pk
+    :param max_num_rows: the number of prediction elements at which this function raises a RuntimeError. NB: the
+        count stops early via a LIMIT
+    :return: the number of prediction elements that pred_ele_sql returns
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM ({pred_ele_sql} LIMIT %s) AS pred_ele;",
+                       [project.pk] + pred_ele_params + [int(max_num_rows) + 1])
+        num_pred_eles = cursor.fetchone()[0]
+    if num_pred_eles > max_num_rows:
+        raise RuntimeError(f"number of rows exceeded maximum. num_rows={num_pred_eles}, max_num_rows={max_num_rows}")
+
+    return num_pred_eles
+
+
+def _forecast_csv_rows_sql(pred_ele_sql, projection):
+    """
+    A `copy_forecasts_csv_for_project()` helper that returns a query that expands the rows returned by `pred_ele_sql`
+    (a `_query_forecasts_sql_for_pred_class()` query) into FORECAST_CSV_HEADER rows, in the order that
+    `query_forecasts_for_project()` yields them. Takes these params: the project's pk (for the timezeros' seasons, which
+    are computed as `Project.timezero_to_season_name()` does), then pred_ele_sql's, and then projection's.
+
+    :param pred_ele_sql: a `_query_forecasts_sql_for_pred_class()` query
+    :param projection: the projection dict returned by `validate_forecasts_query()`. it is applied as
+        `_project_pred_data_rows()` applies it. NB: cats and quantiles are compared as jsonb, e.g., 1 and 1.0 are equal
+    :return: a 2-tuple: (sql, projection_params)
+    """
+    and_bin_cats, and_max_samples, and_quantiles, projection_params = '', '', '', []
+    if projection['bin_cats'] is not None:
+        and_bin_cats = "AND jsonb_build_array(bin.cat) <@ %s::jsonb"
+        projection_params.append(json.dumps(projection['bin_cats']))
+    if projection['max_samples'] is not None:
+        and_max_samples = "AND sample.ord <= %s"
+        projection_params.append(projection['max_samples'])
+    if projection['quantiles'] is not None:
+        and_quantiles = "AND jsonb_build_array(quantile.quantile) <@ %s::jsonb"
+        projection_params.append(json.dumps(projection['quantiles']))
+    class_name_cases = ' '.join(f"WHEN {class_int} THEN '{class_name}'"
+                                for class_int, class_name in PRED_CLASS_INT_TO_NAME.items())
+    csv_value_columns = ',\n'.join(_csv_value_sql(f"csv_vals.{column_name}") for column_name in FORECAST_CSV_HEADER[6:])
+    sql = f"""
+        WITH tz_season AS (
+            SELECT tz.id                                           AS tz_id,
+                   to_char(tz.timezero_date, 'YYYY-MM-DD')         AS timezero_str,
+                   (SELECT NULLIF(season_tz.season_name, '')
+                    FROM {TimeZero._meta.db_table} AS season_tz
+                    WHERE season_tz.project_id = tz.project_id
+                      AND season_tz.is_season_start
+                      AND season_tz.timezero_date <= tz.timezero_date
+                    ORDER BY season_tz.timezero_date DESC
+                    LIMIT 1)                                       AS season
+            FROM {TimeZero._meta.db_table} AS tz
+            WHERE tz.project_id = %s),
+             pred_ele AS ({pred_ele_sql})
+        SELECT COALESCE(NULLIF(fm.abbreviation, ''), fm.name),
+               tz_season.timezero_str,
+               tz_season.season,
+               unit.name,
+               target.name,
+               CASE pred_ele.pred_class {class_name_cases} END,
+               {csv_value_columns}
+        FROM pred_ele
+                 JOIN {ForecastModel._meta.db_table} AS fm ON pred_ele.fm_id = fm.id
+                 JOIN tz_season ON pred_ele.tz_id = tz_season.tz_id
+                 JOIN {Unit._meta.db_table} AS unit ON pred_ele.unit_id = unit.id
+                 JOIN {Target._meta.db_table} AS target ON pred_ele.target_id = target.id
+                 CROSS JOIN LATERAL (
+            -- bin. NB: the first SELECT's NULLs are cast so that the UNION's column types are jsonb
+            SELECT bin.ord, NULL::jsonb, bin.cat, bin.prob, NULL::jsonb, NULL::jsonb, NULL::jsonb, NULL::jsonb,
+                   NULL::jsonb, NULL::jsonb
+            FROM ROWS FROM (jsonb_array_elements(pred_ele.pred_data -> 'cat'),
+                            jsonb_array_elements(pred_ele.pred_data -> 'prob')) WITH ORDINALITY AS bin(cat, prob, ord)
+            WHERE pred_ele.pred_class = {PredictionElement.BIN_CLASS} {and_bin_cats}
+            UNION ALL
+            -- named
+            SELECT 1, NULL, NULL, NULL, NULL, NULL, pred_ele.pred_data -> 'family', pred_ele.pred_data -> 'param1',
+                   pred_ele.pred_data -> 'param2', pred_ele.pred_data -> 'param3'
+            WHERE pred_ele.pred_class = {PredictionElement.NAMED_CLASS}
+            UNION ALL
+            -- point
+            SELECT 1, pred_ele.pred_data -> 'value', NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+            WHERE pred_ele.pred_class = {PredictionElement.POINT_CLASS}
+            UNION ALL
+            -- sample
+            SELECT sample.ord, NULL, NULL, NULL, sample.sample, NULL, NULL, NULL, NULL, NULL
+            FROM jsonb_array_elements(pred_ele.pred_data -> 'sample') WITH ORDINALITY AS sample(sample, ord)
+            WHERE pred_ele.pred_class = {PredictionElement.SAMPLE_CLASS} {and_max_samples}
+            UNION ALL
+            -- quantile
+            SELECT quantile.ord, quantile.value, NULL, NULL, NULL, quantile.quantile, NULL, NULL, NULL, NULL
+            FROM ROWS FROM (jsonb_array_elements(pred_ele.pred_data -> 'quantile'),
+                            jsonb_array_elements(pred_ele.pred_data -> 'value'))
+                     WITH ORDINALITY AS quantile(quantile, value, ord)
+            WHERE pred_ele.pred_class = {PredictionElement.QUANTILE_CLASS} {and_quantiles}
+        ) AS csv_vals(ord, value, cat, prob, sample, quantile, family, param1, param2, param3)
+        ORDER BY pred_ele.fm_id, pred_ele.tz_id, pred_ele.unit_id, pred_ele.target_id, pred_ele.pred_class, csv_vals.ord
+    """
+    return sql, projection_params
+
+
+def _csv_value_sql(jsonb_expr):
+    """
+    A `_forecast_csv_rows_sql()` helper that returns an SQL expression that formats the JSON value `jsonb_expr` as
+    `csv.writer()` formats its `json.loads()` value. Missing and null values, and empty strings, are NULL, which
+    COPY writes as an empty field (an empty string would be written as '""'). A number is a float if its text has a
+    decimal point. Integral floats less than 1e16 are written by `repr()` with a trailing '.0', and non-integral ones
+    between 1e15 and 1e16 are written as-is (b/c `repr()` uses exponent notation only from 1e16, but float8 does from
+    1e15).
+    """
+    return f"""CASE jsonb_typeof({jsonb_expr})
+                   WHEN 'boolean' THEN CASE WHEN ({jsonb_expr})::boolean THEN 'True' ELSE 'False' END
+                   WHEN 'number' THEN
+                       CASE WHEN position('.' IN ({jsonb_expr})::text) = 0 THEN ({jsonb_expr})::text
+                            WHEN ({jsonb_expr})::float8 = trunc(({jsonb_expr})::float8)
+                                AND abs(({jsonb_expr})::float8) < 1e16
+                                THEN trunc(({jsonb_expr})::numeric)::text || '.0'
+                            WHEN abs(({jsonb_expr})::float8) >= 1e15 THEN ({jsonb_expr})::text
+                            ELSE ({jsonb_expr})::float8::text
+                           END
+                   WHEN 'string' THEN NULLIF({jsonb_expr} #>> '{{}}', '')
+                   ELSE NULL
+                   END"""
+
+
+class _CopyCsvWriter(object):
+    """
+    A file-like object that `copy_forecasts_csv_for_project()` passes to `copy_expert()`. Converts COPY's '\n' record
+    terminators to `csv.writer()`'s '\r\n', and counts records. Newlines inside quoted fields are kept as-is, which
+    we detect by tracking whether we are inside quotes (an escaped quote ('""') toggles twice).
+    """
+
+
+    def __init__(self, out_fp):
+        self.out_fp = out_fp
+        self.num_rows = 0
+        self._is_in_quotes = False
+
+
+    def write(self, data):
+        pieces = data.split(b'\n')
+        for piece_idx, piece in enumerate(pieces):
+            if piece.count(b'"') % 2:
+                self._is_in_quotes = not self._is_in_quotes
+            self.out_fp.write(piece)
+            if piece_idx == len(pieces) - 1:  # not followed by a newline
+                break
+            elif self._is_in_quotes:
+                self.out_fp.write(b'\n')
+            else:
+                self.out_fp.write(b'\r\n')
+                self.num_rows += 1
+
+
 def validate_forecasts_query(project, query):
     """
     Validates `query` according to the parameters documented at https://docs.zoltardata.com/ .
 
     :param project: as passed from `query_forecasts_for_project()`
     :param query: ""
-    :return: a 2-tuple: (error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of)) . notice the
-        second element is itself a 6-tuple of validated object IDs. there are two cases, which determine the return
-        values: 1) valid query: error_messages is [], and ID lists are valid integers. as_of is either None (if not
-        passed) or a timezone-aware datetime object. 2) invalid query: error_messages is a list of strings, and the ID
-        lists are all []. Note that types is converted to ints via PRED_CLASS_NAME_TO_INT.
+    :return: a 2-tuple: (error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)) .
+        notice the second element is itself a 7-tuple of validated object IDs, as_of, and projection. there are two
+        cases, which determine the return values: 1) valid query: error_messages is [], and ID lists are valid
+        integers. as_of is either None (if not passed) or a timezone-aware datetime object. 2) invalid query:
+        error_messages is a list of strings, and the ID lists are all []. Note that types is converted to ints via
+        PRED_CLASS_NAME_TO_INT. projection is a dict with the keys 'quantiles', 'max_samples', and 'bin_cats', whose
+        values are None if not passed
     """
     from utils.forecast import PRED_CLASS_INT_TO_NAME  # avoid circular imports
 
 
     # return value. filled next
     error_messages, model_ids, unit_ids, target_ids, timezero_ids, types, as_of = [], [], [], [], [], [], None
+    projection = {'quantiles': None, 'max_samples': None, 'bin_cats': None}
 
     # validate query type
     if not isinstance(query, dict):
         error_messages.append(f"query was not a dict: {query}, query type={type(query)}")
-        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types)]
+        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)]
 
     # validate keys
     actual_keys = set(query.keys())
-    expected_keys = {'models', 'units', 'targets', 'timezeros', 'types', 'as_of'}
+    expected_keys = {'models', 'units', 'targets', 'timezeros', 'types', 'as_of', 'quantiles', 'max_samples',
+                     'bin_cats'}
     if not (actual_keys <= expected_keys):
         error_messages.append(f"one or more query keys were invalid. query={query}, actual_keys={actual_keys}, "
                               f"expected_keys={expected_keys}")
         # return even though we could technically continue
-        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of)]
+        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)]
 
     # validate as_of if passed. must be parsable as a timezone-aware datetime
     error_message, as_of = _validate_as_of(query)
     if error_message:
         error_messages.append(error_message)
-        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of)]
+        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)]
+
+    # validate projection keys if passed
+    error_message, projection = _validate_projection(query)
+    if error_message:
+        error_messages.append(error_message)
+        return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)]
 
     # validate object IDs that strings refer to
     error_messages, (model_ids, unit_ids, target_ids, timezero_ids) = _validate_query_ids(project, query)
@@ -258,12 +557,46 @@ def validate_forecasts_query(project, query):
         if not (set(types) <= valid_prediction_types):
             error_messages.append(f"one or more types were invalid prediction types. types={set(types)}, "
                                   f"valid_prediction_types={valid_prediction_types}, query={query}")
-            return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of)]
+            return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)]
 
         types = [PRED_CLASS_NAME_TO_INT[class_name] for class_name in types]
 
     # done (may or may not be valid)
-    return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of)]
+    return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection)]
+
+
+def _validate_projection(query):
+    """
+    A validate_forecasts_query() helper that validates the optional 'quantiles', 'max_samples', and 'bin_cats' keys.
+
+    :param query: as passed to `validate_forecasts_query()`
+    :return: a 2-tuple: (error_message, projection) where error_message is None if valid, and projection is as
+        documented in `validate_forecasts_query()`
+    """
+    projection = {'quantiles': None, 'max_samples': None, 'bin_cats': None}
+    if 'quantiles' in query:
+        quantiles = query['quantiles']
+        if (not isinstance(quantiles, list)) or (not quantiles) \
+                or any(isinstance(quantile, bool) or (not isinstance(quantile, (int, float))) or
+                       (not 0 <= quantile <= 1) for quantile in quantiles):
+            return f"'quantiles' was not a non-empty list of numbers in [0, 1]. quantiles={quantiles!r}", projection
+
+        projection['quantiles'] = quantiles
+    if 'max_samples' in query:
+        max_samples = query['max_samples']
+        if isinstance(max_samples, bool) or (not isinstance(max_samples, int)) or (max_samples < 1):
+            return f"'max_samples' was not a positive integer. max_samples={max_samples!r}", projection
+
+        projection['max_samples'] = max_samples
+    if 'bin_cats' in query:
+        bin_cats = query['bin_cats']
+        if (not isinstance(bin_cats, list)) or (not bin_cats) \
+                or any(not isinstance(cat, (str, int, float, bool)) for cat in bin_cats):
+            return (f"'bin_cats' was not a non-empty list of strings, numbers, or booleans. bin_cats={bin_cats!r}",
+                    projection)
+
+        projection['bin_cats'] = bin_cats
+    return None, projection
 
 
 def _validate_as_of(query):
@@ -375,6 +708,313 @@ def _validate_query_ids(project, query):
     return [error_messages, (model_ids, unit_ids, target_ids, timezero_ids)]
 
 
+#
+# estimate_forecasts_query()
+#
+
+# the number of prediction elements per class that `estimate_forecasts_query()` samples to estimate their average
+# number of CSV rows (bin, quantile, and sample elements have one row per cat, quantile, or sample) and value sizes
+QUERY_ESTIMATE_SAMPLE_SIZE = 100
+
+# `_query_endpoint()` rejects forecast queries whose estimated number of prediction elements is more than this many
+# times MAX_NUM_QUERY_ROWS. the factor allows for the estimate's error, i.e., it rejects only obviously oversized
+# queries
+QUERY_ESTIMATE_MAX_ROWS_FACTOR = 2
+
+
+def estimate_forecasts_query(project, validated_query):
+    """
+    Estimates the size of `query_forecasts_for_project()`'s output without running the query. The number of prediction
+    elements comes from the ForecastMetaPrediction counts of each (model, timezero)'s latest version (as of as_of, if
+    passed), which include the elements merged from earlier versions. Those are scaled by the fraction of the
+    versions' units and targets (from ForecastMetaPrediction's bitsets) that the query selects. Each class's
+    average number of rows per element and value column sizes come from a sample of the project's current elements.
+    Forecasts whose metadata has not been cached are not counted.
+
+    :param project: a Project
+    :param validated_query: the second element of a valid query's `validate_forecasts_query()` result, i.e., its
+        object IDs, types, and as_of
+    :return: a dict with these int keys: 'num_elements', 'num_rows' (not including the header), and 'num_bytes' (of
+        the CSV, including the header)
+    """
+    model_ids, unit_ids, target_ids, timezero_ids, type_ints, as_of, projection = validated_query
+
+    # the latest version of each (model, timezero)
+    forecasts_qs = Forecast.objects.filter(forecast_model__project=project, forecast_model__is_oracle=False)
+    newer_forecasts_qs = Forecast.objects.filter(forecast_model=OuterRef('forecast_model'),
+                                                 time_zero=OuterRef('time_zero'),
+                                                 issued_at__gt=OuterRef('issued_at'))
+    if model_ids:
+        forecasts_qs = forecasts_qs.filter(forecast_model_id__in=model_ids)
+    if timezero_ids:
+        forecasts_qs = forecasts_qs.filter(time_zero_id__in=timezero_ids)
+    if as_of:
+        forecasts_qs = forecasts_qs.filter(issued_at__lte=as_of)
+        newer_forecasts_qs = newer_forecasts_qs.filter(issued_at__lte=as_of)
+    latest_forecasts_qs = forecasts_qs.filter(~Exists(newer_forecasts_qs))
+
+    # the fraction of those versions' elements that the unit and target filters select, assuming elements are spread
+    # evenly across units and targets. the versions' units and targets come from their ForecastMetaPrediction bitsets,
+    # intersected with the project's current ones to skip deleted ones - see `ids_to_bitset()`
+    selected_fraction = 1
+    for bits_field_name, ids, objects_qs in [('unit_bits', unit_ids, project.units),
+                                             ('target_bits', target_ids, project.targets)]:
+        if ids:
+            current_mask = ids_to_mask(objects_qs.values_list('id', flat=True))
+            selected_mask = ids_to_mask(ids) & current_mask
+            num_total, num_selected = 0, 0
+            for bitset, offset in ForecastMetaPrediction.objects.filter(forecast__in=latest_forecasts_qs) \
+                    .values_list(bits_field_name, f'{bits_field_name}_offset'):
+                present_mask = bitset_to_mask(bitset, offset)
+                num_total += count_mask_ids(present_mask & current_mask)
+                num_selected += count_mask_ids(present_mask & selected_mask)
+            selected_fraction *= (num_selected / num_total) if num_total else 0
+
+    # element counts by class
+    pred_class_to_count_field = {PredictionElement.BIN_CLASS: 'bin_count',
+                                 PredictionElement.NAMED_CLASS: 'named_count',
+                                 PredictionElement.POINT_CLASS: 'point_count',
+                                 PredictionElement.SAMPLE_CLASS: 'sample_count',
+                                 PredictionElement.QUANTILE_CLASS: 'quantile_count'}
+    pred_classes = type_ints if type_ints else list(pred_class_to_count_field.keys())
+    count_sums = ForecastMetaPrediction.objects.filter(forecast__in=latest_forecasts_qs) \
+        .aggregate(**{pred_class_to_count_field[pred_class]: Sum(pred_class_to_count_field[pred_class])
+                      for pred_class in pred_classes})
+
+    # the bytes in each row's non-value columns: the average names plus commas and line terminator
+    model_abbrevs = [forecast_model.abbreviation for forecast_model in project.models.filter(is_oracle=False)
+                     if (not model_ids) or (forecast_model.pk in model_ids)]
+    unit_names = [unit.name for unit in project.units.all() if (not unit_ids) or (unit.pk in unit_ids)]
+    target_names = [target.name for target in project.targets.all() if (not target_ids) or (target.pk in target_ids)]
+    season_names = [season_name for season_name in project.timezero_to_season_name().values()]
+    name_bytes = sum(_mean([len(name.encode('utf-8')) for name in names if name is not None])
+                     for names in [model_abbrevs, unit_names, target_names, season_names]) \
+                 + len('YYYY-MM-DD') + len(FORECAST_CSV_HEADER) - 1 + len('\r\n')
+
+    num_elements, num_rows, num_bytes = 0, 0, len(','.join(FORECAST_CSV_HEADER) + '\r\n')
+    for pred_class in pred_classes:
+        class_num_elements = (count_sums[pred_class_to_count_field[pred_class]] or 0) * selected_fraction
+        rows_per_element, value_bytes_per_row = _estimate_element_rows_and_value_bytes(project, pred_class, model_ids,
+                                                                                   projection)
+        class_num_rows = class_num_elements * rows_per_element
+        num_elements += class_num_elements
+        num_rows += class_num_rows
+        num_bytes += class_num_rows * (name_bytes + len(PRED_CLASS_INT_TO_NAME[pred_class]) + value_bytes_per_row)
+    return {'num_elements': round(num_elements), 'num_rows': round(num_rows), 'num_bytes': round(num_bytes)}
+
+
+def _estimate_element_rows_and_value_bytes(project, pred_class, model_ids, projection):
+    """
+    An `estimate_forecasts_query()` helper that samples up to QUERY_ESTIMATE_SAMPLE_SIZE of project's current
+    non-retracted elements of class pred_class. Rows are limited by projection as `_project_pred_data_rows()` limits
+    them.
+
+    :return: a 2-tuple: (rows_per_element, value_bytes_per_row) - the sample's average number of CSV rows per element,
+        and average number of bytes in each row's value columns ('value' through 'param3'). returns (1, 0) if there
+        are no elements
+    """
+    cur_pred_eles_qs = CurrentPredictionElement.objects.filter(forecast_model__project=project,
+                                                               forecast_model__is_oracle=False,
+                                                               pred_class=pred_class, is_retract=False)
+    if model_ids:
+        cur_pred_eles_qs = cur_pred_eles_qs.filter(forecast_model_id__in=model_ids)
+    sample_datas = PredictionData.objects.filter(
+        data_hash__in=cur_pred_eles_qs.values('data_hash')[:QUERY_ESTIMATE_SAMPLE_SIZE]) \
+        .values_list('data', flat=True)
+
+    num_elements, num_rows, num_value_bytes = 0, 0, 0
+    for pred_data in sample_datas:
+        if pred_class == PredictionElement.NAMED_CLASS:
+            row_values = [[pred_data['family']] + [pred_data.get(param_name, '')
+                                                   for param_name in ['param1', 'param2', 'param3']]]
+        elif pred_class == PredictionElement.POINT_CLASS:
+            row_values = [[pred_data['value']]]
+        else:  # bin, quantile, or sample
+            row_values = _project_pred_data_rows(pred_class, pred_data, projection)
+        num_elements += 1
+        num_rows += len(row_values)
+        num_value_bytes += sum(len(str(value)) for values in row_values for value in values)
+    if not num_elements:
+        return 1, 0
+
+    return num_rows / num_elements, (num_value_bytes / num_rows) if num_rows else 0
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0
+
+
+#
+# query_forecasts_partitioned()
+#
+
+# the number of partitions per pool process that `query_forecasts_partitioned()` splits queries into. more than one
+# balances the load when partitions' sizes are uneven
+NUM_QUERY_PARTITIONS_PER_PROCESS = 4
+
+
+def query_forecasts_partitioned(project, query, pool_size, is_copy, max_num_rows=MAX_NUM_QUERY_ROWS):
+    """
+    A generator that returns the same rows as `query_forecasts_for_project()`, but that runs query as independent
+    partitions (see `forecasts_query_partitions()`) across a process pool of size `pool_size`, or serially in the
+    current process if `pool_size` is 1. Each partition writes its CSV to a temporary file, which this function then
+    reads back in partition order. NB: all values are strs, as they are in the CSV.
+
+    The partitions run when iteration starts. max_num_rows applies to the total number of prediction elements (as it
+    does for `query_forecasts_for_project()`), and each partition runs in its own transaction with
+    `_set_local_query_timeouts()`.
+
+    :param project: a Project
+    :param query: as passed to `query_forecasts_for_project()`
+    :param pool_size: the number of processes to run partitions in. 1 means run them in the current process
+    :param is_copy: True if partitions should use `copy_forecasts_csv_for_project()`. postgres only
+    :param max_num_rows: as passed to `query_forecasts_for_project()`
+    :return: a generator of CSV rows including the header
+    """
+    partition_queries = forecasts_query_partitions(project, query, pool_size * NUM_QUERY_PARTITIONS_PER_PROCESS)
+    logger.debug(f"query_forecasts_partitioned(): 1/3 running partitions. # partitions={len(partition_queries)}, "
+                 f"pool_size={pool_size}, query={query}, project={project}")
+    partition_args = [(project.pk, partition_query, is_copy, max_num_rows) for partition_query in partition_queries]
+    partition_results = []  # (csv_file_path, num_rows, num_pred_eles) 3-tuples of successful partitions, in order
+    try:
+        if pool_size <= 1:
+            for args in partition_args:
+                partition_results.append(_query_forecasts_partition(*args))
+        else:
+            # NB: as in `load_forecast_archive()`, we close the parent's database connections before forking so that
+            # workers open their own rather than sharing the parent's socket
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context('fork')) \
+                    as executor:
+                futures = [executor.submit(_query_forecasts_partition, *args) for args in partition_args]
+                partition_ex = None
+                for future in futures:  # collect all successful results so that their files are removed below
+                    try:
+                        partition_results.append(future.result())
+                    except Exception as ex:
+                        partition_ex = partition_ex or ex
+                if partition_ex:
+                    raise partition_ex
+
+        num_pred_eles = sum(partition_num_pred_eles for _, _, partition_num_pred_eles in partition_results)
+        if num_pred_eles > max_num_rows:
+            raise RuntimeError(f"number of rows exceeded maximum. num_rows={num_pred_eles}, "
+                               f"max_num_rows={max_num_rows}")
+
+        num_rows = sum(partition_num_rows - 1 for _, partition_num_rows, _ in partition_results)  # - 1 for header
+        logger.debug(f"query_forecasts_partitioned(): 2/3 reading partitions. num_rows={num_rows}, "
+                     f"num_pred_eles={num_pred_eles}")
+        yield FORECAST_CSV_HEADER
+        for csv_file_path, _, _ in partition_results:
+            with open(csv_file_path, newline='', encoding='utf-8') as csv_file_fp:
+                csv_reader = csv.reader(csv_file_fp)
+                next(csv_reader)  # skip header
+                yield from csv_reader
+    finally:
+        for csv_file_path, _, _ in partition_results:
+            os.remove(csv_file_path)
+
+    # done
+    logger.debug(f"query_forecasts_partitioned(): 3/3 done. num_rows={num_rows}, query={query}, project={project}")
+
+
+def _query_forecasts_partition(project_pk, query, is_copy, max_num_rows):
+    """
+    A `query_forecasts_partitioned()` helper that runs one partition's query and writes its CSV (including the header)
+    to a new temporary file. Runs in a pool worker process if pool_size > 1, so its args and return value must be
+    picklable.
+
+    :param project_pk: the pk of the Project to query
+    :param query: the partition's query
+    :param is_copy: as passed to `query_forecasts_partitioned()`
+    :param max_num_rows: ""
+    :return: a 3-tuple: (csv_file_path, num_rows, num_pred_eles) where num_rows includes the header, and
+        num_pred_eles is the number of prediction elements the rows were expanded from. the caller must remove the file
+    """
+    project = Project.objects.get(pk=project_pk)
+    csv_file_fd, csv_file_path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with open(csv_file_fd, 'wb') as csv_file_fp, transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                _set_local_query_timeouts(cursor)
+            if is_copy:
+                num_rows, num_pred_eles = _copy_forecasts_csv(project, query, csv_file_fp, max_num_rows)
+            else:
+                # the caller limits the total number of elements, which the query counts as it expands them into rows
+                text_io_wrapper = io.TextIOWrapper(csv_file_fp, 'utf-8', newline='')
+                rows = IterCounter(query_forecasts_for_project(project, query, max_num_rows))
+                csv.writer(text_io_wrapper).writerows(rows)
+                text_io_wrapper.detach()  # flushes. NB: o/w closing the wrapper would close csv_file_fp
+                num_rows, num_pred_eles = rows.count, rows.return_value
+        return csv_file_path, num_rows, num_pred_eles
+    except Exception as ex:
+        os.remove(csv_file_path)
+        raise ex
+
+
+def forecasts_query_partitions(project, query, max_num_partitions):
+    """
+    Splits query into at most max_num_partitions queries whose results, concatenated in order and without their
+    headers, are the same as query's. Partitions are contiguous blocks of the query's models, in ID order (the order
+    that `_query_forecasts_sql_for_pred_class()` returns rows in), that have roughly the same number of current
+    prediction elements. If the query's data is from a single model then they are blocks of its timezeros instead.
+
+    :param project: a Project
+    :param query: as passed to `query_forecasts_for_project()`. NB: assumes it has passed validation via
+        `validate_forecasts_query()`
+    :param max_num_partitions: the maximum number of partitions to return
+    :return: a list of queries, which is [query] if it cannot be split
+    """
+    error_messages, (model_ids, unit_ids, target_ids, timezero_ids, type_ints, as_of, _) = \
+        validate_forecasts_query(project, query)
+    if error_messages:
+        raise RuntimeError(f"invalid query. query={query}, errors={error_messages}")
+
+    # weigh each model (and timezero) by its number of current elements. this is only an estimate for as_of queries
+    cur_pred_eles_qs = CurrentPredictionElement.objects.filter(forecast_model__project=project,
+                                                               forecast_model__is_oracle=False)
+    if model_ids:
+        cur_pred_eles_qs = cur_pred_eles_qs.filter(forecast_model_id__in=model_ids)
+    if timezero_ids:
+        cur_pred_eles_qs = cur_pred_eles_qs.filter(time_zero_id__in=timezero_ids)
+    model_id_weights = list(cur_pred_eles_qs.values_list('forecast_model_id').annotate(Count('id'))
+                            .order_by('forecast_model_id'))
+    if len(model_id_weights) > 1:
+        model_id_to_abbrev = {forecast_model.pk: forecast_model.abbreviation for forecast_model in project.models.all()}
+        return [dict(query, models=[model_id_to_abbrev[model_id] for model_id in partition_model_ids])
+                for partition_model_ids in _contiguous_partitions(model_id_weights, max_num_partitions)]
+
+    timezero_id_weights = list(cur_pred_eles_qs.values_list('time_zero_id').annotate(Count('id'))
+                               .order_by('time_zero_id'))
+    if len(timezero_id_weights) > 1:
+        timezero_id_to_date = {timezero.pk: timezero.timezero_date.strftime(YYYY_MM_DD_DATE_FORMAT)
+                               for timezero in project.timezeros.all()}
+        return [dict(query, timezeros=[timezero_id_to_date[timezero_id] for timezero_id in partition_timezero_ids])
+                for partition_timezero_ids in _contiguous_partitions(timezero_id_weights, max_num_partitions)]
+
+    return [query]
+
+
+def _contiguous_partitions(id_weights, max_num_partitions):
+    """
+    A `forecasts_query_partitions()` helper that greedily splits id_weights into contiguous partitions.
+
+    :param id_weights: a list of (id, weight) 2-tuples
+    :param max_num_partitions: the maximum number of partitions to return
+    :return: a list of at most max_num_partitions non-empty lists of ids whose total weights are roughly equal
+    """
+    target_weight = sum(weight for _, weight in id_weights) / max_num_partitions
+    partitions = [[]]
+    partition_weight = 0
+    for the_id, weight in id_weights:
+        if partitions[-1] and (partition_weight + weight > target_weight) and (len(partitions) < max_num_partitions):
+            partitions.append([])
+            partition_weight = 0
+        partitions[-1].append(the_id)
+        partition_weight += weight
+    return partitions
+
+
 #
 # _forecasts_query_worker()
 #
@@ -385,9 +1025,109 @@ def _validate_query_ids(project, query):
 QUERY_FORECAST_STATEMENT_TIMEOUT = 60
 
 
+#
+# query output formats
+#
+
+# the values of the optional 'format' query job field. QUERY_FORMAT_PARQUET requires the optional pyarrow package
+QUERY_FORMAT_CSV = 'csv'
+QUERY_FORMAT_PARQUET = 'parquet'
+QUERY_FORMATS = (QUERY_FORMAT_CSV, QUERY_FORMAT_PARQUET)
+
+# the number of rows in each batch that `_write_parquet_rows()` writes, i.e., each Parquet row group
+PARQUET_BATCH_SIZE = 100_000
+
+# column name -> Arrow type name for `_write_parquet_rows()`. covers FORECAST_CSV_HEADER and TRUTH_CSV_HEADER.
+# 'dictionary' columns are dictionary-encoded strings, which pandas reads as categoricals. 'number' columns ('value' and
+# 'sample') hold values whose type depends on the target, so each is written as two: a float column with the same name
+# for numeric targets' values, and a string column named with a PARQUET_TEXT_COLUMN_SUFFIX for other targets' values
+# (formatted as they are in the CSV, e.g., 'True'). 'cat' is a string for the same reason
+_PARQUET_COLUMN_TYPES = {'model': 'dictionary', 'timezero': 'date', 'season': 'dictionary', 'unit': 'dictionary',
+                         'target': 'dictionary', 'class': 'dictionary', 'value': 'number', 'cat': 'string',
+                         'prob': 'float', 'sample': 'number', 'quantile': 'float', 'family': 'dictionary',
+                         'param1': 'float', 'param2': 'float', 'param3': 'float'}
+
+# the suffix of the string column that `_write_parquet_rows()` adds after each 'number' column, e.g., 'value_text'
+PARQUET_TEXT_COLUMN_SUFFIX = '_text'
+
+
+def is_parquet_available():
+    """
+    :return: True if the optional pyarrow package that QUERY_FORMAT_PARQUET requires is installed, and False o/w
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _write_parquet_rows(rows, bytes_io):
+    """
+    A `_query_worker()` helper that writes rows as returned by `query_forecasts_for_project()` or
+    `query_truth_for_project()` to bytes_io as a compressed Parquet file. The rows are converted and written
+    PARQUET_BATCH_SIZE at a time so that only one batch is in memory. Empty ('') and None values (e.g., the season
+    of a timezero that is not in one) are written as nulls. Columns are written in header order, except that each
+    'number' column in _PARQUET_COLUMN_TYPES is followed by its PARQUET_TEXT_COLUMN_SUFFIX column. A row's value is in
+    at most one of the two: the float one if it is numeric (int or float, but not bool), and the string one o/w.
+
+    :param rows: an iterable of rows whose first row is the header. its column names must be in _PARQUET_COLUMN_TYPES
+    :param bytes_io: a binary file-like object to write the Parquet file to
+    :return: the number of rows written, not including the header
+    :raises RuntimeError: if pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(f"the {QUERY_FORMAT_PARQUET!r} format requires the pyarrow package, which is not installed")
+
+
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+    def column_arrays(column_type, values):  # returns a list of the arrays for one column: two if 'number', o/w one
+        if column_type == 'date':
+            return [pyarrow.array([None if value in ('', None) else datetime.date.fromisoformat(value)
+                                   for value in values], type=pyarrow.date32())]
+        elif column_type == 'float':
+            return [pyarrow.array([None if value in ('', None) else float(value) for value in values],
+                                  type=pyarrow.float64())]
+        elif column_type == 'number':
+            return [pyarrow.array([float(value) if is_number(value) else None for value in values],
+                                  type=pyarrow.float64()),
+                    pyarrow.array([None if (value in ('', None)) or is_number(value) else str(value)
+                                   for value in values], type=pyarrow.string())]
+
+        array = pyarrow.array([None if value in ('', None) else str(value) for value in values], type=pyarrow.string())
+        return [array.dictionary_encode() if column_type == 'dictionary' else array]
+
+
+    rows = iter(rows)
+    header = next(rows)
+    column_types = [_PARQUET_COLUMN_TYPES[column_name] for column_name in header]
+    schema_fields = []
+    for column_name, column_type in zip(header, column_types):
+        if column_type == 'dictionary':
+            schema_fields.append((column_name, pyarrow.dictionary(pyarrow.int32(), pyarrow.string())))
+        else:
+            column_names = [column_name, column_name + PARQUET_TEXT_COLUMN_SUFFIX] if column_type == 'number' \
+                else [column_name]
+            schema_fields.extend((name, array.type) for name, array in zip(column_names,
+                                                                           column_arrays(column_type, [])))
+    schema = pyarrow.schema(schema_fields)
+    num_rows = 0
+    with pyarrow.parquet.ParquetWriter(bytes_io, schema, compression='zstd') as parquet_writer:
+        for batch_rows in chunked(rows, PARQUET_BATCH_SIZE):
+            columns = zip(*batch_rows)
+            parquet_writer.write_table(pyarrow.table([array for column_type, column_values in zip(column_types, columns)
+                                                      for array in column_arrays(column_type, column_values)],
+                                                     schema=schema))
+            num_rows += len(batch_rows)
+    return num_rows
+
+
 class IterCounter(object):
     """
-    Generator (iterator, actually) wrapper that tracks the number of `yield` calls that have been made.
+    Generator (iterator, actually) wrapper that tracks the number of `yield` calls that have been made, and, once it is
+    exhausted, the wrapped generator's return value (None if it has none).
     per https://stackoverflow.com/questions/6309277/how-to-count-the-items-in-a-generator-consumed-by-other-code
     """
 
@@ -395,10 +1135,18 @@ class IterCounter(object):
     def __init__(self, it):
         self._iter = it
         self.count = 0
+        self.return_value = None
 
 
     def _counterWrapper(self, it):
-        for i in it:
+        it = iter(it)
+        while True:
+            try:
+                i = next(it)
+            except StopIteration as stop_iteration:
+                self.return_value = stop_iteration.value
+                return
+
             yield i
             self.count += 1
 
@@ -414,11 +1162,32 @@ def _forecasts_query_worker(job_pk):
     assumes these input_json fields are present and valid:
     - 'project_pk'
     - 'query' (assume has passed `validate_forecasts_query()`)
+
+    runs the query via `query_forecasts_partitioned()` if QUERY_POOL_SIZE > 1
     """
-    _query_worker(job_pk, query_forecasts_for_project)
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import IS_QUERY_CSV_COPY, QUERY_POOL_SIZE
+
+
+    is_copy = IS_QUERY_CSV_COPY and (connection.vendor == 'postgresql')
+    if QUERY_POOL_SIZE > 1:
+        def query_project_fcn(project, query):
+            return query_forecasts_partitioned(project, query, QUERY_POOL_SIZE, is_copy)
+
 
+        _query_worker(job_pk, query_project_fcn)
+    else:
+        _query_worker(job_pk, query_forecasts_for_project, copy_forecasts_csv_for_project if is_copy else None)
 
-def _query_worker(job_pk, query_project_fcn):
+
+def _query_worker(job_pk, query_project_fcn, copy_project_fcn=None):
+    """
+    :param job_pk: the pk of the Job to run
+    :param query_project_fcn: a function that takes (project, query) and returns the rows to write
+    :param copy_project_fcn: optional function that takes (project, query, bytes_io), writes the CSV to bytes_io, and
+        returns the number of rows written. used instead of query_project_fcn if passed and the job's format is
+        QUERY_FORMAT_CSV. currently only `copy_forecasts_csv_for_project()`
+    """
     # imported here so that tests can patch via mock:
     from utils.cloud_file import upload_file
 
@@ -427,16 +1196,21 @@ def _query_worker(job_pk, query_project_fcn):
     job = get_object_or_404(Job, pk=job_pk)
     project = get_object_or_404(Project, pk=job.input_json['project_pk'])
     query = job.input_json['query']
+    query_format = job.input_json.get('format', QUERY_FORMAT_CSV)
+    if query_format != QUERY_FORMAT_CSV:
+        copy_project_fcn = None
+    cache_key = job.input_json.get('cache_key')  # set by `_create_query_job()` if the query cache is enabled
+    data_version = project_data_version(project.pk) if cache_key else None  # NB: before querying
     try:
         logger.debug(f"_query_worker(): 1/4 querying rows. query={query}. job={job}")
         # use a transaction to set the scope of the postgres `statement_timeout` parameter. statement_timeout raises
         # this error: django.db.utils.OperationalError ('canceling statement due to statement timeout'). Similarly,
         # idle_in_transaction_session_timeout raises django.db.utils.InternalError . todo does not consistently work!
-        if connection.vendor == 'postgresql':
+        if copy_project_fcn:
+            rows = None  # copy_project_fcn() is called below
+        elif connection.vendor == 'postgresql':
             with transaction.atomic(), connection.cursor() as cursor:
-                cursor.execute(f"SET LOCAL statement_timeout = '{QUERY_FORECAST_STATEMENT_TIMEOUT}s';")
-                cursor.execute(
-                    f"SET LOCAL idle_in_transaction_session_timeout = '{QUERY_FORECAST_STATEMENT_TIMEOUT}s';")
+                _set_local_query_timeouts(cursor)
                 rows = query_project_fcn(project, query)
         else:
             rows = query_project_fcn(project, query)
@@ -465,17 +1239,32 @@ def _query_worker(job_pk, query_project_fcn):
         # per https://stackoverflow.com/questions/59079354/how-to-write-utf-8-csv-into-bytesio-in-python3 :
         with io.BytesIO() as bytes_io:
             logger.debug(f"_query_worker(): 2/4 writing rows. job={job}")
-            text_io_wrapper = io.TextIOWrapper(bytes_io, 'utf-8', newline='')
-            rows = IterCounter(rows)
-            csv.writer(text_io_wrapper).writerows(rows)
-            text_io_wrapper.flush()
+            if copy_project_fcn:
+                # unlike query_project_fcn(), which returns a generator, copy_project_fcn() runs its query here, so
+                # the timeouts apply to it
+                with transaction.atomic(), connection.cursor() as cursor:
+                    _set_local_query_timeouts(cursor)
+                    num_rows = copy_project_fcn(project, query, bytes_io)
+            else:
+                # num_rows includes the header for all formats, as copy_project_fcn()'s does
+                rows = IterCounter(rows)
+                if query_format == QUERY_FORMAT_PARQUET:
+                    _write_parquet_rows(rows, bytes_io)
+                else:
+                    text_io_wrapper = io.TextIOWrapper(bytes_io, 'utf-8', newline='')
+                    csv.writer(text_io_wrapper).writerows(rows)
+                    text_io_wrapper.flush()
+                num_rows = rows.count
+            num_bytes = bytes_io.tell()
             bytes_io.seek(0)
 
             logger.debug(f"_query_worker(): 3/4 uploading file. job={job}")
             upload_file(job, bytes_io)  # might raise S3 exception
-            job.output_json = {'num_rows': rows.count}
+            job.output_json = {'num_rows': num_rows}
             job.status = Job.SUCCESS
             job.save()
+            if cache_key:
+                _cache_query_result(job, cache_key, data_version, num_bytes)
             logger.debug(f"_query_worker(): 4/4 done. job={job}")
     except (BotoCoreError, Boto3Error, ClientError, ConnectionClosedError) as aws_exc:
         job.status = Job.FAILED
@@ -489,6 +1278,25 @@ def _query_worker(job_pk, query_project_fcn):
         job.save()
 
 
+def _cache_query_result(job, cache_key, data_version, num_bytes):
+    """
+    A `_query_worker()` helper that calls `cache_query_result()`. errors are logged rather than raised b/c the job
+    itself succeeded.
+    """
+    try:
+        cache_query_result(job, cache_key, data_version, num_bytes)
+    except Exception as ex:
+        logger.error(f"_query_worker(): error caching result: {ex!r}. job={job}")
+
+
+def _set_local_query_timeouts(cursor):
+    """
+    A `_query_worker()` helper that sets the postgres timeouts for the current transaction.
+    """
+    cursor.execute(f"SET LOCAL statement_timeout = '{QUERY_FORECAST_STATEMENT_TIMEOUT}s';")
+    cursor.execute(f"SET LOCAL idle_in_transaction_session_timeout = '{QUERY_FORECAST_STATEMENT_TIMEOUT}s';")
+
+
 #
 # query_truth_for_project()
 #
@@ -542,12 +1350,13 @@ def query_truth_for_project(project, query, max_num_rows=MAX_NUM_QUERY_ROWS):
 
     # get the SQL then execute and iterate over resulting data
     model_ids = [oracle_model.pk]
-    sql = _query_forecasts_sql_for_pred_class(None, model_ids, unit_ids, target_ids, timezero_ids, as_of, False)
+    sql, sql_params = _query_forecasts_sql_for_pred_class(None, model_ids, unit_ids, target_ids, timezero_ids, as_of,
+                                                          False)
     logger.debug(f"query_truth_for_project(): 2/3 executing sql. model_ids, unit_ids, target_ids, timezero_ids, "
                  f"as_of= {model_ids}, {unit_ids}, {target_ids}, {timezero_ids}, {as_of}")
     num_rows = 0
-    with connection.cursor() as cursor:
-        cursor.execute(sql, (project.pk,))
+    with server_side_cursor() as cursor:
+        cursor.execute(sql, [project.pk] + sql_params)
         for fm_id, tz_id, pred_class, unit_id, target_id, is_retract, pred_data in batched_rows(cursor):
             # we do not have to check is_retract b/c we pass `is_include_retract=False`, which skips retractions
             num_rows += 1
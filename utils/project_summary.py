@@ -0,0 +1,119 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+
+from forecast_app.models import Forecast, ForecastMetaPrediction, Project, ProjectSummary
+
+
+logger = logging.getLogger(__name__)
+
+
+#
+# ---- project summary counters ----
+#
+# ProjectSummary rows are created along with their Project (see `_create_summary_for_project()`), or by the migration
+# that added them for existing projects. they are maintained incrementally by the signals in
+# forecast_app/models/project_summary.py, which call the functions below, and are recomputed from scratch by
+# `refresh_project_summary()` when a change cannot be tracked incrementally. the `project_summary_util.py refresh`
+# command does so for all projects, which repairs any drift. NB: the incremental updates are applied after the writer's
+# transaction commits so that the summary's row is not locked for the rest of it, which would serialize concurrent
+# forecast loads into the same project
+#
+
+def project_summary(project):
+    """
+    :param project: a Project
+    :return: the project's ProjectSummary. NB: uses the cached `project.summary` if it was loaded via
+        `select_related()`. creates it if necessary, which should only happen for projects that were created without
+        signals, e.g., via `loaddata`
+    """
+    try:
+        return project.summary
+    except ProjectSummary.DoesNotExist:
+        return refresh_project_summary(project.pk)
+
+
+def refresh_project_summary(project_id, is_create=True):
+    """
+    Recomputes all of a project's ProjectSummary fields from scratch. Called by writers whose changes the signals
+    cannot track incrementally: truth loads and deletes, which define batches by editing their forecasts' issued_at;
+    model edits, which can change is_oracle; and metadata rebuilds, which use direct SQL.
+
+    The summary's row is locked while its fields are computed so that concurrent incremental updates are not lost: they
+    wait for the lock and then add their changes to the computed fields. Because those updates are applied after their
+    writer commits, one whose writer committed just before the fields were computed can be counted twice. The
+    `project_summary_util.py refresh` command repairs such drift. A missing row is created (and committed, if not called
+    in a transaction) before it is locked.
+
+    :param project_id: a Project.pk
+    :param is_create: True if the summary should be created if it does not exist. False if it should only be updated
+    :return: the ProjectSummary, or None if is_create is False and there was none
+    """
+    from utils.project_truth import truth_batches  # avoid circular imports
+
+
+    if is_create:
+        ProjectSummary.objects.get_or_create(project_id=project_id)
+
+    with transaction.atomic():
+        summary = ProjectSummary.objects.select_for_update().filter(project_id=project_id).first()
+        if not summary:
+            return None
+
+        project = Project.objects.get(pk=project_id)
+        forecasts_qs = Forecast.objects.filter(forecast_model__project=project)
+        model_forecasts_qs = forecasts_qs.filter(forecast_model__is_oracle=False)
+        num_rows = ForecastMetaPrediction.objects.filter(forecast__in=model_forecasts_qs) \
+            .aggregate(num_rows=Sum(F('point_count') + F('named_count') + F('bin_count') + F('sample_count')
+                                    + F('quantile_count')))['num_rows']
+        batches = truth_batches(project)
+        summary.num_models = project.models.filter(is_oracle=False).count()
+        summary.num_forecasts = model_forecasts_qs.count()
+        summary.num_rows = num_rows or 0
+        summary.last_update = forecasts_qs.aggregate(Max('created_at'))['created_at__max']
+        summary.num_truth_batches = len(batches)
+        summary.truth_latest_source = batches[-1][0] if batches else None
+        summary.truth_latest_issued_at = batches[-1][1] if batches else None
+        summary.save()
+    return summary
+
+
+def add_to_project_summary(project_id, **field_deltas):
+    """
+    Adds the passed deltas to a project's ProjectSummary counters after the current transaction commits (immediately if
+    there is none), and not at all if it is rolled back. Does nothing if the project has no summary yet. NB: uses an
+    UPDATE rather than an upsert so that it is safe to call while the project is being deleted.
+
+    :param project_id: a Project.pk
+    :param field_deltas: maps ProjectSummary counter field names to the int to add to them
+    """
+    transaction.on_commit(lambda: ProjectSummary.objects.filter(project_id=project_id)
+                          .update(**{field_name: F(field_name) + delta for field_name, delta in field_deltas.items()}))
+
+
+def update_project_summary_last_update(project_id, created_at, is_deleted=False):
+    """
+    Updates a project's ProjectSummary.last_update after a Forecast is created or deleted. Like
+    `add_to_project_summary()`, the update is applied after the current transaction commits. Does nothing if the project
+    has no summary yet.
+
+    :param project_id: a Project.pk
+    :param created_at: the created or deleted Forecast's created_at
+    :param is_deleted: True if the Forecast was deleted, in which case last_update is recomputed from the remaining
+        forecasts, but only if it was the deleted one's. this keeps deleting a model or project with many forecasts
+        from recomputing it once per forecast
+    """
+    def update_last_update():
+        summary_qs = ProjectSummary.objects.filter(project_id=project_id)
+        if not is_deleted:
+            summary_qs.filter(Q(last_update__isnull=True) | Q(last_update__lt=created_at)) \
+                .update(last_update=created_at)
+        else:
+            latest_created_at = Forecast.objects.filter(forecast_model__project_id=OuterRef('project_id')) \
+                .order_by('-created_at') \
+                .values('created_at')[:1]
+            summary_qs.filter(last_update=created_at).update(last_update=Subquery(latest_created_at))
+
+
+    transaction.on_commit(update_last_update)
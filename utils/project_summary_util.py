@@ -0,0 +1,53 @@
+import click
+import django
+from django.shortcuts import get_object_or_404
+
+
+# set up django. must be done before loading models. NB: requires DJANGO_SETTINGS_MODULE to be set
+django.setup()
+
+from utils.project_summary import refresh_project_summary
+
+from forecast_app.models import Project, ProjectSummary
+
+
+# https://stackoverflow.com/questions/44051647/get-params-sent-to-a-subcommand-of-a-click-group
+class MyGroup(click.Group):
+    def invoke(self, ctx):
+        ctx.obj = tuple(ctx.args)
+        super().invoke(ctx)
+
+
+@click.group(cls=MyGroup)
+@click.pass_context
+def cli(ctx):
+    args = ctx.obj
+    print('cli: {} {}'.format(ctx.invoked_subcommand, ' '.join(args)))
+
+
+@cli.command()
+@click.option('--project-pk')
+def refresh(project_pk):
+    """
+    A subcommand that recomputes one or all projects' ProjectSummary from scratch, which repairs any drift in the
+    incrementally-maintained counters. Creates missing ones. Prints the summaries that changed. Runs in the calling
+    thread and therefore blocks.
+
+    :param project_pk: if a valid Project pk then only that project's summary is refreshed. o/w refreshes all
+    """
+    def summary_fields(summary):
+        return None if summary is None else [getattr(summary, field.attname) for field in ProjectSummary._meta.fields]
+
+
+    projects = [get_object_or_404(Project, pk=project_pk)] if project_pk else Project.objects.all()
+    print("refreshing summaries")
+    for project in projects:
+        old_fields = summary_fields(ProjectSummary.objects.filter(project=project).first())
+        new_fields = summary_fields(refresh_project_summary(project.pk))
+        if old_fields != new_fields:
+            print(f"* {project}: {old_fields} -> {new_fields}")
+    print("refresh done")
+
+
+if __name__ == '__main__':
+    cli()
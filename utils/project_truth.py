@@ -5,6 +5,7 @@ import logging
 from collections import defaultdict
 
 from django.db import transaction, connection
+from django.db.models import OuterRef, Subquery
 
 from forecast_app.models import PredictionElement
 from forecast_app.models.prediction_element import PRED_CLASS_INT_TO_NAME
@@ -100,11 +101,12 @@ def get_truth_data_preview(project):
         return PredictionData.objects.none()
 
     # note: https://code.djangoproject.com/ticket/32483 sqlite3 json query bug -> we manually access field instead of
-    # using 'data__value'
-    pred_data_qs = PredictionData.objects \
-                       .filter(pred_ele__forecast__forecast_model=oracle_model) \
-                       .values_list('pred_ele__forecast__time_zero__timezero_date', 'pred_ele__unit__name',
-                                    'pred_ele__target__name',
+    # using 'data__value'. PredictionData is content-addressed, so we look up each element's data via its data_hash
+    pred_data_qs = PredictionElement.objects \
+                       .filter(forecast__forecast_model=oracle_model, is_retract=False) \
+                       .annotate(data=Subquery(PredictionData.objects.filter(data_hash=OuterRef('data_hash'))
+                                               .values('data'))) \
+                       .values_list('forecast__time_zero__timezero_date', 'unit__name', 'target__name',
                                     'data')[:10]
     return [(tz_date, unit__name, target__name, data['value'])
             for tz_date, unit__name, target__name, data in pred_data_qs]
@@ -178,6 +180,7 @@ def load_truth_data(project, truth_file_path_or_fp, file_name=None, is_convert_n
 def _load_truth_data(project, oracle_model, truth_file_fp, file_name, is_convert_na_none):
     from forecast_app.models import Forecast  # avoid circular imports
     from utils.forecast import load_predictions_from_json_io_dict  # ""
+    from utils.project_summary import refresh_project_summary  # ""
 
 
     # load, validate, and replace with objects and parsed values.
@@ -244,6 +247,7 @@ def _load_truth_data(project, oracle_model, truth_file_fp, file_name, is_convert
             forecast.issued_at = issued_at
             forecast.save()
 
+    refresh_project_summary(project.pk, is_create=False)  # truth batch info
     logger.debug(f"_load_truth_data(): done")
     return len(rows)
 
@@ -421,12 +425,14 @@ def truth_delete_batch(project, source, issued_at):
     :param issued_at: "" 1 ""
     """
     from forecast_app.models import Forecast  # avoid circular imports
+    from utils.project_summary import refresh_project_summary  # ""
 
 
     logger.debug(f"truth_delete_batch(): started. source={source}, issued_at={issued_at}")
     batch_forecasts_qs = Forecast.objects.filter(forecast_model=oracle_model_for_project(project),
                                                  source=source, issued_at=issued_at)
     batch_forecasts_qs.delete()
+    refresh_project_summary(project.pk, is_create=False)  # truth batch info
     logger.debug(f"truth_delete_batch(): done. source={source}, issued_at={issued_at}")
 
 
@@ -0,0 +1,164 @@
+import datetime
+import hashlib
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils.timezone import now
+
+from forecast_app.models import ProjectDataVersion, QueryCacheEntry
+from forecast_app.models.job import JOB_TYPE_QUERY_FORECAST, JOB_TYPE_QUERY_TRUTH
+
+
+logger = logging.getLogger(__name__)
+
+
+#
+# ---- query result cache ----
+#
+# query Jobs whose normalized query (see `query_cache_key()`) was already run against the same project data reuse the
+# earlier Job's output file. "same project data" is tracked by ProjectDataVersion, which is bumped whenever anything
+# that can appear in query results changes. cache entries are QueryCacheEntry instances, which are created by
+# `_query_worker()` and used by `_create_query_job()`
+#
+
+def query_cache_key(query_job_type, query_format, validated_query):
+    """
+    :param query_job_type: either JOB_TYPE_QUERY_FORECAST or JOB_TYPE_QUERY_TRUTH
+    :param query_format: one of QUERY_FORMATS
+    :param validated_query: the second element of a valid query's `validate_forecasts_query()` or
+        `validate_truth_query()` result (depending on query_job_type), i.e., its object IDs, types, and as_of
+    :return: a str that identifies the query's results for any ProjectDataVersion, or None if validated_query is None.
+        the query is normalized first so that equivalent ones have the same key: ID lists (and forecast queries'
+        'quantiles' and 'bin_cats') are sorted and de-duplicated, and as_of is converted to UTC
+    """
+    if validated_query is None:
+        return None
+
+    if query_job_type == JOB_TYPE_QUERY_FORECAST:
+        model_ids, unit_ids, target_ids, timezero_ids, types, as_of, projection = validated_query
+        normalized_query = {'models': sorted(set(model_ids)), 'units': sorted(set(unit_ids)),
+                            'targets': sorted(set(target_ids)), 'timezeros': sorted(set(timezero_ids)),
+                            'types': sorted(set(types)),
+                            'quantiles': sorted(set(projection['quantiles'])) if projection['quantiles'] else None,
+                            'max_samples': projection['max_samples'],
+                            'bin_cats': sorted({json.dumps(cat) for cat in projection['bin_cats']})
+                            if projection['bin_cats'] else None}
+    elif query_job_type == JOB_TYPE_QUERY_TRUTH:
+        unit_ids, target_ids, timezero_ids, as_of = validated_query
+        normalized_query = {'units': sorted(set(unit_ids)), 'targets': sorted(set(target_ids)),
+                            'timezeros': sorted(set(timezero_ids))}
+    else:
+        raise RuntimeError(f"invalid query_job_type: {query_job_type!r}")
+
+    normalized_query['as_of'] = as_of.astimezone(datetime.timezone.utc).isoformat() if as_of else None
+    key_json = json.dumps({'type': query_job_type, 'format': query_format, 'query': normalized_query},
+                          sort_keys=True)
+    return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
+
+
+def project_data_version(project_id):
+    """
+    :param project_id: a Project.pk
+    :return: the project's current ProjectDataVersion.version, creating its row if necessary
+    """
+    data_version, _ = ProjectDataVersion.objects.get_or_create(project_id=project_id)
+    return data_version.version
+
+
+def bump_project_data_version(project_id):
+    """
+    Increments the project's ProjectDataVersion.version, which invalidates its QueryCacheEntrys. Does nothing if the
+    project has no version yet, in which case it has no entries. NB: uses an UPDATE rather than an upsert so that it is
+    safe to call while the project is being deleted.
+
+    The UPDATE is run after the current transaction commits (immediately if there is none) so that the project's row is
+    not locked for the rest of the caller's transaction, which would serialize concurrent forecast uploads. The late
+    bump is tolerated by the cache: an entry created in between is recorded at the version from before its query ran
+    (see `cache_query_result()`), which the bump makes stale.
+
+    :param project_id: a Project.pk
+    """
+    transaction.on_commit(
+        lambda: ProjectDataVersion.objects.filter(project_id=project_id).update(version=F('version') + 1))
+
+
+def cached_query_entry(project, cache_key):
+    """
+    :param project: a Project
+    :param cache_key: a `query_cache_key()` result
+    :return: the QueryCacheEntry for cache_key at project's current data version, or None if there is none or it is
+        older than QUERY_CACHE_MAX_AGE_DAYS. updates the entry's last_used_at
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import QUERY_CACHE_MAX_AGE_DAYS
+
+
+    data_version = ProjectDataVersion.objects.filter(project=project).values_list('version', flat=True).first()
+    if data_version is None:
+        return None
+
+    cache_entry = QueryCacheEntry.objects.filter(project=project, cache_key=cache_key, data_version=data_version,
+                                                 created_at__gte=now() - datetime.timedelta(
+                                                     days=QUERY_CACHE_MAX_AGE_DAYS)) \
+        .first()
+    if cache_entry:
+        cache_entry.last_used_at = now()
+        cache_entry.save(update_fields=['last_used_at'])
+    return cache_entry
+
+
+def cache_query_result(job, cache_key, data_version, num_bytes):
+    """
+    Adds a QueryCacheEntry for job's output file, and then evicts old entries. Does nothing if there is already an entry
+    for the same key and version, e.g., if the same query was run concurrently.
+
+    :param job: a successful query Job whose output_json has 'num_rows'
+    :param cache_key: the `query_cache_key()` result for job's query
+    :param data_version: the project's ProjectDataVersion.version from /before/ the query was run. this means an entry
+        for a query that ran while the data changed is created with an already-stale version, which is never used
+    :param num_bytes: the size of job's output file
+    """
+    QueryCacheEntry.objects.get_or_create(project_id=job.input_json['project_pk'], cache_key=cache_key,
+                                          data_version=data_version,
+                                          defaults={'job': job, 'num_rows': job.output_json['num_rows'],
+                                                    'num_bytes': num_bytes})
+    evict_query_cache()
+
+
+def evict_query_cache(max_age_days=None, max_size=None):
+    """
+    Deletes QueryCacheEntrys that are stale (their project's data has changed), that are older than max_age_days, or
+    that are the least recently used ones beyond a total num_bytes of max_size.
+
+    :param max_age_days: defaults to QUERY_CACHE_MAX_AGE_DAYS
+    :param max_size: defaults to QUERY_CACHE_MAX_SIZE
+    :return: the number of entries deleted
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import QUERY_CACHE_MAX_AGE_DAYS, QUERY_CACHE_MAX_SIZE
+
+
+    max_age_days = QUERY_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_size = QUERY_CACHE_MAX_SIZE if max_size is None else max_size
+
+    # stale and old entries
+    current_version = ProjectDataVersion.objects.filter(project=OuterRef('project')).values('version')
+    num_deleted, _ = QueryCacheEntry.objects.filter(data_version__lt=Subquery(current_version)).delete()
+    num_old, _ = QueryCacheEntry.objects.filter(created_at__lt=now() - datetime.timedelta(days=max_age_days)).delete()
+    num_deleted += num_old
+
+    # least recently used entries beyond max_size
+    total_size, lru_ids = 0, []
+    for entry_id, num_bytes in QueryCacheEntry.objects.order_by('-last_used_at', '-id') \
+            .values_list('id', 'num_bytes'):
+        total_size += num_bytes
+        if total_size > max_size:
+            lru_ids.append(entry_id)
+    if lru_ids:
+        num_lru, _ = QueryCacheEntry.objects.filter(id__in=lru_ids).delete()
+        num_deleted += num_lru
+
+    logger.debug(f"evict_query_cache(): done. num_deleted={num_deleted}")
+    return num_deleted
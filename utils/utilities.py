@@ -1,5 +1,7 @@
 import logging
+from contextlib import contextmanager
 
+from django.db import connection, transaction
 from django.template import Template, Context
 
 
@@ -103,15 +105,61 @@ SQL_ROWS_BATCH_SIZE = 2000
 
 def batched_rows(cursor):
     """
-    Generator that retrieves rows from `cursor` in batches of size SQL_ROWS_BATCH_SIZE.
+    Generator that retrieves rows from `cursor` in batches of size SQL_ROWS_BATCH_SIZE, or of size `cursor.itersize`
+    for `server_side_cursor()`s. NB: rows are only actually streamed from the database for the latter. regular psycopg2
+    cursors fetch all rows when the query is executed.
 
     :param cursor: a cursor
     :return: next row from cursor
     """
+    batch_size = cursor.itersize if getattr(cursor, 'name', None) else SQL_ROWS_BATCH_SIZE
     while True:
-        rows = cursor.fetchmany(SQL_ROWS_BATCH_SIZE)
+        rows = cursor.fetchmany(batch_size)
         if not rows:
             break
 
         for row in rows:
             yield row
+
+
+@contextmanager
+def server_side_cursor():
+    """
+    A context manager that returns a cursor for queries whose results should be streamed from the database via
+    `batched_rows()` rather than fetched all at once, e.g., those of `query_forecasts_for_project()`. On postgres this
+    is a named (server-side) cursor with an itersize of SERVER_SIDE_CURSOR_ITERSIZE. It is created in a transaction so
+    that postgres does not have to materialize the results for a WITH HOLD cursor (which is what psycopg2 requires
+    outside of one). Other databases (i.e., sqlite), a SERVER_SIDE_CURSOR_ITERSIZE of 0, and the DATABASES
+    'DISABLE_SERVER_SIDE_CURSORS' option (e.g., for pgbouncer transaction pooling) get a regular cursor. NB: named
+    cursors can execute only one SELECT statement.
+    """
+    # imported here so that tests can patch via mock:
+    from forecast_repo.settings.base import SERVER_SIDE_CURSOR_ITERSIZE
+
+
+    if (connection.vendor != 'postgresql') or (not SERVER_SIDE_CURSOR_ITERSIZE) \
+            or connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        with connection.cursor() as cursor:
+            yield cursor
+        return
+
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.cursor.itersize = SERVER_SIDE_CURSOR_ITERSIZE  # NB: set on the psycopg2 cursor, not Django's wrapper
+        yield cursor
+
+
+def sql_in_values(column, values):
+    """
+    Returns an SQL condition that is true if `column` is one of `values`, with the values bound as params rather than
+    interpolated into the SQL. On postgres the condition is `column = ANY(%s)` with a single array param, which means
+    the SQL is the same regardless of the values and their number. sqlite has no arrays, so there it is
+    `column IN (%s, ...)` with one param per value.
+
+    :param column: an SQL column expression, e.g., 'fm.id'
+    :param values: a non-empty list of values, e.g., ints
+    :return: a 2-tuple: (sql, params) where params is a list
+    """
+    if connection.vendor == 'postgresql':
+        return f"{column} = ANY(%s)", [list(values)]
+    else:
+        return f"{column} IN ({', '.join(['%s'] * len(values))})", list(values)